@@ -0,0 +1,87 @@
+import time
+import threading
+from typing import Callable, List, Optional
+
+
+class RequestCancelled(Exception):
+    """요청이 취소되었거나 제한 시간을 넘김 (결과를 받을 클라이언트가 없음)"""
+    pass
+
+
+class CancellationToken:
+    """
+    요청 단위 취소 토큰
+
+    파이프라인 각 단계(STT 디코딩 루프, LLM HTTP 호출, TTS 합성)에 전달되어
+    클라이언트가 끊기거나 제한 시간이 지나면 진행 중인 작업을 중단시킴
+    """
+
+    def __init__(self, timeout: Optional[float] = None, probe_interval: float = 0.1):
+        """
+        Args:
+            timeout: 요청 제한 시간 (초, 없으면 무제한)
+            probe_interval: 외부 상태 확인(클라이언트 연결 등) 최소 간격 (초)
+        """
+        self.deadline = time.monotonic() + timeout if timeout is not None else None
+        self.reason = None
+        self.probe_interval = probe_interval
+        self._event = threading.Event()
+        self._probes: List[Callable[[], bool]] = []
+        self._last_probe = 0.0
+        self._lock = threading.Lock()
+
+    def cancel(self, reason: str = "cancelled"):
+        with self._lock:
+            if self.reason is None:
+                self.reason = reason
+        self._event.set()
+
+    def add_probe(self, probe: Callable[[], bool], reason: str = "client_disconnected"):
+        """주기적으로 확인할 취소 조건 등록 (True를 반환하면 취소)"""
+        self._probes.append(lambda: probe() and reason)
+
+    @property
+    def cancelled(self) -> bool:
+        if self._event.is_set():
+            return True
+        if self.deadline is not None and time.monotonic() >= self.deadline:
+            self.cancel("deadline_exceeded")
+            return True
+        if self._probes:
+            now = time.monotonic()
+            if now - self._last_probe >= self.probe_interval:
+                self._last_probe = now
+                for probe in self._probes:
+                    reason = probe()
+                    if reason:
+                        self.cancel(reason)
+                        return True
+        return False
+
+    def check(self):
+        """취소되었으면 RequestCancelled 발생"""
+        if self.cancelled:
+            raise RequestCancelled(self.reason)
+
+    def remaining(self, default: Optional[float] = None) -> Optional[float]:
+        """남은 시간 (초, 제한이 없으면 default)"""
+        if self.deadline is None:
+            return default
+        return max(0.0, self.deadline - time.monotonic())
+
+    def wait(self, seconds: float) -> bool:
+        """최대 seconds 동안 대기 (취소되면 즉시 True 반환)"""
+        end = time.monotonic() + seconds
+        while True:
+            if self.cancelled:
+                return True
+            left = end - time.monotonic()
+            if left <= 0:
+                return False
+            self._event.wait(min(left, self.probe_interval))
+
+
+def check(token: Optional[CancellationToken]):
+    """token이 있을 때만 취소 여부 확인"""
+    if token is not None:
+        token.check()
@@ -1,62 +1,152 @@
 import os
+import time
+import queue
+import random
 import logging
+import threading
 from abc import ABC, abstractmethod
-from typing import Dict, Any, Optional
+from collections import deque
+from contextlib import nullcontext
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Dict, Any, Optional, List, Union, Iterator, Tuple
+from Models.Cancellation import CancellationToken, RequestCancelled, check
+
+# 응답 생성 실패시 사용자에게 전달되는 기본 응답
+FALLBACK_RESPONSE = "죄송합니다. 응답을 생성하는 중에 오류가 발생했습니다."
+
+# 한국어 음성 명령 처리를 위한 기본 시스템 프롬프트
+KOREAN_SYSTEM_PROMPT = """당신은 한국어 음성 명령을 처리하는 AI 어시스턴트입니다. 
+사용자의 음성 명령을 이해하고 적절한 응답을 제공하세요. 
+특히 일정 관리, 캘린더 관련 명령에 대해 도움을 주세요."""
+
+class LLMError(Exception):
+    """LLM 응답 생성 실패 (사용 가능한 백엔드 없음 등)"""
+    pass
 
 # Base LLM class
 class BaseLLM(ABC):
     @abstractmethod
-    def generate_response(self, user_input: str) -> str:
+    def generate_response(self, user_input: str,
+                          history: Optional[List[Dict[str, str]]] = None,
+                          token: Optional[CancellationToken] = None) -> str:
         pass
     
     @abstractmethod
     def get_model_info(self) -> Dict[str, Any]:
         pass
+    
+    def generate_or_raise(self, user_input: str,
+                          history: Optional[List[Dict[str, str]]] = None,
+                          token: Optional[CancellationToken] = None) -> str:
+        """실패시 기본 응답 대신 예외를 전달하는 응답 생성"""
+        return self.generate_response(user_input, history=history, token=token)
+    
+    def generate_stream(self, user_input: str,
+                        history: Optional[List[Dict[str, str]]] = None,
+                        token: Optional[CancellationToken] = None,
+                        max_new_tokens: Optional[int] = None) -> Iterator[str]:
+        """
+        응답을 생성되는 대로 조각으로 반환 (실패시 예외 전달)
+        
+        스트리밍을 지원하지 않는 백엔드는 완성된 응답 하나를 반환
+        """
+        yield self.generate_or_raise(user_input, history=history, token=token)
 
 # GPT LLM Implementation
 class GPTLLM(BaseLLM):
-    def __init__(self, api_key: Optional[str] = None, model: str = "gpt-3.5-turbo"):
+    def __init__(self, api_key: Optional[str] = None, model: str = "gpt-3.5-turbo",
+                 system_prompt: Optional[str] = None, max_tokens: int = 512):
         self.model = model
+        self.max_tokens = max_tokens
         self.api_key = api_key or os.getenv('OPENAI_API_KEY')
         
         if not self.api_key:
             raise ValueError("OpenAI API key is required. Set OPENAI_API_KEY environment variable.")
         
         self._setup_logging()
-        self._setup_korean_prompt()
+        self._setup_korean_prompt(system_prompt)
         self.logger.info(f"GPT LLM initialized successfully with model: {self.model}")
     
     def _setup_logging(self):
-        logging.basicConfig(level=logging.INFO)
         self.logger = logging.getLogger(__name__)
     
-    def _setup_korean_prompt(self):
+    def _setup_korean_prompt(self, system_prompt: Optional[str] = None):
         """한국어 음성 명령 처리를 위한 시스템 프롬프트 설정"""
-        self.korean_system_prompt = """당신은 한국어 음성 명령을 처리하는 AI 어시스턴트입니다. 
-사용자의 음성 명령을 이해하고 적절한 응답을 제공하세요. 
-특히 일정 관리, 캘린더 관련 명령에 대해 도움을 주세요."""
+        self.korean_system_prompt = system_prompt or KOREAN_SYSTEM_PROMPT
+        # 매 요청 동일한 접두부를 유지해야 OpenAI 자동 프롬프트 캐시가 적용됨
+        self._system_message = {"role": "system", "content": self.korean_system_prompt}
+    
+    def _build_messages(self, user_input: str,
+                        history: Optional[List[Dict[str, str]]] = None) -> List[Dict[str, str]]:
+        """시스템 프롬프트 → 대화 요약 → 최근 대화 → 현재 입력 순서로 메시지 구성"""
+        messages = [self._system_message]
+        for message in history or []:
+            if message["role"] == "summary":
+                messages.append({"role": "system", "content": f"이전 대화 요약:\n{message['content']}"})
+            else:
+                messages.append({"role": message["role"], "content": message["content"]})
+        messages.append({"role": "user", "content": user_input})
+        return messages
     
-    def generate_response(self, user_input: str) -> str:
+    def generate_or_raise(self, user_input: str,
+                          history: Optional[List[Dict[str, str]]] = None,
+                          token: Optional[CancellationToken] = None) -> str:
+        """사용자 입력에 대한 응답 생성 (실패시 예외 전달)"""
+        import openai
+        openai.api_key = self.api_key
+        
+        check(token)
+        response = openai.ChatCompletion.create(
+            model=self.model,
+            messages=self._build_messages(user_input, history),
+            max_tokens=self.max_tokens,
+            temperature=0.7,
+            # 요청 제한 시간을 넘겨 기다리지 않도록 HTTP 타임아웃을 남은 시간으로 제한
+            request_timeout=token.remaining() if token else None
+        )
+        check(token)
+        
+        return response.choices[0].message.content.strip()
+    
+    def generate_stream(self, user_input: str,
+                        history: Optional[List[Dict[str, str]]] = None,
+                        token: Optional[CancellationToken] = None,
+                        max_new_tokens: Optional[int] = None) -> Iterator[str]:
+        """응답을 생성되는 대로 반환 (소비자가 멈추면 스트림을 닫아 생성 중단)"""
+        import openai
+        openai.api_key = self.api_key
+        
+        check(token)
+        response = openai.ChatCompletion.create(
+            model=self.model,
+            messages=self._build_messages(user_input, history),
+            max_tokens=max_new_tokens or self.max_tokens,
+            temperature=0.7,
+            stream=True,
+            request_timeout=token.remaining() if token else None
+        )
+        try:
+            for chunk in response:
+                check(token)
+                content = chunk.choices[0].delta.get("content")
+                if content:
+                    yield content
+        finally:
+            close = getattr(response, "close", None)
+            if close is not None:
+                close()
+    
+    def generate_response(self, user_input: str,
+                          history: Optional[List[Dict[str, str]]] = None,
+                          token: Optional[CancellationToken] = None) -> str:
         """사용자 입력에 대한 응답 생성"""
         try:
-            import openai
-            openai.api_key = self.api_key
-            
-            response = openai.ChatCompletion.create(
-                model=self.model,
-                messages=[
-                    {"role": "system", "content": self.korean_system_prompt},
-                    {"role": "user", "content": user_input}
-                ],
-                max_tokens=512,
-                temperature=0.7
-            )
-            
-            return response.choices[0].message.content.strip()
-            
+            return self.generate_or_raise(user_input, history, token)
+        except RequestCancelled:
+            raise
         except Exception as e:
             self.logger.error(f"GPT response generation failed: {e}")
-            return "죄송합니다. 응답을 생성하는 중에 오류가 발생했습니다."
+            return FALLBACK_RESPONSE
     
     def get_model_info(self) -> Dict[str, Any]:
         """모델 정보 반환"""
@@ -74,54 +164,141 @@ class GPTLLM(BaseLLM):
 
 # Gemini LLM Implementation
 class GeminiLLM(BaseLLM):
-    def __init__(self, api_key: Optional[str] = None, model: str = "gemini-pro"):
+    def __init__(self, api_key: Optional[str] = None, model: str = "gemini-pro",
+                 system_prompt: Optional[str] = None,
+                 use_context_cache: bool = False,
+                 cache_ttl_seconds: int = 3600):
         self.model_name = model
         self.api_key = api_key or os.getenv('GOOGLE_API_KEY')
+        self.use_context_cache = use_context_cache
+        self.cache_ttl_seconds = cache_ttl_seconds
+        self.cached_content = None
         
         if not self.api_key:
             raise ValueError("Google API key is required. Set GOOGLE_API_KEY environment variable.")
         
         self._setup_logging()
-        self._setup_korean_prompt()
+        self._setup_korean_prompt(system_prompt)
         self._initialize_model()
         self.logger.info(f"Gemini LLM initialized successfully with model: {self.model_name}")
     
     def _setup_logging(self):
-        logging.basicConfig(level=logging.INFO)
         self.logger = logging.getLogger(__name__)
     
-    def _setup_korean_prompt(self):
+    def _setup_korean_prompt(self, system_prompt: Optional[str] = None):
         """한국어 음성 명령 처리를 위한 시스템 프롬프트 설정"""
-        self.korean_system_prompt = """당신은 한국어 음성 명령을 처리하는 AI 어시스턴트입니다. 
-사용자의 음성 명령을 이해하고 적절한 응답을 제공하세요. 
-특히 일정 관리, 캘린더 관련 명령에 대해 도움을 주세요."""
+        self.korean_system_prompt = system_prompt or KOREAN_SYSTEM_PROMPT
     
     def _initialize_model(self):
-        """Gemini 모델 초기화"""
+        """Gemini 모델 초기화 (시스템 프롬프트는 모델에 한 번만 설정)"""
         try:
             import google.generativeai as genai
             genai.configure(api_key=self.api_key)
-            self.model = genai.GenerativeModel(self.model_name)
+            
+            if self.use_context_cache:
+                self.model = self._create_cached_model(genai)
+            if self.cached_content is None:
+                self.model = genai.GenerativeModel(
+                    self.model_name,
+                    system_instruction=self.korean_system_prompt
+                )
         except Exception as e:
             self.logger.error(f"Failed to initialize Gemini model: {e}")
             raise
     
-    def generate_response(self, user_input: str) -> str:
-        """사용자 입력에 대한 응답 생성"""
+    def _create_cached_model(self, genai):
+        """정적 시스템 프롬프트를 서버측 컨텍스트 캐시에 등록"""
         try:
-            # 시스템 프롬프트와 사용자 입력 결합
-            full_prompt = f"{self.korean_system_prompt}\n\n사용자: {user_input}"
+            import datetime
+            from google.generativeai import caching
             
-            response = self.model.generate_content(full_prompt)
-            
-            if response.text:
-                return response.text.strip()
+            self.cached_content = caching.CachedContent.create(
+                model=self.model_name,
+                system_instruction=self.korean_system_prompt,
+                ttl=datetime.timedelta(seconds=self.cache_ttl_seconds)
+            )
+            self.logger.info(f"Gemini context cache created: {self.cached_content.name}")
+            return genai.GenerativeModel.from_cached_content(cached_content=self.cached_content)
+        except Exception as e:
+            # 모델/프롬프트 길이에 따라 캐시를 지원하지 않으면 일반 모델 사용
+            self.logger.warning(f"Gemini context cache unavailable, using system_instruction: {e}")
+            self.cached_content = None
+            return None
+    
+    def _build_history(self, history: Optional[List[Dict[str, str]]] = None) -> List[Dict[str, Any]]:
+        """대화 기록을 Gemini chat history 형식으로 변환"""
+        contents = []
+        for message in history or []:
+            if message["role"] == "summary":
+                contents.append({"role": "user", "parts": [f"이전 대화 요약:\n{message['content']}"]})
+                contents.append({"role": "model", "parts": ["네, 이전 대화 내용을 참고하겠습니다."]})
             else:
-                return "죄송합니다. 응답을 생성할 수 없습니다."
-                
+                role = "model" if message["role"] == "assistant" else "user"
+                contents.append({"role": role, "parts": [message["content"]]})
+        return contents
+    
+    def generate_or_raise(self, user_input: str,
+                          history: Optional[List[Dict[str, str]]] = None,
+                          token: Optional[CancellationToken] = None) -> str:
+        """사용자 입력에 대한 응답 생성 (실패시 예외 전달)"""
+        check(token)
+        remaining = token.remaining() if token else None
+        request_options = {"timeout": remaining} if remaining is not None else None
+        if history:
+            chat = self.model.start_chat(history=self._build_history(history))
+            response = chat.send_message(user_input, request_options=request_options)
+        else:
+            response = self.model.generate_content(user_input, request_options=request_options)
+        check(token)
+        
+        try:
+            text = response.text
+        except ValueError:
+            # 안전 필터 등으로 텍스트가 없는 응답
+            text = None
+        if not text or not text.strip():
+            raise LLMError("Gemini returned an empty response")
+        return text.strip()
+    
+    def generate_stream(self, user_input: str,
+                        history: Optional[List[Dict[str, str]]] = None,
+                        token: Optional[CancellationToken] = None,
+                        max_new_tokens: Optional[int] = None) -> Iterator[str]:
+        """응답을 생성되는 대로 반환 (소비자가 멈추면 남은 조각을 받지 않음)"""
+        check(token)
+        remaining = token.remaining() if token else None
+        options = {
+            "stream": True,
+            "request_options": {"timeout": remaining} if remaining is not None else None,
+            "generation_config": {"max_output_tokens": max_new_tokens} if max_new_tokens else None,
+        }
+        if history:
+            chat = self.model.start_chat(history=self._build_history(history))
+            response = chat.send_message(user_input, **options)
+        else:
+            response = self.model.generate_content(user_input, **options)
+        
+        for chunk in response:
+            check(token)
+            try:
+                text = chunk.text
+            except ValueError:
+                # 안전 필터 등으로 텍스트가 없는 조각
+                continue
+            if text:
+                yield text
+    
+    def generate_response(self, user_input: str,
+                          history: Optional[List[Dict[str, str]]] = None,
+                          token: Optional[CancellationToken] = None) -> str:
+        """사용자 입력에 대한 응답 생성"""
+        try:
+            return self.generate_or_raise(user_input, history, token)
+        except RequestCancelled:
+            raise
         except Exception as e:
             self.logger.error(f"Gemini response generation failed: {e}")
-            return "죄송합니다. 응답을 생성하는 중에 오류가 발생했습니다."
+            return FALLBACK_RESPONSE
     
     def get_model_info(self) -> Dict[str, Any]:
         """모델 정보 반환"""
@@ -134,10 +311,841 @@ class GeminiLLM(BaseLLM):
                 "context_understanding": True,
                 "command_processing": True,
                 "response_generation": True,
-                "multimodal": True
+                "multimodal": True,
+                "context_cache": self.cached_content is not None
             }
         }
 
+# Stub LLM Implementation (오프라인 테스트/부하 테스트용)
+class StubLLM(BaseLLM):
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0,
+                 failure_rate: float = 0.0, response: Optional[str] = None,
+                 name: str = "stub", **kwargs):
+        """
+        Args:
+            latency: 기본 응답 지연 (초)
+            jitter: 추가 지연의 최대값 (초, 균등 분포)
+            failure_rate: 예외 발생 확률 (0.0 ~ 1.0)
+            response: 고정 응답 (없으면 입력을 그대로 포함한 응답)
+        """
+        self.name = name
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self.response = response
+    
+    def generate_or_raise(self, user_input: str,
+                          history: Optional[List[Dict[str, str]]] = None,
+                          token: Optional[CancellationToken] = None) -> str:
+        delay = self.latency + random.uniform(0, self.jitter)
+        if token is not None:
+            if token.wait(delay):
+                raise RequestCancelled(token.reason)
+        else:
+            time.sleep(delay)
+        if random.random() < self.failure_rate:
+            raise LLMError(f"Stub backend '{self.name}' failed")
+        return self.response or f"'{user_input}'에 대한 테스트 응답입니다."
+    
+    def generate_response(self, user_input: str,
+                          history: Optional[List[Dict[str, str]]] = None,
+                          token: Optional[CancellationToken] = None) -> str:
+        try:
+            return self.generate_or_raise(user_input, history, token)
+        except RequestCancelled:
+            raise
+        except Exception:
+            return FALLBACK_RESPONSE
+    
+    def get_model_info(self) -> Dict[str, Any]:
+        return {
+            "model_name": self.name,
+            "provider": "Stub",
+            "supported_languages": ["ko", "en"],
+            "features": {
+                "offline": True,
+                "latency": self.latency,
+                "failure_rate": self.failure_rate
+            }
+        }
+
+def _legacy_cache(cache) -> Tuple[Tuple[Any, Any], ...]:
+    """모델 KV 캐시 → 층별 (key, value) 튜플 [batch, heads, seq, dim]"""
+    if hasattr(cache, "to_legacy_cache"):
+        return tuple(cache.to_legacy_cache())
+    if hasattr(cache, "layers"):
+        return tuple((layer.keys, layer.values) for layer in cache.layers)
+    return tuple(cache)
+
+def _model_cache(legacy: Tuple[Tuple[Any, Any], ...]):
+    """층별 (key, value) 튜플 → 모델에 전달할 KV 캐시 (transformers 버전별 형식)"""
+    try:
+        from transformers import DynamicCache
+    except ImportError:
+        return legacy
+    if hasattr(DynamicCache, "from_legacy_cache"):
+        return DynamicCache.from_legacy_cache(legacy)
+    return DynamicCache(legacy)
+
+class _LocalModel:
+    """로드된 로컬 모델 + 시스템 프롬프트 KV 캐시 (메모리 관리자가 함께 내리고 다시 만듦)"""
+    
+    def __init__(self, model, tokenizer, prefix_ids: List[int], prefix_cache, eos_ids: set):
+        self.model = model
+        self.tokenizer = tokenizer
+        self.prefix_ids = prefix_ids
+        self.prefix_cache = prefix_cache
+        self.eos_ids = eos_ids
+
+class _Generation:
+    """연속 배치에 참여하는 요청 하나"""
+    
+    def __init__(self, prompt_ids: List[int], max_new_tokens: int,
+                 token: Optional[CancellationToken]):
+        self.prompt_ids = prompt_ids
+        self.max_new_tokens = max_new_tokens
+        self.token = token
+        self.output_ids: List[int] = []
+        self.text = ""
+        self.chunks = queue.Queue()   # 텍스트 조각, 끝나면 None
+        self.error: Optional[BaseException] = None
+        self.abandoned = False        # 소비자가 스트림을 닫음 (충분한 응답을 받음)
+        self.submitted_at = time.monotonic()
+        self.first_token_at = None
+
+# Local LLM Implementation (양자화된 소형 instruct 모델, 클라우드 왕복 없음)
+class LocalLLM(BaseLLM):
+    """
+    로컬 transformers 모델 (CPU: int8 동적 양자화, CUDA: bitsandbytes 4bit)
+    
+    - 시스템 프롬프트 KV 캐시: 정적 프롬프트는 한 번만 계산하고 요청마다 이어서 사용
+    - 연속 배치: 생성 스레드 하나가 토큰 단위로 진행하며 새 요청은 다음 단계에 합류,
+      끝난 요청은 바로 빠짐 (동시 요청이 늘수록 처리량 증가). ai_server에서는 스케줄러 슬롯이
+      파이프라인 전체를 감싸므로 배치 크기는 SCHED_MAX_CONCURRENT + SCHED_FAST_LANE_SLOTS를 넘지 않음
+      (기본값이면 최대 2개) - 처리량이 필요하면 SCHED_MAX_CONCURRENT를 함께 올릴 것
+    - 스트리밍: generate_stream이 생성되는 대로 텍스트 조각 반환
+    """
+    
+    def __init__(self, model: Optional[str] = None,
+                 system_prompt: Optional[str] = None,
+                 quantization: Optional[str] = None,
+                 device: Optional[str] = None,
+                 max_batch_size: Optional[int] = None,
+                 max_new_tokens: Optional[int] = None,
+                 temperature: float = 0.0,
+                 governor=None):
+        """
+        Args:
+            model: Hugging Face 모델 이름 또는 경로 (기본값: LOCAL_LLM_MODEL)
+            system_prompt: 시스템 프롬프트 (KV 캐시로 재사용)
+            quantization: "int8" (CPU 동적 양자화), "4bit"/"8bit" (CUDA bitsandbytes), "none"
+            device: 실행 device (기본값: CUDA가 있으면 cuda)
+            max_batch_size: 동시에 생성하는 최대 요청 수 (기본값: LOCAL_LLM_MAX_BATCH)
+            max_new_tokens: 요청별 최대 생성 토큰 수 (기본값: LOCAL_LLM_MAX_NEW_TOKENS)
+            temperature: 샘플링 온도 (0이면 greedy)
+            governor: 메모리 관리자 (지정시 쉬는 동안 모델을 내렸다가 다시 로드)
+        """
+        import torch
+        
+        self.model_name = model or os.getenv('LOCAL_LLM_MODEL', 'Qwen/Qwen2.5-1.5B-Instruct')
+        self.device = device or ("cuda" if torch.cuda.is_available() else "cpu")
+        self.quantization = quantization or os.getenv(
+            'LOCAL_LLM_QUANTIZATION', "int8" if self.device == "cpu" else "4bit")
+        self.max_batch_size = max_batch_size or int(os.getenv('LOCAL_LLM_MAX_BATCH', '8'))
+        self.max_new_tokens = max_new_tokens or int(os.getenv('LOCAL_LLM_MAX_NEW_TOKENS', '256'))
+        self.temperature = temperature
+        self.governor = governor
+        self._handle = None
+        self._loaded: Optional[_LocalModel] = None
+        
+        self._pending: deque = deque()
+        self._condition = threading.Condition()
+        self._stop_event = threading.Event()
+        self._thread = None
+        self.metrics = {"requests": 0, "cancelled": 0, "steps": 0, "batched_tokens": 0,
+                        "generated_tokens": 0, "prefix_tokens_reused": 0, "prompt_tokens": 0,
+                        "total_ttft": 0.0, "max_batch": 0}
+        self._metrics_lock = threading.Lock()
+        
+        self._setup_logging()
+        self._setup_korean_prompt(system_prompt)
+        if governor is not None:
+            self._handle = governor.register(f"llm:{self.model_name}", loader=self._load_model,
+                                             preload=True)
+        else:
+            self._loaded = self._load_model()
+        self.logger.info(f"Local LLM initialized: {self.model_name} ({self.quantization}) on {self.device}")
+    
+    def _setup_logging(self):
+        self.logger = logging.getLogger(__name__)
+    
+    def _setup_korean_prompt(self, system_prompt: Optional[str] = None):
+        """한국어 음성 명령 처리를 위한 시스템 프롬프트 설정"""
+        self.korean_system_prompt = system_prompt or KOREAN_SYSTEM_PROMPT
+    
+    def _load_model(self) -> _LocalModel:
+        """모델 로드 + 양자화 + 시스템 프롬프트 KV 캐시 계산"""
+        import torch
+        from transformers import AutoModelForCausalLM, AutoTokenizer
+        
+        tokenizer = AutoTokenizer.from_pretrained(self.model_name)
+        if self.quantization in ("4bit", "8bit"):
+            from transformers import BitsAndBytesConfig
+            config = BitsAndBytesConfig(load_in_4bit=True, bnb_4bit_compute_dtype=torch.float16) \
+                if self.quantization == "4bit" else BitsAndBytesConfig(load_in_8bit=True)
+            model = AutoModelForCausalLM.from_pretrained(self.model_name, quantization_config=config,
+                                                         device_map=self.device)
+        else:
+            dtype = torch.float32 if self.device == "cpu" else torch.float16
+            model = AutoModelForCausalLM.from_pretrained(self.model_name, torch_dtype=dtype).to(self.device)
+            if self.quantization == "int8":
+                # Linear 가중치만 int8로 (CPU 전용, 활성값은 실행 중 양자화)
+                model = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+        model.eval()
+        
+        eos_ids = model.generation_config.eos_token_id
+        eos_ids = set(eos_ids if isinstance(eos_ids, (list, tuple)) else [eos_ids])
+        eos_ids.add(tokenizer.eos_token_id)
+        eos_ids.discard(None)
+        
+        # 시스템 메시지만 렌더링한 토큰이 모든 요청 프롬프트의 공통 접두부
+        prefix_ids = tokenizer.apply_chat_template(
+            [{"role": "system", "content": self.korean_system_prompt}], tokenize=True)
+        with torch.inference_mode():
+            output = model(input_ids=torch.tensor([prefix_ids], device=self.device), use_cache=True)
+        self.logger.info(f"System prompt KV cache: {len(prefix_ids)} tokens")
+        return _LocalModel(model, tokenizer, list(prefix_ids), _legacy_cache(output.past_key_values), eos_ids)
+    
+    def _resident(self):
+        """생성 구간 동안 메모리 관리자가 모델을 내리지 않도록 고정"""
+        if self._handle is not None:
+            return self._handle.acquire()
+        return nullcontext(self._loaded)
+    
+    def _tokenizer(self):
+        return self._handle.get().tokenizer if self._handle is not None else self._loaded.tokenizer
+    
+    def _build_messages(self, user_input: str,
+                        history: Optional[List[Dict[str, str]]] = None) -> List[Dict[str, str]]:
+        """
+        시스템 프롬프트 → 대화 요약 → 최근 대화 → 현재 입력 순서로 메시지 구성
+        
+        시스템 메시지를 하나만 두어야 접두부가 KV 캐시와 일치 (요약은 사용자/응답 쌍으로)
+        """
+        messages = [{"role": "system", "content": self.korean_system_prompt}]
+        for message in history or []:
+            if message["role"] == "summary":
+                messages.append({"role": "user", "content": f"이전 대화 요약:\n{message['content']}"})
+                messages.append({"role": "assistant", "content": "네, 이전 대화 내용을 참고하겠습니다."})
+            else:
+                messages.append({"role": message["role"], "content": message["content"]})
+        messages.append({"role": "user", "content": user_input})
+        return messages
+    
+    # ---- 생성 요청 ----
+    
+    def generate_stream(self, user_input: str,
+                        history: Optional[List[Dict[str, str]]] = None,
+                        token: Optional[CancellationToken] = None,
+                        max_new_tokens: Optional[int] = None) -> Iterator[str]:
+        """
+        생성되는 대로 텍스트 조각 반환
+        
+        소비자가 중간에 멈추면 (generator close) 해당 요청은 다음 단계에서 배치에서 빠짐
+        """
+        check(token)
+        prompt_ids = self._tokenizer().apply_chat_template(
+            self._build_messages(user_input, history), tokenize=True, add_generation_prompt=True)
+        generation = _Generation(list(prompt_ids), max_new_tokens or self.max_new_tokens, token)
+        self._submit(generation)
+        
+        try:
+            while True:
+                try:
+                    chunk = generation.chunks.get(timeout=token.probe_interval if token else 0.5)
+                except queue.Empty:
+                    check(token)
+                    continue
+                if chunk is None:
+                    break
+                yield chunk
+            if generation.error is not None:
+                raise generation.error
+        finally:
+            generation.abandoned = True
+    
+    def generate_or_raise(self, user_input: str,
+                          history: Optional[List[Dict[str, str]]] = None,
+                          token: Optional[CancellationToken] = None) -> str:
+        """사용자 입력에 대한 응답 생성 (실패시 예외 전달)"""
+        return "".join(self.generate_stream(user_input, history, token)).strip()
+    
+    def generate_response(self, user_input: str,
+                          history: Optional[List[Dict[str, str]]] = None,
+                          token: Optional[CancellationToken] = None) -> str:
+        """사용자 입력에 대한 응답 생성"""
+        try:
+            return self.generate_or_raise(user_input, history, token)
+        except RequestCancelled:
+            raise
+        except Exception as e:
+            self.logger.error(f"Local LLM response generation failed: {e}")
+            return FALLBACK_RESPONSE
+    
+    def _submit(self, generation: _Generation):
+        with self._condition:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._batch_loop, name="local-llm", daemon=True)
+                self._thread.start()
+            self._pending.append(generation)
+            self._condition.notify()
+        with self._metrics_lock:
+            self.metrics["requests"] += 1
+    
+    # ---- 연속 배치 ----
+    
+    def _batch_loop(self):
+        """대기 요청이 있으면 모델을 고정하고 배치가 빌 때까지 토큰 단위로 진행"""
+        while not self._stop_event.is_set():
+            with self._condition:
+                while not self._pending and not self._stop_event.is_set():
+                    self._condition.wait(timeout=1.0)
+            if self._stop_event.is_set():
+                break
+            
+            batch = _Batch()
+            try:
+                with self._resident() as loaded:
+                    while (batch.generations or self._pending) and not self._stop_event.is_set():
+                        self._admit(loaded, batch)
+                        if batch.generations:
+                            self._step(loaded, batch)
+            except Exception as e:
+                # 모델 오류는 진행 중/대기 중인 요청 모두에 전달
+                self.logger.error(f"Local LLM batch failed: {e}")
+                with self._condition:
+                    failed = batch.generations + list(self._pending)
+                    self._pending.clear()
+                for generation in failed:
+                    self._finish(generation, LLMError(f"Local generation failed: {e}"))
+        
+        with self._condition:
+            stopped = list(self._pending)
+            self._pending.clear()
+        for generation in stopped:
+            self._finish(generation, LLMError("Local LLM stopped"))
+    
+    def _admit(self, loaded: _LocalModel, batch: "_Batch"):
+        """대기 요청을 배치 여유만큼 꺼내 프롬프트를 처리(prefill)하고 배치에 합류"""
+        import torch
+        
+        while len(batch.generations) < self.max_batch_size:
+            with self._condition:
+                if not self._pending:
+                    return
+                generation = self._pending.popleft()
+            if self._should_drop(generation):
+                continue
+            
+            # 시스템 프롬프트 접두부가 일치하는 만큼 캐시 재사용 (마지막 토큰은 입력으로 남김)
+            reuse = 0
+            limit = min(len(loaded.prefix_ids), len(generation.prompt_ids) - 1)
+            while reuse < limit and loaded.prefix_ids[reuse] == generation.prompt_ids[reuse]:
+                reuse += 1
+            past = tuple((k[:, :, :reuse], v[:, :, :reuse]) for k, v in loaded.prefix_cache) if reuse else None
+            
+            with torch.inference_mode():
+                output = loaded.model(
+                    input_ids=torch.tensor([generation.prompt_ids[reuse:]], device=self.device),
+                    past_key_values=_model_cache(past) if past else None,
+                    use_cache=True
+                )
+            with self._metrics_lock:
+                self.metrics["prefix_tokens_reused"] += reuse
+                self.metrics["prompt_tokens"] += len(generation.prompt_ids)
+            
+            batch.add(generation, _legacy_cache(output.past_key_values))
+            self._emit(loaded, batch, [generation], output.logits[:, -1])
+    
+    def _step(self, loaded: _LocalModel, batch: "_Batch"):
+        """배치 전체를 한 토큰 진행"""
+        import torch
+        
+        input_ids = torch.tensor([[g.output_ids[-1]] for g in batch.generations], device=self.device)
+        batch.extend_mask()
+        with torch.inference_mode():
+            output = loaded.model(
+                input_ids=input_ids,
+                attention_mask=batch.mask,
+                # 왼쪽 패딩이 있으므로 위치는 실제 토큰 수 기준
+                position_ids=batch.mask.sum(dim=1, keepdim=True) - 1,
+                past_key_values=_model_cache(batch.cache),
+                use_cache=True
+            )
+        batch.cache = _legacy_cache(output.past_key_values)
+        with self._metrics_lock:
+            self.metrics["steps"] += 1
+            self.metrics["batched_tokens"] += len(batch.generations)
+            self.metrics["max_batch"] = max(self.metrics["max_batch"], len(batch.generations))
+        self._emit(loaded, batch, list(batch.generations), output.logits[:, -1])
+    
+    def _emit(self, loaded: _LocalModel, batch: "_Batch", generations: List[_Generation], logits):
+        """다음 토큰 선택 → 텍스트 조각 전달 → 끝난 요청을 배치에서 제거"""
+        import torch
+        
+        if self.temperature > 0:
+            probs = torch.softmax(logits.float() / self.temperature, dim=-1)
+            next_ids = torch.multinomial(probs, 1).squeeze(-1).tolist()
+        else:
+            next_ids = logits.argmax(dim=-1).tolist()
+        
+        done = []
+        for generation, next_id in zip(generations, next_ids):
+            if self._should_drop(generation):
+                done.append(generation)
+                continue
+            if generation.first_token_at is None:
+                generation.first_token_at = time.monotonic()
+                with self._metrics_lock:
+                    self.metrics["total_ttft"] += generation.first_token_at - generation.submitted_at
+            if next_id in loaded.eos_ids:
+                done.append(generation)
+                continue
+            
+            generation.output_ids.append(next_id)
+            text = loaded.tokenizer.decode(generation.output_ids, skip_special_tokens=True)
+            # 여러 토큰에 걸친 한글 음절은 완성될 때까지 보류
+            if not text.endswith("\ufffd") and len(text) > len(generation.text):
+                generation.chunks.put(text[len(generation.text):])
+                generation.text = text
+            if len(generation.output_ids) >= generation.max_new_tokens:
+                done.append(generation)
+        
+        with self._metrics_lock:
+            self.metrics["generated_tokens"] += len(generations) - len(done)
+        if done:
+            batch.remove(done)
+            for generation in done:
+                self._finish(generation)
+    
+    def _should_drop(self, generation: _Generation) -> bool:
+        """소비자가 떠났거나 취소된 요청"""
+        if generation.abandoned:
+            return True
+        if generation.token is not None and generation.token.cancelled:
+            with self._metrics_lock:
+                self.metrics["cancelled"] += 1
+            generation.error = RequestCancelled(generation.token.reason)
+            return True
+        return False
+    
+    def _finish(self, generation: _Generation, error: Optional[BaseException] = None):
+        if error is not None and generation.error is None:
+            generation.error = error
+        generation.chunks.put(None)
+    
+    # ---- 정보/정리 ----
+    
+    def get_batching_stats(self) -> Dict[str, Any]:
+        with self._metrics_lock:
+            stats = dict(self.metrics)
+        with self._condition:
+            stats["waiting"] = len(self._pending)
+        requests = stats["requests"] - stats["waiting"]
+        stats["mean_batch"] = round(stats["batched_tokens"] / stats["steps"], 2) if stats["steps"] else 0.0
+        stats["mean_ttft"] = round(stats.pop("total_ttft") / requests, 3) if requests else None
+        return stats
+    
+    def get_model_info(self) -> Dict[str, Any]:
+        """모델 정보 반환"""
+        return {
+            "model_name": self.model_name,
+            "provider": "Local",
+            "device": self.device,
+            "quantization": self.quantization,
+            "supported_languages": ["ko", "en"],
+            "batching": self.get_batching_stats(),
+            "features": {
+                "offline": True,
+                "streaming": True,
+                "continuous_batching": True,
+                "system_prompt_cache": True,
+                "max_batch_size": self.max_batch_size
+            }
+        }
+    
+    def close(self):
+        """생성 스레드 정지 후 모델 해제"""
+        self._stop_event.set()
+        with self._condition:
+            self._condition.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout=5.0)
+        if self._handle is not None:
+            self._handle.unregister()
+        self._loaded = None
+
+class _Batch:
+    """진행 중인 요청들의 KV 캐시 (왼쪽 패딩으로 길이를 맞춰 한 번에 디코딩)"""
+    
+    def __init__(self):
+        self.generations: List[_Generation] = []
+        self.cache = None   # 층별 (key, value) [batch, heads, seq, dim]
+        self.mask = None    # [batch, seq], 패딩은 0
+    
+    def add(self, generation: _Generation, cache):
+        """prefill을 마친 요청 하나를 배치에 합류 (짧은 쪽을 왼쪽으로 패딩)"""
+        import torch
+        import torch.nn.functional as F
+        
+        length = cache[0][0].shape[2]
+        mask = torch.ones(1, length, dtype=torch.long, device=cache[0][0].device)
+        if self.cache is None:
+            self.generations, self.cache, self.mask = [generation], cache, mask
+            return
+        
+        current = self.cache[0][0].shape[2]
+        target = max(current, length)
+        pad = lambda t, n: F.pad(t, (0, 0, n, 0)) if n else t
+        self.cache = tuple(
+            (torch.cat([pad(bk, target - current), pad(k, target - length)]),
+             torch.cat([pad(bv, target - current), pad(v, target - length)]))
+            for (bk, bv), (k, v) in zip(self.cache, cache)
+        )
+        self.mask = torch.cat([F.pad(self.mask, (target - current, 0)), F.pad(mask, (target - length, 0))])
+        self.generations.append(generation)
+    
+    def extend_mask(self):
+        import torch
+        self.mask = torch.cat([self.mask, self.mask.new_ones(self.mask.shape[0], 1)], dim=1)
+    
+    def remove(self, finished: List[_Generation]):
+        """끝난 요청을 빼고 모든 요청이 패딩인 왼쪽 열 제거"""
+        import torch
+        
+        keep = [i for i, g in enumerate(self.generations) if g not in finished]
+        self.generations = [self.generations[i] for i in keep]
+        if not keep:
+            self.cache, self.mask = None, None
+            return
+        
+        index = torch.tensor(keep, device=self.mask.device)
+        mask = self.mask.index_select(0, index)
+        start = int((mask.sum(dim=0) > 0).nonzero()[0])
+        self.mask = mask[:, start:]
+        self.cache = tuple((k.index_select(0, index)[:, :, start:], v.index_select(0, index)[:, :, start:])
+                           for k, v in self.cache)
+
+class BackendStats:
+    """백엔드별 최근 지연 시간/오류율 (고정 크기 윈도우)"""
+    
+    def __init__(self, window: int = 100):
+        self.samples = deque(maxlen=window)  # (latency, success)
+        self.lock = threading.Lock()
+    
+    def record(self, latency: float, success: bool):
+        with self.lock:
+            self.samples.append((latency, success))
+    
+    def _latencies(self) -> List[float]:
+        return sorted(latency for latency, success in self.samples if success)
+    
+    def percentile(self, q: float) -> Optional[float]:
+        with self.lock:
+            latencies = self._latencies()
+        if not latencies:
+            return None
+        index = min(len(latencies) - 1, int(q * len(latencies)))
+        return latencies[index]
+    
+    def error_rate(self) -> float:
+        with self.lock:
+            if not self.samples:
+                return 0.0
+            return sum(1 for _, success in self.samples if not success) / len(self.samples)
+    
+    def count(self) -> int:
+        with self.lock:
+            return len(self.samples)
+
+class CircuitBreaker:
+    """연속 실패시 백엔드를 일정 시간 제외하는 회로 차단기"""
+    
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+    
+    def __init__(self, failure_threshold: int = 5, cooldown: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.probe_in_flight = False
+        self.lock = threading.Lock()
+    
+    def allow_request(self) -> bool:
+        """요청 허용 여부 (OPEN 상태에서 cooldown이 지나면 탐색 요청 1개만 허용)"""
+        with self.lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.cooldown:
+                self.state = self.HALF_OPEN
+            if self.state == self.HALF_OPEN and not self.probe_in_flight:
+                self.probe_in_flight = True
+                return True
+            return False
+    
+    def is_available(self) -> bool:
+        """상태를 바꾸지 않고 요청 가능 여부만 확인"""
+        with self.lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.HALF_OPEN:
+                return not self.probe_in_flight
+            return time.monotonic() - self.opened_at >= self.cooldown
+    
+    def record_success(self):
+        with self.lock:
+            self.state = self.CLOSED
+            self.consecutive_failures = 0
+            self.probe_in_flight = False
+    
+    def release_probe(self):
+        """결과 없이 끝난 탐색 요청(취소 등)의 슬롯 반환 (상태는 유지해 다음 요청이 다시 탐색)"""
+        with self.lock:
+            self.probe_in_flight = False
+    
+    def record_failure(self):
+        with self.lock:
+            self.consecutive_failures += 1
+            if self.state == self.HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+            self.probe_in_flight = False
+
+# Routing LLM Implementation
+class RoutingLLM(BaseLLM):
+    """지연 시간 기반 다중 백엔드 라우터 (헤지 요청 + 회로 차단기)"""
+    
+    def __init__(self, backends: Union[Dict[str, BaseLLM], List[BaseLLM]],
+                 hedge_after: Optional[float] = None,
+                 hedge_percentile: float = 0.95,
+                 min_samples: int = 10,
+                 window: int = 100,
+                 failure_threshold: int = 5,
+                 cooldown: float = 30.0,
+                 timeout: float = 30.0,
+                 max_workers: int = 16):
+        """
+        Args:
+            backends: 이름 → LLM 또는 LLM 목록 (목록 순서가 초기 우선순위)
+            hedge_after: 헤지 요청 발사 시간 (초, 없으면 1순위 백엔드의 p95 사용)
+            hedge_percentile: 헤지 기준 백분위수
+            min_samples: 통계 기반 라우팅/헤지를 시작할 최소 샘플 수
+            window: 백엔드별 통계 윈도우 크기
+            failure_threshold: 회로 차단기가 열리는 연속 실패 수
+            cooldown: 회로 차단기 OPEN 유지 시간 (초)
+            timeout: 전체 요청 제한 시간 (초)
+        """
+        if isinstance(backends, dict):
+            self.backends = dict(backends)
+        else:
+            self.backends = {f"{i}:{type(llm).__name__}": llm for i, llm in enumerate(backends)}
+        if not self.backends:
+            raise ValueError("RoutingLLM requires at least one backend")
+        
+        self.config = {
+            "hedge_after": hedge_after,
+            "hedge_percentile": hedge_percentile,
+            "min_samples": min_samples,
+            "timeout": timeout,
+        }
+        self.stats = {name: BackendStats(window) for name in self.backends}
+        self.breakers = {name: CircuitBreaker(failure_threshold, cooldown) for name in self.backends}
+        self.metrics = {"requests": 0, "hedged": 0, "hedge_wins": 0, "failovers": 0, "failures": 0}
+        self._metrics_lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="llm-router")
+        self._setup_logging()
+        self.logger.info(f"Routing LLM initialized with backends: {list(self.backends)}")
+    
+    def _setup_logging(self):
+        self.logger = logging.getLogger(__name__)
+    
+    def _count(self, key: str):
+        with self._metrics_lock:
+            self.metrics[key] += 1
+    
+    def _rank_backends(self) -> List[str]:
+        """사용 가능한 백엔드를 예상 지연 시간 순으로 정렬"""
+        order = list(self.backends)
+        
+        def score(name: str):
+            stats = self.stats[name]
+            if stats.count() < self.config["min_samples"]:
+                # 샘플이 부족하면 등록 순서대로 탐색
+                return (0, 0.0, order.index(name))
+            median = stats.percentile(0.5) or 0.0
+            # 오류율이 높을수록 실패 후 재시도 비용을 반영해 불리하게
+            return (1, median * (1.0 + 4.0 * stats.error_rate()), order.index(name))
+        
+        available = [name for name in order if self.breakers[name].is_available()]
+        return sorted(available, key=score)
+    
+    def _hedge_delay(self, name: str) -> Optional[float]:
+        """헤지 요청을 발사하기까지 기다릴 시간"""
+        if self.config["hedge_after"] is not None:
+            return self.config["hedge_after"]
+        stats = self.stats[name]
+        if stats.count() < self.config["min_samples"]:
+            return None
+        return stats.percentile(self.config["hedge_percentile"])
+    
+    def _submit(self, name: str, user_input: str, history: Optional[List[Dict[str, str]]],
+                token: Optional[CancellationToken] = None):
+        """백엔드 호출 제출 (늦게 끝난 요청도 완료시 통계에 반영)"""
+        def call():
+            start = time.monotonic()
+            try:
+                result = self.backends[name].generate_or_raise(user_input, history=history, token=token)
+            except RequestCancelled:
+                # 취소는 백엔드 장애가 아니므로 통계에 반영하지 않고 탐색 슬롯만 반환
+                self.breakers[name].release_probe()
+                raise
+            except Exception:
+                self.stats[name].record(time.monotonic() - start, False)
+                self.breakers[name].record_failure()
+                raise
+            self.stats[name].record(time.monotonic() - start, True)
+            self.breakers[name].record_success()
+            return result
+        return self._executor.submit(call)
+    
+    def _next_backend(self, candidates: List[str]) -> Optional[str]:
+        """회로 차단기가 허용하는 다음 후보 선택"""
+        while candidates:
+            name = candidates.pop(0)
+            if self.breakers[name].allow_request():
+                return name
+        return None
+    
+    def generate_or_raise(self, user_input: str,
+                          history: Optional[List[Dict[str, str]]] = None,
+                          token: Optional[CancellationToken] = None) -> str:
+        """가장 빠른 정상 백엔드로 요청하고, p95를 넘기면 다음 백엔드로 헤지"""
+        self._count("requests")
+        check(token)
+        timeout = self.config["timeout"]
+        if token is not None:
+            timeout = min(timeout, token.remaining(timeout))
+        deadline = time.monotonic() + timeout
+        candidates = self._rank_backends()
+        
+        primary = self._next_backend(candidates)
+        if primary is None:
+            self._count("failures")
+            raise LLMError("No healthy LLM backend available")
+        
+        pending = {self._submit(primary, user_input, history, token): primary}
+        hedge_delay = self._hedge_delay(primary)
+        hedge_at = time.monotonic() + hedge_delay if hedge_delay is not None else None
+        hedged = set()
+        last_error = None
+        
+        while pending:
+            check(token)
+            now = time.monotonic()
+            if now >= deadline:
+                break
+            wait_until = deadline if hedge_at is None else min(deadline, hedge_at)
+            if token is not None:
+                # 클라이언트 연결 끊김 등을 놓치지 않도록 짧게 나눠 대기
+                wait_until = min(wait_until, now + token.probe_interval)
+            done, _ = wait(list(pending), timeout=max(0.0, wait_until - now),
+                           return_when=FIRST_COMPLETED)
+            
+            for future in done:
+                name = pending.pop(future)
+                try:
+                    result = future.result()
+                except RequestCancelled:
+                    raise
+                except Exception as e:
+                    last_error = e
+                    self.logger.warning(f"LLM backend '{name}' failed: {e}")
+                    continue
+                if name in hedged:
+                    self._count("hedge_wins")
+                return result
+            
+            # 실패했거나 헤지 시간이 지나면 다음 백엔드 호출
+            failed = bool(done) and not pending
+            hedge_due = hedge_at is not None and time.monotonic() >= hedge_at
+            if failed or hedge_due:
+                backup = self._next_backend(candidates)
+                hedge_at = None
+                if backup is not None:
+                    if failed:
+                        self._count("failovers")
+                    else:
+                        self._count("hedged")
+                        hedged.add(backup)
+                    pending[self._submit(backup, user_input, history, token)] = backup
+        
+        check(token)
+        self._count("failures")
+        if last_error is not None and not pending:
+            raise LLMError(f"All LLM backends failed: {last_error}")
+        raise LLMError(f"LLM request timed out after {self.config['timeout']}s")
+    
+    def generate_response(self, user_input: str,
+                          history: Optional[List[Dict[str, str]]] = None,
+                          token: Optional[CancellationToken] = None) -> str:
+        """사용자 입력에 대한 응답 생성"""
+        try:
+            return self.generate_or_raise(user_input, history, token)
+        except RequestCancelled:
+            raise
+        except Exception as e:
+            self.logger.error(f"Routed response generation failed: {e}")
+            return FALLBACK_RESPONSE
+    
+    def get_routing_stats(self) -> Dict[str, Any]:
+        """백엔드별 라우팅 통계"""
+        backends = {}
+        for name in self.backends:
+            stats = self.stats[name]
+            backends[name] = {
+                "samples": stats.count(),
+                "p50": stats.percentile(0.5),
+                "p95": stats.percentile(0.95),
+                "error_rate": round(stats.error_rate(), 3),
+                "circuit": self.breakers[name].state
+            }
+        with self._metrics_lock:
+            metrics = dict(self.metrics)
+        return {"backends": backends, "metrics": metrics}
+    
+    def get_model_info(self) -> Dict[str, Any]:
+        """모델 정보 반환"""
+        return {
+            "model_name": "router",
+            "provider": "Router",
+            "supported_languages": ["ko", "en"],
+            "backends": {name: llm.get_model_info() for name, llm in self.backends.items()},
+            "routing": self.get_routing_stats(),
+            "features": {
+                "hedged_requests": True,
+                "circuit_breaker": True,
+                "latency_aware": True
+            }
+        }
+    
+    def __del__(self):
+        """리소스 정리"""
+        if hasattr(self, '_executor'):
+            self._executor.shutdown(wait=False)
+
 # LLM Factory for easy model selection
 class LLMFactory:
     @staticmethod
@@ -146,14 +1154,42 @@ class LLMFactory:
         LLM 모델 생성 팩토리
         
         Args:
-            model_type: "gpt" or "gemini"
+            model_type: "gpt", "gemini", "local", "stub" or "router"
             **kwargs: 모델별 추가 파라미터
+                router의 경우 backends (예: "gemini,gpt", 기본값: LLM_BACKENDS 환경 변수)
+                와 RoutingLLM 파라미터 (hedge_after, cooldown 등)
         """
         if model_type.lower() == "gpt":
             return GPTLLM(**kwargs)
         elif model_type.lower() == "gemini":
             return GeminiLLM(**kwargs)
+        elif model_type.lower() == "local":
+            return LocalLLM(**kwargs)
+        elif model_type.lower() == "stub":
+            return StubLLM(**kwargs)
+        elif model_type.lower() == "router":
+            return LLMFactory._create_router(**kwargs)
         else:
-            raise ValueError(f"Unsupported model type: {model_type}. Use 'gpt' or 'gemini'")
-
-# Llama3LLM 클래스는 삭제됨 - GPT/Gemini만 지원
\ No newline at end of file
+            raise ValueError(f"Unsupported model type: {model_type}. Use 'gpt', 'gemini', 'local', 'stub' or 'router'")
+    
+    @staticmethod
+    def _create_router(backends: Optional[Union[str, List[str]]] = None, **kwargs) -> BaseLLM:
+        """백엔드 이름 목록으로 RoutingLLM 생성 (system_prompt는 모든 백엔드에 전달)"""
+        backends = backends or os.getenv('LLM_BACKENDS', 'gemini,gpt')
+        if isinstance(backends, str):
+            backends = [name.strip() for name in backends.split(',') if name.strip()]
+        
+        backend_kwargs = {}
+        if "system_prompt" in kwargs:
+            backend_kwargs["system_prompt"] = kwargs.pop("system_prompt")
+        
+        llms = {}
+        for name in backends:
+            if name.lower() == "router":
+                raise ValueError("Router backends cannot include 'router'")
+            try:
+                llms[name] = LLMFactory.create_llm(name, **backend_kwargs)
+            except ValueError as e:
+                # API 키가 없는 백엔드는 제외하고 나머지로 라우팅
+                logging.getLogger(__name__).warning(f"Skipping LLM backend '{name}': {e}")
+        return RoutingLLM(llms, **kwargs)
@@ -0,0 +1,190 @@
+import os
+import sys
+import json
+import queue
+import random
+import atexit
+import logging
+import logging.handlers
+import contextvars
+from contextlib import contextmanager
+from typing import Dict, Any, Optional
+
+# 현재 처리 중인 요청 ID (요청 스레드마다 독립)
+_request_id: contextvars.ContextVar = contextvars.ContextVar("request_id", default=None)
+
+# configure_logging이 설치한 핸들러/리스너 (중복 설정 방지)
+_queue_handler = None
+_listener = None
+
+# 로그 레코드의 표준 속성 (이외의 속성은 extra로 전달된 필드)
+_STANDARD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime"}
+
+
+@contextmanager
+def request_scope(request_id: str):
+    """구간 안에서 남기는 로그에 request_id 포함"""
+    reset = _request_id.set(request_id)
+    try:
+        yield
+    finally:
+        _request_id.reset(reset)
+
+
+def current_request_id() -> Optional[str]:
+    return _request_id.get()
+
+
+def log_fields(payload: Optional[Dict[str, Any]] = None, **fields) -> Dict[str, Any]:
+    """
+    구조화 로그용 extra 생성
+
+    Args:
+        payload: 전사 결과/LLM 응답 등 크기가 큰 본문 (샘플링/길이 제한 대상)
+        **fields: 항상 기록하는 작은 값 (단계별 시간 등)
+
+    사용 예:
+        logger.info("STT 완료", extra=log_fields(payload={"transcript": text}, stt=0.82))
+    """
+    return {"fields": fields, "payload": payload or {}}
+
+
+class ContextFilter(logging.Filter):
+    """request_id 주입과 본문 필드 샘플링/길이 제한 (로그를 남기는 스레드에서 실행)"""
+
+    def __init__(self, payload_sample_rate: float = 0.1, payload_max_chars: int = 200):
+        super().__init__()
+        self.payload_sample_rate = payload_sample_rate
+        self.payload_max_chars = payload_max_chars
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = _request_id.get()
+        payload = getattr(record, "payload", None)
+        if payload:
+            # 본문은 길이만 항상 남기고 내용은 일부 레코드에서만 앞부분을 남김
+            keep = record.levelno >= logging.WARNING or random.random() < self.payload_sample_rate
+            limited = {}
+            for key, value in payload.items():
+                text = "" if value is None else str(value)
+                limited[f"{key}_chars"] = len(text)
+                if keep:
+                    limited[key] = text if len(text) <= self.payload_max_chars else text[:self.payload_max_chars] + "…"
+            record.payload = limited
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """한 줄 JSON 레코드"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        request_id = getattr(record, "request_id", None)
+        if request_id:
+            entry["request_id"] = request_id
+        entry.update(getattr(record, "fields", None) or {})
+        entry.update(getattr(record, "payload", None) or {})
+        for key, value in vars(record).items():
+            if key not in _STANDARD_ATTRS and key not in ("fields", "payload", "request_id"):
+                entry[key] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    """개발용 한 줄 텍스트 (구조화 필드는 뒤에 key=value로)"""
+
+    def __init__(self):
+        super().__init__('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    def format(self, record: logging.LogRecord) -> str:
+        line = super().format(record)
+        extra = dict(getattr(record, "fields", None) or {})
+        extra.update(getattr(record, "payload", None) or {})
+        request_id = getattr(record, "request_id", None)
+        prefix = f"[{request_id}] " if request_id else ""
+        suffix = " ".join(f"{k}={v}" for k, v in extra.items())
+        return f"{prefix}{line} {suffix}".rstrip()
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """큐가 가득 차면 기다리지 않고 버림 (요청 스레드가 로그 I/O로 막히지 않도록)"""
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def configure_logging(level: Optional[str] = None,
+                      log_format: Optional[str] = None,
+                      log_file: Optional[str] = None,
+                      queue_size: int = 10000) -> logging.Handler:
+    """
+    프로세스 전체 로깅 설정 (진입점에서 한 번 호출, 다시 호출해도 무시)
+
+    요청 스레드는 큐에 레코드만 넣고, 포맷/출력은 별도 리스너 스레드에서 처리
+
+    Args:
+        level: 로그 레벨 (기본값: LOG_LEVEL 또는 INFO)
+        log_format: "json" 또는 "text" (기본값: LOG_FORMAT 또는 json)
+        log_file: 로그 파일 경로 (기본값: LOG_FILE, 없으면 stderr만, 크기 기준 순환)
+        queue_size: 출력 대기 레코드 최대 수 (초과분은 버림)
+    """
+    global _queue_handler, _listener
+    if _queue_handler is not None:
+        return _queue_handler
+
+    level = level or os.getenv('LOG_LEVEL', 'INFO')
+    log_format = log_format or os.getenv('LOG_FORMAT', 'json')
+    log_file = log_file or os.getenv('LOG_FILE')
+    formatter = JsonFormatter() if log_format == "json" else TextFormatter()
+
+    handlers = [logging.StreamHandler(sys.stderr)]
+    if log_file:
+        handlers.append(logging.handlers.RotatingFileHandler(
+            log_file,
+            maxBytes=int(os.getenv('LOG_MAX_BYTES', str(50 * 1024 * 1024))),
+            backupCount=int(os.getenv('LOG_BACKUP_COUNT', '5')),
+            encoding="utf-8"
+        ))
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    _queue_handler = DroppingQueueHandler(queue.Queue(maxsize=queue_size))
+    _queue_handler.addFilter(ContextFilter(
+        payload_sample_rate=float(os.getenv('LOG_PAYLOAD_SAMPLE_RATE', '0.1')),
+        payload_max_chars=int(os.getenv('LOG_PAYLOAD_MAX_CHARS', '200'))
+    ))
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(_queue_handler)
+    root.setLevel(level)
+
+    _listener = logging.handlers.QueueListener(_queue_handler.queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    atexit.register(_listener.stop)
+    return _queue_handler
+
+
+def get_logging_stats() -> Dict[str, Any]:
+    """비동기 로깅 큐 상태"""
+    if _queue_handler is None:
+        return {"configured": False}
+    return {
+        "configured": True,
+        "queued": _queue_handler.queue.qsize(),
+        "dropped": _queue_handler.dropped,
+    }
@@ -0,0 +1,175 @@
+import re
+import time
+import logging
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, Optional, List, Callable
+
+# 토큰 수 추정용 패턴 (한글 음절은 대부분 1토큰 이상으로 분할됨)
+_HANGUL_PATTERN = re.compile(r'[가-힣]')
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    토크나이저 없이 빠르게 토큰 수 추정
+
+    한글은 음절당 약 1토큰, 그 외 문자는 약 4자당 1토큰으로 계산
+    """
+    if not text:
+        return 0
+    hangul_count = len(_HANGUL_PATTERN.findall(text))
+    other_count = len(text) - hangul_count
+    return hangul_count + (other_count + 3) // 4
+
+
+# 기본 요약기: LLM 호출 없이 이전 요약 + 오래된 대화를 잘라서 보관
+def truncate_summarizer(previous_summary: str, turns: List[Dict[str, str]],
+                        max_tokens: int) -> str:
+    lines = [previous_summary] if previous_summary else []
+    for turn in turns:
+        lines.append(f"사용자: {turn['user']}")
+        lines.append(f"AI: {turn['assistant']}")
+    lines = [line for text in lines for line in text.split("\n") if line.strip()]
+
+    # 최근 내용 우선으로 예산에 맞게 오래된 줄부터 제거
+    while len(lines) > 1 and estimate_tokens("\n".join(lines)) > max_tokens:
+        lines.pop(0)
+    summary = "\n".join(lines)
+
+    # 한 줄만 남았는데도 길면 앞부분 자르기
+    while summary and estimate_tokens(summary) > max_tokens:
+        summary = summary[max(1, len(summary) // 4):]
+    return summary.strip()
+
+
+class ConversationMemory:
+    """세션별 대화 기록 저장소 (토큰 예산 + 점진적 요약)"""
+
+    def __init__(self,
+                 max_context_tokens: int = 1024,
+                 keep_recent_turns: int = 4,
+                 summary_max_tokens: int = 256,
+                 summarizer: Optional[Callable[[str, List[Dict[str, str]], int], str]] = None,
+                 max_sessions: int = 1000,
+                 session_ttl: float = 3600.0):
+        self.config = {
+            "max_context_tokens": max_context_tokens,  # 요약 + 최근 대화 토큰 예산
+            "keep_recent_turns": keep_recent_turns,    # 요약하지 않고 유지할 최근 턴 수
+            "summary_max_tokens": summary_max_tokens,  # 요약 토큰 상한
+            "max_sessions": max_sessions,              # 보관할 최대 세션 수 (LRU)
+            "session_ttl": session_ttl,                # 세션 만료 시간 (초)
+        }
+        self.summarizer = summarizer or truncate_summarizer
+        self._sessions: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._setup_logging()
+
+    def _setup_logging(self):
+        self.logger = logging.getLogger(__name__)
+
+    def _get_session(self, session_id: str) -> Dict[str, Any]:
+        """세션 조회 (없거나 만료되면 새로 생성)"""
+        now = time.time()
+        session = self._sessions.get(session_id)
+        if session is None or now - session["last_access"] > self.config["session_ttl"]:
+            session = {"summary": "", "turns": [], "last_access": now}
+            self._sessions[session_id] = session
+        session["last_access"] = now
+        self._sessions.move_to_end(session_id)
+
+        # 오래된 세션 정리
+        while len(self._sessions) > self.config["max_sessions"]:
+            self._sessions.popitem(last=False)
+        return session
+
+    def get_context(self, session_id: str) -> List[Dict[str, str]]:
+        """
+        LLM에 전달할 대화 맥락 반환
+
+        Returns:
+            List[Dict[str, str]]: role/content 메시지 목록 (요약은 "summary" role)
+        """
+        with self._lock:
+            session = self._get_session(session_id)
+            messages = []
+            if session["summary"]:
+                messages.append({"role": "summary", "content": session["summary"]})
+            for turn in session["turns"]:
+                messages.append({"role": "user", "content": turn["user"]})
+                messages.append({"role": "assistant", "content": turn["assistant"]})
+            return messages
+
+    def add_turn(self, session_id: str, user_message: str, assistant_message: str):
+        """대화 턴 추가 후 예산 초과분을 요약으로 이동"""
+        with self._lock:
+            session = self._get_session(session_id)
+            session["turns"].append({
+                "user": user_message,
+                "assistant": assistant_message,
+                "tokens": estimate_tokens(user_message) + estimate_tokens(assistant_message)
+            })
+            evicted = self._evict_over_budget(session)
+
+        # 요약기는 LLM 호출일 수 있으므로 잠금 밖에서 실행
+        if evicted:
+            self._fold_into_summary(session_id, evicted)
+
+    def _evict_over_budget(self, session: Dict[str, Any]) -> List[Dict[str, str]]:
+        """예산을 넘는 오래된 턴 분리"""
+        budget = self.config["max_context_tokens"] - estimate_tokens(session["summary"])
+        keep = self.config["keep_recent_turns"]
+        turns = session["turns"]
+
+        evicted = []
+        while turns and (len(turns) > keep or sum(t["tokens"] for t in turns) > budget):
+            # 가장 최근 턴은 예산을 넘어도 유지
+            if len(turns) == 1:
+                break
+            evicted.append(turns.pop(0))
+        return evicted
+
+    def _fold_into_summary(self, session_id: str, evicted: List[Dict[str, str]]):
+        """분리된 턴을 기존 요약에 점진적으로 합침"""
+        with self._lock:
+            previous_summary = self._get_session(session_id)["summary"]
+
+        try:
+            summary = self.summarizer(previous_summary, evicted, self.config["summary_max_tokens"])
+        except Exception as e:
+            self.logger.warning(f"대화 요약 실패, 기본 요약 사용: {e}")
+            summary = truncate_summarizer(previous_summary, evicted, self.config["summary_max_tokens"])
+
+        with self._lock:
+            self._get_session(session_id)["summary"] = summary
+
+    def clear(self, session_id: str):
+        """세션 대화 기록 삭제"""
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def get_session_info(self, session_id: str) -> Dict[str, Any]:
+        """세션 상태 정보 반환"""
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None:
+                return {"exists": False}
+            return {
+                "exists": True,
+                "turns": len(session["turns"]),
+                "summary_tokens": estimate_tokens(session["summary"]),
+                "context_tokens": estimate_tokens(session["summary"]) + sum(t["tokens"] for t in session["turns"])
+            }
+
+
+def make_llm_summarizer(llm) -> Callable[[str, List[Dict[str, str]], int], str]:
+    """LLM을 사용하는 요약기 생성"""
+    def summarize(previous_summary: str, turns: List[Dict[str, str]], max_tokens: int) -> str:
+        conversation = "\n".join(f"사용자: {t['user']}\nAI: {t['assistant']}" for t in turns)
+        prompt = (
+            f"다음 이전 요약과 대화를 {max_tokens}토큰 이내의 한국어로 요약하세요. "
+            f"일정, 날짜, 사용자 선호 등 이후 대화에 필요한 사실만 남기세요.\n\n"
+            f"이전 요약:\n{previous_summary or '(없음)'}\n\n대화:\n{conversation}"
+        )
+        summary = llm.generate_or_raise(prompt)
+        return truncate_summarizer(summary, [], max_tokens)
+    return summarize
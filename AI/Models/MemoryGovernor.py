@@ -0,0 +1,560 @@
+"""
+Memory Governor
+프로세스 메모리 예산 관리 (모델 로드/해제 + 작업 수용 제어)
+
+- 사용량 = max(측정 RSS, 약정량): 측정 RSS는 이 프로세스와 자식 프로세스(Whisper 작업자 풀 등) 합,
+  약정량은 시작 시점 기준선 + 로드된 모델 + 실행 중인 작업의 예약 합
+- 실행 중인 작업이 이미 RSS에 반영된 만큼을 다시 더하지 않고, 아직 할당하지 않은 예약은 놓치지 않음
+- 예산을 넘으면 오래 쉰 모델부터 내리고, 그래도 부족한 작업은 대기 후 거부
+"""
+
+import os
+import gc
+import sys
+import time
+import ctypes
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Dict, Any, Optional, Callable
+
+from Models.Cancellation import CancellationToken, RequestCancelled
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+_MB = 1024 * 1024
+
+
+class MemoryBudgetExceeded(Exception):
+    """메모리 예산 안에서 모델 로드/작업을 수용할 수 없음 (유휴 모델을 내려도 부족)"""
+    pass
+
+
+def current_rss(include_children: bool = False) -> int:
+    """현재 프로세스 RSS (바이트, include_children이면 자식 프로세스 RSS 합 포함)"""
+    if psutil is not None:
+        process = psutil.Process()
+        rss = process.memory_info().rss
+        if include_children:
+            for child in process.children(recursive=True):
+                try:
+                    rss += child.memory_info().rss
+                except psutil.Error:
+                    pass
+        return rss
+    try:
+        rss = _statm_rss("self")
+        if include_children:
+            rss += sum(_statm_rss(str(pid)) for pid in _child_pids(os.getpid()))
+        return rss
+    except (OSError, ValueError, IndexError):
+        # /proc이 없는 환경은 최대 RSS로 대신 (현재 값보다 크게 잡혀 보수적)
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+
+
+def _statm_rss(pid: str) -> int:
+    with open(f"/proc/{pid}/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+
+
+def _child_pids(pid: int) -> list:
+    """/proc의 children 목록으로 자손 프로세스 ID 수집 (이미 종료된 프로세스는 건너뜀)"""
+    pids = []
+    try:
+        tasks = os.listdir(f"/proc/{pid}/task")
+    except OSError:
+        return pids
+    for tid in tasks:
+        try:
+            with open(f"/proc/{pid}/task/{tid}/children") as f:
+                children = [int(child) for child in f.read().split()]
+        except (OSError, ValueError):
+            continue
+        for child in children:
+            pids.append(child)
+            pids.extend(_child_pids(child))
+    return pids
+
+
+def available_memory() -> Optional[int]:
+    """시스템에서 새로 할당 가능한 메모리 (바이트, 알 수 없으면 None)"""
+    if psutil is not None:
+        return psutil.virtual_memory().available
+    try:
+        with open("/proc/meminfo") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    return None
+
+
+def model_bytes(model: Any) -> int:
+    """torch 모듈이 호스트 메모리에 올린 파라미터/버퍼 크기 (torch 모듈이 아니면 0)"""
+    parameters = getattr(model, "parameters", None)
+    buffers = getattr(model, "buffers", None)
+    if not callable(parameters):
+        return 0
+    tensors = list(parameters()) + (list(buffers()) if callable(buffers) else [])
+    return sum(t.numel() * t.element_size() for t in tensors if t.device.type == "cpu")
+
+
+def release_free_memory():
+    """해제된 객체의 메모리를 OS에 반환 (GC → CUDA 캐시 → glibc free list)"""
+    gc.collect()
+    torch = sys.modules.get("torch")
+    if torch is not None and torch.cuda.is_available():
+        torch.cuda.empty_cache()
+    try:
+        ctypes.CDLL("libc.so.6").malloc_trim(0)
+    except (OSError, AttributeError):
+        pass
+
+
+class _Component:
+    """관리 대상 모델 하나의 상태"""
+
+    def __init__(self, name: str, loader: Callable[[], Any],
+                 unloader: Optional[Callable[[Any], None]],
+                 warm_up: Optional[Callable[[Any], None]],
+                 estimated_bytes: int, idle_timeout: Optional[float], pinned: bool):
+        self.name = name
+        self.loader = loader
+        self.unloader = unloader
+        self.warm_up = warm_up
+        self.idle_timeout = idle_timeout
+        self.pinned = pinned
+        self.value = None
+        self.state = "unloaded"  # unloaded / loading / loaded
+        self.bytes = estimated_bytes  # 로드 전에는 추정값, 로드 후에는 측정값
+        self.in_use = 0
+        self.last_used = time.monotonic()
+        self.loads = 0
+        self.evictions = 0
+        self.load_seconds = None
+
+
+class ModelHandle:
+    """등록된 모델 접근자 (메모리 관리자가 내린 모델은 다음 사용시 다시 로드)"""
+
+    def __init__(self, governor: "MemoryGovernor", name: str):
+        self.governor = governor
+        self.name = name
+
+    @contextmanager
+    def acquire(self, token: Optional[CancellationToken] = None):
+        """사용 구간 동안 모델을 내리지 않도록 고정하고 모델 반환"""
+        with self.governor.acquire(self.name, token) as model:
+            yield model
+
+    def get(self, token: Optional[CancellationToken] = None) -> Any:
+        """모델 반환 (필요하면 로드, 고정하지 않음)"""
+        return self.governor.load(self.name, token)
+
+    @property
+    def loaded(self) -> bool:
+        return self.governor.is_loaded(self.name)
+
+    def unload(self) -> bool:
+        return self.governor.evict(self.name)
+
+    def unregister(self):
+        self.governor.unregister(self.name)
+
+
+class MemoryGovernor:
+    """
+    프로세스 메모리 관리자
+
+    - 예산: RSS 상한 (budget_mb가 없으면 측정/보고만 하고 거부하지 않음)
+    - 모델: idle_timeout 동안 사용하지 않은 모델을 내리고 다음 사용시 다시 로드 + 예열
+    - 수위: RSS가 high_watermark를 넘으면 low_watermark 아래로 내려갈 때까지 오래 쉰 모델부터 내림
+    - 작업: 예상 메모리를 더해 예산을 넘는 작업은 admission_timeout 동안 대기 후 거부
+    """
+
+    def __init__(self,
+                 budget_mb: Optional[float] = None,
+                 high_watermark: float = 0.9,
+                 low_watermark: float = 0.75,
+                 idle_timeout: float = 0.0,
+                 admission_timeout: float = 10.0,
+                 check_interval: float = 5.0):
+        """
+        Args:
+            budget_mb: 메모리 예산 (MB, 자식 프로세스 포함, None이면 제한 없음)
+            high_watermark: 유휴 모델 정리를 시작하는 RSS (예산 대비 비율)
+            low_watermark: 정리 후 목표 RSS (예산 대비 비율)
+            idle_timeout: 모델을 내리기까지의 미사용 시간 (초, 0이면 내리지 않음)
+            admission_timeout: 예산 초과 작업/로드의 최대 대기 시간 (초)
+            check_interval: 유휴/수위 점검 주기 (초)
+        """
+        if not 0 < low_watermark <= high_watermark <= 1:
+            raise ValueError("Watermarks must satisfy 0 < low <= high <= 1")
+        self.config = {
+            "budget_bytes": int(budget_mb * _MB) if budget_mb else None,
+            "high_watermark": high_watermark,
+            "low_watermark": low_watermark,
+            "idle_timeout": idle_timeout,
+            "admission_timeout": admission_timeout,
+            "check_interval": check_interval,
+        }
+        self._components: Dict[str, _Component] = {}
+        self._condition = threading.Condition()
+        self._reserved = 0      # 실행 중인 작업의 예상 메모리 합
+        # 모델/작업을 제외한 기준 사용량 (인터프리터, 라이브러리)
+        self._baseline = current_rss(include_children=True)
+        self._active_work = 0
+        self._peak_rss = 0
+        self.metrics = {"admitted": 0, "queued": 0, "refused": 0, "evictions": 0, "reloads": 0}
+        self._stop_event = threading.Event()
+        self._thread = None
+
+        self._setup_logging()
+
+    def _setup_logging(self):
+        self.logger = logging.getLogger(__name__)
+
+    def start(self):
+        """유휴/수위 점검 스레드 시작"""
+        if self._thread is not None:
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._monitor_loop, name="memory-governor", daemon=True)
+        self._thread.start()
+        self.logger.info(f"Memory governor started (budget: {self._budget_mb()} MB)")
+
+    def stop(self):
+        """점검 스레드 정지 후 모든 모델 해제"""
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5.0)
+            self._thread = None
+        for name in list(self._components):
+            self.unregister(name)
+
+    # ---- 모델 등록/사용 ----
+
+    def register(self, name: str, loader: Callable[[], Any],
+                 unloader: Optional[Callable[[Any], None]] = None,
+                 warm_up: Optional[Callable[[Any], None]] = None,
+                 estimated_bytes: int = 0,
+                 idle_timeout: Optional[float] = None,
+                 pinned: bool = False,
+                 preload: bool = False) -> ModelHandle:
+        """
+        모델 등록
+
+        Args:
+            name: 구성 요소 이름 (통계 키)
+            loader: 모델을 만들어 반환하는 함수
+            unloader: 모델 해제 함수 (기본값: 참조만 제거)
+            warm_up: 로드 직후 한 번 실행할 예열 함수
+            estimated_bytes: 첫 로드 전 예산 계산에 쓸 예상 크기
+            idle_timeout: 모델별 미사용 시간 (기본값: 관리자 설정)
+            pinned: 유휴/수위 정리 대상에서 제외
+            preload: 등록 즉시 로드
+        """
+        with self._condition:
+            if name in self._components:
+                raise ValueError(f"Component already registered: {name}")
+            self._components[name] = _Component(name, loader, unloader, warm_up,
+                                                estimated_bytes, idle_timeout, pinned)
+        if preload:
+            self.load(name)
+        return ModelHandle(self, name)
+
+    def unregister(self, name: str):
+        """모델 해제 후 등록 취소 (사용 중이면 사용이 끝날 때까지 대기)"""
+        with self._condition:
+            component = self._components.get(name)
+            if component is None:
+                return
+            while component.in_use or component.state == "loading":
+                self._condition.wait()
+            value = self._take(component)
+            del self._components[name]
+        self._dispose(component, value)
+
+    def is_loaded(self, name: str) -> bool:
+        with self._condition:
+            component = self._components.get(name)
+            return component is not None and component.state == "loaded"
+
+    @contextmanager
+    def acquire(self, name: str, token: Optional[CancellationToken] = None):
+        """모델 사용 구간 (구간 동안 정리 대상에서 제외)"""
+        component = self._components[name]
+        model = self._load(name, token, pin=True)
+        try:
+            yield model
+        finally:
+            with self._condition:
+                component.in_use -= 1
+                component.last_used = time.monotonic()
+                self._condition.notify_all()
+
+    def load(self, name: str, token: Optional[CancellationToken] = None) -> Any:
+        """모델 반환 (내려가 있으면 예산을 확인하고 다시 로드)"""
+        return self._load(name, token, pin=False)
+
+    def _load(self, name: str, token: Optional[CancellationToken], pin: bool) -> Any:
+        with self._condition:
+            component = self._components[name]
+            while component.state == "loading":
+                self._wait(token)
+            if component.state == "loaded":
+                component.last_used = time.monotonic()
+                if pin:
+                    component.in_use += 1
+                return component.value
+
+            # 다른 스레드가 같은 모델을 동시에 로드하지 않도록 먼저 표시
+            component.state = "loading"
+            try:
+                self._make_room(component.bytes, token, exclude=component)
+            except BaseException:
+                component.state = "unloaded"
+                self._condition.notify_all()
+                raise
+            reload = component.loads > 0
+
+        start = time.monotonic()
+        rss_before = current_rss(include_children=True)
+        try:
+            value = component.loader()
+            if component.warm_up is not None:
+                component.warm_up(value)
+        except BaseException:
+            with self._condition:
+                component.state = "unloaded"
+                self._condition.notify_all()
+            raise
+        # 호스트 메모리에 올라간 텐서 크기, torch 모듈이 아니면 로드 전후 RSS 차이
+        measured = model_bytes(value) or max(0, current_rss(include_children=True) - rss_before)
+
+        with self._condition:
+            component.value = value
+            component.state = "loaded"
+            component.bytes = measured or component.bytes
+            component.loads += 1
+            component.load_seconds = round(time.monotonic() - start, 3)
+            component.last_used = time.monotonic()
+            if pin:
+                component.in_use += 1
+            if reload:
+                self.metrics["reloads"] += 1
+            self._condition.notify_all()
+        self.logger.info(f"Loaded {name}: {measured / _MB:.0f} MB in {component.load_seconds}s"
+                         f"{' (reload)' if reload else ''}")
+        return value
+
+    def evict(self, name: str) -> bool:
+        """모델 내리기 (사용 중이면 False)"""
+        with self._condition:
+            component = self._components.get(name)
+            if component is None or component.state != "loaded" or component.in_use:
+                return False
+            value = self._take(component)
+        self._dispose(component, value)
+        return True
+
+    def _take(self, component: _Component) -> Any:
+        """잠금 안에서 모델 참조를 떼어냄 (실제 해제는 잠금 밖에서)"""
+        value, component.value = component.value, None
+        if component.state == "loaded":
+            component.state = "unloaded"
+            component.evictions += 1
+            self.metrics["evictions"] += 1
+        return value
+
+    def _dispose(self, component: _Component, value: Any):
+        if value is None:
+            return
+        if component.unloader is not None:
+            try:
+                component.unloader(value)
+            except Exception as e:
+                self.logger.warning(f"Failed to unload {component.name}: {e}")
+        del value
+        release_free_memory()
+        self.logger.info(f"Unloaded {component.name} (RSS: {current_rss() / _MB:.0f} MB)")
+
+    # ---- 작업 수용 ----
+
+    @contextmanager
+    def admit(self, nbytes: int, token: Optional[CancellationToken] = None,
+              timeout: Optional[float] = None):
+        """
+        예상 메모리가 nbytes인 작업 구간
+
+        예산을 넘으면 유휴 모델을 내리고, 그래도 부족하면 다른 작업이 끝나기를 기다림
+
+        Raises:
+            MemoryBudgetExceeded: timeout 안에 메모리를 확보하지 못함
+            RequestCancelled: 대기 중 요청이 취소됨
+        """
+        with self._condition:
+            self._make_room(nbytes, token, timeout=timeout)
+            self._reserved += nbytes
+            self._active_work += 1
+            self.metrics["admitted"] += 1
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._reserved -= nbytes
+                self._active_work -= 1
+                self._condition.notify_all()
+
+    def _make_room(self, nbytes: int, token: Optional[CancellationToken],
+                   exclude: Optional[_Component] = None, timeout: Optional[float] = None):
+        """잠금을 잡은 상태에서 nbytes를 더해도 예산 안에 들도록 정리/대기"""
+        budget = self.config["budget_bytes"]
+        if budget is None:
+            return
+        if nbytes > budget:
+            self.metrics["refused"] += 1
+            raise MemoryBudgetExceeded(f"Request needs {nbytes // _MB} MB, budget is {budget // _MB} MB")
+
+        timeout = self.config["admission_timeout"] if timeout is None else timeout
+        deadline = time.monotonic() + timeout
+        queued = False
+        while self._usage() + nbytes > budget:
+            victim = self._idle_victim(exclude)
+            if victim is not None:
+                value = self._take(victim)
+                # 해제(gc/malloc_trim)는 느릴 수 있지만 그동안 예산 판단이 바뀌면 안 되므로 잠금 안에서
+                self._dispose(victim, value)
+                continue
+
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                self.metrics["refused"] += 1
+                raise MemoryBudgetExceeded(
+                    f"Memory budget exceeded: RSS {current_rss(include_children=True) // _MB} MB, "
+                    f"committed {self._committed() // _MB} MB + {nbytes // _MB} MB > {budget // _MB} MB")
+            if not queued:
+                queued = True
+                self.metrics["queued"] += 1
+            self._wait(token, remaining)
+
+    def _committed(self) -> int:
+        """기준선 + 로드된(로드 중인) 모델 + 실행 중인 작업 예약 (잠금 안에서 호출)"""
+        models = sum(c.bytes for c in self._components.values() if c.state != "unloaded")
+        return self._baseline + models + self._reserved
+
+    def _usage(self) -> int:
+        """
+        예산 판단용 사용량 (잠금 안에서 호출)
+
+        실행 중인 작업의 예약 일부는 이미 RSS에 포함되어 있으므로 둘을 더하지 않고 큰 쪽을 사용
+        """
+        return max(current_rss(include_children=True), self._committed())
+
+    def _idle_victim(self, exclude: Optional[_Component] = None) -> Optional[_Component]:
+        """사용 중이 아닌 로드된 모델 중 가장 오래 쉰 것"""
+        candidates = [c for c in self._components.values()
+                      if c.state == "loaded" and not c.in_use and not c.pinned and c is not exclude]
+        return min(candidates, key=lambda c: c.last_used) if candidates else None
+
+    def _wait(self, token: Optional[CancellationToken], timeout: float = 0.5):
+        if token is not None:
+            if token.cancelled:
+                raise RequestCancelled(token.reason)
+            timeout = min(timeout, token.probe_interval)
+        self._condition.wait(timeout=min(timeout, 0.5))
+
+    # ---- 주기 점검 ----
+
+    def _monitor_loop(self):
+        while not self._stop_event.wait(self.config["check_interval"]):
+            try:
+                self.check()
+            except Exception as e:
+                self.logger.error(f"Memory check failed: {e}")
+
+    def check(self) -> int:
+        """
+        유휴 시간이 지난 모델과 수위를 넘긴 만큼의 모델 내리기
+
+        Returns:
+            int: 내린 모델 수
+        """
+        evicted = 0
+        now = time.monotonic()
+        with self._condition:
+            for component in list(self._components.values()):
+                idle_timeout = component.idle_timeout if component.idle_timeout is not None \
+                    else self.config["idle_timeout"]
+                if (idle_timeout and component.state == "loaded" and not component.in_use
+                        and not component.pinned and now - component.last_used >= idle_timeout):
+                    self.logger.info(f"Evicting idle {component.name} "
+                                     f"({now - component.last_used:.0f}s unused)")
+                    self._dispose(component, self._take(component))
+                    evicted += 1
+
+            rss = current_rss(include_children=True)
+            self._peak_rss = max(self._peak_rss, rss)
+            budget = self.config["budget_bytes"]
+            if budget and self._usage() > budget * self.config["high_watermark"]:
+                target = budget * self.config["low_watermark"]
+                while self._usage() > target:
+                    victim = self._idle_victim()
+                    if victim is None:
+                        self.logger.warning(f"RSS {rss // _MB} MB above high watermark, "
+                                            f"no idle model to evict")
+                        break
+                    self._dispose(victim, self._take(victim))
+                    evicted += 1
+            if evicted:
+                self._condition.notify_all()
+        return evicted
+
+    # ---- 보고 ----
+
+    def _budget_mb(self) -> Optional[float]:
+        budget = self.config["budget_bytes"]
+        return round(budget / _MB, 1) if budget else None
+
+    def get_stats(self) -> Dict[str, Any]:
+        """구성 요소별 메모리 사용량"""
+        rss = current_rss(include_children=True)
+        now = time.monotonic()
+        with self._condition:
+            self._peak_rss = max(self._peak_rss, rss)
+            components = {}
+            resident = 0
+            for name, c in self._components.items():
+                if c.state == "loaded":
+                    resident += c.bytes
+                components[name] = {
+                    "state": c.state,
+                    "mb": round(c.bytes / _MB, 1) if c.state == "loaded" else 0.0,
+                    "estimated_mb": round(c.bytes / _MB, 1),
+                    "in_use": c.in_use,
+                    "idle_seconds": round(now - c.last_used, 1),
+                    "loads": c.loads,
+                    "evictions": c.evictions,
+                    "last_load_seconds": c.load_seconds,
+                }
+            budget = self.config["budget_bytes"]
+            return {
+                # 자식 프로세스(Whisper 작업자 등) 포함
+                "rss_mb": round(rss / _MB, 1),
+                "committed_mb": round(self._committed() / _MB, 1),
+                "peak_rss_mb": round(self._peak_rss / _MB, 1),
+                "budget_mb": self._budget_mb(),
+                "high_watermark_mb": round(budget * self.config["high_watermark"] / _MB, 1) if budget else None,
+                "low_watermark_mb": round(budget * self.config["low_watermark"] / _MB, 1) if budget else None,
+                "components": components,
+                "work": {"active": self._active_work, "reserved_mb": round(self._reserved / _MB, 1)},
+                # 모델 외 나머지 (인터프리터, 라이브러리, 캐시, 실행 중인 작업의 실제 사용량)
+                "other_mb": round(max(0, rss - resident) / _MB, 1),
+                **self.metrics,
+            }
@@ -0,0 +1,177 @@
+import re
+import math
+import logging
+import threading
+from typing import Dict, Any, Optional, List, Iterable
+
+from Models.Memory import estimate_tokens
+
+# 문장 끝: 마침표/물음표/느낌표(연속 가능) 뒤 공백, 또는 줄바꿈
+_SENTENCE_END = re.compile(r'(?<=[.!?。])[\'")\]]*\s+|\n+')
+
+# MPEG 오디오 비트레이트 (kbps) - [MPEG-1 Layer III, MPEG-2/2.5 Layer III]
+_MP3_BITRATES = [
+    [0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320],
+    [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+]
+
+
+def split_sentences(text: str) -> List[str]:
+    """문장 단위로 나누기 (마지막 조각은 아직 끝나지 않은 문장일 수 있음)"""
+    return [s.strip() for s in _SENTENCE_END.split(text) if s and s.strip()]
+
+
+def mp3_seconds(audio: bytes) -> Optional[float]:
+    """고정 비트레이트 MP3 길이 (첫 프레임 헤더의 비트레이트 기준, 알 수 없으면 None)"""
+    for i in range(min(len(audio) - 3, 4096)):
+        if audio[i] != 0xFF or (audio[i + 1] & 0xE0) != 0xE0:
+            continue
+        version = (audio[i + 1] >> 3) & 0x03   # 3: MPEG-1, 2: MPEG-2, 0: MPEG-2.5
+        layer = (audio[i + 1] >> 1) & 0x03     # 1: Layer III
+        index = audio[i + 2] >> 4
+        if layer != 1 or version == 1 or index in (0, 15):
+            continue
+        kbps = _MP3_BITRATES[0 if version == 3 else 1][index]
+        return (len(audio) - i) * 8 / (kbps * 1000)
+    return None
+
+
+class ResponseBudget:
+    """
+    음성 응답 예산 (LLM 생성과 TTS가 공유)
+
+    사용자가 실제로 듣는 길이(재생 시간 예산 × 발화 속도)에서 글자 수/문장 수 상한을 정하고,
+    이를 LLM 최대 토큰 수와 생성 중단 조건으로 사용 (들리지 않을 토큰에 비용/시간을 쓰지 않음)
+    """
+
+    def __init__(self,
+                 max_speech_seconds: float = 20.0,
+                 max_sentences: int = 3,
+                 chars_per_second: float = 7.0,
+                 tts_max_chars: int = 500,
+                 token_margin: float = 1.5,
+                 adapt_rate: float = 0.1):
+        """
+        Args:
+            max_speech_seconds: 응답 음성의 최대 재생 시간 (초)
+            max_sentences: 최대 문장 수
+            chars_per_second: TTS 발화 속도 초기값 (합성 결과로 계속 보정)
+            tts_max_chars: TTS가 한 번에 합성할 최대 글자 수
+            token_margin: 글자 수 → 토큰 상한 여유 배율 (마지막 문장을 끝맺을 여유)
+            adapt_rate: 발화 속도 보정 지수 이동 평균 비율
+        """
+        self.config = {
+            "max_speech_seconds": max_speech_seconds,
+            "max_sentences": max_sentences,
+            "tts_max_chars": tts_max_chars,
+            "token_margin": token_margin,
+            "adapt_rate": adapt_rate,
+        }
+        self.chars_per_second = chars_per_second
+        self.metrics = {"responses": 0, "early_stops": 0, "truncated": 0,
+                        "generated_chars": 0, "spoken_chars": 0}
+        self._lock = threading.Lock()
+        self._setup_logging()
+
+    def _setup_logging(self):
+        self.logger = logging.getLogger(__name__)
+
+    @property
+    def max_chars(self) -> int:
+        """재생 시간 예산 안에 말할 수 있는 글자 수"""
+        return max(1, min(self.config["tts_max_chars"],
+                          int(self.config["max_speech_seconds"] * self.chars_per_second)))
+
+    @property
+    def max_tokens(self) -> int:
+        """LLM 최대 생성 토큰 수 (한글 음절당 약 1토큰 + 여유)"""
+        return math.ceil(estimate_tokens("가" * self.max_chars) * self.config["token_margin"]) + 16
+
+    def system_prompt(self, base_prompt: str) -> str:
+        """응답 길이 지시를 덧붙인 시스템 프롬프트 (요청마다 같아 프롬프트 캐시 유지)"""
+        return (f"{base_prompt}\n음성으로 읽어 줄 답변이므로 {self.config['max_sentences']}문장, "
+                f"{self.max_chars}자 이내로 간결하게 답하세요.")
+
+    def _complete_part(self, text: str) -> str:
+        """마지막 문장 끝까지의 부분 (이후 조각은 아직 생성 중인 문장)"""
+        end = 0
+        for match in _SENTENCE_END.finditer(text):
+            end = match.end()
+        return text[:end]
+
+    def _enough(self, text: str) -> bool:
+        """끝난 문장이 문장 수 예산을 채웠거나, 더 생성해도 글자 수 예산에 들어갈 수 없음"""
+        return (len(split_sentences(self._complete_part(text))) >= self.config["max_sentences"]
+                or len(text.strip()) > self.max_chars)
+
+    def collect(self, chunks: Iterable[str]) -> str:
+        """
+        스트리밍 응답을 예산이 찰 때까지만 받기
+
+        예산을 채우면 스트림을 닫아 생성을 멈추고 (로컬 모델은 배치에서 빠지고,
+        HTTP 스트림은 연결이 닫힘) 말할 부분만 반환
+        """
+        stream = iter(chunks)
+        text = ""
+        stopped = False
+        try:
+            for chunk in stream:
+                text += chunk
+                if self._enough(text):
+                    stopped = True
+                    break
+        finally:
+            close = getattr(stream, "close", None)
+            if close is not None:
+                close()
+
+        # 중간에 멈췄으면 생성 중이던 마지막 문장 조각은 말하지 않음
+        spoken = self.truncate((self._complete_part(text) or text) if stopped else text)
+        with self._lock:
+            self.metrics["responses"] += 1
+            self.metrics["early_stops"] += stopped
+            self.metrics["generated_chars"] += len(text.strip())
+            self.metrics["spoken_chars"] += len(spoken)
+        return spoken
+
+    def truncate(self, text: str) -> str:
+        """예산 안의 문장까지만 남기기 (첫 문장이 너무 길면 공백 위치에서 자름)"""
+        text = re.sub(r'[ \t]+', ' ', text or "").strip()
+        if not text:
+            return ""
+        max_chars = self.max_chars
+        kept, length = [], 0
+        for sentence in split_sentences(text):
+            if len(kept) >= self.config["max_sentences"] or length + len(sentence) > max_chars:
+                break
+            kept.append(sentence)
+            length += len(sentence) + 1
+
+        if not kept:
+            cut = text[:max_chars]
+            space = cut.rfind(" ")
+            kept = [cut[:space] if space > max_chars // 2 else cut]
+        result = " ".join(kept)
+        if len(result) < len(" ".join(split_sentences(text))):
+            with self._lock:
+                self.metrics["truncated"] += 1
+        return result
+
+    def observe_speech(self, text: str, seconds: Optional[float]):
+        """합성된 음성 길이로 발화 속도 보정 (다음 요청의 글자/토큰 상한에 반영)"""
+        if not text or not seconds or seconds <= 0:
+            return
+        rate = self.config["adapt_rate"]
+        with self._lock:
+            self.chars_per_second += rate * (len(text) / seconds - self.chars_per_second)
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self.metrics)
+            generated = stats["generated_chars"]
+            stats["unspoken_ratio"] = round(1 - stats["spoken_chars"] / generated, 4) if generated else 0.0
+            stats["chars_per_second"] = round(self.chars_per_second, 2)
+        stats["max_chars"] = self.max_chars
+        stats["max_tokens"] = self.max_tokens
+        stats["max_sentences"] = self.config["max_sentences"]
+        return stats
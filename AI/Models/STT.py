@@ -4,22 +4,125 @@ import numpy as np
 import logging
 import os
 import re
+import math
+import time
 import tempfile
+import threading
 import soundfile as sf
-from typing import Optional, Union, List
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager, nullcontext
+from typing import Optional, Union, List, Dict, Any, Tuple
 from pathlib import Path
 import librosa
 import noisereduce as nr
+from Models.Cancellation import CancellationToken, RequestCancelled, check
+from Models.MemoryGovernor import MemoryGovernor, release_free_memory, available_memory
+
+# 모델별 파라미터 수 (첫 로드 전 메모리 예산 계산용, fp32 기준)
+_WHISPER_PARAMS = {"tiny": 39e6, "base": 74e6, "small": 244e6, "medium": 769e6,
+                   "large": 1550e6, "turbo": 809e6}
+
+# 장문 변환 작업자 프로세스의 Whisper 모델 (프로세스마다 한 번만 로드)
+_worker_model = None
+
+def _init_long_form_worker(model_name: str, device: str, num_threads: int):
+    """장문 변환 작업자 프로세스 초기화"""
+    global _worker_model
+    torch.set_num_threads(num_threads)
+    _worker_model = whisper.load_model(model_name, device=device)
+
+def _transcribe_chunk(audio: np.ndarray, offset: float, language: str, task: str,
+                      fp16: bool, model=None) -> List[Dict[str, Any]]:
+    """오디오 청크 변환 (타임스탬프는 원본 기준으로 보정)"""
+    model = model or _worker_model
+    result = model.transcribe(
+        audio,
+        language=language,
+        task=task,
+        fp16=fp16,
+        # 청크 간 독립 디코딩 (이전 텍스트 조건화는 병렬화를 막고 환각 반복을 전파함)
+        condition_on_previous_text=False,
+        temperature=0.0
+    )
+    return [
+        {"start": offset + seg["start"], "end": offset + seg["end"], "text": seg["text"].strip()}
+        for seg in result["segments"] if seg["text"].strip()
+    ]
+
+# stage graph 작업자 프로세스의 STT (프로세스마다 한 번만 생성)
+_worker_stt = None
+_worker_preprocessor = None
+
+def init_stt_worker(model_name: str, num_threads: int):
+    """Whisper 단계 작업자 프로세스 초기화 (프로세스마다 CPU 모델을 따로 로드)"""
+    global _worker_stt
+    torch.set_num_threads(num_threads)
+    _worker_stt = WhisperSTT(model_name=model_name, device="cpu")
+
+def transcribe_in_worker(audio: np.ndarray, decoding_config: Optional[Dict[str, Any]] = None,
+                         timeout: Optional[float] = None) -> str:
+    """
+    작업자 프로세스 모델로 16kHz 음성 변환 (init_stt_worker로 초기화된 프로세스에서 실행)
+    
+    Args:
+        decoding_config: 요청 프로세스 STT의 디코딩 설정 (update_decoding_config 변경 반영)
+        timeout: 요청의 남은 시간 (초, 취소 토큰은 프로세스를 넘길 수 없으므로 같은 기한의 토큰으로 중단)
+    """
+    if decoding_config is not None:
+        _worker_stt.decoding_config = dict(decoding_config)
+    token = CancellationToken(timeout=timeout) if timeout is not None else None
+    return _worker_stt.transcribe_array(audio, token=token)
+
+def init_decode_worker():
+    """디코딩/전처리 단계 작업자 프로세스 초기화 (모듈 import와 전처리기 생성을 첫 요청 전에)"""
+    global _worker_preprocessor
+    _worker_preprocessor = WhisperSTT(device="cpu", load_model=False)
+
+def decode_audio_file(audio_path: Union[str, Path], preprocessing_config: Dict[str, Any],
+                      use_preprocessing: bool = True) -> Tuple[np.ndarray, Dict[str, Optional[float]]]:
+    """
+    음성 파일 디코딩 + 전처리 (모델이 필요 없어 프로세스 풀에서도 실행 가능)
+    
+    Returns:
+        Tuple: (16kHz float32 음성, 전처리 단계별 실행 시간 - 생략한 단계는 None)
+    """
+    if _worker_preprocessor is None:
+        init_decode_worker()
+    _worker_preprocessor.preprocessing_config.update(preprocessing_config)
+    return _worker_preprocessor.load_audio(audio_path, use_preprocessing=use_preprocessing)
 
 class WhisperSTT:
-    def __init__(self, model_name="small", device: Optional[str] = None):
+    def __init__(self, model_name="small", device: Optional[str] = None,
+                 governor: Optional[MemoryGovernor] = None, load_model: bool = True,
+                 long_form_workers: Optional[int] = None):
+        """
+        Args:
+            model_name: Whisper 모델 이름
+            device: 실행 device (기본값: 자동 선택)
+            governor: 메모리 관리자 (지정시 쉬는 동안 모델을 내렸다가 다음 요청에서 다시 로드)
+            load_model: False면 모델 없이 전처리만 사용 (디코딩/전처리 작업자 프로세스용)
+            long_form_workers: 장문 변환 작업자 프로세스 수 (기본값: CPU 코어 수와 가용 메모리 기준)
+        """
         self.model_name = model_name
         self.device = self._get_device(device)
+        self.governor = governor
+        self.long_form_workers = long_form_workers
+        self._handle = None
+        self._model = None
+        # 장문 변환 프로세스 풀 (첫 장문 요청에서 만들고 이후 요청이 공유)
+        self._long_form_pool = None
+        self._long_form_handle = None
+        self._long_form_lock = threading.Lock()
+        # Whisper는 디코딩마다 공유 모델에 kv-cache hook을 설치하므로 동시 디코딩 불가
+        self._model_lock = threading.Lock()
         
         self._setup_logging()
-        self._load_model()
         self._setup_korean_optimization()
         self._setup_audio_preprocessing()
+        self._setup_decoding_profiles()
+        if load_model:
+            self._load_model()
         
         self.logger.info(f"Whisper STT initialized successfully on {self.device}")
     
@@ -36,13 +139,58 @@ class WhisperSTT:
             return "cpu"
     
     def _setup_logging(self):
-        logging.basicConfig(level=logging.INFO)
         self.logger = logging.getLogger(__name__)
     
     def _load_model(self):
+        if self.governor is None:
+            self._model = self._create_model()
+            return
+        
+        if self._handle is not None:
+            self._handle.unregister()
+        params = _WHISPER_PARAMS.get(self.model_name.split(".")[0].split("-")[0], 0)
+        self._handle = self.governor.register(
+            f"stt:{self.model_name}",
+            loader=self._create_model,
+            warm_up=self._warm_up,
+            # GPU 모델은 호스트 메모리를 거의 쓰지 않음
+            estimated_bytes=int(params * 4) if self.device == "cpu" else 0,
+            preload=True
+        )
+    
+    def _create_model(self):
         self.logger.info(f"Loading Whisper model: {self.model_name} on {self.device}")
-        self.model = whisper.load_model(self.model_name, device=self.device)
+        model = whisper.load_model(self.model_name, device=self.device)
         self.logger.info("Model loaded successfully")
+        return model
+    
+    def _warm_up(self, model):
+        """로드 직후 1초 무음을 한 번 디코딩 (커널 선택/버퍼 할당 비용을 첫 요청이 떠안지 않도록)"""
+        model.transcribe(
+            np.zeros(16000, dtype=np.float32),
+            language=self.default_language,
+            fp16=False if self.device == "cpu" else True,
+            condition_on_previous_text=False,
+            without_timestamps=True,
+            temperature=0.0
+        )
+    
+    @property
+    def model(self):
+        """Whisper 모델 (메모리 관리자가 내렸으면 다시 로드)"""
+        if self._handle is not None:
+            return self._handle.get()
+        return self._model
+    
+    def _resident(self, token: Optional[CancellationToken] = None):
+        """사용 구간 동안 메모리 관리자가 모델을 내리지 않도록 고정"""
+        return self._handle.acquire(token) if self._handle is not None else nullcontext()
+    
+    def unload(self) -> bool:
+        """모델을 메모리에서 내림 (메모리 관리자 사용시 다음 요청에서 다시 로드)"""
+        if self._handle is not None:
+            return self._handle.unload()
+        return False
     
     def _setup_korean_optimization(self):
         self.default_language = "ko"
@@ -56,7 +204,111 @@ class WhisperSTT:
             "remove_silence": True,       # 무음 구간 제거
             "sample_rate": 16000,         # 샘플링 레이트
             "noise_reduction_strength": 0.1,  # 잡음 제거 강도
+            # 적응형 전처리: 신호 품질을 측정해 필요한 단계만 실행 (켜진 단계 중에서)
+            "adaptive": True,
+            "denoise_below_snr_db": 20.0,     # 추정 SNR이 이보다 낮을 때만 잡음 제거
+            "trim_above_silence_ratio": 0.2,  # 무음 비율이 이보다 높을 때만 무음 제거
+            "target_level_db": (-30.0, -14.0),  # RMS 레벨(dBFS)이 범위 밖일 때만 정규화
+        }
+        self._preprocessing_stats = {
+            "clips": 0,
+            "stages": {stage: {"run": 0, "skipped": 0, "seconds": 0.0}
+                       for stage in ("remove_silence", "noise_reduction", "normalize_audio")},
+        }
+        self._stats_lock = threading.Lock()
+    
+    def _setup_decoding_profiles(self):
+        """
+        디코딩 설정 (stt_benchmark.py로 프로필/항목별 지연 시간과 CER 비교)
+        
+        짧은 음성 명령은 command 프로필: 이전 문맥/타임스탬프/온도 fallback 없이
+        음성 길이에 비례한 토큰 수까지만 디코딩 (환각 반복 루프가 최악 지연 시간의 원인)
+        """
+        self.decoding_config = {
+            "command_max_seconds": 15.0,  # 이 길이 이하 음성에 command 프로필 적용
+            # 음성 1초당 최대 토큰 수 (None이면 제한 없음)
+            # 한국어 발화는 약 5음절/초이고 Whisper 다국어 토크나이저는 한글 한 음절을 1~3토큰으로 나누므로
+            # 빠른 발화도 자르지 않도록 여유 있게 잡음. 상한에 걸리면 경고 로그와 token_cap_hits로 확인 후
+            # stt_benchmark.py가 출력하는 전사 토큰 밀도(최대 토큰/초)로 조정
+            "tokens_per_second": 25.0,
+            "min_tokens": 16,             # 아주 짧은 음성의 최소 토큰 수
+            "without_timestamps": True,   # 타임스탬프 토큰 생략 (명령은 구간 정보 불필요)
+            "eot_threshold": 0.3,         # 문장 끝 확률이 이 이상이면 바로 종료 (None이면 사용 안 함)
         }
+        self._decoding_stats = {"command": 0, "general": 0, "token_cap_hits": 0, "eot_stops": 0}
+    
+    def decoding_options(self, duration: float, profile: Optional[str] = None) -> Dict[str, Any]:
+        """
+        음성 길이에 맞는 Whisper 디코딩 옵션
+        
+        Args:
+            duration: 음성 길이 (초)
+            profile: "command" / "general" (기본값: command_max_seconds 기준 자동 선택)
+            
+        Returns:
+            Dict[str, Any]: model.transcribe 옵션 (command 프로필은 sample_len 포함)
+        """
+        config = self.decoding_config
+        if profile is None:
+            profile = "command" if duration <= config["command_max_seconds"] else "general"
+        if profile == "general":
+            return {"condition_on_previous_text": True, "temperature": 0.0}
+        
+        options = {
+            "condition_on_previous_text": False,
+            "without_timestamps": config["without_timestamps"],
+            # 단일 온도 + 임계값 없음 → 압축률/로그확률로 인한 재디코딩 없음
+            "temperature": 0.0,
+            "compression_ratio_threshold": None,
+            "logprob_threshold": None,
+        }
+        if config["tokens_per_second"]:
+            # Whisper의 기본 상한(n_text_ctx // 2 = 224)보다 커지지 않도록
+            options["sample_len"] = min(224, max(config["min_tokens"],
+                                                 math.ceil(duration * config["tokens_per_second"])))
+        return options
+    
+    def configure_decoding(self, **kwargs):
+        """디코딩 설정 변경"""
+        self.decoding_config.update(kwargs)
+        self.logger.info(f"Decoding configuration updated: {kwargs}")
+    
+    def get_decoding_stats(self) -> Dict[str, Any]:
+        with self._stats_lock:
+            return {**self._decoding_stats, "config": dict(self.decoding_config)}
+    
+    def _run_decoding(self, audio: Union[str, np.ndarray], language: str, task: str,
+                      profile: Optional[str], token: Optional[CancellationToken]) -> Dict[str, Any]:
+        """프로필 옵션으로 디코딩 (파일 경로는 길이를 알기 위해 먼저 16kHz로 로드)"""
+        if isinstance(audio, (str, Path)):
+            audio = whisper.load_audio(str(audio))
+        audio = audio.astype(np.float32, copy=False)
+        
+        options = self.decoding_options(len(audio) / 16000, profile)
+        command = not options["condition_on_previous_text"]
+        eot_threshold = self.decoding_config["eot_threshold"] if command else None
+        with self._decoding(token, eot_threshold=eot_threshold):
+            result = self.model.transcribe(
+                audio,
+                language=language,
+                task=task,
+                fp16=False if self.device == "cpu" else True,
+                **options
+            )
+        
+        with self._stats_lock:
+            self._decoding_stats["command" if command else "general"] += 1
+            sample_len = options.get("sample_len")
+            cap_hit = bool(sample_len) and any(len(seg["tokens"]) >= sample_len for seg in result["segments"])
+            if cap_hit:
+                self._decoding_stats["token_cap_hits"] += 1
+        if cap_hit:
+            # 상한에 걸림: 환각 루프를 잘랐거나 tokens_per_second가 너무 작음 (정상 발화가 잘렸는지 확인용)
+            self.logger.warning(
+                f"Decoding hit token cap: sample_len={sample_len}, duration={len(audio) / 16000:.2f}s, "
+                f"text={result.get('text', '')[:50]!r}"
+            )
+        return result
     
     def preprocess_audio(self, audio_path: Union[str, Path]) -> str:
         """
@@ -73,18 +325,12 @@ class WhisperSTT:
             
             # 오디오 로드
             audio, sr = librosa.load(audio_path, sr=self.preprocessing_config["sample_rate"])
+            audio, timings = self.preprocess_array(audio, sr)
             
-            # 1. 무음 구간 제거
-            if self.preprocessing_config["remove_silence"]:
-                audio = self._remove_silence(audio, sr)
-            
-            # 2. 잡음 제거
-            if self.preprocessing_config["noise_reduction"]:
-                audio = self._reduce_noise(audio, sr)
-            
-            # 3. 음성 정규화
-            if self.preprocessing_config["normalize_audio"]:
-                audio = self._normalize_audio(audio)
+            if all(seconds is None for seconds in timings.values()):
+                # 깨끗한 녹음은 다시 쓰지 않고 원본 사용
+                self.logger.info("음성 전처리 생략 (신호 품질 양호)")
+                return audio_path
             
             # 전처리된 오디오를 임시 파일로 저장
             temp_path = tempfile.mktemp(suffix=".wav")
@@ -97,6 +343,109 @@ class WhisperSTT:
             self.logger.error(f"음성 전처리 실패: {str(e)}")
             return audio_path  # 실패시 원본 파일 반환
     
+    def preprocess_array(self, audio: np.ndarray, sr: int) -> Tuple[np.ndarray, Dict[str, Optional[float]]]:
+        """
+        메모리의 음성에 적응형 전처리 적용
+        
+        Returns:
+            Tuple: (전처리된 음성, 단계별 실행 시간 - 생략한 단계는 None)
+        """
+        plan = self._plan_preprocessing(audio, sr)
+        stages = (
+            ("remove_silence", lambda a: self._remove_silence(a, sr)),  # 1. 무음 구간 제거
+            ("noise_reduction", lambda a: self._reduce_noise(a, sr)),   # 2. 잡음 제거
+            ("normalize_audio", self._normalize_audio),                 # 3. 음성 정규화
+        )
+        timings = {}
+        for stage, apply in stages:
+            timings[stage] = None
+            if plan[stage]:
+                start = time.perf_counter()
+                audio = apply(audio)
+                timings[stage] = time.perf_counter() - start
+        self.record_preprocessing(timings)
+        return audio, timings
+    
+    def load_audio(self, audio_path: Union[str, Path],
+                   use_preprocessing: bool = True) -> Tuple[np.ndarray, Dict[str, Optional[float]]]:
+        """
+        음성 파일을 16kHz float32 배열로 디코딩 (전처리 결과를 임시 파일로 쓰지 않음)
+        
+        Returns:
+            Tuple: (음성, 전처리 단계별 실행 시간 - 생략한 단계는 None)
+        """
+        self._validate_audio_file(audio_path)
+        audio, sr = librosa.load(str(audio_path), sr=self.preprocessing_config["sample_rate"])
+        timings = {}
+        if use_preprocessing:
+            audio, timings = self.preprocess_array(audio, sr)
+        return audio.astype(np.float32, copy=False), timings
+    
+    def estimate_signal_quality(self, audio: np.ndarray, sr: int) -> Dict[str, float]:
+        """
+        빠른 신호 품질 추정 (20ms 프레임 RMS 기반, 잡음 제거보다 수백 배 빠름)
+        
+        Returns:
+            Dict[str, float]: level_db (전체 RMS dBFS), snr_db (음성/잡음 프레임 에너지 차이),
+                              silence_ratio (최대 대비 -40dB 미만 프레임 비율)
+        """
+        frame = max(1, int(sr * 0.02))
+        count = len(audio) // frame
+        if count == 0:
+            return {"level_db": -100.0, "snr_db": 0.0, "silence_ratio": 1.0}
+        
+        frames = audio[:count * frame].reshape(count, frame)
+        frame_db = 10.0 * np.log10(np.mean(frames ** 2, axis=1) + 1e-10)
+        # 상위 프레임은 음성, 하위 프레임은 배경 잡음으로 간주
+        speech_db, noise_db = np.percentile(frame_db, [90, 10])
+        level_db = 10.0 * np.log10(np.mean(audio ** 2) + 1e-10)
+        return {
+            "level_db": round(float(level_db), 2),
+            "snr_db": round(float(speech_db - noise_db), 2),
+            # _remove_silence와 같은 기준 (top_db=40)
+            "silence_ratio": round(float(np.mean(frame_db < frame_db.max() - 40.0)), 3),
+        }
+    
+    def _plan_preprocessing(self, audio: np.ndarray, sr: int) -> Dict[str, bool]:
+        """클립별로 실행할 전처리 단계 결정 (설정에서 꺼진 단계는 실행하지 않음)"""
+        config = self.preprocessing_config
+        plan = {stage: bool(config[stage]) for stage in ("remove_silence", "noise_reduction", "normalize_audio")}
+        if not config.get("adaptive") or not any(plan.values()):
+            return plan
+        
+        quality = self.estimate_signal_quality(audio, sr)
+        low, high = config["target_level_db"]
+        plan["remove_silence"] &= quality["silence_ratio"] > config["trim_above_silence_ratio"]
+        plan["noise_reduction"] &= quality["snr_db"] < config["denoise_below_snr_db"]
+        plan["normalize_audio"] &= not (low <= quality["level_db"] <= high)
+        self.logger.info(f"Signal quality {quality} → preprocessing {plan}")
+        return plan
+    
+    def _record_stage(self, stage: str, ran: bool, seconds: float = 0.0):
+        with self._stats_lock:
+            stats = self._preprocessing_stats["stages"][stage]
+            stats["run" if ran else "skipped"] += 1
+            stats["seconds"] += seconds
+            if stage == "remove_silence":
+                self._preprocessing_stats["clips"] += 1
+    
+    def record_preprocessing(self, timings: Dict[str, Optional[float]]):
+        """전처리 단계별 실행/생략 기록 (다른 프로세스에서 전처리한 결과도 같은 통계에 반영)"""
+        for stage, seconds in timings.items():
+            self._record_stage(stage, seconds is not None, seconds or 0.0)
+    
+    def get_preprocessing_stats(self) -> Dict[str, Any]:
+        """전처리 단계별 실행/생략 횟수와 평균 실행 시간"""
+        with self._stats_lock:
+            stages = {}
+            for stage, stats in self._preprocessing_stats["stages"].items():
+                stages[stage] = {
+                    "run": stats["run"],
+                    "skipped": stats["skipped"],
+                    "avg_seconds": round(stats["seconds"] / stats["run"], 4) if stats["run"] else None,
+                }
+            return {"clips": self._preprocessing_stats["clips"], "stages": stages}
+    
     def _remove_silence(self, audio: np.ndarray, sr: int) -> np.ndarray:
         """무음 구간 제거"""
         try:
@@ -153,10 +502,73 @@ class WhisperSTT:
             self.logger.warning(f"음성 정규화 실패: {e}")
             return audio
     
+    @contextmanager
+    def _decoding(self, token: Optional[CancellationToken] = None,
+                  eot_threshold: Optional[float] = None):
+        """
+        모델 사용 구간 (취소 가능)
+        
+        잠금을 기다리는 동안과 디코딩 중 토큰마다 취소 여부를 확인해
+        클라이언트가 떠난 요청의 디코딩을 즉시 중단
+        
+        Args:
+            eot_threshold: 지정시 문장 끝 토큰 확률이 이 이상이면 그 자리에서 디코딩 종료
+        """
+        if token is None:
+            with self._model_lock, self._resident(), self._eot_stop(eot_threshold):
+                yield
+            return
+        
+        while not self._model_lock.acquire(timeout=token.probe_interval):
+            token.check()
+        try:
+            token.check()
+            with self._resident(token), self._eot_stop(eot_threshold):
+                # 디코더는 생성 토큰마다 호출되므로 여기서 예외를 내면 transcribe가 중단됨
+                handle = self.model.decoder.register_forward_pre_hook(lambda module, args: token.check())
+                try:
+                    yield
+                finally:
+                    handle.remove()
+        finally:
+            self._model_lock.release()
+    
+    @contextmanager
+    def _eot_stop(self, threshold: Optional[float]):
+        """
+        디코더 출력에서 문장 끝(EOT) 확률이 threshold 이상이면 EOT를 최댓값으로 올려 종료
+        
+        greedy 디코딩은 EOT가 1위일 때만 멈추므로, 말이 끝난 뒤 "감사합니다" 같은
+        꼬리 환각을 이어 붙이기 전에 끊음 (첫 토큰은 Whisper의 SuppressBlank가 EOT를 막음)
+        """
+        if threshold is None:
+            yield
+            return
+        
+        model = self.model
+        eot = whisper.tokenizer.get_tokenizer(model.is_multilingual, num_languages=model.num_languages).eot
+        
+        def hook(module, args, logits):
+            last = logits[:, -1]
+            stop = last.float().softmax(dim=-1)[:, eot] >= threshold
+            if stop.any():
+                logits[stop, -1, eot] = last[stop].max(dim=-1).values + 1.0
+                with self._stats_lock:
+                    self._decoding_stats["eot_stops"] += int(stop.sum())
+            return logits
+        
+        handle = model.decoder.register_forward_hook(hook)
+        try:
+            yield
+        finally:
+            handle.remove()
+    
     def transcribe(self, audio_path: Union[str, Path], 
                    language: Optional[str] = None,
                    task: str = "transcribe",
-                   use_preprocessing: bool = True) -> str:
+                   use_preprocessing: bool = True,
+                   token: Optional[CancellationToken] = None,
+                   profile: Optional[str] = None) -> str:
         """
         음성 파일을 텍스트로 변환
         
@@ -165,30 +577,26 @@ class WhisperSTT:
             language: 언어 코드 (기본값: 한국어)
             task: 작업 유형 (transcribe/translate)
             use_preprocessing: 전처리 사용 여부
+            token: 요청 취소 토큰 (취소시 RequestCancelled 발생)
+            profile: 디코딩 프로필 ("command" / "general", 기본값: 음성 길이로 선택)
             
         Returns:
             str: 변환된 텍스트
         """
+        processed_audio_path = audio_path
         try:
             self._validate_audio_file(audio_path)
             
             # 전처리 적용
-            processed_audio_path = audio_path
             if use_preprocessing:
+                check(token)
                 processed_audio_path = self.preprocess_audio(audio_path)
             
             # 언어 설정
             language = language or self.default_language
             
             # Whisper 모델로 변환
-            result = self.model.transcribe(
-                processed_audio_path,
-                language=language,
-                task=task,
-                fp16=False if self.device == "cpu" else True,
-                condition_on_previous_text=True,
-                temperature=0.0
-            )
+            result = self._run_decoding(processed_audio_path, language, task, profile, token)
             
             text = result["text"].strip()
             
@@ -196,18 +604,20 @@ class WhisperSTT:
             if self.korean_optimization:
                 text = self._post_process_korean(text)
             
-            # 임시 파일 정리
-            if use_preprocessing and processed_audio_path != audio_path:
-                try:
-                    os.remove(processed_audio_path)
-                except:
-                    pass
-            
             return text
             
+        except RequestCancelled:
+            raise
         except Exception as e:
             self.logger.error(f"Transcription failed: {str(e)}")
             raise
+        finally:
+            # 임시 파일 정리 (취소/실패시에도)
+            if processed_audio_path != audio_path:
+                try:
+                    os.remove(processed_audio_path)
+                except:
+                    pass
     
     def _validate_audio_file(self, audio_path: Union[str, Path]):
         """음성 파일 유효성 검사"""
@@ -221,30 +631,213 @@ class WhisperSTT:
         if file_ext not in supported_formats:
             self.logger.warning(f"Unsupported audio format: {file_ext}")
     
+    def transcribe_long(self, audio_path: Union[str, Path],
+                        language: Optional[str] = None,
+                        task: str = "transcribe",
+                        chunk_seconds: float = 30.0,
+                        overlap_seconds: float = 1.5) -> Dict[str, Any]:
+        """
+        장시간 음성 병렬 변환 (회의 녹음 등)
+        
+        무음 지점에서 겹치는 청크로 분할 후 공유 프로세스 풀(long_form_workers개)에서 병렬 변환하고,
+        겹친 구간의 중복을 제거해 이어 붙임
+        
+        Args:
+            audio_path: 음성 파일 경로
+            language: 언어 코드 (기본값: 한국어)
+            task: 작업 유형 (transcribe/translate)
+            chunk_seconds: 목표 청크 길이 (초, Whisper 창 크기 30초 이하 권장)
+            overlap_seconds: 청크 간 겹침 길이 (초)
+            
+        Returns:
+            Dict[str, Any]: text, segments (start/end/text), chunks, duration
+        """
+        self._validate_audio_file(audio_path)
+        language = language or self.default_language
+        sr = self.preprocessing_config["sample_rate"]
+        fp16 = False if self.device == "cpu" else True
+        
+        audio, _ = librosa.load(audio_path, sr=sr)
+        duration = len(audio) / sr
+        spans = self._split_at_silence(audio, sr, chunk_seconds, overlap_seconds)
+        self.logger.info(f"Long-form transcription: {duration:.1f}s → {len(spans)} chunks")
+        
+        if self.device != "cpu" or len(spans) == 1:
+            # GPU는 프로세스를 늘려도 이득이 없으므로 로드된 모델로 순차 처리
+            with self._model_lock, self._resident():
+                chunk_segments = [
+                    _transcribe_chunk(audio[start:end], start / sr, language, task, fp16, model=self.model)
+                    for start, end in spans
+                ]
+        else:
+            chunk_segments = self._transcribe_chunks_parallel(audio, sr, spans, language, task)
+        
+        segments = self._merge_chunk_segments(chunk_segments, spans, sr)
+        text = " ".join(seg["text"] for seg in segments).strip()
+        if self.korean_optimization:
+            text = self._post_process_korean(text)
+        
+        return {
+            "text": text,
+            "segments": segments,
+            "chunks": len(spans),
+            "duration": round(duration, 2)
+        }
+    
+    def _split_at_silence(self, audio: np.ndarray, sr: int,
+                          chunk_seconds: float, overlap_seconds: float) -> List[Tuple[int, int]]:
+        """목표 길이 근처의 무음 지점에서 겹치는 청크 구간(샘플 인덱스) 생성"""
+        total = len(audio)
+        chunk = int(chunk_seconds * sr)
+        overlap = int(overlap_seconds * sr)
+        if total <= chunk:
+            return [(0, total)]
+        
+        # 무음 구간의 중앙을 분할 후보로 사용
+        intervals = librosa.effects.split(audio, top_db=40, frame_length=2048, hop_length=512)
+        candidates = [(intervals[i][1] + intervals[i + 1][0]) // 2 for i in range(len(intervals) - 1)]
+        
+        # 겹침을 더해도 청크가 chunk_seconds를 넘지 않도록 분할
+        max_body = max(sr, chunk - 2 * overlap)
+        min_body = max_body // 2
+        cuts = [0]
+        while total - cuts[-1] > max_body:
+            low, high = cuts[-1] + min_body, cuts[-1] + max_body
+            in_window = [c for c in candidates if low <= c <= high]
+            # 무음 지점이 없으면 최대 길이에서 자르고 겹침으로 보완
+            cuts.append(max(in_window) if in_window else high)
+        cuts.append(total)
+        
+        return [(max(0, cuts[i] - overlap), min(total, cuts[i + 1] + overlap))
+                for i in range(len(cuts) - 1)]
+    
+    def _transcribe_chunks_parallel(self, audio: np.ndarray, sr: int, spans: List[Tuple[int, int]],
+                                    language: str, task: str) -> List[List[Dict[str, Any]]]:
+        """청크들을 공유 프로세스 풀에서 병렬 변환 (입력 순서 유지)"""
+        with self._long_form_executor() as executor:
+            futures = [
+                executor.submit(_transcribe_chunk, audio[start:end], start / sr, language, task, False)
+                for start, end in spans
+            ]
+            return [future.result() for future in futures]
+    
+    def _worker_bytes(self) -> int:
+        """작업자 프로세스 하나의 예상 메모리 (fp32 모델 + 디코딩 버퍼/인터프리터 여유)"""
+        params = _WHISPER_PARAMS.get(self.model_name.split(".")[0].split("-")[0], _WHISPER_PARAMS["small"])
+        return int(params * 4 * 2)
+    
+    def _long_form_worker_count(self) -> int:
+        """장문 변환 작업자 수 (지정값, 없으면 코어 수와 가용 메모리의 절반 중 작은 쪽)"""
+        if self.long_form_workers:
+            return self.long_form_workers
+        cpu_count = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count()
+        workers = cpu_count or 1
+        available = available_memory()
+        if available is not None:
+            workers = min(workers, available // 2 // self._worker_bytes())
+        return max(1, workers)
+    
+    def _create_long_form_pool(self) -> ProcessPoolExecutor:
+        """작업자 프로세스를 모두 띄우고 모델 로드까지 마친 풀 생성"""
+        workers = self._long_form_worker_count()
+        cpu_count = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count()
+        # 작업자 간 코어 과다 할당 방지
+        threads_per_worker = max(1, (cpu_count or 1) // workers)
+        self.logger.info(f"Starting long-form transcription pool: {workers} workers")
+        # torch는 fork 이후 스레드 풀 상태가 깨질 수 있어 spawn 사용
+        pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"),
+                                   initializer=_init_long_form_worker,
+                                   initargs=(self.model_name, "cpu", threads_per_worker))
+        # 첫 요청이 모델 로드를 떠안지 않고, 메모리 관리자가 로드 후 사용량을 측정할 수 있도록
+        for future in [pool.submit(int) for _ in range(workers)]:
+            future.result()
+        return pool
+    
+    @contextmanager
+    def _long_form_executor(self):
+        """공유 장문 변환 풀 사용 구간 (메모리 관리자 사용시 쉬는 동안 풀을 내리고 예산에 반영)"""
+        if self.governor is None:
+            with self._long_form_lock:
+                if self._long_form_pool is None:
+                    self._long_form_pool = self._create_long_form_pool()
+            yield self._long_form_pool
+            return
+        
+        with self._long_form_lock:
+            if self._long_form_handle is None:
+                self._long_form_handle = self.governor.register(
+                    f"stt-long-form:{self.model_name}",
+                    loader=self._create_long_form_pool,
+                    unloader=lambda pool: pool.shutdown(wait=True),
+                    estimated_bytes=self._long_form_worker_count() * self._worker_bytes()
+                )
+        with self._long_form_handle.acquire() as pool:
+            yield pool
+    
+    def _merge_chunk_segments(self, chunk_segments: List[List[Dict[str, Any]]],
+                              spans: List[Tuple[int, int]], sr: int) -> List[Dict[str, Any]]:
+        """겹친 구간의 중간 지점을 경계로 세그먼트를 합치고 경계의 중복 단어 제거"""
+        merged = []
+        for i, segments in enumerate(chunk_segments):
+            # 앞 청크와의 겹침 중간 지점 이후 / 다음 청크와의 겹침 중간 지점 이전만 사용
+            low = (spans[i][0] + spans[i - 1][1]) / 2 / sr if i > 0 else float("-inf")
+            high = (spans[i + 1][0] + spans[i][1]) / 2 / sr if i + 1 < len(spans) else float("inf")
+            kept = [seg for seg in segments if low <= (seg["start"] + seg["end"]) / 2 < high]
+            
+            if merged and kept:
+                kept[0] = dict(kept[0], text=self._dedupe_overlap(merged[-1]["text"], kept[0]["text"]))
+                if not kept[0]["text"]:
+                    kept = kept[1:]
+            merged.extend(kept)
+        return merged
+    
+    def _dedupe_overlap(self, previous: str, current: str, max_words: int = 8) -> str:
+        """previous의 끝 단어들과 겹치는 current 앞부분 제거"""
+        prev_words = previous.split()
+        cur_words = current.split()
+        for n in range(min(max_words, len(prev_words), len(cur_words)), 0, -1):
+            tail = [w.strip('.,!?') for w in prev_words[-n:]]
+            head = [w.strip('.,!?') for w in cur_words[:n]]
+            if tail == head:
+                return " ".join(cur_words[n:])
+        return current
+    
+    def transcribe_array(self, audio: np.ndarray,
+                         language: Optional[str] = None,
+                         partial: bool = False,
+                         token: Optional[CancellationToken] = None) -> str:
+        """
+        메모리의 16kHz mono 음성을 텍스트로 변환 (임시 파일/전처리 없음)
+        
+        Args:
+            audio: float32 음성 배열
+            language: 언어 코드 (기본값: 한국어)
+            partial: 말하는 도중의 부분 결과 여부 (타임스탬프 디코딩과 후처리 생략)
+            token: 요청 취소 토큰
+            
+        Returns:
+            str: 변환된 텍스트
+        """
+        # 부분 결과는 길이와 관계없이 command 프로필 (빨리 끝나는 것이 정확도보다 중요)
+        result = self._run_decoding(audio, language or self.default_language, "transcribe",
+                                    "command" if partial else None, token)
+        
+        text = result["text"].strip()
+        if self.korean_optimization and not partial:
+            text = self._post_process_korean(text)
+        return text
+    
     def transcribe_streaming(self, audio_chunks: List[np.ndarray], 
                            sample_rate: int = 16000,
                            language: Optional[str] = None) -> str:
         """
-        실시간 스트리밍 음성 변환 (현재 미사용)
+        실시간 스트리밍 음성 변환 (수신한 청크를 합쳐 한 번에 변환)
         """
         try:
-            # 오디오 청크들을 하나로 합치기
             combined_audio = np.concatenate(audio_chunks)
-            
-            # 임시 파일로 저장
-            temp_path = tempfile.mktemp(suffix=".wav")
-            sf.write(temp_path, combined_audio, sample_rate)
-            
-            # 변환 실행
-            result = self.transcribe(temp_path, language=language)
-            
-            # 임시 파일 정리
-            try:
-                os.remove(temp_path)
-            except:
-                pass
-            
-            return result
+            if sample_rate != 16000:
+                combined_audio = librosa.resample(combined_audio, orig_sr=sample_rate, target_sr=16000)
+            return self.transcribe_array(combined_audio, language=language)
             
         except Exception as e:
             self.logger.error(f"Streaming transcription failed: {str(e)}")
@@ -297,19 +890,35 @@ class WhisperSTT:
         return {
             "model_name": self.model_name,
             "device": self.device,
+            # 메모리 관리자가 쉬는 모델을 내렸으면 False (다음 요청에서 다시 로드)
+            "resident": self._handle.loaded if self._handle is not None else self._model is not None,
             "korean_optimization": self.korean_optimization,
             "preprocessing_enabled": True,
+            "preprocessing_stats": self.get_preprocessing_stats(),
+            "decoding_stats": self.get_decoding_stats(),
             "supported_languages": ["ko", "en", "ja", "zh", "es", "fr", "de", "it", "pt", "ru", "ar", "hi"],
             "features": {
                 "real_time": True,
                 "streaming": True,
+                "long_form_parallel": True,
                 "noise_reduction": True,
                 "silence_removal": True,
                 "audio_normalization": True
             }
         }
     
-    def __del__(self):
-        """리소스 정리"""
-        if hasattr(self, 'model'):
-            del self.model
\ No newline at end of file
+    def close(self):
+        """모델/장문 변환 풀 해제 (메모리 관리자 사용시 등록도 취소)"""
+        with self._long_form_lock:
+            if self._long_form_handle is not None:
+                self._long_form_handle.unregister()
+                self._long_form_handle = None
+            elif self._long_form_pool is not None:
+                self._long_form_pool.shutdown(wait=True)
+                self._long_form_pool = None
+        if self._handle is not None:
+            self._handle.unregister()
+            self._handle = None
+        elif self._model is not None:
+            self._model = None
+            release_free_memory()
\ No newline at end of file
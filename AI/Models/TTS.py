@@ -1,24 +1,32 @@
 import logging
 import re
-import tempfile
-import os
-from typing import Union, Dict, Any
+import time
+from typing import Union, Dict, Any, Optional
 from gtts import gTTS
+from Models.Cancellation import CancellationToken, RequestCancelled, check
+from Models.ResponseBudget import ResponseBudget
 
 class TTS:
-    def __init__(self, model_name=None):
+    def __init__(self, model_name=None, budget: Optional[ResponseBudget] = None):
+        """
+        Args:
+            budget: 응답 예산 (LLM과 공유, 예산을 넘는 부분은 합성하지 않음)
+        """
         self.model_name = model_name or "google_tts"
+        self.budget = budget or ResponseBudget()
         self._setup_logging()
         self.logger.info("Google TTS initialized successfully")
     
     def _setup_logging(self):
-        logging.basicConfig(level=logging.INFO)
         self.logger = logging.getLogger(__name__)
     
-    def generate_from_llm_response(self, llm_response: str, output_path=None) -> Union[bytes, str]:
+    def generate_from_llm_response(self, llm_response: str, output_path=None,
+                                   token: Optional[CancellationToken] = None) -> Union[bytes, str]:
         try:
             processed_text = self._preprocess_korean_text(llm_response)
-            return self._generate_speech(processed_text, output_path)
+            return self._generate_speech(processed_text, output_path, token)
+        except RequestCancelled:
+            raise
         except Exception as e:
             self.logger.error(f"LLM response to speech failed: {e}")
             raise
@@ -32,29 +40,30 @@ class TTS:
         text = re.sub(r'\s+', ' ', text)
         text = text.strip()
         
-        # 긴 텍스트 자르기 (TTS 제한)
-        if len(text) > 500:
-            sentences = text.split('.')
-            text = '. '.join(sentences[:3]) + '.'
-        
-        return text.strip()
+        # 재생 시간 예산을 넘는 문장 자르기 (LLM이 예산 안에서 생성했으면 그대로)
+        return self.budget.truncate(text)
     
-    def _generate_speech(self, text: str, output_path=None) -> Union[bytes, str]:
+    def _generate_speech(self, text: str, output_path=None,
+                         token: Optional[CancellationToken] = None) -> Union[bytes, str]:
         try:
-            if not output_path:
-                with tempfile.NamedTemporaryFile(delete=False, suffix='.mp3') as tmp_file:
-                    output_path = tmp_file.name
-            
-            tts = gTTS(text=text, lang='ko', slow=False)
-            tts.save(output_path)
+            check(token)
+            remaining = token.remaining() if token else None
+            tts = gTTS(text=text, lang='ko', slow=False, timeout=remaining)
             
-            with open(output_path, 'rb') as f:
-                audio_data = f.read()
+            # 문장 조각별 HTTP 요청 사이마다 취소 여부 확인
+            parts = []
+            for part in tts.stream():
+                check(token)
+                parts.append(part)
+            audio_data = b''.join(parts)
             
-            if output_path.startswith('/tmp/'):
-                os.unlink(output_path)
+            if output_path:
+                with open(output_path, 'wb') as f:
+                    f.write(audio_data)
             
             return audio_data
+        except RequestCancelled:
+            raise
         except Exception as e:
             self.logger.error(f"Speech generation failed: {e}")
             raise
@@ -82,3 +91,69 @@ class TTS:
     
     def __del__(self):
         pass
+
+# Stub TTS (오프라인 테스트/부하 테스트용)
+class StubTTS:
+    # 무음 MPEG-2 Layer III 프레임 (16kHz mono, 32kbps, 144바이트 = 36ms)
+    _SILENT_FRAME = b'\xff\xf3\x48\xc4' + b'\x00' * 140
+    _FRAME_SECONDS = 0.036
+    
+    def __init__(self, model_name=None, latency: float = 0.0, chars_per_second: float = 7.0,
+                 budget: Optional[ResponseBudget] = None):
+        """
+        Args:
+            latency: 합성 지연 (초)
+            chars_per_second: 발화 속도 (응답 길이에 비례하는 무음 길이 계산용)
+            budget: 응답 예산 (예산을 넘는 부분은 합성하지 않음)
+        """
+        self.model_name = model_name or "stub_tts"
+        self.latency = latency
+        self.chars_per_second = chars_per_second
+        self.budget = budget
+    
+    def generate_from_llm_response(self, llm_response: str, output_path=None,
+                                   token: Optional[CancellationToken] = None) -> Union[bytes, str]:
+        if token is not None:
+            if token.wait(self.latency):
+                raise RequestCancelled(token.reason)
+        else:
+            time.sleep(self.latency)
+        text = self.budget.truncate(llm_response) if self.budget else llm_response
+        seconds = len(text or "") / self.chars_per_second
+        audio_data = self._SILENT_FRAME * max(1, int(seconds / self._FRAME_SECONDS))
+        if output_path:
+            with open(output_path, 'wb') as f:
+                f.write(audio_data)
+        return audio_data
+    
+    def get_model_info(self) -> Dict[str, Any]:
+        return {
+            "model_name": self.model_name,
+            "model_type": "stub",
+            "supported_languages": ["ko"],
+            "features": {
+                "offline": True,
+                "latency": self.latency
+            }
+        }
+    
+    def change_model(self, model_name: str):
+        self.model_name = model_name
+
+# TTS Factory
+class TTSFactory:
+    @staticmethod
+    def create_tts(tts_type: str = "google", **kwargs):
+        """
+        TTS 모델 생성 팩토리
+        
+        Args:
+            tts_type: "google" or "stub"
+            **kwargs: 모델별 추가 파라미터
+        """
+        if tts_type.lower() == "google":
+            return TTS(**kwargs)
+        elif tts_type.lower() == "stub":
+            return StubTTS(**kwargs)
+        else:
+            raise ValueError(f"Unsupported TTS type: {tts_type}. Use 'google' or 'stub'")
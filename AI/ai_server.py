@@ -6,22 +6,63 @@ AI Server for Flutter App Integration
 
 import os
 import json
+import argparse
+import uuid
+import base64
+import hmac
+import hashlib
+import select
+import socket
 import logging
 import tempfile
+import threading
+from contextlib import contextmanager
 from datetime import datetime
-from typing import Dict, Any, Optional
-from flask import Flask, request, jsonify
+from urllib.parse import quote
+from typing import Dict, Any, Optional, Iterable
+import numpy as np
+import soundfile as sf
+from flask import Flask, request, jsonify, g, Response, stream_with_context
 from flask_cors import CORS
 
 # AI 모듈 import
-from Processor.voice_pipeline import VoicePipeline
+from voice_pipeline import VoicePipeline
+from job_queue import JobQueue, JobDeferred, InvalidCallbackURL
+from task_store import TaskStore, VersionConflict, CursorExpired, DEFAULT_TIMEZONE
+from reminders import ReminderEngine
+from scheduler import FairScheduler, SchedulerRejected
+from stage_graph import parse_stage_config
+from profiling import RequestProfiler
+from autotune import load_profile, apply_profile
+from traffic_capture import TrafficRecorder
+from audio_codec import (CODECS, codec_for_content_type, content_type_rate, upload_suffix,
+                         negotiate_response_codec, decode_stream, encode_stream)
+from Models.Cancellation import CancellationToken, RequestCancelled
+from Models.MemoryGovernor import MemoryGovernor, MemoryBudgetExceeded
+from Models.ResponseBudget import ResponseBudget
+from Models.LogConfig import configure_logging, request_scope, get_logging_stats
+
+# 클라이언트가 제한 시간을 지정하지 않은 동기 요청의 기본 제한 시간 (초)
+DEFAULT_REQUEST_TIMEOUT = float(os.getenv('REQUEST_TIMEOUT', '60'))
+
+# 응답 텍스트 헤더(X-Transcript/X-LLM-Response) 최대 길이 (인코딩 후 바이트, 프록시 8KB 제한 대비)
+MAX_TEXT_HEADER_BYTES = int(os.getenv('MAX_TEXT_HEADER_BYTES', '2048'))
 
 class AIServer:
     def __init__(self, device: str = "auto", llm_type: str = "gemini"):
         self.device = self._get_device(device)
         self.llm_type = llm_type
         self._setup_logging()
+        self._initialize_memory_governor()
         self._initialize_voice_pipeline()
+        self._initialize_scheduler()
+        # 요청 단위 프로파일러 (X-Profile + X-Profile-Token(PROFILE_TOKEN) 헤더 또는 PROFILE_SAMPLE_RATE로 활성화)
+        self.profiler = RequestProfiler()
+        # 재현 테스트용 요청 샘플링 (TRACE_SAMPLE_RATE로 활성화)
+        self.recorder = TrafficRecorder()
+        # 취소 사유별 중단된 요청 수
+        self.cancellations: Dict[str, int] = {}
+        self._cancellations_lock = threading.Lock()
         self.logger.info(f"AI Server initialized successfully on {self.device}")
     
     def _get_device(self, device: str) -> str:
@@ -35,13 +76,27 @@ class AIServer:
         return device
     
     def _setup_logging(self):
-        """로깅 설정"""
-        logging.basicConfig(
-            level=logging.INFO,
-            format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-        )
+        """로깅 설정 (출력 형식/대상은 main의 configure_logging에서 설정)"""
         self.logger = logging.getLogger(__name__)
     
+    def _initialize_memory_governor(self):
+        """
+        메모리 관리자 초기화
+        
+        MEMORY_BUDGET_MB가 없으면 사용량 보고만 하고, MODEL_IDLE_TIMEOUT이 0이면 모델을 내리지 않음
+        """
+        budget_mb = os.getenv('MEMORY_BUDGET_MB')
+        self.memory = MemoryGovernor(
+            budget_mb=float(budget_mb) if budget_mb else None,
+            high_watermark=float(os.getenv('MEMORY_HIGH_WATERMARK', '0.9')),
+            low_watermark=float(os.getenv('MEMORY_LOW_WATERMARK', '0.75')),
+            idle_timeout=float(os.getenv('MODEL_IDLE_TIMEOUT', '0')),
+            admission_timeout=float(os.getenv('MEMORY_ADMISSION_TIMEOUT', '10'))
+        )
+        # 요청 하나의 예상 메모리 = 기본 + 음성 1초당 (전처리/멜 스펙트로그램/디코딩 버퍼)
+        self.work_base_bytes = int(float(os.getenv('MEMORY_WORK_BASE_MB', '100')) * 1024 * 1024)
+        self.work_bytes_per_second = int(float(os.getenv('MEMORY_WORK_MB_PER_SECOND', '2')) * 1024 * 1024)
+    
     def _initialize_voice_pipeline(self):
         """음성 처리 파이프라인 초기화"""
         self.logger.info("Initializing Voice Pipeline...")
@@ -49,25 +104,104 @@ class AIServer:
         # 환경 변수에서 LLM 타입 가져오기
         llm_type = os.getenv('LLM_MODEL', self.llm_type)
         
+        # 부하 테스트 등 오프라인 실행시 LLM_MODEL=stub, TTS_MODEL=stub
+        tts_type = os.getenv('TTS_MODEL', 'google')
+        
         self.voice_pipeline = VoicePipeline(
-            stt_model="small",
-            llm_type=llm_type,  # "gpt" or "gemini"
-            device=self.device
+            stt_model=os.getenv('STT_MODEL', 'small'),
+            llm_type=llm_type,  # "gpt", "gemini", "local", "router" or "stub"
+            device=self.device,
+            tts_type=tts_type,  # "google" or "stub"
+            speculative_llm=os.getenv('SPECULATIVE_LLM', '0') == '1',
+            speculation_stable_seconds=float(os.getenv('SPECULATION_STABLE_SECONDS', '0.6')),
+            governor=self.memory,
+            # 응답 음성 재생 시간 예산 (LLM 최대 토큰/생성 중단 시점과 TTS 합성 범위에 공통 적용)
+            response_budget=ResponseBudget(
+                max_speech_seconds=float(os.getenv('RESPONSE_MAX_SECONDS', '20')),
+                max_sentences=int(os.getenv('RESPONSE_MAX_SENTENCES', '3')),
+                chars_per_second=float(os.getenv('TTS_CHARS_PER_SECOND', '7'))
+            ),
+            # 단계별 실행기/작업자 수/큐 크기 (예: "decode=process:4,llm=thread:16:32")
+            # 요청 동시 실행 수는 SCHED_MAX_CONCURRENT, 단계별 CPU/네트워크 동시 처리 수는 여기서 결정
+            stage_config=parse_stage_config(os.getenv('PIPELINE_STAGES'))
+        )
+        
+        self.logger.info(f"Voice Pipeline initialized with LLM: {llm_type}, TTS: {tts_type}")
+    
+    def _initialize_scheduler(self):
+        """요청 스케줄러 초기화 (짧은 명령 우선 + 클라이언트별 공정 분배)"""
+        self.scheduler = FairScheduler(
+            max_concurrent=int(os.getenv('SCHED_MAX_CONCURRENT', '1')),
+            fast_lane_slots=int(os.getenv('SCHED_FAST_LANE_SLOTS', '1')),
+            fast_lane_seconds=float(os.getenv('SCHED_FAST_LANE_SECONDS', '5.0')),
+            client_max_running=int(os.getenv('SCHED_CLIENT_MAX_RUNNING', '1')),
+            client_max_queued=int(os.getenv('SCHED_CLIENT_MAX_QUEUED', '8'))
+        )
+        # 스케줄러 슬롯이 파이프라인 전체를 감싸므로 동시 실행 수(일반 + 빠른 차선)가 곧 로컬 LLM 연속 배치의 최대 크기
+        max_batch = self.scheduler.config["max_concurrent"] + self.scheduler.config["fast_lane_slots"]
+        if self.voice_pipeline.llm_type == "local" and self.scheduler.config["max_concurrent"] < 2:
+            self.logger.warning(f"Local LLM batches are capped at {max_batch} requests by the scheduler; "
+                                f"raise SCHED_MAX_CONCURRENT to benefit from continuous batching")
+    
+    def process_voice_command(self, audio_file_path: str,
+                              session_id: Optional[str] = None,
+                              client_id: str = "anonymous",
+                              profile: bool = False,
+                              token: Optional[CancellationToken] = None) -> Dict[str, Any]:
+        """음성 명령 처리 파이프라인 (token이 취소되면 대기/처리 중 어느 단계에서든 중단)"""
+        self.logger.info(f"Processing voice command from: {audio_file_path}")
+        return self._schedule(
+            client_id, self.scheduler.estimate_cost(audio_file_path),
+            lambda: self._run_pipeline(audio_file_path, session_id, profile, token),
+            token
         )
+    
+    def process_voice_live(self, chunks: Iterable[np.ndarray],
+                           session_id: Optional[str] = None,
+                           client_id: str = "anonymous",
+                           profile: bool = False,
+                           token: Optional[CancellationToken] = None) -> Dict[str, Any]:
+        """
+        사용자가 말하는 동안 도착하는 16kHz PCM 청크 처리 (스트리밍 본문 업로드)
+        
+        수신 중 부분 STT/추측 LLM은 스케줄러의 남는 슬롯에서만 실행하고 (대기 중인 요청에 양보),
+        음성이 끝나 길이를 알게 된 뒤 최종 처리 구간은 일반 요청처럼 슬롯을 배정받음
+        """
+        return self._guarded(lambda: self._run_live_pipeline(chunks, session_id, client_id, profile, token))
+    
+    def _schedule(self, client_id: str, cost: float, fn, token: Optional[CancellationToken]) -> Dict[str, Any]:
+        """스케줄러 슬롯과 메모리를 배정받은 뒤 Voice Pipeline을 통한 통합 처리"""
+        def run():
+            with self._admission(client_id, cost, token):
+                return fn()
+        return self._guarded(run)
+    
+    @contextmanager
+    def _admission(self, client_id: str, cost: float, token: Optional[CancellationToken]):
+        """
+        실행 구간 배정 (스케줄러 슬롯 → 메모리 예산)
         
-        self.logger.info(f"Voice Pipeline initialized with LLM: {llm_type}")
+        슬롯을 받은 요청만 메모리를 예약하므로 대기열의 요청은 예산을 차지하지 않음
+        """
+        with self.scheduler.slot(client_id, cost, token):
+            with self.memory.admit(self.work_base_bytes + int(cost * self.work_bytes_per_second), token):
+                yield
     
-    def process_voice_command(self, audio_file_path: str) -> Dict[str, Any]:
-        """음성 명령 처리 파이프라인"""
+    def _guarded(self, fn) -> Dict[str, Any]:
+        """취소/거부는 호출자에게 전달하고 나머지 오류는 실패 결과로 변환"""
         try:
-            self.logger.info(f"Processing voice command from: {audio_file_path}")
-            
-            # Voice Pipeline을 통한 통합 처리
-            result = self.voice_pipeline.process_voice_command(audio_file_path)
+            result = fn()
             
             self.logger.info(f"Pipeline processing completed: {result.get('success', False)}")
             return result
             
+        except RequestCancelled as e:
+            self.logger.info(f"Voice command abandoned: {e}")
+            with self._cancellations_lock:
+                self.cancellations[str(e)] = self.cancellations.get(str(e), 0) + 1
+            raise
+        except (SchedulerRejected, MemoryBudgetExceeded):
+            raise
         except Exception as e:
             self.logger.error(f"Error processing voice command: {e}")
             return {
@@ -75,6 +209,77 @@ class AIServer:
                 "error": str(e),
                 "timestamp": datetime.now().isoformat()
             }
+    
+    def _run_pipeline(self, audio_file_path: str, session_id: Optional[str],
+                      profile: bool, token: Optional[CancellationToken] = None) -> Dict[str, Any]:
+        """파이프라인 실행 (프로파일링 대상이면 결과에 산출물 경로 포함)"""
+        with self.profiler.session(force=profile) as session:
+            result = self.voice_pipeline.process_voice_input(audio_file_path, session_id=session_id,
+                                                             token=token)
+        if session is not None:
+            # 서버 파일 경로 대신 결과 디렉토리 이름만 (PROFILE_DIR 아래에서 찾을 수 있음)
+            result["profile_id"] = os.path.basename(session.output_dir)
+        self.recorder.maybe_record(audio_file_path, result, self._trace_config())
+        return result
+    
+    def _run_live_pipeline(self, chunks: Iterable[np.ndarray], session_id: Optional[str], client_id: str,
+                           profile: bool, token: Optional[CancellationToken] = None) -> Dict[str, Any]:
+        """스트리밍 업로드 파이프라인 실행 (파일 요청과 같이 프로파일링/trace 기록 대상)"""
+        # trace는 입력 음성 파일이 필요하므로 기록 대상일 때만 받은 청크를 모아 둠
+        captured = [] if self.recorder.should_record() else None
+        if captured is not None:
+            chunks = _capture_chunks(chunks, captured)
+        with self.profiler.session(force=profile) as session:
+            result = self.voice_pipeline.process_voice_stream(
+                chunks, session_id=session_id, token=token,
+                admit=lambda duration: self._admission(client_id, duration, token),
+                background=lambda duration: self.scheduler.background_slot(client_id, duration)
+            )
+        if session is not None:
+            result["profile_id"] = os.path.basename(session.output_dir)
+        if captured:
+            with tempfile.NamedTemporaryFile(delete=False, suffix=".wav") as tmp_file:
+                audio_path = tmp_file.name
+            try:
+                sf.write(audio_path, np.concatenate(captured), 16000)
+                self.recorder.record(audio_path, result, self._trace_config())
+            finally:
+                os.remove(audio_path)
+        return result
+    
+    def _trace_config(self) -> Dict[str, Any]:
+        """trace 재현에 필요한 파이프라인 설정"""
+        return {
+            "stt_model": self.voice_pipeline.stt.model_name,
+            "llm_type": self.voice_pipeline.llm_type,
+            "tts_type": self.voice_pipeline.tts_type,
+            "device": self.device,
+            "preprocessing": self.voice_pipeline.stt.get_preprocessing_info(),
+        }
+    
+    def process_job(self, audio_file_path: str, params: Dict[str, Any]) -> Dict[str, Any]:
+        """작업 큐 핸들러 (결과는 JSON으로 저장됨, 할당량/메모리 부족은 나중에 재시도)"""
+        try:
+            result = self.process_voice_command(
+                audio_file_path,
+                session_id=params.get("session_id"),
+                client_id=params.get("client_id") or "anonymous"
+            )
+        except (SchedulerRejected, MemoryBudgetExceeded) as e:
+            # 동기 요청이면 429/503으로 재시도를 맡기지만, 접수된 작업은 큐에서 다시 실행
+            raise JobDeferred(str(e))
+        if not result.get("success"):
+            # _guarded가 실패를 결과 dict로 바꾸므로, 작업 상태가 failed가 되도록 다시 예외로
+            raise RuntimeError(result.get("error") or "Voice processing failed")
+        return to_json_result(result)
+
+def to_json_result(result: Dict[str, Any]) -> Dict[str, Any]:
+    """음성 바이트를 base64로 인코딩해 JSON 응답 가능하게 변환"""
+    result = dict(result)
+    if isinstance(result.get("audio_output"), bytes):
+        result["audio_output"] = base64.b64encode(result["audio_output"]).decode("ascii")
+        result["audio_encoding"] = "base64"
+    return result
 
 # Flask 앱 초기화
 app = Flask(__name__)
@@ -83,6 +288,39 @@ CORS(app)  # Flutter 앱에서 접근 허용
 # AI 서버 인스턴스
 ai_server = None
 
+# 비동기 작업 큐
+job_queue = None
+
+# 사용자 일정 저장소
+task_store = None
+
+# 일정 알림 엔진
+reminder_engine = None
+
+# 롱폴링 최대 대기 시간 (초)
+MAX_JOB_WAIT_SECONDS = 60
+
+# /users/<user_id>/... API 토큰 서명 키 (없으면 사용자 API를 모두 거부)
+USER_TOKEN_SECRET = os.getenv('USER_TOKEN_SECRET')
+
+@app.before_request
+def _bind_request_id():
+    """요청 처리 중 남기는 로그를 요청 ID로 묶음 (X-Request-ID 헤더가 있으면 그대로 사용)"""
+    g.request_id = request.headers.get('X-Request-ID') or uuid.uuid4().hex[:16]
+    g.log_scope = request_scope(g.request_id)
+    g.log_scope.__enter__()
+
+@app.after_request
+def _add_request_id_header(response):
+    response.headers['X-Request-ID'] = g.request_id
+    return response
+
+@app.teardown_request
+def _unbind_request_id(exc):
+    scope = g.pop('log_scope', None)
+    if scope is not None:
+        scope.__exit__(None, None, None)
+
 @app.route('/health', methods=['GET'])
 def health_check():
     """서버 상태 확인"""
@@ -91,34 +329,340 @@ def health_check():
         "device": ai_server.device if ai_server else "not_initialized",
         "llm_type": ai_server.llm_type if ai_server else "not_initialized",
         "pipeline_info": ai_server.voice_pipeline.get_pipeline_info() if ai_server else None,
+        "jobs": job_queue.get_stats() if job_queue else None,
+        "tasks": task_store.get_stats() if task_store else None,
+        "reminders": reminder_engine.get_stats() if reminder_engine else None,
+        "scheduler": ai_server.scheduler.get_stats() if ai_server else None,
+        "memory": ai_server.memory.get_stats() if ai_server else None,
+        "cancellations": dict(ai_server.cancellations) if ai_server else None,
+        "logging": get_logging_stats(),
         "timestamp": datetime.now().isoformat()
     })
 
 @app.route('/process_voice', methods=['POST'])
 def process_voice():
-    """음성 명령 처리 API"""
+    """
+    음성 명령 처리 API
+    
+    입력: multipart "audio" 파일 또는 음성 본문 (Content-Type: audio/pcm; rate=16000, audio/ogg,
+          audio/flac 등, chunked 전송 가능 - 말하는 도중 보내면 받는 대로 처리 시작)
+    출력: 기본은 JSON (MP3 base64), Accept에 음성 타입(예: audio/ogg; codecs=opus)이 있으면
+          해당 코덱으로 인코딩하며 스트리밍 (텍스트 결과는 X-Transcript/X-LLM-Response 헤더)
+    """
+    try:
+        token = _create_request_token()
+        options = {"session_id": _get_session_id(), "client_id": _get_client_id(), "token": token}
+        
+        if request.mimetype.startswith('audio/'):
+            # 사용자가 말하는 동안 받는 대로 디코딩해 파이프라인에 전달 (chunked 전송)
+            content_type = request.headers.get('Content-Type')
+            # 디코딩 스레드에서는 request 프록시를 쓸 수 없으므로 스트림을 요청 스레드에서 꺼내 전달
+            chunks = decode_stream(_iter_request_body(request.stream), codec_for_content_type(content_type),
+                                   sample_rate=content_type_rate(content_type))
+            result = ai_server.process_voice_live(chunks, profile=_profile_requested(), **options)
+        else:
+            if 'audio' not in request.files:
+                return jsonify({"error": "No audio file provided"}), 400
+            
+            audio_file = request.files['audio']
+            
+            # 임시 파일로 저장 (형식 판별을 위해 원래 코덱의 확장자 유지)
+            suffix = upload_suffix(audio_file.mimetype, audio_file.filename)
+            with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as tmp_file:
+                audio_file.save(tmp_file.name)
+                audio_path = tmp_file.name
+            
+            # AI 처리
+            try:
+                result = ai_server.process_voice_command(
+                    audio_path,
+                    profile=_profile_requested(),
+                    **options
+                )
+            finally:
+                # 임시 파일 삭제
+                os.unlink(audio_path)
+        
+        codec = negotiate_response_codec(request.headers.get('Accept'))
+        if codec and result.get("success") and isinstance(result.get("audio_output"), bytes):
+            return _audio_response(result, codec)
+        return jsonify(to_json_result(result))
+        
+    except RequestCancelled as e:
+        # 연결이 끊긴 클라이언트는 응답을 받지 못하지만 로그/프록시용 상태 코드 구분
+        return jsonify({"error": f"Request cancelled: {e}"}), 504 if str(e) == "deadline_exceeded" else 499
+    except SchedulerRejected as e:
+        return jsonify({"error": str(e)}), 429
+    except MemoryBudgetExceeded as e:
+        # 다른 요청이 끝나거나 유휴 모델이 내려가면 수용 가능
+        return jsonify({"error": str(e)}), 503, {"Retry-After": "5"}
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+def _capture_chunks(chunks: Iterable[np.ndarray], captured: list):
+    """청크를 그대로 넘기면서 captured에 복사 (trace 기록용)"""
+    for chunk in chunks:
+        captured.append(chunk)
+        yield chunk
+
+def _iter_request_body(stream, block_size: int = 8192):
+    """요청 본문을 도착하는 대로 읽기 (chunked 전송 포함, 요청 context 밖의 스레드에서도 사용 가능)"""
+    while True:
+        data = stream.read(block_size)
+        if not data:
+            return
+        yield data
+
+def _audio_response(result: Dict[str, Any], codec: str) -> Response:
+    """음성 본문 응답 (TTS MP3를 요청 코덱으로 인코딩하며 전송)"""
+    audio = result["audio_output"]
+    body = [audio] if codec == "mp3" else stream_with_context(encode_stream([audio], codec, input_codec="mp3"))
+    headers = {
+        # HTTP 헤더는 latin-1만 허용되므로 UTF-8 퍼센트 인코딩
+        "X-Transcript": _header_text(result.get("transcribed_text")),
+        "X-LLM-Response": _header_text(result.get("llm_response")),
+        "X-Total-Time": str(result.get("total_time")),
+        "Vary": "Accept",
+    }
+    return Response(body, mimetype=CODECS[codec]["mime"], headers=headers)
+
+def _header_text(text: Optional[str], limit: int = MAX_TEXT_HEADER_BYTES) -> str:
+    """
+    텍스트를 헤더 값으로 (HTTP 헤더는 latin-1만 허용되므로 UTF-8 퍼센트 인코딩)
+    
+    프록시 헤더 크기 제한(보통 8KB)을 넘지 않도록 인코딩 후 limit 바이트 안에 들도록 뒤를 자르고 "…" 표시
+    """
+    encoded = quote(text or "")
+    if len(encoded) <= limit:
+        return encoded
+    budget = limit - len(quote("…"))
+    parts = []
+    for char in text:
+        piece = quote(char)
+        budget -= len(piece)
+        if budget < 0:
+            break
+        parts.append(piece)
+    return "".join(parts) + quote("…")
+
+def _profile_requested() -> bool:
+    """관리자 토큰과 함께 X-Profile: 1을 보낸 요청만 강제 프로파일링"""
+    return request.headers.get('X-Profile') == '1' and \
+        ai_server.profiler.authorize(request.headers.get('X-Profile-Token'))
+
+def _get_session_id() -> Optional[str]:
+    """요청의 대화 세션 ID (헤더 또는 폼 필드)"""
+    return request.headers.get('X-Session-ID') or request.form.get('session_id')
+
+def _get_client_id() -> str:
+    """스케줄링 단위가 되는 클라이언트 ID (헤더가 없으면 접속 IP)"""
+    return request.headers.get('X-Client-ID') or request.remote_addr or "anonymous"
+
+def _create_request_token() -> CancellationToken:
+    """
+    동기 요청의 취소 토큰
+    
+    제한 시간은 X-Deadline-Ms 헤더(남은 밀리초) 또는 REQUEST_TIMEOUT,
+    클라이언트 소켓이 닫히면 연결 끊김으로 취소
+    """
+    deadline_ms = request.headers.get('X-Deadline-Ms', type=float)
+    token = CancellationToken(timeout=deadline_ms / 1000.0 if deadline_ms else DEFAULT_REQUEST_TIMEOUT)
+    
+    # werkzeug 개발 서버는 연결 소켓을 environ에 노출 (다른 WSGI 서버에서는 제한 시간만 적용)
+    sock = request.environ.get('werkzeug.socket') or request.environ.get('gunicorn.socket')
+    if sock is not None:
+        token.add_probe(lambda: _client_disconnected(sock))
+    return token
+
+def _client_disconnected(sock) -> bool:
+    """요청 본문을 모두 읽은 뒤 소켓이 읽기 가능한데 데이터가 없으면 상대가 연결을 닫은 것"""
+    try:
+        readable, _, _ = select.select([sock], [], [], 0)
+        if not readable:
+            return False
+        return sock.recv(1, socket.MSG_PEEK) == b''
+    except (BlockingIOError, InterruptedError, ValueError):
+        # ValueError: TLS 소켓은 MSG_PEEK 미지원
+        return False
+    except OSError:
+        return True
+
+@app.route('/jobs', methods=['POST'])
+def submit_job():
+    """비동기 음성 처리 작업 제출 API (즉시 작업 ID 반환)"""
     try:
         if 'audio' not in request.files:
             return jsonify({"error": "No audio file provided"}), 400
         
         audio_file = request.files['audio']
+        callback_url = request.form.get('callback_url')
+        if callback_url:
+            # 서버가 임의의 내부 주소로 요청을 보내지 않도록 업로드 저장 전에 거부
+            job_queue.validate_callback_url(callback_url)
         
-        # 임시 파일로 저장
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.wav') as tmp_file:
+        suffix = upload_suffix(audio_file.mimetype, audio_file.filename)
+        with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as tmp_file:
             audio_file.save(tmp_file.name)
             audio_path = tmp_file.name
         
-        # AI 처리
-        result = ai_server.process_voice_command(audio_path)
-        
-        # 임시 파일 삭제
-        os.unlink(audio_path)
+        job_id = job_queue.submit(
+            audio_path,
+            params={"session_id": _get_session_id(), "client_id": _get_client_id()},
+            callback_url=callback_url
+        )
         
-        return jsonify(result)
+        return jsonify({
+            "job_id": job_id,
+            "status": "queued",
+            "status_url": f"/jobs/{job_id}"
+        }), 202
         
+    except InvalidCallbackURL as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+@app.route('/jobs/<job_id>', methods=['GET'])
+def get_job(job_id: str):
+    """작업 상태 조회 API (?wait=초 지정시 완료까지 롱폴링)"""
+    wait_seconds = min(request.args.get('wait', default=0, type=float), MAX_JOB_WAIT_SECONDS)
+    
+    if wait_seconds > 0:
+        job = job_queue.wait(job_id, wait_seconds)
+    else:
+        job = job_queue.get(job_id)
+    
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(job)
+
+@app.route('/jobs/<job_id>', methods=['DELETE'])
+def cancel_job(job_id: str):
+    """대기 중인 작업 취소 API"""
+    if job_queue.cancel(job_id):
+        return jsonify({"job_id": job_id, "status": "cancelled"})
+    if job_queue.get(job_id) is None:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify({"error": "Job is already running or finished"}), 409
+
+@app.route('/users/<user_id>/tasks', methods=['GET'])
+def list_tasks(user_id: str):
+    """
+    일정 조회 API (날짜순)
+    
+    ?start=&end= (ISO 8601, [start, end)) 또는 ?date= (하루), ?limit=&after= (페이지, 응답의 next를 after로)
+    응답의 cursor는 이후 /tasks/changes 증분 동기화의 시작점
+    """
+    if not _authorized_user(user_id):
+        return jsonify({"error": "Forbidden"}), 403
+    try:
+        date = request.args.get('date')
+        if date:
+            return jsonify(task_store.list_for_date(
+                user_id, date,
+                limit=request.args.get('limit', type=int),
+                after=request.args.get('after')
+            ))
+        return jsonify(task_store.list_range(
+            user_id,
+            start=request.args.get('start'),
+            end=request.args.get('end'),
+            limit=request.args.get('limit', type=int),
+            after=request.args.get('after')
+        ))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+@app.route('/users/<user_id>/tasks/changes', methods=['GET'])
+def task_changes(user_id: str):
+    """증분 동기화 API (?cursor=마지막으로 받은 cursor, has_more가 true면 이어서 요청)"""
+    if not _authorized_user(user_id):
+        return jsonify({"error": "Forbidden"}), 403
+    try:
+        return jsonify(task_store.changes_since(
+            user_id,
+            cursor=request.args.get('cursor', default=0, type=int),
+            limit=request.args.get('limit', type=int)
+        ))
+    except CursorExpired as e:
+        # 클라이언트는 cursor 없이 전체 목록을 다시 받아야 함
+        return jsonify({"error": str(e), "resync": True}), 410
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+@app.route('/users/<user_id>/tasks/<task_id>', methods=['GET'])
+def get_task(user_id: str, task_id: str):
+    if not _authorized_user(user_id):
+        return jsonify({"error": "Forbidden"}), 403
+    task = task_store.get(user_id, task_id)
+    if task is None:
+        return jsonify({"error": "Task not found"}), 404
+    return jsonify(task)
+
+@app.route('/users/<user_id>/tasks/<task_id>', methods=['PUT'])
+def put_task(user_id: str, task_id: str):
+    """일정 추가/수정 API (If-Match: 버전 지정시 다른 기기의 변경을 덮어쓰지 않음, 0이면 새 일정만)"""
+    if not _authorized_user(user_id):
+        return jsonify({"error": "Forbidden"}), 403
+    try:
+        task = dict(request.get_json(force=True) or {}, id=task_id)
+        return jsonify(task_store.upsert(user_id, task, expected_version=_expected_version()))
+    except VersionConflict as e:
+        return jsonify({"error": str(e), "task": task_store.get(user_id, task_id)}), 409
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+@app.route('/users/<user_id>/tasks/<task_id>', methods=['DELETE'])
+def delete_task(user_id: str, task_id: str):
+    """일정 삭제 API"""
+    if not _authorized_user(user_id):
+        return jsonify({"error": "Forbidden"}), 403
+    try:
+        if task_store.delete(user_id, task_id, expected_version=_expected_version()):
+            return jsonify({"id": task_id, "deleted": True})
+        return jsonify({"error": "Task not found"}), 404
+    except VersionConflict as e:
+        return jsonify({"error": str(e), "task": task_store.get(user_id, task_id)}), 409
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+def issue_user_token(user_id: str) -> str:
+    """사용자 API 토큰 발급 (로그인을 처리하는 서비스가 같은 USER_TOKEN_SECRET으로 만들어 앱에 전달)"""
+    return hmac.new(USER_TOKEN_SECRET.encode("utf-8"), user_id.encode("utf-8"), hashlib.sha256).hexdigest()
+
+def _authorized_user(user_id: str) -> bool:
+    """X-User-Token 헤더가 user_id에 발급된 토큰인지 (다른 사용자의 일정/알림 접근 차단)"""
+    token = request.headers.get('X-User-Token')
+    if not USER_TOKEN_SECRET or not token:
+        return False
+    return hmac.compare_digest(token.encode("utf-8"), issue_user_token(user_id).encode("utf-8"))
+
+def _expected_version() -> Optional[int]:
+    """If-Match 헤더의 일정 버전 (따옴표 허용)"""
+    value = request.headers.get('If-Match')
+    if value is None:
+        return None
+    try:
+        return int(value.strip().strip('"'))
+    except ValueError:
+        raise ValueError(f"Invalid If-Match version: {value}")
+
+@app.route('/users/<user_id>/reminders', methods=['GET'])
+def poll_reminders(user_id: str):
+    """발송된 알림 조회 API (?wait=초 지정시 새 알림이 발송될 때까지 롱폴링, 받은 뒤 ack)"""
+    if not _authorized_user(user_id):
+        return jsonify({"error": "Forbidden"}), 403
+    wait_seconds = min(request.args.get('wait', default=0, type=float), MAX_JOB_WAIT_SECONDS)
+    return jsonify({"reminders": reminder_engine.poll(user_id, wait=wait_seconds)})
+
+@app.route('/users/<user_id>/reminders/ack', methods=['POST'])
+def ack_reminders(user_id: str):
+    """알림 확인 API (body: {"task_ids": [...]})"""
+    if not _authorized_user(user_id):
+        return jsonify({"error": "Forbidden"}), 403
+    task_ids = (request.get_json(force=True, silent=True) or {}).get("task_ids") or []
+    return jsonify({"acked": reminder_engine.ack(user_id, [str(t) for t in task_ids])})
+
 @app.route('/test', methods=['GET'])
 def test_endpoint():
     """테스트용 엔드포인트"""
@@ -128,21 +672,80 @@ def test_endpoint():
         "timestamp": datetime.now().isoformat()
     })
 
-def main():
+def main(argv=None):
     """메인 함수"""
-    global ai_server
+    global ai_server, job_queue, task_store, reminder_engine
+    parser = argparse.ArgumentParser(description="AI 음성 비서 서버")
+    parser.add_argument("--host", default=os.getenv('HOST', '0.0.0.0'), help="바인드 주소")
+    parser.add_argument("--port", type=int, default=int(os.getenv('PORT', '5000')), help="포트")
+    # 한 머신에서 여러 노드를 띄울 때 (router.py --spawn) 리로더 프로세스가 중복되지 않도록
+    parser.add_argument("--no-debug", action="store_true", help="개발 모드(리로더) 끄기")
+    args = parser.parse_args(argv)
+    debug = not args.no_debug
+    
+    # 요청 스레드에서는 큐에 넣기만 하고 출력은 별도 스레드에서 (LOG_FORMAT=text로 개발용 출력)
+    configure_logging()
+    
+    # 자동 튜닝 프로파일이 있으면 torch 스레드 수 적용 (autotune.py로 생성)
+    tuning_profile = load_profile()
+    if tuning_profile:
+        apply_profile(tuning_profile, latency_optimized=True)
+        print(f"⚙️  Tuning profile applied: {tuning_profile['server_threads']} torch threads")
     
     # AI 서버 초기화
     print("🚀 Initializing AI Server...")
     ai_server = AIServer(device="auto")
     
+    # 작업 큐 초기화 (재시작 전에 접수된 작업도 이어서 처리)
+    job_queue = JobQueue(
+        handler=ai_server.process_job,
+        db_path=os.getenv('JOB_DB_PATH', 'jobs.db'),
+        spool_dir=os.getenv('JOB_SPOOL_DIR', 'job_spool'),
+        num_workers=int(os.getenv('JOB_WORKERS', '2')),
+        result_ttl=float(os.getenv('JOB_RESULT_TTL', '3600')),
+        # 쉼표로 구분된 콜백 허용 호스트 (지정하지 않으면 http/https URL 모두 허용)
+        callback_hosts=[h.strip() for h in os.getenv('JOB_CALLBACK_HOSTS', '').split(',') if h.strip()] or None
+    )
+    # 사용자 일정 저장소 (오래된 삭제 표시는 TASK_TOMBSTONE_TTL 후 정리)
+    # 앱이 보내는 시간대 없는 날짜는 TASK_TIMEZONE의 지역 시각으로 해석 (일정/알림 공통)
+    task_timezone = os.getenv('TASK_TIMEZONE', DEFAULT_TIMEZONE)
+    task_store = TaskStore(
+        db_path=os.getenv('TASK_DB_PATH', 'tasks.db'),
+        tombstone_ttl=float(os.getenv('TASK_TOMBSTONE_TTL', str(30 * 86400))),
+        timezone=task_timezone
+    )
+    if not USER_TOKEN_SECRET:
+        print("⚠️ USER_TOKEN_SECRET is not set: /users/<user_id>/... APIs will reject all requests")
+    
+    # 일정 알림 (일정 추가/수정/삭제시 자동 재예약, REMINDER_WEBHOOK_URL 설정시 푸시)
+    reminder_engine = ReminderEngine(
+        db_path=os.getenv('REMINDER_DB_PATH', 'reminders.db'),
+        resolution=float(os.getenv('REMINDER_RESOLUTION', '0.5')),
+        max_in_memory=int(os.getenv('REMINDER_MAX_IN_MEMORY', '100000')),
+        webhook_url=os.getenv('REMINDER_WEBHOOK_URL'),
+        timezone=task_timezone
+    )
+    task_store.add_listener(reminder_engine.on_task_change)
+    
+    # 개발 모드 리로더의 감시 프로세스에서는 작업자를 띄우지 않음
+    if not debug or os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        ai_server.memory.start()
+        job_queue.start()
+        task_store.start()
+        reminder_engine.start()
+    
     # Flask 서버 시작
     print("🌐 Starting Flask server...")
-    app.run(
-        host='0.0.0.0',  # 모든 IP에서 접근 허용
-        port=5000,        # 포트 5000
-        debug=True        # 개발 모드
-    )
+    try:
+        app.run(
+            host=args.host,   # 기본값: 모든 IP에서 접근 허용
+            port=args.port,   # 기본값: 5000 (router.py 뒤에서 여러 노드를 띄울 때 노드마다 다르게)
+            debug=debug,      # 개발 모드
+            threaded=True     # 롱폴링 요청이 다른 요청을 막지 않도록
+        )
+    finally:
+        # 가비지 컬렉터(__del__)에 맡기지 않고 모델 메모리를 명시적으로 해제
+        ai_server.memory.stop()
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file
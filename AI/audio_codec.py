@@ -0,0 +1,267 @@
+#!/usr/bin/env python3
+"""
+Audio Codec Negotiation
+업로드/응답 음성의 압축 코덱(Opus, FLAC, MP3, WAV) 선택과 ffmpeg 파이프 기반 스트리밍 변환
+
+- 수신: 압축 음성을 받는 동안 바로 16kHz mono PCM으로 디코딩 (audio/pcm 본문은 ffmpeg 없이 변환)
+- 응답: Accept 헤더로 요청된 코덱으로 인코딩하며 인코딩된 부분부터 전송
+"""
+
+import os
+import shutil
+import logging
+import threading
+import subprocess
+from typing import Dict, Any, Iterable, Iterator, Optional
+
+import numpy as np
+
+# 지원 코덱: MIME 타입 → ffmpeg 설정
+CODECS: Dict[str, Dict[str, Any]] = {
+    "opus": {"mime": "audio/ogg; codecs=opus", "suffix": ".ogg", "format": "ogg",
+             "args": ["-c:a", "libopus", "-application", "voip"],
+             "bitrate": os.getenv('OPUS_BITRATE', '24k')},
+    "flac": {"mime": "audio/flac", "suffix": ".flac", "format": "flac",
+             "args": ["-c:a", "flac", "-compression_level", "5"], "bitrate": None},
+    "mp3": {"mime": "audio/mpeg", "suffix": ".mp3", "format": "mp3",
+            "args": ["-c:a", "libmp3lame"], "bitrate": os.getenv('MP3_BITRATE', '32k')},
+    "wav": {"mime": "audio/wav", "suffix": ".wav", "format": "wav",
+            "args": ["-c:a", "pcm_s16le"], "bitrate": None},
+    # 헤더 없는 16kHz mono 16-bit little-endian (pyaudio paInt16 프레임 그대로, 디코딩 불필요)
+    "pcm": {"mime": "audio/pcm; rate=16000", "suffix": ".pcm", "format": "s16le",
+            "args": ["-c:a", "pcm_s16le", "-ar", "16000"], "bitrate": None},
+}
+
+# 요청 Content-Type/Accept에 올 수 있는 MIME 타입 → 코덱
+_MIME_ALIASES = {
+    "audio/ogg": "opus",
+    "audio/opus": "opus",
+    "audio/webm": "opus",
+    "audio/flac": "flac",
+    "audio/x-flac": "flac",
+    "audio/mpeg": "mp3",
+    "audio/mp3": "mp3",
+    "audio/wav": "wav",
+    "audio/x-wav": "wav",
+    "audio/wave": "wav",
+    "audio/pcm": "pcm",
+}
+
+_SUFFIX_ALIASES = {".ogg": "opus", ".opus": "opus", ".webm": "opus", ".flac": "flac",
+                   ".mp3": "mp3", ".wav": "wav", ".m4a": None}
+
+PCM_SAMPLE_RATE = 16000
+
+
+def codec_for_content_type(content_type: Optional[str]) -> Optional[str]:
+    """Content-Type 헤더의 코덱 (모르는 타입이면 None)"""
+    if not content_type:
+        return None
+    mime = content_type.split(";")[0].strip().lower()
+    return _MIME_ALIASES.get(mime)
+
+
+def upload_suffix(content_type: Optional[str], filename: Optional[str]) -> str:
+    """업로드 파일을 저장할 확장자 (ffmpeg/Whisper가 형식을 판별할 수 있도록)"""
+    ext = os.path.splitext(filename or "")[1].lower()
+    if ext in _SUFFIX_ALIASES:
+        return ext
+    codec = codec_for_content_type(content_type)
+    return CODECS[codec]["suffix"] if codec else ".wav"
+
+
+def negotiate_response_codec(accept_header: Optional[str]) -> Optional[str]:
+    """
+    Accept 헤더에서 q값이 가장 높은 지원 음성 코덱 선택
+
+    Returns:
+        Optional[str]: 코덱 이름 (음성 타입을 요청하지 않았으면 None → JSON 응답)
+    """
+    best, best_q = None, 0.0
+    for item in (accept_header or "").split(","):
+        parts = [p.strip() for p in item.split(";")]
+        mime = parts[0].lower()
+        q = 1.0
+        codecs_param = None
+        for param in parts[1:]:
+            key, _, value = param.partition("=")
+            if key == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+            elif key == "codecs":
+                codecs_param = value.strip('"').lower()
+        codec = "opus" if codecs_param == "opus" else _MIME_ALIASES.get(mime)
+        if codec and q > best_q:
+            best, best_q = codec, q
+    return best
+
+
+def _ffmpeg() -> str:
+    path = shutil.which("ffmpeg")
+    if path is None:
+        raise RuntimeError("ffmpeg is required for compressed audio (install ffmpeg)")
+    return path
+
+
+def _pump(source: Iterable[bytes], sink):
+    """source의 바이트를 sink(ffmpeg stdin)로 전달 후 닫기 (별도 스레드에서 실행)"""
+    try:
+        for data in source:
+            if data:
+                sink.write(data)
+    except (BrokenPipeError, ValueError):
+        pass
+    except Exception as e:
+        # 입력 중단을 알리지 않으면 ffmpeg가 빈 입력으로 끝나 원인을 알 수 없음
+        logging.getLogger(__name__).error(f"Audio input stream failed: {e}")
+    finally:
+        try:
+            sink.close()
+        except OSError:
+            pass
+
+
+def content_type_rate(content_type: Optional[str], default: int = PCM_SAMPLE_RATE) -> int:
+    """Content-Type의 rate 파라미터 (예: audio/pcm; rate=44100)"""
+    for param in (content_type or "").split(";")[1:]:
+        key, _, value = param.partition("=")
+        if key.strip().lower() == "rate":
+            try:
+                return int(value.strip())
+            except ValueError:
+                break
+    return default
+
+
+def _decode_pcm16(source: Iterable[bytes]) -> Iterator[np.ndarray]:
+    """16kHz PCM16 바이트 조각을 도착하는 대로 float32로 변환 (조각 경계의 홀수 바이트는 다음 조각으로)"""
+    pending = b""
+    for data in source:
+        pending += data
+        usable = len(pending) - len(pending) % 2
+        if usable:
+            yield np.frombuffer(pending[:usable], dtype="<i2").astype(np.float32) / 32768.0
+            pending = pending[usable:]
+
+
+def decode_stream(source: Iterable[bytes], codec: Optional[str] = None,
+                  block_seconds: float = 0.25,
+                  sample_rate: int = PCM_SAMPLE_RATE) -> Iterator[np.ndarray]:
+    """
+    압축 음성 바이트 스트림을 받는 대로 16kHz mono float32 PCM으로 디코딩
+
+    Args:
+        source: 음성 바이트 조각 (예: 요청 본문 스트림)
+        codec: 입력 코덱 (None이면 ffmpeg가 판별)
+        block_seconds: 내보낼 PCM 조각 길이
+        sample_rate: codec이 "pcm"일 때 입력 샘플링 레이트 (16kHz가 아니면 ffmpeg로 변환)
+    """
+    if codec == "pcm" and sample_rate == PCM_SAMPLE_RATE:
+        yield from _decode_pcm16(source)
+        return
+
+    command = [_ffmpeg(), "-hide_banner", "-loglevel", "error"]
+    if codec in ("flac", "wav", "mp3"):
+        command += ["-f", CODECS[codec]["format"]]
+    elif codec == "pcm":
+        command += ["-f", "s16le", "-ac", "1", "-ar", str(sample_rate)]
+    command += ["-i", "pipe:0", "-f", "s16le", "-ac", "1", "-ar", str(PCM_SAMPLE_RATE), "pipe:1"]
+
+    process = subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                               stderr=subprocess.PIPE)
+    # stdin 쓰기와 stdout 읽기를 동시에 해야 파이프 버퍼가 차도 막히지 않음
+    writer = threading.Thread(target=_pump, args=(source, process.stdin), daemon=True)
+    writer.start()
+
+    block_bytes = int(PCM_SAMPLE_RATE * block_seconds) * 2
+    pending = b""
+    completed = False
+    try:
+        while True:
+            data = process.stdout.read(block_bytes)
+            if not data:
+                break
+            pending += data
+            usable = len(pending) - len(pending) % 2
+            if usable:
+                yield np.frombuffer(pending[:usable], dtype="<i2").astype(np.float32) / 32768.0
+                pending = pending[usable:]
+        completed = True
+    finally:
+        if not completed and process.poll() is None:
+            # 소비자가 중간에 멈춤 (요청 취소 등)
+            process.kill()
+        process.stdout.close()
+        process.wait()
+        writer.join(timeout=1.0)
+        error = process.stderr.read().decode("utf-8", "replace").strip()
+        process.stderr.close()
+
+    if process.returncode != 0:
+        raise RuntimeError(f"Audio decoding failed: {error or process.returncode}")
+
+
+def encode_stream(source: Iterable[bytes], codec: str, bitrate: Optional[str] = None,
+                  input_codec: Optional[str] = None, read_size: int = 4096) -> Iterator[bytes]:
+    """
+    음성 바이트를 지정 코덱으로 인코딩하며 인코딩된 부분부터 반환
+
+    Args:
+        source: 입력 음성 바이트 조각 (예: TTS MP3)
+        codec: 출력 코덱 (CODECS 키)
+        bitrate: 비트레이트 (기본값: 코덱별 환경 변수 설정)
+        input_codec: 입력 코덱 (None이면 ffmpeg가 판별)
+    """
+    spec = CODECS[codec]
+    command = [_ffmpeg(), "-hide_banner", "-loglevel", "error"]
+    if input_codec:
+        command += ["-f", CODECS[input_codec]["format"]]
+        if input_codec == "pcm":
+            command += ["-ac", "1", "-ar", str(PCM_SAMPLE_RATE)]
+    command += ["-i", "pipe:0", "-ac", "1", *spec["args"]]
+    bitrate = bitrate or spec["bitrate"]
+    if bitrate:
+        command += ["-b:a", bitrate]
+    if codec == "opus":
+        # 페이지를 자주 내보내 첫 바이트 지연을 줄임
+        command += ["-page_duration", "20000"]
+    command += ["-f", spec["format"], "pipe:1"]
+
+    process = subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                               stderr=subprocess.DEVNULL)
+    writer = threading.Thread(target=_pump, args=(source, process.stdin), daemon=True)
+    writer.start()
+    try:
+        while True:
+            data = process.stdout.read1(read_size)
+            if not data:
+                break
+            yield data
+    finally:
+        process.stdout.close()
+        if process.poll() is None:
+            process.kill()
+        process.wait()
+        writer.join(timeout=1.0)
+
+
+def encode_bytes(audio: bytes, codec: str, bitrate: Optional[str] = None,
+                 input_codec: Optional[str] = None) -> bytes:
+    """음성 바이트 전체를 한 번에 변환 (JSON 응답/클라이언트 업로드용)"""
+    return b"".join(encode_stream([audio], codec, bitrate, input_codec))
+
+
+def encode_pcm16(pcm: bytes, codec: str, sample_rate: int = PCM_SAMPLE_RATE,
+                 bitrate: Optional[str] = None) -> bytes:
+    """16-bit mono PCM(pyaudio paInt16 프레임)을 압축 코덱으로 변환"""
+    spec = CODECS[codec]
+    command = [_ffmpeg(), "-hide_banner", "-loglevel", "error",
+               "-f", "s16le", "-ac", "1", "-ar", str(sample_rate), "-i", "pipe:0",
+               *spec["args"]]
+    bitrate = bitrate or spec["bitrate"]
+    if bitrate:
+        command += ["-b:a", bitrate]
+    command += ["-f", spec["format"], "pipe:1"]
+    return subprocess.run(command, input=pcm, stdout=subprocess.PIPE, check=True).stdout
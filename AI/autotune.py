@@ -0,0 +1,283 @@
+#!/usr/bin/env python3
+"""
+CPU Auto-Tuner
+CPU 토폴로지(코어/NUMA) 감지 후 실제 transcribe 경로로 보정 실행해
+torch 스레드 수, 작업자 프로세스 수, CPU affinity를 결정하고 프로파일로 저장
+
+사용 예:
+    python autotune.py sample.wav --target-latency 2.0 -o tuning_profile.json
+"""
+
+import os
+import sys
+import json
+import glob
+import time
+import socket
+import argparse
+import logging
+import platform
+import statistics
+from typing import Dict, Any, Optional, List
+
+# AI 모듈 import
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PROFILE_PATH = "tuning_profile.json"
+
+
+def _parse_cpulist(text: str) -> List[int]:
+    """"0-3,8-11" 형식의 CPU 목록 파싱"""
+    cpus = []
+    for part in text.strip().split(","):
+        if not part:
+            continue
+        if "-" in part:
+            low, high = part.split("-")
+            cpus.extend(range(int(low), int(high) + 1))
+        else:
+            cpus.append(int(part))
+    return cpus
+
+
+def detect_topology() -> Dict[str, Any]:
+    """
+    사용 가능한 CPU, 물리 코어, NUMA 노드 감지 (Linux sysfs, 그 외 OS는 논리 CPU만)
+
+    Returns:
+        Dict[str, Any]: logical_cpus, physical_cores (코어별 하이퍼스레드 CPU 목록), numa_nodes
+    """
+    if hasattr(os, "sched_getaffinity"):
+        available = sorted(os.sched_getaffinity(0))
+    else:
+        available = list(range(os.cpu_count() or 1))
+
+    # 물리 코어: (패키지, 코어) 단위로 하이퍼스레드 형제 CPU 묶기
+    cores: Dict[tuple, List[int]] = {}
+    for cpu in available:
+        base = f"/sys/devices/system/cpu/cpu{cpu}/topology"
+        try:
+            with open(f"{base}/physical_package_id") as f:
+                package = int(f.read())
+            with open(f"{base}/core_id") as f:
+                core = int(f.read())
+        except (OSError, ValueError):
+            package, core = 0, cpu
+        cores.setdefault((package, core), []).append(cpu)
+
+    # NUMA 노드별 사용 가능한 CPU
+    numa_nodes = []
+    for node_path in sorted(glob.glob("/sys/devices/system/node/node[0-9]*")):
+        try:
+            with open(os.path.join(node_path, "cpulist")) as f:
+                cpus = [c for c in _parse_cpulist(f.read()) if c in available]
+        except OSError:
+            continue
+        if cpus:
+            numa_nodes.append(cpus)
+    if not numa_nodes:
+        numa_nodes = [available]
+
+    return {
+        "logical_cpus": available,
+        "physical_cores": [sorted(cpus) for _, cpus in sorted(cores.items())],
+        "numa_nodes": numa_nodes,
+    }
+
+
+def plan_affinity(topology: Dict[str, Any], workers: int, threads: int) -> List[List[int]]:
+    """
+    작업자별 CPU 집합 배정
+
+    작업자 하나가 NUMA 노드를 넘지 않도록 노드 안에서 물리 코어를 연속으로 배정하고,
+    각 코어의 하이퍼스레드 형제도 함께 포함
+    """
+    node_of = {cpu: i for i, cpus in enumerate(topology["numa_nodes"]) for cpu in cpus}
+    cores_by_node: Dict[int, List[List[int]]] = {}
+    for core in topology["physical_cores"]:
+        cores_by_node.setdefault(node_of.get(core[0], 0), []).append(core)
+
+    assignments = []
+    for node in sorted(cores_by_node):
+        cores = cores_by_node[node]
+        for start in range(0, len(cores) - threads + 1, threads):
+            if len(assignments) == workers:
+                return assignments
+            assignments.append(sorted(cpu for core in cores[start:start + threads] for cpu in core))
+    return assignments
+
+
+def calibrate(audio_path: str, model_name: str = "small",
+              thread_candidates: Optional[List[int]] = None,
+              repeats: int = 3, use_preprocessing: bool = True) -> Dict[int, float]:
+    """
+    torch 스레드 수별 transcribe 지연 시간(중앙값, 초) 측정
+
+    Args:
+        audio_path: 보정에 사용할 대표 음성 파일
+        model_name: Whisper 모델
+        thread_candidates: 측정할 스레드 수 목록 (기본값: 1, 2, 4, ... 물리 코어 수)
+        repeats: 스레드 수별 반복 횟수
+    """
+    import torch
+    from Models.STT import WhisperSTT
+
+    topology = detect_topology()
+    physical = len(topology["physical_cores"])
+    if thread_candidates is None:
+        thread_candidates, t = [], 1
+        while t < physical:
+            thread_candidates.append(t)
+            t *= 2
+        thread_candidates.append(physical)
+
+    stt = WhisperSTT(model_name=model_name, device="cpu")
+    # 첫 실행의 초기화 비용 제외
+    stt.transcribe(audio_path, use_preprocessing=use_preprocessing)
+
+    latencies = {}
+    for threads in thread_candidates:
+        torch.set_num_threads(threads)
+        samples = []
+        for _ in range(repeats):
+            start = time.perf_counter()
+            stt.transcribe(audio_path, use_preprocessing=use_preprocessing)
+            samples.append(time.perf_counter() - start)
+        latencies[threads] = statistics.median(samples)
+        logger.info(f"threads={threads}: {latencies[threads]:.3f}s")
+    return latencies
+
+
+def choose_configuration(latencies: Dict[int, float], topology: Dict[str, Any],
+                         target_latency: float) -> Dict[str, Any]:
+    """
+    목표 지연 시간 이내에서 처리량(작업자 수 / 지연 시간)이 최대인 구성 선택
+
+    작업자들이 서로 다른 물리 코어를 쓰므로 처리량이 작업자 수에 비례한다고 가정하고,
+    목표를 만족하는 구성이 없으면 지연 시간이 가장 짧은 구성 선택
+    """
+    physical = len(topology["physical_cores"])
+    options = []
+    for threads, latency in latencies.items():
+        workers = max(1, physical // threads)
+        options.append({
+            "torch_threads": threads,
+            "workers": workers,
+            "latency": round(latency, 4),
+            "throughput": round(workers / latency, 4),
+            "meets_target": latency <= target_latency,
+        })
+
+    feasible = [o for o in options if o["meets_target"]]
+    if feasible:
+        best = max(feasible, key=lambda o: (o["throughput"], -o["latency"]))
+    else:
+        best = min(options, key=lambda o: o["latency"])
+    return {"selected": best, "candidates": sorted(options, key=lambda o: o["torch_threads"])}
+
+
+def build_profile(audio_path: str, model_name: str = "small", target_latency: float = 2.0,
+                  repeats: int = 3) -> Dict[str, Any]:
+    """토폴로지 감지 + 보정 실행 + 구성 선택"""
+    topology = detect_topology()
+    latencies = calibrate(audio_path, model_name, repeats=repeats)
+    choice = choose_configuration(latencies, topology, target_latency)
+    selected = choice["selected"]
+
+    return {
+        "host": socket.gethostname(),
+        "machine": platform.machine(),
+        "processor": platform.processor(),
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "model_name": model_name,
+        "target_latency": target_latency,
+        "topology": {
+            "logical_cpus": len(topology["logical_cpus"]),
+            "physical_cores": len(topology["physical_cores"]),
+            "numa_nodes": topology["numa_nodes"],
+        },
+        "torch_threads": selected["torch_threads"],
+        # 모델 하나로 요청을 순차 처리하는 서버 프로세스용 (지연 시간 최소)
+        "server_threads": min(latencies, key=latencies.get),
+        "interop_threads": 1,
+        "workers": selected["workers"],
+        "affinity": plan_affinity(topology, selected["workers"], selected["torch_threads"]),
+        "candidates": choice["candidates"],
+    }
+
+
+def save_profile(profile: Dict[str, Any], path: str = DEFAULT_PROFILE_PATH):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(profile, f, indent=2)
+
+
+def load_profile(path: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    """저장된 프로파일 로드 (없거나 다른 호스트 유형이면 None)"""
+    path = path or os.getenv('TUNING_PROFILE', DEFAULT_PROFILE_PATH)
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding="utf-8") as f:
+        profile = json.load(f)
+
+    cpus = len(detect_topology()["logical_cpus"])
+    if profile.get("topology", {}).get("logical_cpus") != cpus:
+        logger.warning(f"Tuning profile {path} was made for a different CPU count, ignoring")
+        return None
+    return profile
+
+
+def apply_profile(profile: Dict[str, Any], worker_index: Optional[int] = None,
+                  latency_optimized: bool = False):
+    """
+    현재 프로세스에 프로파일 적용
+
+    Args:
+        profile: build_profile 결과
+        worker_index: 작업자 번호 (지정시 해당 작업자의 CPU affinity 적용)
+        latency_optimized: 단일 프로세스 서버처럼 처리량보다 지연 시간이 중요한 경우
+    """
+    import torch
+
+    threads = profile.get("server_threads", profile["torch_threads"]) if latency_optimized else profile["torch_threads"]
+    torch.set_num_threads(threads)
+    try:
+        # 병렬 작업이 시작된 뒤에는 변경할 수 없음
+        torch.set_num_interop_threads(profile.get("interop_threads", 1))
+    except RuntimeError:
+        pass
+
+    affinity = profile.get("affinity") or []
+    if worker_index is not None and affinity and hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, affinity[worker_index % len(affinity)])
+
+
+def main(argv=None):
+    """메인 함수"""
+    parser = argparse.ArgumentParser(description="CPU 토폴로지 기반 STT 스레드/작업자 자동 튜닝")
+    parser.add_argument("audio", help="보정에 사용할 대표 음성 파일")
+    parser.add_argument("-o", "--output", default=DEFAULT_PROFILE_PATH, help="프로파일 저장 경로")
+    parser.add_argument("--model", default="small", help="Whisper 모델")
+    parser.add_argument("--target-latency", type=float, default=2.0, help="목표 요청 지연 시간 (초)")
+    parser.add_argument("--repeats", type=int, default=3, help="스레드 수별 반복 횟수")
+    args = parser.parse_args(argv)
+
+    from Models.LogConfig import configure_logging
+    configure_logging(log_format=os.getenv('LOG_FORMAT', 'text'))
+    topology = detect_topology()
+    print(f"🖥️  논리 CPU {len(topology['logical_cpus'])}개, 물리 코어 {len(topology['physical_cores'])}개, "
+          f"NUMA 노드 {len(topology['numa_nodes'])}개")
+
+    profile = build_profile(args.audio, args.model, args.target_latency, args.repeats)
+    save_profile(profile, args.output)
+
+    print(f"✅ torch 스레드 {profile['torch_threads']}개 × 작업자 {profile['workers']}개 → {args.output}")
+    for candidate in profile["candidates"]:
+        mark = "*" if candidate["torch_threads"] == profile["torch_threads"] else " "
+        print(f" {mark} threads={candidate['torch_threads']:>3} workers={candidate['workers']:>3} "
+              f"latency={candidate['latency']:.3f}s throughput={candidate['throughput']:.2f}/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,243 @@
+#!/usr/bin/env python3
+"""
+Batch Transcription CLI
+디렉토리 또는 목록 파일의 음성들을 작업자 프로세스 풀로 일괄 변환 (JSONL 결과, 이어하기 지원)
+
+사용 예:
+    python batch_transcribe.py recordings/ -o results.jsonl --workers 4
+    python batch_transcribe.py manifest.txt -o results.jsonl --model base
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from typing import Dict, Any, List, Set, Iterator
+
+# AI 모듈 import
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from autotune import load_profile
+
+AUDIO_EXTENSIONS = ('.wav', '.mp3', '.m4a', '.flac', '.ogg')
+
+# 작업자 프로세스의 STT 인스턴스 (프로세스마다 한 번만 로드)
+_worker_stt = None
+
+
+def _init_worker(model_name: str, num_threads: int, affinity: List[List[int]], counter):
+    """작업자 프로세스 초기화 (affinity가 있으면 작업자별 CPU 집합 고정)"""
+    global _worker_stt
+    import torch
+    from Models.STT import WhisperSTT
+
+    torch.set_num_threads(num_threads)
+    if affinity and hasattr(os, "sched_setaffinity"):
+        with counter.get_lock():
+            index = counter.value
+            counter.value += 1
+        os.sched_setaffinity(0, affinity[index % len(affinity)])
+    _worker_stt = WhisperSTT(model_name=model_name, device="cpu")
+
+
+def _transcribe_file(path: str, language: str, use_preprocessing: bool) -> Dict[str, Any]:
+    """파일 하나 변환 (예외는 결과 레코드로 반환)"""
+    import soundfile as sf
+
+    start = time.time()
+    record = {"path": path, "worker": os.getpid()}
+    try:
+        record["audio_duration"] = round(sf.info(path).duration, 3)
+    except Exception:
+        record["audio_duration"] = None
+
+    try:
+        record["text"] = _worker_stt.transcribe(path, language=language, use_preprocessing=use_preprocessing)
+        record["status"] = "ok"
+    except Exception as e:
+        record["status"] = "error"
+        record["error"] = str(e)
+
+    record["elapsed"] = round(time.time() - start, 3)
+    return record
+
+
+def collect_inputs(source: str) -> List[str]:
+    """
+    입력 음성 파일 목록 수집
+
+    Args:
+        source: 음성 디렉토리 (재귀 탐색) 또는 목록 파일
+                (한 줄에 경로 하나, 또는 "path" 필드가 있는 JSONL)
+    """
+    if os.path.isdir(source):
+        paths = []
+        for root, _, files in os.walk(source):
+            for name in files:
+                if name.lower().endswith(AUDIO_EXTENSIONS):
+                    paths.append(os.path.join(root, name))
+        return sorted(paths)
+
+    base_dir = os.path.dirname(os.path.abspath(source))
+    paths = []
+    with open(source, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            path = json.loads(line)["path"] if line.startswith("{") else line
+            # 목록 파일 기준 상대 경로 허용
+            paths.append(path if os.path.isabs(path) else os.path.join(base_dir, path))
+    return paths
+
+
+def load_completed(output_path: str) -> Set[str]:
+    """기존 결과 파일에서 성공한 항목 경로 (이어하기용)"""
+    completed = set()
+    if not os.path.exists(output_path):
+        return completed
+    with open(output_path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                # 중단 시점에 잘린 마지막 줄은 무시
+                continue
+            if record.get("status") == "ok":
+                completed.add(record["path"])
+    return completed
+
+
+def _ends_without_newline(path: str) -> bool:
+    if not os.path.exists(path) or os.path.getsize(path) == 0:
+        return False
+    with open(path, "rb") as f:
+        f.seek(-1, os.SEEK_END)
+        return f.read(1) != b"\n"
+
+
+class ProgressReporter:
+    """진행률/처리량 출력"""
+
+    def __init__(self, total: int, interval: float = 5.0):
+        self.total = total
+        self.interval = interval
+        self.start = time.time()
+        self.last_report = 0.0
+        self.done = 0
+        self.errors = 0
+        self.audio_seconds = 0.0
+
+    def update(self, record: Dict[str, Any]):
+        self.done += 1
+        if record["status"] != "ok":
+            self.errors += 1
+        self.audio_seconds += record.get("audio_duration") or 0.0
+
+        now = time.time()
+        if now - self.last_report >= self.interval or self.done == self.total:
+            self.last_report = now
+            self.report()
+
+    def report(self):
+        elapsed = max(time.time() - self.start, 1e-6)
+        rate = self.done / elapsed
+        eta = (self.total - self.done) / rate if rate > 0 else float("inf")
+        print(f"[{self.done}/{self.total}] "
+              f"{rate:.2f} files/s, {self.audio_seconds / elapsed:.1f}x realtime, "
+              f"errors {self.errors}, ETA {eta:.0f}s", flush=True)
+
+
+def iter_results(paths: List[str], args: argparse.Namespace) -> Iterator[Dict[str, Any]]:
+    """작업자 풀로 변환하며 완료 순서대로 결과 반환"""
+    cpu_count = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count()
+    profile = load_profile(args.tuning_profile)
+    affinity = []
+    if profile:
+        # 명시적으로 지정한 값이 튜닝 프로파일보다 우선
+        workers = args.workers or profile["workers"]
+        threads = args.threads or profile["torch_threads"]
+        if not args.workers and not args.threads:
+            affinity = profile.get("affinity") or []
+    else:
+        workers = args.workers or max(1, cpu_count // 2)
+        threads = args.threads or max(1, cpu_count // workers)
+
+    # torch는 fork 이후 스레드 풀 상태가 깨질 수 있어 spawn 사용
+    context = multiprocessing.get_context("spawn")
+    counter = context.Value("i", 0)
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context,
+                             initializer=_init_worker,
+                             initargs=(args.model, threads, affinity, counter)) as executor:
+        use_preprocessing = not args.no_preprocessing
+        pending = set()
+        queue = iter(paths)
+        # 수천 개 파일을 한 번에 제출하지 않도록 작업자 수의 2배만 유지
+        for path in queue:
+            pending.add(executor.submit(_transcribe_file, path, args.language, use_preprocessing))
+            if len(pending) >= workers * 2:
+                break
+
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield future.result()
+                next_path = next(queue, None)
+                if next_path is not None:
+                    pending.add(executor.submit(_transcribe_file, next_path, args.language, use_preprocessing))
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Whisper 일괄 음성 변환")
+    parser.add_argument("input", help="음성 디렉토리 또는 목록 파일 (txt/jsonl)")
+    parser.add_argument("-o", "--output", default="transcripts.jsonl", help="결과 JSONL 경로")
+    parser.add_argument("--model", default="small", help="Whisper 모델 (tiny/base/small/medium/large)")
+    parser.add_argument("--language", default="ko", help="언어 코드")
+    parser.add_argument("--workers", type=int, default=0, help="작업자 프로세스 수 (기본값: 코어 수 / 2)")
+    parser.add_argument("--threads", type=int, default=0, help="작업자당 torch 스레드 수 (기본값: 코어 수 / 작업자 수)")
+    parser.add_argument("--tuning-profile", default=None,
+                        help="autotune.py 프로파일 경로 (기본값: TUNING_PROFILE 또는 tuning_profile.json)")
+    parser.add_argument("--no-preprocessing", action="store_true", help="음성 전처리 생략")
+    parser.add_argument("--no-resume", action="store_true", help="기존 결과를 무시하고 처음부터 실행")
+    parser.add_argument("--report-interval", type=float, default=5.0, help="진행률 출력 간격 (초)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    """메인 함수"""
+    args = parse_args(argv)
+
+    paths = collect_inputs(args.input)
+    if not args.no_resume:
+        completed = load_completed(args.output)
+        skipped = len([p for p in paths if p in completed])
+        paths = [p for p in paths if p not in completed]
+        if skipped:
+            print(f"⏭️  이미 완료된 {skipped}개 파일 건너뜀")
+    mode = "w" if args.no_resume else "a"
+
+    if not paths:
+        print("✅ 변환할 파일이 없습니다.")
+        return
+
+    print(f"🎯 {len(paths)}개 파일 변환 시작 → {args.output}")
+    progress = ProgressReporter(len(paths), args.report_interval)
+
+    with open(args.output, mode, encoding="utf-8") as out:
+        if mode == "a" and _ends_without_newline(args.output):
+            # 중단으로 잘린 마지막 줄과 새 결과가 붙지 않도록
+            out.write("\n")
+        for record in iter_results(paths, args):
+            # 한 줄씩 즉시 기록해 중단되어도 완료분은 보존
+            out.write(json.dumps(record, ensure_ascii=False) + "\n")
+            out.flush()
+            progress.update(record)
+
+    print(f"✅ 완료: {progress.done - progress.errors}개 성공, {progress.errors}개 실패 "
+          f"({time.time() - progress.start:.1f}초)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,433 @@
+#!/usr/bin/env python3
+"""
+Durable Job Queue
+SQLite 기반 비동기 음성 처리 작업 큐 (제출 → 작업 ID → 폴링/롱폴링/콜백)
+"""
+
+import os
+import json
+import time
+import uuid
+import shutil
+import sqlite3
+import logging
+import threading
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+from typing import Dict, Any, Optional, Callable, List
+
+from Models.LogConfig import request_scope
+
+# 작업 상태
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+CANCELLED = "cancelled"
+FINISHED_STATES = (SUCCEEDED, FAILED, CANCELLED)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    audio_path TEXT NOT NULL,
+    params TEXT NOT NULL,
+    callback_url TEXT,
+    result TEXT,
+    error TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    deferrals INTEGER NOT NULL DEFAULT 0,
+    not_before REAL,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_status_created ON jobs (status, created_at);
+CREATE INDEX IF NOT EXISTS idx_jobs_finished ON jobs (finished_at);
+"""
+
+# 이전 버전 DB에 추가할 열 (이름 → 정의)
+_ADDED_COLUMNS = {
+    "deferrals": "INTEGER NOT NULL DEFAULT 0",
+    "not_before": "REAL",
+}
+
+
+class InvalidCallbackURL(ValueError):
+    """허용되지 않는 콜백 URL (http/https가 아니거나 허용 호스트 목록에 없음)"""
+    pass
+
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    """콜백 요청의 리다이렉트를 따라가지 않음 (허용 호스트 검사 우회 방지)"""
+
+    def redirect_request(self, req, fp, code, msg, headers, newurl):
+        return None
+
+
+class JobDeferred(Exception):
+    """일시적으로 처리할 수 없는 작업 (실패가 아니라 잠시 후 다시 큐에서 실행)"""
+    pass
+
+
+class JobQueue:
+    """SQLite에 영속화되는 작업 큐 + 작업자 스레드 풀"""
+
+    def __init__(self,
+                 handler: Callable[[str, Dict[str, Any]], Dict[str, Any]],
+                 db_path: str = "jobs.db",
+                 spool_dir: str = "job_spool",
+                 num_workers: int = 2,
+                 result_ttl: float = 3600.0,
+                 max_attempts: int = 2,
+                 poll_interval: float = 1.0,
+                 defer_delay: float = 5.0,
+                 max_defer_delay: float = 60.0,
+                 max_deferrals: int = 20,
+                 callback_hosts: Optional[List[str]] = None,
+                 callback_workers: int = 2):
+        """
+        Args:
+            handler: (audio_path, params) → JSON 직렬화 가능한 결과 dict
+            db_path: SQLite 데이터베이스 경로
+            spool_dir: 제출된 음성 파일 보관 디렉토리
+            num_workers: 작업자 스레드 수
+            result_ttl: 완료된 작업 결과 보관 시간 (초)
+            max_attempts: 재시작 복구 포함 최대 실행 횟수
+            poll_interval: 작업자 유휴 대기 간격 (초)
+            defer_delay: handler가 JobDeferred를 던진 작업의 첫 재시도 대기 (초, 이후 2배씩)
+            max_defer_delay: 재시도 대기 상한 (초)
+            max_deferrals: 이 횟수를 넘게 미뤄진 작업은 실패 처리
+            callback_hosts: 콜백을 허용할 호스트 목록 (None이면 http/https URL이면 모두 허용)
+            callback_workers: 콜백 전송 스레드 수 (작업자 스레드가 콜백 재시도로 묶이지 않도록 분리)
+        """
+        self.handler = handler
+        self.db_path = db_path
+        self.spool_dir = spool_dir
+        self.config = {
+            "num_workers": num_workers,
+            "result_ttl": result_ttl,
+            "max_attempts": max_attempts,
+            "poll_interval": poll_interval,
+            "defer_delay": defer_delay,
+            "max_defer_delay": max_defer_delay,
+            "max_deferrals": max_deferrals,
+            "callback_hosts": {host.lower() for host in callback_hosts} if callback_hosts else None,
+            "callback_workers": callback_workers,
+        }
+        self._condition = threading.Condition()
+        self._stop_event = threading.Event()
+        self._workers = []
+        self._callback_executor = None
+        self._callback_opener = urllib.request.build_opener(_NoRedirect)
+
+        self._setup_logging()
+        os.makedirs(self.spool_dir, exist_ok=True)
+        self._initialize_db()
+
+    def _setup_logging(self):
+        self.logger = logging.getLogger(__name__)
+
+    @contextmanager
+    def _connect(self):
+        """autocommit 연결 (사용 후 닫음)"""
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def _initialize_db(self):
+        """테이블 생성 및 WAL 모드 설정"""
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+            columns = {row["name"] for row in conn.execute("PRAGMA table_info(jobs)")}
+            for name, definition in _ADDED_COLUMNS.items():
+                if name not in columns:
+                    conn.execute(f"ALTER TABLE jobs ADD COLUMN {name} {definition}")
+
+    def start(self):
+        """중단된 작업 복구 후 작업자/정리 스레드 시작"""
+        self._recover_interrupted_jobs()
+        self._stop_event.clear()
+        self._callback_executor = ThreadPoolExecutor(max_workers=self.config["callback_workers"],
+                                                     thread_name_prefix="job-callback")
+
+        for i in range(self.config["num_workers"]):
+            worker = threading.Thread(target=self._worker_loop, name=f"job-worker-{i}", daemon=True)
+            worker.start()
+            self._workers.append(worker)
+
+        janitor = threading.Thread(target=self._janitor_loop, name="job-janitor", daemon=True)
+        janitor.start()
+        self._workers.append(janitor)
+
+        self.logger.info(f"Job queue started with {self.config['num_workers']} workers ({self.db_path})")
+
+    def stop(self, timeout: float = 5.0):
+        """작업자 종료 (실행 중인 작업은 재시작시 다시 큐에 들어감)"""
+        self._stop_event.set()
+        with self._condition:
+            self._condition.notify_all()
+        for worker in self._workers:
+            worker.join(timeout=timeout)
+        self._workers = []
+        if self._callback_executor is not None:
+            self._callback_executor.shutdown(wait=False)
+            self._callback_executor = None
+
+    def _recover_interrupted_jobs(self):
+        """이전 프로세스에서 실행 중이던 작업을 다시 대기 상태로"""
+        with self._connect() as conn:
+            cursor = conn.execute(
+                "UPDATE jobs SET status = ?, started_at = NULL WHERE status = ? AND attempts < ?",
+                (QUEUED, RUNNING, self.config["max_attempts"])
+            )
+            recovered = cursor.rowcount
+            conn.execute(
+                "UPDATE jobs SET status = ?, error = ?, finished_at = ? WHERE status = ?",
+                (FAILED, "Interrupted too many times", time.time(), RUNNING)
+            )
+        if recovered:
+            self.logger.info(f"Recovered {recovered} interrupted jobs")
+
+    def submit(self, audio_path: str, params: Optional[Dict[str, Any]] = None,
+               callback_url: Optional[str] = None, move: bool = True) -> str:
+        """
+        작업 제출
+
+        Args:
+            audio_path: 음성 파일 경로 (스풀 디렉토리로 이동/복사됨)
+            params: 처리 파라미터 (session_id 등)
+            callback_url: 완료시 결과를 POST할 URL
+            move: True면 원본 파일을 이동, False면 복사
+
+        Returns:
+            str: 작업 ID
+
+        Raises:
+            InvalidCallbackURL: 허용되지 않는 콜백 URL
+        """
+        if callback_url:
+            self.validate_callback_url(callback_url)
+        job_id = uuid.uuid4().hex
+        suffix = os.path.splitext(audio_path)[1] or ".wav"
+        spooled_path = os.path.join(self.spool_dir, f"{job_id}{suffix}")
+        if move:
+            shutil.move(audio_path, spooled_path)
+        else:
+            shutil.copyfile(audio_path, spooled_path)
+
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO jobs (id, status, audio_path, params, callback_url, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (job_id, QUEUED, spooled_path, json.dumps(params or {}), callback_url, time.time())
+            )
+
+        with self._condition:
+            self._condition.notify_all()
+        return job_id
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """작업 상태/결과 조회"""
+        with self._connect() as conn:
+            row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+
+        job = {
+            "job_id": row["id"],
+            "status": row["status"],
+            "created_at": row["created_at"],
+            "started_at": row["started_at"],
+            "finished_at": row["finished_at"],
+            "attempts": row["attempts"],
+        }
+        if row["status"] == QUEUED:
+            job["queue_position"] = self._queue_position(row["created_at"])
+        if row["result"] is not None:
+            job["result"] = json.loads(row["result"])
+        if row["error"] is not None:
+            job["error"] = row["error"]
+        return job
+
+    def _queue_position(self, created_at: float) -> int:
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT COUNT(*) FROM jobs WHERE status = ? AND created_at < ?",
+                (QUEUED, created_at)
+            ).fetchone()
+        return row[0]
+
+    def wait(self, job_id: str, timeout: float) -> Optional[Dict[str, Any]]:
+        """작업 완료까지 최대 timeout초 대기 (롱폴링)"""
+        deadline = time.monotonic() + timeout
+        job = self.get(job_id)
+        while job is not None and job["status"] not in FINISHED_STATES:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            with self._condition:
+                self._condition.wait(timeout=min(remaining, self.config["poll_interval"]))
+            job = self.get(job_id)
+        return job
+
+    def cancel(self, job_id: str) -> bool:
+        """대기 중인 작업 취소"""
+        with self._connect() as conn:
+            cursor = conn.execute(
+                "UPDATE jobs SET status = ?, finished_at = ? WHERE id = ? AND status = ?",
+                (CANCELLED, time.time(), job_id, QUEUED)
+            )
+            cancelled = cursor.rowcount > 0
+            row = conn.execute("SELECT audio_path FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if cancelled:
+            self._remove_file(row["audio_path"])
+            with self._condition:
+                self._condition.notify_all()
+        return cancelled
+
+    def _claim_next(self) -> Optional[sqlite3.Row]:
+        """가장 오래된 대기 작업을 원자적으로 RUNNING으로 변경 (미뤄진 작업은 재시도 시각 이후)"""
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = conn.execute(
+                    "SELECT * FROM jobs WHERE status = ? AND (not_before IS NULL OR not_before <= ?) "
+                    "ORDER BY created_at LIMIT 1", (QUEUED, time.time())
+                ).fetchone()
+                if row is not None:
+                    conn.execute(
+                        "UPDATE jobs SET status = ?, started_at = ?, attempts = attempts + 1 WHERE id = ?",
+                        (RUNNING, time.time(), row["id"])
+                    )
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        return row
+
+    def _worker_loop(self):
+        while not self._stop_event.is_set():
+            try:
+                row = self._claim_next()
+            except sqlite3.Error as e:
+                self.logger.error(f"Failed to claim job: {e}")
+                row = None
+
+            if row is None:
+                with self._condition:
+                    self._condition.wait(timeout=self.config["poll_interval"])
+                continue
+
+            self._run_job(row)
+
+    def _run_job(self, row: sqlite3.Row):
+        """작업 실행 및 결과 저장"""
+        job_id = row["id"]
+        self.logger.info(f"Running job {job_id}")
+        result, error = None, None
+        try:
+            # 작업 처리 중 남기는 로그는 작업 ID로 묶음
+            with request_scope(job_id):
+                result = self.handler(row["audio_path"], json.loads(row["params"]))
+            status = SUCCEEDED
+        except JobDeferred as e:
+            if row["deferrals"] < self.config["max_deferrals"]:
+                self._defer(row, e)
+                return
+            self.logger.error(f"Job {job_id} deferred too many times: {e}")
+            error = str(e)
+            status = FAILED
+        except Exception as e:
+            self.logger.error(f"Job {job_id} failed: {e}")
+            error = str(e)
+            status = FAILED
+
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE jobs SET status = ?, result = ?, error = ?, finished_at = ? WHERE id = ?",
+                (status, json.dumps(result) if result is not None else None, error, time.time(), job_id)
+            )
+        self._remove_file(row["audio_path"])
+
+        with self._condition:
+            self._condition.notify_all()
+
+        if row["callback_url"] and self._callback_executor is not None:
+            self._callback_executor.submit(self._send_callback, row["callback_url"], self.get(job_id))
+
+    def validate_callback_url(self, url: str):
+        """콜백 URL 검사 (http/https + 호스트 필수, 허용 목록이 있으면 그 호스트만)"""
+        try:
+            parts = urlsplit(url)
+            host = parts.hostname
+        except ValueError:
+            raise InvalidCallbackURL(f"Invalid callback URL: {url}")
+        if parts.scheme not in ("http", "https") or not host:
+            raise InvalidCallbackURL(f"Callback URL must be an http(s) URL: {url}")
+        allowed = self.config["callback_hosts"]
+        if allowed is not None and host.lower() not in allowed:
+            raise InvalidCallbackURL(f"Callback host not allowed: {host}")
+
+    def _defer(self, row: sqlite3.Row, reason: Exception):
+        """작업을 대기 상태로 되돌리고 지수 백오프 후 재시도 (이번 실행은 시도 횟수에서 제외)"""
+        delay = min(self.config["defer_delay"] * 2 ** row["deferrals"], self.config["max_defer_delay"])
+        self.logger.info(f"Job {row['id']} deferred for {delay:.0f}s: {reason}")
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE jobs SET status = ?, started_at = NULL, attempts = attempts - 1, "
+                "deferrals = deferrals + 1, not_before = ? WHERE id = ? AND status = ?",
+                (QUEUED, time.time() + delay, row["id"], RUNNING)
+            )
+
+    def _send_callback(self, url: str, job: Dict[str, Any], retries: int = 3):
+        """완료된 작업을 콜백 URL로 POST (콜백 스레드에서 실행, 실패시 지수 백오프 재시도)"""
+        body = json.dumps(job).encode("utf-8")
+        for attempt in range(retries):
+            try:
+                request = urllib.request.Request(
+                    url, data=body, headers={"Content-Type": "application/json"}, method="POST"
+                )
+                with self._callback_opener.open(request, timeout=10):
+                    return
+            except Exception as e:
+                self.logger.warning(f"Callback to {url} failed (attempt {attempt + 1}): {e}")
+            if attempt + 1 < retries and self._stop_event.wait(timeout=2 ** attempt):
+                return
+
+    def _janitor_loop(self):
+        """TTL이 지난 완료 작업 정리"""
+        while not self._stop_event.wait(timeout=60):
+            try:
+                self.purge_expired()
+            except sqlite3.Error as e:
+                self.logger.error(f"Failed to purge expired jobs: {e}")
+
+    def purge_expired(self) -> int:
+        """TTL이 지난 완료 작업 삭제"""
+        cutoff = time.time() - self.config["result_ttl"]
+        placeholders = ",".join("?" * len(FINISHED_STATES))
+        with self._connect() as conn:
+            cursor = conn.execute(
+                f"DELETE FROM jobs WHERE status IN ({placeholders}) AND finished_at < ?",
+                (*FINISHED_STATES, cutoff)
+            )
+        return cursor.rowcount
+
+    def get_stats(self) -> Dict[str, int]:
+        """상태별 작업 수"""
+        with self._connect() as conn:
+            rows = conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        return {row[0]: row[1] for row in rows}
+
+    def _remove_file(self, path: str):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
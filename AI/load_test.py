@@ -0,0 +1,245 @@
+#!/usr/bin/env python3
+"""
+Load Generator
+로컬 음성 코퍼스로 /process_voice에 동시 요청을 보내 지연 시간 분포, 오류율, 포화 지점 측정
+
+오프라인 실행을 위해 서버는 stub LLM/TTS로 띄움:
+    LLM_MODEL=stub TTS_MODEL=stub python ai_server.py
+
+사용 예:
+    python load_test.py corpus/ --concurrency 8 --duration 60
+    python load_test.py corpus/ --rate 2 --duration 60
+    python load_test.py corpus/ --sweep 0.5,1,2,4,8 --duration 30 --slo 3.0
+"""
+
+import os
+import json
+import time
+import uuid
+import random
+import argparse
+import threading
+import urllib.request
+import urllib.error
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, List, Optional
+
+AUDIO_EXTENSIONS = ('.wav', '.mp3', '.m4a', '.flac', '.ogg')
+
+
+def load_corpus(source: str) -> List[Dict[str, Any]]:
+    """음성 코퍼스 로드 (파일 내용을 미리 메모리에 올려 디스크 I/O 제외)"""
+    paths = []
+    if os.path.isdir(source):
+        for root, _, files in os.walk(source):
+            paths.extend(os.path.join(root, f) for f in files if f.lower().endswith(AUDIO_EXTENSIONS))
+    else:
+        paths.append(source)
+
+    corpus = []
+    for path in sorted(paths):
+        with open(path, "rb") as f:
+            corpus.append({"name": os.path.basename(path), "data": f.read()})
+    if not corpus:
+        raise ValueError(f"No audio files found in: {source}")
+    return corpus
+
+
+def _multipart_body(field: str, filename: str, data: bytes) -> tuple:
+    """multipart/form-data 본문 생성"""
+    boundary = uuid.uuid4().hex
+    head = (f"--{boundary}\r\n"
+            f'Content-Disposition: form-data; name="{field}"; filename="{filename}"\r\n'
+            f"Content-Type: application/octet-stream\r\n\r\n").encode("utf-8")
+    tail = f"\r\n--{boundary}--\r\n".encode("utf-8")
+    return head + data + tail, f"multipart/form-data; boundary={boundary}"
+
+
+class LoadClient:
+    """요청 하나를 보내고 결과 기록"""
+
+    def __init__(self, url: str, corpus: List[Dict[str, Any]], timeout: float, clients: int):
+        self.url = url.rstrip("/") + "/process_voice"
+        self.corpus = corpus
+        self.timeout = timeout
+        self.clients = clients
+        self.results: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+
+    def send(self, client_index: int):
+        sample = random.choice(self.corpus)
+        body, content_type = _multipart_body("audio", sample["name"], sample["data"])
+        request = urllib.request.Request(self.url, data=body, method="POST", headers={
+            "Content-Type": content_type,
+            "X-Client-ID": f"load-client-{client_index % self.clients}",
+        })
+
+        start = time.perf_counter()
+        record = {"sent_at": time.time(), "file": sample["name"]}
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                payload = json.loads(response.read())
+                record["status"] = response.status
+                record["ok"] = bool(payload.get("success"))
+                if not record["ok"]:
+                    record["error"] = payload.get("error")
+        except urllib.error.HTTPError as e:
+            record["status"] = e.code
+            record["ok"] = False
+            record["error"] = f"HTTP {e.code}"
+        except Exception as e:
+            record["status"] = None
+            record["ok"] = False
+            record["error"] = type(e).__name__
+        record["latency"] = time.perf_counter() - start
+
+        with self._lock:
+            self.results.append(record)
+
+
+def run_closed_loop(client: LoadClient, concurrency: int, duration: float):
+    """동시 사용자 concurrency명이 응답을 받자마자 다음 요청 전송"""
+    deadline = time.monotonic() + duration
+
+    def user(index: int):
+        while time.monotonic() < deadline:
+            client.send(index)
+
+    threads = [threading.Thread(target=user, args=(i,), daemon=True) for i in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+
+def run_open_loop(client: LoadClient, rate: float, duration: float, max_in_flight: int = 256):
+    """초당 rate건 포아송 도착 (서버 응답 속도와 무관하게 전송)"""
+    deadline = time.monotonic() + duration
+    with ThreadPoolExecutor(max_workers=max_in_flight) as executor:
+        index = 0
+        next_at = time.monotonic()
+        while True:
+            next_at += random.expovariate(rate)
+            if next_at >= deadline:
+                break
+            time.sleep(max(0.0, next_at - time.monotonic()))
+            executor.submit(client.send, index)
+            index += 1
+
+
+def _percentile(values: List[float], q: float) -> Optional[float]:
+    if not values:
+        return None
+    values = sorted(values)
+    index = min(len(values) - 1, int(round(q * (len(values) - 1))))
+    return round(values[index], 4)
+
+
+def summarize(results: List[Dict[str, Any]], elapsed: float) -> Dict[str, Any]:
+    """지연 시간 백분위수, 오류율, 처리량 요약"""
+    latencies = [r["latency"] for r in results if r["ok"]]
+    errors = {}
+    for r in results:
+        if not r["ok"]:
+            errors[r["error"]] = errors.get(r["error"], 0) + 1
+    total = len(results)
+    return {
+        "requests": total,
+        "succeeded": len(latencies),
+        "error_rate": round((total - len(latencies)) / total, 4) if total else 0.0,
+        "throughput": round(len(latencies) / elapsed, 3) if elapsed > 0 else 0.0,
+        "latency": {
+            "p50": _percentile(latencies, 0.50),
+            "p90": _percentile(latencies, 0.90),
+            "p95": _percentile(latencies, 0.95),
+            "p99": _percentile(latencies, 0.99),
+            "max": round(max(latencies), 4) if latencies else None,
+        },
+        "errors": errors,
+    }
+
+
+def run_step(args: argparse.Namespace, corpus: List[Dict[str, Any]],
+             rate: Optional[float] = None, concurrency: Optional[int] = None) -> Dict[str, Any]:
+    """부하 단계 하나 실행"""
+    client = LoadClient(args.url, corpus, args.timeout, args.clients)
+    start = time.monotonic()
+    if rate is not None:
+        run_open_loop(client, rate, args.duration)
+    else:
+        run_closed_loop(client, concurrency, args.duration)
+    summary = summarize(client.results, time.monotonic() - start)
+    summary["offered_rate"] = rate
+    summary["sent_rate"] = round(summary["requests"] / args.duration, 3)
+    summary["concurrency"] = concurrency
+    return summary
+
+
+def is_saturated(summary: Dict[str, Any], slo: float, max_error_rate: float) -> bool:
+    """처리량이 제공 부하를 못 따라가거나 p95/오류율 목표를 넘으면 포화"""
+    p95 = summary["latency"]["p95"]
+    if summary["error_rate"] > max_error_rate or p95 is None or p95 > slo:
+        return True
+    # 포아송 도착의 편차를 피하기 위해 명목 값이 아닌 실제 전송률과 비교
+    return summary["offered_rate"] is not None and summary["throughput"] < 0.9 * summary["sent_rate"]
+
+
+def print_summary(summary: Dict[str, Any]):
+    latency = summary["latency"]
+    load = f"rate={summary['offered_rate']}/s" if summary["offered_rate"] else f"concurrency={summary['concurrency']}"
+    print(f"{load:>18} | {summary['requests']:>5} req | {summary['throughput']:>7.2f}/s | "
+          f"err {summary['error_rate'] * 100:5.1f}% | "
+          f"p50 {latency['p50']}s p95 {latency['p95']}s p99 {latency['p99']}s", flush=True)
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="ai_server 부하 생성기")
+    parser.add_argument("corpus", help="음성 파일 디렉토리 또는 단일 파일")
+    parser.add_argument("--url", default="http://localhost:5000", help="서버 주소")
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument("--concurrency", type=int, help="동시 사용자 수 (closed loop)")
+    mode.add_argument("--rate", type=float, help="초당 요청 수 (open loop, 포아송 도착)")
+    mode.add_argument("--sweep", help="포화 지점 탐색용 초당 요청 수 목록 (예: 0.5,1,2,4)")
+    parser.add_argument("--duration", type=float, default=30.0, help="단계별 실행 시간 (초)")
+    parser.add_argument("--clients", type=int, default=16, help="요청을 나눌 가상 클라이언트 ID 수")
+    parser.add_argument("--timeout", type=float, default=60.0, help="요청 제한 시간 (초)")
+    parser.add_argument("--slo", type=float, default=5.0, help="포화 판단 p95 기준 (초)")
+    parser.add_argument("--max-error-rate", type=float, default=0.01, help="포화 판단 오류율 기준")
+    parser.add_argument("-o", "--output", help="결과 JSON 저장 경로")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    """메인 함수"""
+    args = parse_args(argv)
+    corpus = load_corpus(args.corpus)
+    print(f"🎯 {args.url} ← {len(corpus)}개 음성 파일")
+
+    summaries = []
+    if args.sweep:
+        saturation = None
+        for rate in [float(r) for r in args.sweep.split(",")]:
+            summary = run_step(args, corpus, rate=rate)
+            summaries.append(summary)
+            print_summary(summary)
+            if is_saturated(summary, args.slo, args.max_error_rate):
+                saturation = rate
+                break
+        if saturation is None:
+            print("✅ 포화 지점에 도달하지 않았습니다.")
+        else:
+            print(f"⚠️  포화 지점: {saturation}/s (p95 > {args.slo}s, 오류율 초과 또는 처리량 미달)")
+    elif args.rate:
+        summaries.append(run_step(args, corpus, rate=args.rate))
+        print_summary(summaries[-1])
+    else:
+        summaries.append(run_step(args, corpus, concurrency=args.concurrency or 1))
+        print_summary(summaries[-1])
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(summaries, f, indent=2, ensure_ascii=False)
+
+
+if __name__ == "__main__":
+    main()
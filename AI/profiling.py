@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+"""
+Request Profiling
+요청 단위 선택적 프로파일링 (관리자 토큰이 있는 헤더 또는 샘플링으로 활성화)
+
+- Python 샘플링 프로파일: flamegraph.pl / speedscope 호환 collapsed stack 파일
+- STT 구간 torch profiler: chrome trace + flamegraph용 stack 파일
+- 비활성 상태에서는 난수 비교 한 번과 context 변수 조회만 수행
+- 결과 디렉토리는 개수/보관 기간을 넘으면 오래된 것부터 삭제
+"""
+
+import os
+import sys
+import hmac
+import json
+import time
+import uuid
+import random
+import shutil
+import logging
+import threading
+import contextvars
+from collections import Counter
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+# 현재 요청에서 진행 중인 프로파일링 세션 (stage graph 작업자 스레드에도 요청 context로 전달됨)
+_session: contextvars.ContextVar = contextvars.ContextVar("profile_session", default=None)
+
+
+class StackSampler:
+    """등록된 스레드들의 호출 스택을 주기적으로 샘플링 (스택 앞에 스레드 이름표를 붙임)"""
+
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self.stacks = Counter()
+        self._threads: Dict[int, str] = {}  # 스레드 ID → 이름표 (예: 실행 중인 단계 이름)
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+
+    def add_thread(self, thread_id: int, label: str) -> Optional[str]:
+        """샘플링 대상 추가 (이미 있으면 이름표만 바꾸고 이전 이름표 반환)"""
+        with self._lock:
+            previous = self._threads.get(thread_id)
+            self._threads[thread_id] = label
+        return previous
+
+    def remove_thread(self, thread_id: int, restore: Optional[str] = None):
+        """샘플링 대상 제거 (restore가 있으면 바깥 구간의 이름표로 되돌림)"""
+        with self._lock:
+            if restore is None:
+                self._threads.pop(thread_id, None)
+            else:
+                self._threads[thread_id] = restore
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop_event.wait(self.interval):
+            with self._lock:
+                threads = list(self._threads.items())
+            if not threads:
+                continue
+            frames = sys._current_frames()
+            for thread_id, label in threads:
+                frame = frames.get(thread_id)
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                    frame = frame.f_back
+                if stack:
+                    stack.append(label)
+                    self.stacks[";".join(reversed(stack))] += 1
+
+    def write_collapsed(self, path: str):
+        """collapsed stack 형식으로 저장 (한 줄에 "호출;경로 샘플수")"""
+        with open(path, "w", encoding="utf-8") as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+
+class ProfileSession:
+    """요청 하나의 프로파일링 결과 수집"""
+
+    def __init__(self, request_id: str, output_dir: str, sample_interval: float,
+                 torch_stages: tuple):
+        self.request_id = request_id
+        self.output_dir = output_dir
+        self.torch_stages = torch_stages
+        self.stage_times: Dict[str, float] = {}
+        # 요청 스레드는 stage graph 결과를 기다리기만 하므로, 단계를 실행하는 작업자 스레드를 샘플링
+        self.sampler = StackSampler(sample_interval)
+        self.started_at = time.time()
+
+    @contextmanager
+    def stage(self, name: str):
+        """파이프라인 단계 구간 측정 (구간 동안 현재 스레드 샘플링, 지정된 단계는 torch profiler도 실행)"""
+        start = time.perf_counter()
+        thread_id = threading.get_ident()
+        outer = self.sampler.add_thread(thread_id, name)
+        torch_profile = self._start_torch_profiler() if name in self.torch_stages else None
+        try:
+            yield
+        finally:
+            if torch_profile is not None:
+                self._stop_torch_profiler(torch_profile, name)
+            self.sampler.remove_thread(thread_id, restore=outer)
+            self.stage_times[name] = round(time.perf_counter() - start, 4)
+
+    def _start_torch_profiler(self):
+        try:
+            import torch.profiler
+            profile = torch.profiler.profile(
+                activities=[torch.profiler.ProfilerActivity.CPU]
+                + ([torch.profiler.ProfilerActivity.CUDA] if torch.cuda.is_available() else []),
+                with_stack=True,
+                record_shapes=False
+            )
+            profile.__enter__()
+            return profile
+        except Exception as e:
+            logging.getLogger(__name__).warning(f"torch profiler unavailable: {e}")
+            return None
+
+    def _stop_torch_profiler(self, profile, name: str):
+        try:
+            profile.__exit__(None, None, None)
+            profile.export_chrome_trace(os.path.join(self.output_dir, f"{name}_torch_trace.json"))
+            profile.export_stacks(os.path.join(self.output_dir, f"{name}_torch.stacks"),
+                                  "self_cpu_time_total")
+        except Exception as e:
+            logging.getLogger(__name__).warning(f"Failed to export torch profile: {e}")
+
+    def write_summary(self):
+        with open(os.path.join(self.output_dir, "summary.json"), "w", encoding="utf-8") as f:
+            json.dump({
+                "request_id": self.request_id,
+                "started_at": self.started_at,
+                "total_time": round(time.time() - self.started_at, 4),
+                "stage_times": self.stage_times,
+                "python_samples": sum(self.sampler.stacks.values()),
+            }, f, indent=2)
+
+
+class RequestProfiler:
+    """요청 단위 프로파일러 (토큰을 가진 관리자가 강제하거나 sample_rate 확률로 활성화)"""
+
+    def __init__(self,
+                 output_dir: Optional[str] = None,
+                 sample_rate: Optional[float] = None,
+                 sample_interval: float = 0.005,
+                 torch_stages: tuple = ("stt",),
+                 admin_token: Optional[str] = None,
+                 max_profiles: Optional[int] = None,
+                 max_age: Optional[float] = None):
+        """
+        Args:
+            output_dir: 결과 저장 디렉토리 (기본값: PROFILE_DIR 환경 변수 또는 ./profiles)
+            sample_rate: 헤더 없이 프로파일링할 요청 비율 (기본값: PROFILE_SAMPLE_RATE 또는 0)
+            sample_interval: Python 스택 샘플링 간격 (초)
+            torch_stages: torch profiler를 실행할 단계 이름
+            admin_token: 요청별 강제 프로파일링에 필요한 토큰 (기본값: PROFILE_TOKEN, 없으면 강제 불가)
+            max_profiles: 보관할 최대 결과 수 (기본값: PROFILE_MAX_COUNT 또는 50)
+            max_age: 결과 보관 기간 (초, 기본값: PROFILE_MAX_AGE 또는 7일)
+        """
+        self.output_dir = output_dir or os.getenv('PROFILE_DIR', 'profiles')
+        self.sample_rate = sample_rate if sample_rate is not None else float(os.getenv('PROFILE_SAMPLE_RATE', '0'))
+        self.sample_interval = sample_interval
+        self.torch_stages = torch_stages
+        self.admin_token = admin_token or os.getenv('PROFILE_TOKEN') or None
+        self.max_profiles = max_profiles if max_profiles is not None else int(os.getenv('PROFILE_MAX_COUNT', '50'))
+        self.max_age = max_age if max_age is not None else float(os.getenv('PROFILE_MAX_AGE', str(7 * 86400)))
+        self._prune_lock = threading.Lock()
+        self._setup_logging()
+
+    def _setup_logging(self):
+        self.logger = logging.getLogger(__name__)
+
+    def authorize(self, token: Optional[str]) -> bool:
+        """요청별 강제 프로파일링 허용 여부 (토큰이 설정되지 않았으면 항상 거부)"""
+        if not self.admin_token or not token:
+            return False
+        return hmac.compare_digest(token.encode("utf-8"), self.admin_token.encode("utf-8"))
+
+    def should_profile(self, force: bool = False) -> bool:
+        return force or (self.sample_rate > 0 and random.random() < self.sample_rate)
+
+    @contextmanager
+    def session(self, force: bool = False, request_id: Optional[str] = None):
+        """
+        프로파일링 세션 (비활성시 None 반환)
+
+        세션 동안 현재 context에서 profile_stage()로 감싼 단계가 측정됨
+        (Python 스택 샘플링은 단계를 실행 중인 스레드 대상 - stage graph 작업자 포함)
+        """
+        if not self.should_profile(force):
+            yield None
+            return
+
+        request_id = request_id or uuid.uuid4().hex[:12]
+        output_dir = os.path.join(self.output_dir, f"{time.strftime('%Y%m%d-%H%M%S')}_{request_id}")
+        os.makedirs(output_dir, exist_ok=True)
+
+        session = ProfileSession(request_id, output_dir, self.sample_interval, self.torch_stages)
+        reset = _session.set(session)
+        session.sampler.start()
+        try:
+            yield session
+        finally:
+            session.sampler.stop()
+            _session.reset(reset)
+            session.sampler.write_collapsed(os.path.join(output_dir, "python.collapsed"))
+            session.write_summary()
+            self.logger.info(f"Profile written to {output_dir}")
+            self._prune()
+
+    def _prune(self):
+        """보관 기간이 지났거나 최대 개수를 넘는 오래된 결과 삭제"""
+        with self._prune_lock:
+            try:
+                entries = [os.path.join(self.output_dir, name) for name in os.listdir(self.output_dir)]
+            except OSError:
+                return
+            profiles = sorted((path for path in entries if os.path.isdir(path)), key=os.path.getmtime)
+            cutoff = time.time() - self.max_age
+            expired = [path for path in profiles if os.path.getmtime(path) < cutoff]
+            kept = [path for path in profiles if path not in expired]
+            if self.max_profiles > 0 and len(kept) > self.max_profiles:
+                expired += kept[:len(kept) - self.max_profiles]
+            for path in expired:
+                shutil.rmtree(path, ignore_errors=True)
+
+
+@contextmanager
+def profile_stage(name: str):
+    """현재 context에 활성 세션이 있을 때만 단계 측정"""
+    session = _session.get()
+    if session is None:
+        yield
+        return
+    with session.stage(name):
+        yield
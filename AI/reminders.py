@@ -0,0 +1,445 @@
+#!/usr/bin/env python3
+"""
+Reminder Engine
+SQLite에 영속화되는 일정 알림 엔진 (최소 힙 + 시간 창 적재 + 묶음 기상)
+
+- 모든 알림은 SQLite에 저장되고, 메모리에는 곧 울릴 시간 창(horizon)의 알림만 힙으로 유지
+  → 대기 중인 알림이 수백만 개여도 메모리 사용량은 max_in_memory로 제한
+- 타이머 스레드 하나가 resolution 단위로 묶어서 깨어나 그 사이에 도래한 알림을 한 번에 처리
+- 재예약/취소는 세대(generation) 번호로 힙의 이전 항목을 무효화 (힙 재구성 없음)
+- 재시작시 놓친 알림은 즉시 발송 (late 표시)
+- 전달: 사용자별 롱폴링(poll/ack) 또는 웹훅 푸시
+"""
+
+import json
+import time
+import heapq
+import sqlite3
+import logging
+import threading
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime, tzinfo
+from zoneinfo import ZoneInfo
+from typing import Dict, Any, Optional, List, Tuple
+
+from task_store import DEFAULT_TIMEZONE
+
+# 알림 상태
+PENDING = "pending"
+FIRED = "fired"
+ACKED = "acked"
+CANCELLED = "cancelled"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS reminders (
+    user_id TEXT NOT NULL,
+    task_id TEXT NOT NULL,
+    title TEXT NOT NULL,
+    due_at REAL NOT NULL,
+    state TEXT NOT NULL,
+    generation INTEGER NOT NULL,
+    fired_at REAL,  -- 발송 시각 (취소된 알림은 취소 시각, 보관 기간 기준)
+    late INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (user_id, task_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_reminders_pending ON reminders (due_at, user_id, task_id) WHERE state = 'pending';
+CREATE INDEX IF NOT EXISTS idx_reminders_fired ON reminders (user_id, fired_at) WHERE state = 'fired';
+CREATE INDEX IF NOT EXISTS idx_reminders_done ON reminders (fired_at) WHERE state != 'pending';
+"""
+
+# 힙 항목/시간 창 경계의 정렬 키: (due_at, user_id, task_id)
+_Key = Tuple[float, str, str]
+
+
+def task_due_at(task: Dict[str, Any], tz: tzinfo) -> Optional[float]:
+    """앱 Task의 알림 시각 (epoch, 완료된 일정은 None)"""
+    if task.get("isCompleted") or not task.get("date"):
+        return None
+    # TaskStore는 기준 시간대의 지역 시각으로 저장하므로 서버 시간대가 아닌 tz로 해석
+    return datetime.fromisoformat(task["date"]).replace(tzinfo=tz).timestamp()
+
+
+class ReminderEngine:
+    """일정 알림 스케줄러"""
+
+    def __init__(self,
+                 db_path: str = "reminders.db",
+                 resolution: float = 0.5,
+                 horizon: float = 600.0,
+                 max_in_memory: int = 100000,
+                 webhook_url: Optional[str] = None,
+                 retention: float = 7 * 86400,
+                 max_pending_webhooks: int = 100,
+                 timezone: str = DEFAULT_TIMEZONE):
+        """
+        Args:
+            db_path: SQLite 데이터베이스 경로
+            resolution: 기상 간격 단위 (초, 알림 발송 지연의 상한)
+            horizon: 메모리에 적재할 시간 창 길이 (초)
+            max_in_memory: 메모리에 둘 최대 알림 수 (창 안의 알림이 더 많으면 창을 줄임)
+            webhook_url: 발송된 알림을 묶어서 POST할 URL (없으면 폴링으로만 전달)
+            retention: 발송/확인된 알림 보관 시간 (초)
+            max_pending_webhooks: 전송 대기 웹훅 묶음 상한 (넘으면 버림, 폴링으로는 계속 받을 수 있음)
+            timezone: 일정 시각의 기준 시간대 (TaskStore와 같은 값)
+        """
+        self.db_path = db_path
+        self.tz = ZoneInfo(timezone)
+        self.webhook_url = webhook_url
+        self.config = {
+            "resolution": resolution,
+            "horizon": horizon,
+            "max_in_memory": max_in_memory,
+            "retention": retention,
+            "max_pending_webhooks": max_pending_webhooks,
+            "timezone": timezone,
+        }
+        self._condition = threading.Condition()
+        self._heap: List[Tuple[float, str, str, int]] = []
+        self._live: Dict[Tuple[str, str], int] = {}  # (user_id, task_id) → 메모리의 유효한 세대
+        self._loaded_until: _Key = (0.0, "", "")  # 이 키보다 앞선 대기 알림은 모두 메모리에 있음
+        self._fired_versions: Dict[str, int] = {}  # 롱폴링 대기자 깨우기용 사용자별 발송 횟수
+        self._stop_event = threading.Event()
+        self._threads: List[threading.Thread] = []
+        self._webhook_executor = None
+        self._webhook_pending = 0
+        self.metrics = {"scheduled": 0, "cancelled": 0, "fired": 0, "late": 0,
+                        "wakeups": 0, "total_lag": 0.0, "max_lag": 0.0, "webhooks_dropped": 0}
+
+        self._setup_logging()
+        self._initialize_db()
+
+    def _setup_logging(self):
+        self.logger = logging.getLogger(__name__)
+
+    @contextmanager
+    def _connect(self):
+        """autocommit 연결 (사용 후 닫음)"""
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def _initialize_db(self):
+        """테이블 생성 및 WAL 모드 설정"""
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+
+    def start(self):
+        """저장된 알림으로 시간 창을 채우고 타이머/정리 스레드 시작 (놓친 알림은 첫 기상에 발송)"""
+        self._stop_event.clear()
+        with self._condition:
+            self._heap, self._live = [], {}
+            self._loaded_until = (0.0, "", "")
+            self._refill(time.time())
+        # 웹훅 재시도가 타이머 스레드를 붙잡지 않도록 전송은 별도 스레드에서 (순서 유지를 위해 1개)
+        self._webhook_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="reminder-webhook")
+
+        timer = threading.Thread(target=self._timer_loop, name="reminder-timer", daemon=True)
+        timer.start()
+        janitor = threading.Thread(target=self._janitor_loop, name="reminder-janitor", daemon=True)
+        janitor.start()
+        self._threads = [timer, janitor]
+        self.logger.info(f"Reminder engine started ({len(self._live)} reminders in memory)")
+
+    def stop(self, timeout: float = 5.0):
+        self._stop_event.set()
+        with self._condition:
+            self._condition.notify_all()
+        for thread in self._threads:
+            thread.join(timeout=timeout)
+        self._threads = []
+        if self._webhook_executor is not None:
+            self._webhook_executor.shutdown(wait=False)
+            self._webhook_executor = None
+
+    def schedule(self, user_id: str, task_id: str, due_at: float, title: str = "") -> int:
+        """
+        알림 예약/재예약 (같은 일정의 이전 예약은 대체)
+
+        Returns:
+            int: 예약 세대 번호
+        """
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = conn.execute(
+                    "SELECT generation FROM reminders WHERE user_id = ? AND task_id = ?", (user_id, task_id)
+                ).fetchone()
+                generation = (row["generation"] if row is not None else 0) + 1
+                conn.execute(
+                    "INSERT INTO reminders (user_id, task_id, title, due_at, state, generation) "
+                    "VALUES (?, ?, ?, ?, ?, ?) "
+                    "ON CONFLICT (user_id, task_id) DO UPDATE SET title = excluded.title, "
+                    "due_at = excluded.due_at, state = excluded.state, generation = excluded.generation, "
+                    "fired_at = NULL, late = 0",
+                    (user_id, task_id, title, due_at, PENDING, generation)
+                )
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+
+        with self._condition:
+            self.metrics["scheduled"] += 1
+            self._live.pop((user_id, task_id), None)
+            if (due_at, user_id, task_id) < self._loaded_until:
+                # 이미 적재된 시간 창 안 - 힙에 추가 (이전 세대 항목은 꺼낼 때 무시됨)
+                self._push(due_at, user_id, task_id, generation)
+                if self._heap[0][0] == due_at:
+                    # 가장 이른 알림이 바뀌었으면 타이머를 깨워 기상 시각 재계산
+                    self._condition.notify_all()
+        return generation
+
+    def cancel(self, user_id: str, task_id: str) -> bool:
+        """알림 취소 (대기 중이 아니면 False)"""
+        with self._connect() as conn:
+            # 행을 지우지 않고 상태만 바꿔 세대 번호를 이어 감 (재예약시 힙에 남은 이전 항목과 구분)
+            cursor = conn.execute(
+                "UPDATE reminders SET state = ?, fired_at = ? WHERE user_id = ? AND task_id = ? AND state = ?",
+                (CANCELLED, time.time(), user_id, task_id, PENDING)
+            )
+        with self._condition:
+            # 힙 항목은 남겨 두고 유효 세대만 지움 (꺼낼 때 무시)
+            self._live.pop((user_id, task_id), None)
+            if cursor.rowcount:
+                self.metrics["cancelled"] += 1
+        return cursor.rowcount > 0
+
+    def on_task_change(self, user_id: str, op: str, task: Dict[str, Any]):
+        """TaskStore 변경 리스너 (일정 시각 변경 → 재예약, 완료/삭제 → 취소)"""
+        due_at = task_due_at(task, self.tz) if op != "delete" else None
+        # 앱과 같이 이미 지난 일정에는 알림을 예약하지 않음
+        if due_at is None or due_at <= time.time():
+            self.cancel(user_id, task["id"])
+        else:
+            self.schedule(user_id, task["id"], due_at, task.get("title", ""))
+
+    def _push(self, due_at: float, user_id: str, task_id: str, generation: int):
+        """힙에 추가 (condition 잠금 안에서 호출)"""
+        heapq.heappush(self._heap, (due_at, user_id, task_id, generation))
+        self._live[(user_id, task_id)] = generation
+        if len(self._heap) > 2 * max(len(self._live), self.config["max_in_memory"] // 2):
+            # 무효화된 항목이 절반을 넘으면 정리
+            self._heap = [e for e in self._heap if self._live.get((e[1], e[2])) == e[3]]
+            heapq.heapify(self._heap)
+        if len(self._live) > self.config["max_in_memory"]:
+            self._shrink()
+
+    def _shrink(self):
+        """메모리 한도를 넘으면 가장 늦은 알림부터 내려놓고 시간 창을 앞당김 (DB에는 남아 있음)"""
+        entries = sorted(e for e in self._heap if self._live.get((e[1], e[2])) == e[3])
+        keep = entries[:self.config["max_in_memory"] * 3 // 4]
+        dropped = entries[len(keep)]
+        self._heap = keep
+        heapq.heapify(self._heap)
+        self._live = {(e[1], e[2]): e[3] for e in keep}
+        self._loaded_until = (dropped[0], dropped[1], dropped[2])
+
+    def _refill(self, now: float):
+        """
+        시간 창을 now + horizon까지 확장 (condition 잠금 안에서 호출)
+
+        (due_at, user_id, task_id) 순서의 키셋 조회로 이미 적재한 알림 다음부터 읽음
+        """
+        target = now + self.config["horizon"]
+        if self._loaded_until[0] >= now + self.config["horizon"] / 2:
+            # 창이 아직 절반 이상 남음 (조회를 창 길이의 절반마다 한 번으로 묶음)
+            return
+        room = self.config["max_in_memory"] - len(self._live)
+        if room <= 0:
+            return
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT user_id, task_id, due_at, generation FROM reminders "
+                "WHERE state = ? AND (due_at, user_id, task_id) >= (?, ?, ?) AND due_at < ? "
+                "ORDER BY due_at, user_id, task_id LIMIT ?",
+                (PENDING, *self._loaded_until, target, room + 1)
+            ).fetchall()
+
+        for row in rows[:room]:
+            heapq.heappush(self._heap, (row["due_at"], row["user_id"], row["task_id"], row["generation"]))
+            self._live[(row["user_id"], row["task_id"])] = row["generation"]
+        if len(rows) > room:
+            # 창이 가득 참 - 다음 적재는 읽지 못한 첫 알림부터
+            last = rows[room]
+            self._loaded_until = (last["due_at"], last["user_id"], last["task_id"])
+        else:
+            self._loaded_until = (target, "", "")
+
+    def _timer_loop(self):
+        """resolution 단위로 묶어서 깨어나 도래한 알림 발송"""
+        resolution = self.config["resolution"]
+        while not self._stop_event.is_set():
+            with self._condition:
+                now = time.time()
+                self._refill(now)
+                due = []
+                while self._heap and self._heap[0][0] <= now:
+                    due_at, user_id, task_id, generation = heapq.heappop(self._heap)
+                    if self._live.get((user_id, task_id)) == generation:
+                        del self._live[(user_id, task_id)]
+                        due.append((user_id, task_id, generation, due_at))
+
+                if not due:
+                    # 다음 알림 시각을 resolution 격자에 맞춰 올림 (근접한 알림을 한 번의 기상으로 처리)
+                    next_due = self._heap[0][0] if self._heap else self._loaded_until[0]
+                    wake_at = min(next_due, now + self.config["horizon"] / 2)
+                    wake_at = (int(wake_at / resolution) + 1) * resolution
+                    self._condition.wait(timeout=max(0.0, wake_at - now))
+                    continue
+                self.metrics["wakeups"] += 1
+
+            try:
+                self._fire(due, now)
+            except sqlite3.Error as e:
+                self.logger.error(f"Failed to fire reminders: {e}")
+
+    def _fire(self, due: List[Tuple[str, str, int, float]], now: float):
+        """도래한 알림을 한 트랜잭션으로 발송 처리 후 전달"""
+        late_threshold = max(60.0, self.config["resolution"] * 4)
+        fired = []
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                for user_id, task_id, generation, due_at in due:
+                    late = now - due_at > late_threshold
+                    # 세대가 같을 때만 (꺼낸 뒤 재예약/취소된 알림은 건너뜀)
+                    cursor = conn.execute(
+                        "UPDATE reminders SET state = ?, fired_at = ?, late = ? "
+                        "WHERE user_id = ? AND task_id = ? AND generation = ? AND state = ?",
+                        (FIRED, now, int(late), user_id, task_id, generation, PENDING)
+                    )
+                    if cursor.rowcount:
+                        fired.append((user_id, task_id, due_at, late))
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+
+        with self._condition:
+            for user_id, _, due_at, late in fired:
+                lag = max(0.0, now - due_at)
+                self.metrics["fired"] += 1
+                if late:
+                    self.metrics["late"] += 1
+                else:
+                    self.metrics["total_lag"] += lag
+                    self.metrics["max_lag"] = max(self.metrics["max_lag"], lag)
+                self._fired_versions[user_id] = self._fired_versions.get(user_id, 0) + 1
+            self._condition.notify_all()
+
+        if fired and self.webhook_url:
+            self._queue_webhook([{"user_id": u, "task_id": t, "due_at": d, "late": l} for u, t, d, l in fired])
+
+    def _queue_webhook(self, reminders: List[Dict[str, Any]]):
+        """웹훅 전송 스레드에 묶음 전달 (웹훅이 계속 실패해 밀리면 버림)"""
+        with self._condition:
+            if self._webhook_executor is None or self._webhook_pending >= self.config["max_pending_webhooks"]:
+                self.metrics["webhooks_dropped"] += 1
+                self.logger.warning(f"Reminder webhook backlog full, dropped {len(reminders)} reminders")
+                return
+            self._webhook_pending += 1
+            self._webhook_executor.submit(self._push_webhook, reminders)
+
+    def _push_webhook(self, reminders: List[Dict[str, Any]], retries: int = 3):
+        """발송된 알림을 묶어서 POST (웹훅 스레드에서 실행, 실패시 지수 백오프 재시도, 폴링으로도 받을 수 있음)"""
+        body = json.dumps({"reminders": reminders}).encode("utf-8")
+        try:
+            for attempt in range(retries):
+                try:
+                    request = urllib.request.Request(
+                        self.webhook_url, data=body, headers={"Content-Type": "application/json"}, method="POST"
+                    )
+                    with urllib.request.urlopen(request, timeout=10):
+                        return
+                except Exception as e:
+                    self.logger.warning(f"Reminder webhook failed (attempt {attempt + 1}): {e}")
+                if attempt + 1 < retries and self._stop_event.wait(timeout=2 ** attempt):
+                    return
+        finally:
+            with self._condition:
+                self._webhook_pending -= 1
+
+    def poll(self, user_id: str, wait: float = 0.0, limit: int = 100) -> List[Dict[str, Any]]:
+        """
+        발송되었지만 확인(ack)되지 않은 알림 조회
+
+        Args:
+            wait: 알림이 없으면 새 알림이 발송될 때까지 최대 대기 시간 (초, 롱폴링)
+        """
+        deadline = time.monotonic() + wait
+        while True:
+            with self._condition:
+                version = self._fired_versions.get(user_id, 0)
+            reminders = self._fired_for(user_id, limit)
+            remaining = deadline - time.monotonic()
+            if reminders or remaining <= 0:
+                return reminders
+            with self._condition:
+                self._condition.wait_for(
+                    lambda: self._fired_versions.get(user_id, 0) != version or self._stop_event.is_set(),
+                    timeout=remaining
+                )
+
+    def _fired_for(self, user_id: str, limit: int) -> List[Dict[str, Any]]:
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT task_id, title, due_at, fired_at, late FROM reminders "
+                "WHERE user_id = ? AND state = ? ORDER BY fired_at LIMIT ?",
+                (user_id, FIRED, limit)
+            ).fetchall()
+        return [{"task_id": r["task_id"], "title": r["title"], "due_at": r["due_at"],
+                 "fired_at": r["fired_at"], "late": bool(r["late"])} for r in rows]
+
+    def ack(self, user_id: str, task_ids: List[str]) -> int:
+        """전달된 알림 확인 처리 (다음 폴링에서 제외)"""
+        if not task_ids:
+            return 0
+        placeholders = ",".join("?" * len(task_ids))
+        with self._connect() as conn:
+            cursor = conn.execute(
+                f"UPDATE reminders SET state = ? WHERE user_id = ? AND state = ? AND task_id IN ({placeholders})",
+                (ACKED, user_id, FIRED, *task_ids)
+            )
+        return cursor.rowcount
+
+    def _janitor_loop(self):
+        """보관 시간이 지난 발송/확인 알림 정리"""
+        while not self._stop_event.wait(timeout=3600):
+            try:
+                self.purge_expired()
+            except sqlite3.Error as e:
+                self.logger.error(f"Failed to purge reminders: {e}")
+
+    def purge_expired(self) -> int:
+        cutoff = time.time() - self.config["retention"]
+        with self._connect() as conn:
+            cursor = conn.execute(
+                "DELETE FROM reminders WHERE state != ? AND fired_at < ?", (PENDING, cutoff)
+            )
+        return cursor.rowcount
+
+    def get_stats(self) -> Dict[str, Any]:
+        """엔진 상태 (대기 중인 전체 알림 수 대신 메모리 창 정보만 - O(1))"""
+        with self._condition:
+            fired_on_time = self.metrics["fired"] - self.metrics["late"]
+            return {
+                "in_memory": len(self._live),
+                "heap_entries": len(self._heap),
+                "loaded_until": self._loaded_until[0],
+                "next_due": self._heap[0][0] if self._heap else None,
+                "scheduled": self.metrics["scheduled"],
+                "cancelled": self.metrics["cancelled"],
+                "fired": self.metrics["fired"],
+                "late": self.metrics["late"],
+                "wakeups": self.metrics["wakeups"],
+                "avg_lag": round(self.metrics["total_lag"] / fired_on_time, 4) if fired_on_time else 0.0,
+                "max_lag": round(self.metrics["max_lag"], 4),
+                "webhooks_pending": self._webhook_pending,
+                "webhooks_dropped": self.metrics["webhooks_dropped"],
+            }
@@ -0,0 +1,796 @@
+#!/usr/bin/env python3
+"""
+Session Router
+여러 AI 서버 노드 앞에서 세션 단위로 요청을 나누는 경량 프론트 라우터
+
+- consistent hashing (가상 노드): 세션/사용자/클라이언트 키를 노드에 배정, 노드가 추가/제거되어도
+  약 1/N의 키만 이동
+- 세션 고정: 대화 기록(ConversationMemory)이 있는 노드로 같은 세션을 계속 보냄. 노드 구성이 바뀌면
+  진행 중인 세션은 그대로 두고, 쉬고 있던 세션부터 새 배정을 따름 (점진적 재분배)
+- 상태 확인: 주기적인 /health + 연결 실패시 즉시 제외, 복구되면 다시 배정
+- drain: 새 세션 배정을 멈추고 진행 중인 요청/대화가 끝나면(또는 제한 시간 후) 제거 가능 상태로
+- 작업(/jobs): 접수한 노드를 기억하고, 모르면 노드들에 차례로 조회
+
+사용 예:
+    python router.py --backends http://127.0.0.1:5001,http://127.0.0.1:5002
+    LLM_MODEL=stub TTS_MODEL=stub python router.py --spawn 3 --base-port 5001
+    curl -X POST localhost:8000/router/nodes/127.0.0.1:5002/drain
+
+일정/알림 저장소(/users/...)는 노드별 SQLite이므로 사용자 요청은 ring의 소유 노드로만 보냄
+(다른 노드로 넘기면 사용자 데이터와 동기화 cursor가 노드별로 갈라짐). 소유 노드가 장애/drained
+상태면 503으로 재시도를 요청하고, 노드 구성 변경으로 소유 노드가 바뀐 사용자의 데이터는 옮기지 않음
+"""
+
+import os
+import sys
+import json
+import time
+import math
+import bisect
+import hashlib
+import argparse
+import logging
+import threading
+import subprocess
+import http.client
+from collections import OrderedDict
+from urllib.parse import urlsplit
+from typing import Dict, Any, Optional, List, Iterator
+
+from flask import Flask, request, jsonify, Response
+
+from Models.LogConfig import configure_logging
+
+# hop-by-hop 헤더와 프록시가 다시 계산하는 헤더 (노드로/노드에서 그대로 전달하지 않음)
+_HOP_HEADERS = {"connection", "keep-alive", "proxy-authenticate", "proxy-authorization", "te",
+                "trailers", "transfer-encoding", "upgrade", "host"}
+
+# 노드 상태
+ACTIVE = "active"      # 새 세션 배정
+DRAINING = "draining"  # 진행 중인 세션만 처리
+DRAINED = "drained"    # 요청을 보내지 않음 (제거 가능)
+
+# 일정/알림 저장소 요청의 키 접두사 (부하 분산 대상에서 제외)
+USER_KEY_PREFIX = "user:"
+
+
+class NoBackendAvailable(Exception):
+    """요청을 보낼 수 있는 노드가 없음"""
+    pass
+
+
+class HashRing:
+    """가상 노드를 둔 consistent hash ring"""
+
+    def __init__(self, vnodes: int = 100):
+        self.vnodes = vnodes
+        self._points: List[tuple] = []  # (해시, 노드 이름) 정렬 목록
+        self._hashes: List[int] = []
+
+    @staticmethod
+    def _hash(key: str) -> int:
+        return int.from_bytes(hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest(), "big")
+
+    def add(self, node: str):
+        self._points.extend((self._hash(f"{node}#{i}"), node) for i in range(self.vnodes))
+        self._points.sort()
+        self._hashes = [h for h, _ in self._points]
+
+    def remove(self, node: str):
+        self._points = [point for point in self._points if point[1] != node]
+        self._hashes = [h for h, _ in self._points]
+
+    def candidates(self, key: str) -> Iterator[str]:
+        """키 위치에서 시계 방향으로 만나는 노드 (중복 없이, 선호 순서)"""
+        if not self._points:
+            return
+        start = bisect.bisect(self._hashes, self._hash(key))
+        seen = set()
+        for i in range(len(self._points)):
+            node = self._points[(start + i) % len(self._points)][1]
+            if node not in seen:
+                seen.add(node)
+                yield node
+
+
+class BackendNode:
+    """AI 서버 노드 하나"""
+
+    def __init__(self, name: str, url: str):
+        parts = urlsplit(url if "//" in url else f"http://{url}")
+        self.name = name
+        self.url = f"http://{parts.hostname}:{parts.port or 80}"
+        self.host = parts.hostname
+        self.port = parts.port or 80
+        self.state = ACTIVE
+        # 첫 상태 확인 전에는 요청을 보내지 않음
+        self.healthy = False
+        self.failures = 0
+        self.in_flight = 0
+        self.drain_deadline: Optional[float] = None
+        self.last_error: Optional[str] = None
+        self.metrics = {"requests": 0, "errors": 0, "failovers": 0}
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "url": self.url,
+            "state": self.state,
+            "healthy": self.healthy,
+            "in_flight": self.in_flight,
+            "last_error": self.last_error,
+            **self.metrics,
+        }
+
+
+class SessionRouter:
+    """
+    키 → 노드 배정 (consistent hashing + 세션 고정 + 상태 확인 + drain)
+
+    배정 순서:
+    1. 고정된 세션이 있고 그 노드가 요청을 받을 수 있으면 그대로 (drain 중인 노드는 대화가 이어지는 동안만)
+    2. ring에서 키 위치 이후의 정상/활성 노드 중, 진행 중인 요청이 평균 × load_factor 미만인 첫 노드
+       (특정 노드에 긴 요청이 몰리면 다음 노드로 - bounded-load consistent hashing)
+       사용자 키는 부하/장애와 관계없이 ring의 첫 노드 (데이터가 있는 노드, 받을 수 없으면 배정 실패)
+    """
+
+    def __init__(self,
+                 vnodes: int = 100,
+                 session_ttl: float = 600.0,
+                 drain_session_idle: float = 30.0,
+                 drain_timeout: float = 300.0,
+                 health_interval: float = 2.0,
+                 failure_threshold: int = 2,
+                 load_factor: float = 1.25,
+                 connect_timeout: float = 2.0,
+                 read_timeout: float = 130.0,
+                 max_tracked_jobs: int = 100000):
+        """
+        Args:
+            vnodes: 노드당 가상 노드 수 (많을수록 키 분포가 고름)
+            session_ttl: 이 시간(초) 동안 요청이 없던 세션은 고정을 풀고 ring 배정을 따름
+            drain_session_idle: drain 중인 노드의 세션은 이 시간(초) 이상 쉬면 다른 노드로 이동
+            drain_timeout: drain 시작 후 이 시간(초)이 지나면 진행 중인 세션이 있어도 drained
+            health_interval: /health 확인 간격 (초)
+            failure_threshold: 연속 상태 확인 실패 횟수 (이상이면 배정 제외)
+            load_factor: 새 배정시 노드별 진행 중 요청 수 상한 (평균 대비 배율)
+            connect_timeout: 노드 연결 제한 시간 (초, 넘으면 다음 노드로)
+            read_timeout: 노드 응답 제한 시간 (초, 작업 롱폴링보다 길게)
+            max_tracked_jobs: 접수 노드를 기억할 최대 작업 수
+        """
+        self.config = {
+            "session_ttl": session_ttl,
+            "drain_session_idle": drain_session_idle,
+            "drain_timeout": drain_timeout,
+            "health_interval": health_interval,
+            "failure_threshold": failure_threshold,
+            "load_factor": load_factor,
+            "connect_timeout": connect_timeout,
+            "read_timeout": read_timeout,
+            "max_tracked_jobs": max_tracked_jobs,
+        }
+        self.ring = HashRing(vnodes)
+        self.nodes: Dict[str, BackendNode] = {}
+        # 키 → [노드 이름, 마지막 요청 시각] (오래된 것부터)
+        self._sessions: "OrderedDict[str, list]" = OrderedDict()
+        self._jobs: "OrderedDict[str, str]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.metrics = {"routed": 0, "sticky": 0, "assigned": 0, "reassigned": 0,
+                        "spilled": 0, "unavailable": 0}
+        self._setup_logging()
+
+    def _setup_logging(self):
+        self.logger = logging.getLogger(__name__)
+
+    # ---- 노드 구성 ----
+
+    def add_node(self, url: str, name: Optional[str] = None) -> BackendNode:
+        """노드 추가 (상태 확인을 통과하면 배정 시작, 쉬고 있던 세션부터 새 노드로 이동)"""
+        node = BackendNode(name or urlsplit(url if "//" in url else f"http://{url}").netloc, url)
+        with self._lock:
+            if node.name in self.nodes:
+                raise ValueError(f"Node already exists: {node.name}")
+            self.nodes[node.name] = node
+            self.ring.add(node.name)
+        self.logger.info(f"Node added: {node.name} ({node.url})")
+        if self._thread is not None:
+            self._check_node(node)
+        return node
+
+    def remove_node(self, name: str, force: bool = False):
+        """
+        노드 제거 (drain이 끝난 노드만, force면 즉시 - 진행 중인 요청은 그대로 완료됨)
+
+        Raises:
+            KeyError: 없는 노드
+            ValueError: drain이 끝나지 않은 노드
+        """
+        with self._lock:
+            node = self.nodes[name]
+            if node.state != DRAINED and not force:
+                raise ValueError(f"Node {name} is {node.state}; drain it first or use force")
+            del self.nodes[name]
+            self.ring.remove(name)
+            self._forget_node(name)
+        self.logger.info(f"Node removed: {name}")
+
+    def drain(self, name: str, timeout: Optional[float] = None) -> BackendNode:
+        """새 세션 배정 중지 (진행 중인 요청/대화가 끝나면 drained)"""
+        with self._lock:
+            node = self.nodes[name]
+            if node.state == ACTIVE:
+                node.state = DRAINING
+                node.drain_deadline = time.monotonic() + (timeout if timeout is not None
+                                                          else self.config["drain_timeout"])
+        self.logger.info(f"Draining node: {name}")
+        self._update_drain()
+        return node
+
+    def activate(self, name: str) -> BackendNode:
+        """drain 취소 / drained 노드 복귀"""
+        with self._lock:
+            node = self.nodes[name]
+            node.state = ACTIVE
+            node.drain_deadline = None
+        self.logger.info(f"Node activated: {name}")
+        return node
+
+    def _forget_node(self, name: str):
+        """노드에 고정된 세션/작업 정리 (잠금 안에서 호출)"""
+        for key in [key for key, entry in self._sessions.items() if entry[0] == name]:
+            del self._sessions[key]
+        for job_id in [job_id for job_id, owner in self._jobs.items() if owner == name]:
+            del self._jobs[job_id]
+
+    # ---- 배정 ----
+
+    def _can_continue(self, node: Optional[BackendNode], idle: float) -> bool:
+        """고정된 세션을 그 노드로 계속 보낼 수 있는지"""
+        if node is None or not node.healthy:
+            return False
+        if node.state == DRAINING:
+            return idle < self.config["drain_session_idle"]
+        return node.state == ACTIVE
+
+    def select(self, key: Optional[str], exclude: Optional[set] = None) -> BackendNode:
+        """
+        요청을 보낼 노드 선택 (반환된 노드는 release()로 반납)
+
+        Args:
+            key: 고정/해싱 키 (None이면 진행 중인 요청이 가장 적은 노드)
+            exclude: 이미 연결에 실패한 노드 이름
+
+        Raises:
+            NoBackendAvailable: 보낼 수 있는 노드가 없음
+        """
+        exclude = exclude or set()
+        now = time.monotonic()
+        with self._lock:
+            eligible = [node for node in self.nodes.values()
+                        if node.healthy and node.state == ACTIVE and node.name not in exclude]
+            node = None
+            if key is not None and key.startswith(USER_KEY_PREFIX):
+                node = self._owner(key, exclude)
+            elif key is None:
+                node = min(eligible, key=lambda n: n.in_flight, default=None)
+            else:
+                entry = self._sessions.get(key)
+                if entry is not None and entry[0] not in exclude and \
+                        self._can_continue(self.nodes.get(entry[0]), now - entry[1]):
+                    node = self.nodes[entry[0]]
+                    self.metrics["sticky"] += 1
+                else:
+                    node = self._assign(key, eligible)
+                    if node is not None:
+                        self.metrics["assigned"] += 1
+                        if entry is not None and entry[0] != node.name:
+                            self.metrics["reassigned"] += 1
+                if node is not None:
+                    self._sessions[key] = [node.name, now]
+                    self._sessions.move_to_end(key)
+                self._expire_sessions(now)
+
+            if node is None:
+                self.metrics["unavailable"] += 1
+                if key is not None and key.startswith(USER_KEY_PREFIX):
+                    raise NoBackendAvailable("Node holding this user's data is unavailable")
+                raise NoBackendAvailable("No healthy backend node available")
+            node.in_flight += 1
+            node.metrics["requests"] += 1
+            self.metrics["routed"] += 1
+            return node
+
+    def _assign(self, key: str, eligible: List[BackendNode]) -> Optional[BackendNode]:
+        """ring 순서대로 부하 상한 아래의 첫 노드 (모두 넘으면 ring의 첫 노드)"""
+        if not eligible:
+            return None
+        names = {node.name for node in eligible}
+        load = sum(node.in_flight for node in eligible) + 1
+        cap = math.ceil(load / len(eligible) * self.config["load_factor"])
+        first = None
+        for name in self.ring.candidates(key):
+            if name not in names:
+                continue
+            node = self.nodes[name]
+            if node.in_flight < cap:
+                if first is not None:
+                    self.metrics["spilled"] += 1
+                return node
+            first = first or node
+        return first
+
+    def _owner(self, key: str, exclude: set) -> Optional[BackendNode]:
+        """사용자 키의 소유 노드 (ring의 첫 노드, 요청을 받을 수 없으면 다른 노드로 넘기지 않고 None)"""
+        name = next(self.ring.candidates(key), None)
+        node = self.nodes.get(name) if name is not None else None
+        if node is None or not node.healthy or node.state == DRAINED or name in exclude:
+            return None
+        return node
+
+    def _expire_sessions(self, now: float):
+        """session_ttl 동안 요청이 없던 세션의 고정 해제 (잠금 안에서 호출)"""
+        ttl = self.config["session_ttl"]
+        while self._sessions:
+            key, entry = next(iter(self._sessions.items()))
+            if now - entry[1] < ttl:
+                break
+            del self._sessions[key]
+
+    def release(self, node: BackendNode, failed: bool = False):
+        """요청 종료 (failed: 연결/응답 오류)"""
+        with self._lock:
+            node.in_flight -= 1
+            if failed:
+                node.metrics["errors"] += 1
+        if node.state == DRAINING:
+            self._update_drain()
+
+    def mark_unreachable(self, node: BackendNode, error: Exception):
+        """연결 실패 - 다음 상태 확인까지 배정 제외 (진행 중인 세션은 다음 노드로)"""
+        with self._lock:
+            node.healthy = False
+            node.failures = max(node.failures, self.config["failure_threshold"])
+            node.last_error = str(error)
+            node.metrics["failovers"] += 1
+        self.logger.warning(f"Node unreachable: {node.name} ({error})")
+
+    def remember_job(self, job_id: str, node: BackendNode):
+        with self._lock:
+            self._jobs[job_id] = node.name
+            if len(self._jobs) > self.config["max_tracked_jobs"]:
+                self._jobs.popitem(last=False)
+
+    def job_candidates(self, job_id: str) -> List[BackendNode]:
+        """작업을 가졌을 노드 (접수 노드를 알면 먼저, 나머지는 정상 노드 순)"""
+        with self._lock:
+            owner = self.nodes.get(self._jobs.get(job_id, ""))
+            others = [node for node in self.nodes.values()
+                      if node is not owner and node.healthy and node.state != DRAINED]
+        return ([owner] if owner is not None else []) + others
+
+    def acquire(self, node: BackendNode):
+        """select를 거치지 않고 고른 노드로 보내는 요청 시작 (작업 조회 등)"""
+        with self._lock:
+            node.in_flight += 1
+            node.metrics["requests"] += 1
+            self.metrics["routed"] += 1
+
+    # ---- 상태 확인 / drain ----
+
+    def start(self):
+        """첫 상태 확인 후 주기적 확인 스레드 시작"""
+        self.check_health()
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name="router-health", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def _run(self):
+        while not self._stop_event.wait(self.config["health_interval"]):
+            try:
+                self.check_health()
+            except Exception as e:
+                self.logger.error(f"Health check failed: {e}")
+
+    def check_health(self):
+        for node in list(self.nodes.values()):
+            if node.state != DRAINED:
+                self._check_node(node)
+        self._update_drain()
+
+    def _check_node(self, node: BackendNode):
+        error = None
+        try:
+            conn = http.client.HTTPConnection(node.host, node.port, timeout=self.config["connect_timeout"])
+            try:
+                conn.request("GET", "/health")
+                response = conn.getresponse()
+                response.read()
+                if response.status != 200:
+                    error = f"HTTP {response.status}"
+            finally:
+                conn.close()
+        except OSError as e:
+            error = str(e) or type(e).__name__
+
+        with self._lock:
+            was_healthy = node.healthy
+            if error is None:
+                node.failures = 0
+                node.healthy = True
+            else:
+                node.failures += 1
+                node.last_error = error
+                if node.failures >= self.config["failure_threshold"]:
+                    node.healthy = False
+        if node.healthy != was_healthy:
+            self.logger.info(f"Node {node.name} is {'healthy' if node.healthy else 'unhealthy'}"
+                             + (f" ({error})" if error else ""))
+
+    def _update_drain(self):
+        """진행 중인 요청과 이어지는 대화가 없거나 제한 시간이 지난 drain 노드를 drained로"""
+        now = time.monotonic()
+        with self._lock:
+            for node in self.nodes.values():
+                if node.state != DRAINING:
+                    continue
+                idle_limit = self.config["drain_session_idle"]
+                active_sessions = sum(1 for entry in self._sessions.values()
+                                      if entry[0] == node.name and now - entry[1] < idle_limit)
+                if (node.in_flight == 0 and active_sessions == 0) or now >= node.drain_deadline:
+                    node.state = DRAINED
+                    for key in [key for key, entry in self._sessions.items() if entry[0] == node.name]:
+                        del self._sessions[key]
+                    self.logger.info(f"Node drained: {node.name} (in flight: {node.in_flight})")
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            sessions: Dict[str, int] = {}
+            for entry in self._sessions.values():
+                sessions[entry[0]] = sessions.get(entry[0], 0) + 1
+            return {
+                "nodes": {name: dict(node.get_stats(), sessions=sessions.get(name, 0))
+                          for name, node in self.nodes.items()},
+                "sessions": len(self._sessions),
+                "tracked_jobs": len(self._jobs),
+                "metrics": dict(self.metrics),
+            }
+
+
+# ---- HTTP 프록시 ----
+
+app = Flask(__name__)
+router: Optional[SessionRouter] = None
+admin_token: Optional[str] = None
+
+
+def _routing_key(path: str) -> Optional[str]:
+    """
+    요청의 고정 키
+
+    - /users/<user_id>/...: 사용자 (일정/알림 저장소가 있는 노드)
+    - 세션 ID (X-Session-ID 헤더 또는 폼 필드): 대화 기록이 있는 노드
+    - 그 외 음성 요청: 클라이언트 (노드별 스케줄러의 클라이언트 할당량이 의미 있도록)
+    """
+    parts = path.strip("/").split("/")
+    if parts[0] == "users" and len(parts) > 1:
+        return f"{USER_KEY_PREFIX}{parts[1]}"
+    if parts[0] not in ("process_voice", "jobs"):
+        return None
+    session_id = request.headers.get("X-Session-ID")
+    if session_id is None and request.mimetype in ("multipart/form-data", "application/x-www-form-urlencoded"):
+        session_id = request.form.get("session_id")
+    if session_id:
+        return f"session:{session_id}"
+    return f"client:{_client_id()}"
+
+
+def _client_id() -> str:
+    return request.headers.get("X-Client-ID") or request.remote_addr or "anonymous"
+
+
+def _request_body():
+    """
+    노드로 보낼 본문 (음성 스트림은 받는 대로 전달, 그 외는 폼 필드를 읽기 위해 메모리에 보관)
+
+    Returns:
+        (본문 bytes 또는 블록 iterator, Content-Length 또는 None - None이면 chunked 전송)
+    """
+    if request.mimetype.startswith("audio/"):
+        def blocks():
+            while True:
+                data = request.stream.read(8192)
+                if not data:
+                    return
+                yield data
+        return blocks(), request.content_length
+    data = request.get_data(cache=True)
+    return data, len(data)
+
+
+def _forward_headers(length: Optional[int]) -> Dict[str, str]:
+    headers = {name: value for name, value in request.headers.items()
+               if name.lower() not in _HOP_HEADERS and name.lower() != "content-length"}
+    if length is not None:
+        headers["Content-Length"] = str(length)
+    # 노드에서는 라우터가 접속 주소로 보이므로 원래 클라이언트를 전달 (스케줄러 공정 분배 단위)
+    headers["X-Client-ID"] = _client_id()
+    forwarded = request.headers.get("X-Forwarded-For")
+    headers["X-Forwarded-For"] = f"{forwarded}, {request.remote_addr}" if forwarded else (request.remote_addr or "")
+    return headers
+
+
+def _connect(node: BackendNode) -> http.client.HTTPConnection:
+    """노드 연결 (연결 단계에서 실패하면 본문을 보내기 전이라 다른 노드로 재시도 가능)"""
+    conn = http.client.HTTPConnection(node.host, node.port, timeout=router.config["connect_timeout"])
+    conn.connect()
+    conn.sock.settimeout(router.config["read_timeout"])
+    return conn
+
+
+def _send(conn: http.client.HTTPConnection, node: BackendNode, body, headers: Dict[str, str]):
+    path = request.full_path if request.query_string else request.path
+    conn.request(request.method, path, body=body, headers=headers)
+    return conn.getresponse()
+
+
+def _relay(conn: http.client.HTTPConnection, response, node: BackendNode,
+           body: Optional[bytes] = None) -> Response:
+    """노드 응답을 받는 대로 클라이언트에 전달 (전달이 끝나면 노드 반납)"""
+    headers = [(name, value) for name, value in response.getheaders() if name.lower() not in _HOP_HEADERS]
+    headers.append(("X-Backend-Node", node.name))
+    state = {"failed": False}
+
+    def stream():
+        if body is not None:
+            yield body
+            return
+        try:
+            while True:
+                data = response.read1(65536)
+                if not data:
+                    return
+                yield data
+        except OSError:
+            state["failed"] = True
+            raise
+
+    def close():
+        conn.close()
+        router.release(node, failed=state["failed"])
+
+    relayed = Response(stream(), status=response.status, headers=headers)
+    # 클라이언트가 중간에 끊어도 WSGI 서버가 호출 (시작되지 않은 generator의 finally는 실행되지 않음)
+    relayed.call_on_close(close)
+    return relayed
+
+
+@app.route('/', defaults={'path': ''}, methods=['GET', 'POST', 'PUT', 'DELETE', 'PATCH'])
+@app.route('/<path:path>', methods=['GET', 'POST', 'PUT', 'DELETE', 'PATCH'])
+def proxy(path: str):
+    """키로 고른 노드에 요청 전달 (연결 실패시 ring의 다음 노드로)"""
+    parts = path.strip("/").split("/")
+    if parts[0] == "jobs" and len(parts) == 2:
+        return _proxy_job(parts[1])
+
+    # 폼 필드(session_id)를 읽기 전에 본문을 보관해야 노드로 다시 보낼 수 있음
+    body, length = _request_body()
+    key = _routing_key(path)
+    headers = _forward_headers(length)
+    tried = set()
+    while True:
+        try:
+            node = router.select(key, exclude=tried)
+        except NoBackendAvailable as e:
+            return jsonify({"error": str(e)}), 503, {"Retry-After": "5"}
+        try:
+            conn = _connect(node)
+            break
+        except OSError as e:
+            router.release(node, failed=True)
+            router.mark_unreachable(node, e)
+            tried.add(node.name)
+
+    try:
+        response = _send(conn, node, body, headers)
+        # 작업 접수 응답은 작업 ID → 노드를 기억하기 위해 읽음 (작은 JSON)
+        if parts[0] == "jobs" and request.method == "POST" and response.status == 202:
+            data = response.read()
+            try:
+                router.remember_job(json.loads(data)["job_id"], node)
+            except (ValueError, KeyError):
+                pass
+            return _relay(conn, response, node, body=data)
+        return _relay(conn, response, node)
+    except OSError as e:
+        conn.close()
+        router.release(node, failed=True)
+        return jsonify({"error": f"Backend {node.name} failed: {e}"}), 502
+
+
+def _proxy_job(job_id: str):
+    """작업 조회/취소 (접수 노드를 모르면 404가 아닌 응답이 나올 때까지 다른 노드에 조회)"""
+    candidates = router.job_candidates(job_id)
+    headers = _forward_headers(None)
+    reached = False
+    for i, node in enumerate(candidates):
+        router.acquire(node)
+        try:
+            conn = _connect(node)
+        except OSError as e:
+            router.release(node, failed=True)
+            router.mark_unreachable(node, e)
+            continue
+        reached = True
+        try:
+            response = _send(conn, node, None, headers)
+            if response.status == 404 and i + 1 < len(candidates):
+                response.read()
+                conn.close()
+                router.release(node)
+                continue
+            if response.status != 404:
+                router.remember_job(job_id, node)
+            return _relay(conn, response, node)
+        except OSError as e:
+            conn.close()
+            router.release(node, failed=True)
+            return jsonify({"error": f"Backend {node.name} failed: {e}"}), 502
+    if not reached:
+        return jsonify({"error": "No healthy backend node available"}), 503, {"Retry-After": "5"}
+    return jsonify({"error": "Job not found"}), 404
+
+
+# ---- 라우터 관리 API ----
+
+def _authorized() -> bool:
+    return admin_token is None or request.headers.get("X-Admin-Token") == admin_token
+
+
+@app.route('/health', methods=['GET'])
+def health_check():
+    """라우터 상태 (정상 노드가 하나도 없으면 503)"""
+    stats = router.get_stats()
+    healthy = any(node["healthy"] and node["state"] == ACTIVE for node in stats["nodes"].values())
+    return jsonify(dict(stats, status="healthy" if healthy else "unavailable")), 200 if healthy else 503
+
+
+@app.route('/router/nodes', methods=['GET'])
+def list_nodes():
+    return jsonify(router.get_stats()["nodes"])
+
+
+@app.route('/router/nodes', methods=['POST'])
+def add_node():
+    """노드 추가 API ({"url": "http://host:port", "name": 선택})"""
+    if not _authorized():
+        return jsonify({"error": "Forbidden"}), 403
+    data = request.get_json(silent=True) or {}
+    if not data.get("url"):
+        return jsonify({"error": "url is required"}), 400
+    try:
+        node = router.add_node(data["url"], data.get("name"))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 409
+    return jsonify(dict(node.get_stats(), name=node.name)), 201
+
+
+@app.route('/router/nodes/<name>/drain', methods=['POST'])
+def drain_node(name: str):
+    """노드 drain API (?timeout=초)"""
+    if not _authorized():
+        return jsonify({"error": "Forbidden"}), 403
+    try:
+        node = router.drain(name, request.args.get('timeout', type=float))
+    except KeyError:
+        return jsonify({"error": "Node not found"}), 404
+    return jsonify(dict(node.get_stats(), name=name))
+
+
+@app.route('/router/nodes/<name>/activate', methods=['POST'])
+def activate_node(name: str):
+    if not _authorized():
+        return jsonify({"error": "Forbidden"}), 403
+    try:
+        node = router.activate(name)
+    except KeyError:
+        return jsonify({"error": "Node not found"}), 404
+    return jsonify(dict(node.get_stats(), name=name))
+
+
+@app.route('/router/nodes/<name>', methods=['DELETE'])
+def remove_node(name: str):
+    """노드 제거 API (drained 노드만, ?force=1이면 즉시)"""
+    if not _authorized():
+        return jsonify({"error": "Forbidden"}), 403
+    try:
+        router.remove_node(name, force=request.args.get('force') == '1')
+    except KeyError:
+        return jsonify({"error": "Node not found"}), 404
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 409
+    return jsonify({"name": name, "status": "removed"})
+
+
+def launch_local_backends(count: int, base_port: int, data_dir: str) -> List[subprocess.Popen]:
+    """
+    로컬 AI 서버 노드 여러 개 실행 (노드마다 포트와 작업/일정 DB 디렉토리를 따로)
+
+    LLM_MODEL/TTS_MODEL 등 나머지 환경 변수는 그대로 전달
+    """
+    server = os.path.join(os.path.dirname(os.path.abspath(__file__)), "ai_server.py")
+    processes = []
+    for i in range(count):
+        port = base_port + i
+        node_dir = os.path.abspath(os.path.join(data_dir, f"node-{port}"))
+        os.makedirs(node_dir, exist_ok=True)
+        env = dict(os.environ,
+                   JOB_DB_PATH=os.path.join(node_dir, "jobs.db"),
+                   JOB_SPOOL_DIR=os.path.join(node_dir, "job_spool"),
+                   TASK_DB_PATH=os.path.join(node_dir, "tasks.db"),
+                   REMINDER_DB_PATH=os.path.join(node_dir, "reminders.db"))
+        processes.append(subprocess.Popen(
+            [sys.executable, server, "--host", "127.0.0.1", "--port", str(port), "--no-debug"],
+            env=env, cwd=node_dir
+        ))
+        print(f"🚀 노드 실행: 127.0.0.1:{port} (pid {processes[-1].pid})")
+    return processes
+
+
+def main(argv=None):
+    """메인 함수 - 라우터 실행"""
+    global router, admin_token
+    parser = argparse.ArgumentParser(description="세션 고정 consistent hashing 라우터")
+    parser.add_argument("--host", default="0.0.0.0", help="바인드 주소")
+    parser.add_argument("--port", type=int, default=8000, help="포트")
+    parser.add_argument("--backends", default=os.getenv('ROUTER_BACKENDS', ''),
+                        help="노드 URL 목록 (쉼표 구분, 예: http://10.0.0.1:5000,http://10.0.0.2:5000)")
+    parser.add_argument("--spawn", type=int, default=0, help="로컬 노드 N개를 실행해 연결 (테스트용)")
+    parser.add_argument("--base-port", type=int, default=5001, help="--spawn 노드의 첫 포트")
+    parser.add_argument("--data-dir", default="router_nodes", help="--spawn 노드별 DB 디렉토리")
+    parser.add_argument("--vnodes", type=int, default=100, help="노드당 가상 노드 수")
+    parser.add_argument("--session-ttl", type=float, default=600.0, help="세션 고정 유지 시간 (초)")
+    parser.add_argument("--drain-timeout", type=float, default=300.0, help="drain 최대 대기 시간 (초)")
+    parser.add_argument("--health-interval", type=float, default=2.0, help="노드 상태 확인 간격 (초)")
+    parser.add_argument("--load-factor", type=float, default=1.25,
+                        help="새 세션 배정시 노드별 진행 중 요청 수 상한 (평균 대비)")
+    parser.add_argument("--admin-token", default=os.getenv('ROUTER_ADMIN_TOKEN'),
+                        help="노드 추가/drain/제거 API 토큰 (X-Admin-Token 헤더)")
+    args = parser.parse_args(argv)
+
+    # 노드와 같은 형식/대상으로 출력 (LOG_LEVEL, LOG_FORMAT, LOG_FILE)
+    configure_logging()
+    admin_token = args.admin_token
+    router = SessionRouter(vnodes=args.vnodes, session_ttl=args.session_ttl,
+                           drain_timeout=args.drain_timeout, health_interval=args.health_interval,
+                           load_factor=args.load_factor)
+
+    processes = launch_local_backends(args.spawn, args.base_port, args.data_dir) if args.spawn else []
+    urls = [url.strip() for url in args.backends.split(",") if url.strip()]
+    urls += [f"http://127.0.0.1:{args.base_port + i}" for i in range(args.spawn)]
+    if not urls:
+        print("❌ 노드가 없습니다. --backends 또는 --spawn을 지정하세요.")
+        return
+    for url in urls:
+        router.add_node(url)
+    router.start()
+
+    print(f"🌐 Router listening on {args.host}:{args.port} → {len(urls)}개 노드")
+    try:
+        app.run(host=args.host, port=args.port, threaded=True)
+    finally:
+        router.stop()
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,303 @@
+#!/usr/bin/env python3
+"""
+Fair Request Scheduler
+음성 길이 기반 요청 스케줄러 (짧은 명령 우선 + 대기 시간 보정 + 클라이언트별 공정 분배)
+"""
+
+import os
+import math
+import time
+import itertools
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Dict, Any, Optional, Callable
+
+import soundfile as sf
+
+from Models.Cancellation import CancellationToken, RequestCancelled
+
+# 이보다 작게 감쇠된 사용량(초)은 우선순위에 영향이 없으므로 기록에서 제거
+_USAGE_EPSILON = 0.01
+
+
+class SchedulerRejected(Exception):
+    """클라이언트 할당량 초과로 요청 거부"""
+    pass
+
+
+class _Ticket:
+    """대기 중인 요청"""
+
+    def __init__(self, seq: int, client_id: str, cost: float):
+        self.seq = seq
+        self.client_id = client_id
+        self.cost = cost
+        self.enqueued_at = time.monotonic()
+        self.lane = None  # 배정된 슬롯 종류 ("fast" / "general")
+
+
+class FairScheduler:
+    """
+    VoicePipeline 앞단 요청 스케줄러
+
+    - 비용: 디코딩된 음성 길이 (초)
+    - 우선순위: 비용 + 클라이언트 최근 사용량 가중치 - 대기 시간 보정 (낮을수록 먼저)
+    - 빠른 차선: fast_lane_seconds 이하의 짧은 요청만 쓸 수 있는 전용 슬롯
+    - 할당량: 클라이언트별 동시 실행/대기 요청 수 제한
+    """
+
+    def __init__(self,
+                 max_concurrent: int = 1,
+                 fast_lane_slots: int = 1,
+                 fast_lane_seconds: float = 5.0,
+                 aging_rate: float = 0.5,
+                 fairness_weight: float = 0.5,
+                 usage_half_life: float = 60.0,
+                 client_max_running: int = 1,
+                 client_max_queued: int = 8):
+        """
+        Args:
+            max_concurrent: 모든 요청이 사용할 수 있는 일반 슬롯 수
+            fast_lane_slots: 짧은 요청 전용 슬롯 수
+            fast_lane_seconds: 빠른 차선을 사용할 수 있는 최대 음성 길이 (초)
+            aging_rate: 대기 1초당 차감되는 우선순위 값 (기아 방지)
+            fairness_weight: 클라이언트 최근 사용 시간(초)에 곱해지는 가중치
+            usage_half_life: 클라이언트 사용량 감쇠 반감기 (초)
+            client_max_running: 클라이언트별 동시 실행 요청 수
+            client_max_queued: 클라이언트별 최대 대기 요청 수 (초과시 거부)
+        """
+        self.config = {
+            "max_concurrent": max_concurrent,
+            "fast_lane_slots": fast_lane_slots,
+            "fast_lane_seconds": fast_lane_seconds,
+            "aging_rate": aging_rate,
+            "fairness_weight": fairness_weight,
+            "usage_half_life": usage_half_life,
+            "client_max_running": client_max_running,
+            "client_max_queued": client_max_queued,
+        }
+        self._condition = threading.Condition()
+        self._sequence = itertools.count()
+        self._waiting: Dict[int, _Ticket] = {}
+        self._running = {"fast": 0, "general": 0}
+        self._client_running: Dict[str, int] = {}
+        self._client_queued: Dict[str, int] = {}
+        self._client_usage: Dict[str, tuple] = {}  # client_id → (사용량, 갱신 시각)
+        self._usage_swept_at = time.monotonic()
+        self.metrics = {"scheduled": 0, "rejected": 0, "abandoned": 0, "fast_lane": 0, "total_wait": 0.0,
+                        "background": 0, "background_skipped": 0}
+
+        self._setup_logging()
+
+    def _setup_logging(self):
+        self.logger = logging.getLogger(__name__)
+
+    def estimate_cost(self, audio_path: str) -> float:
+        """음성 길이(초)로 처리 비용 추정"""
+        try:
+            return sf.info(audio_path).duration
+        except Exception:
+            # 헤더를 읽을 수 없는 형식은 16kHz 16bit mono 기준 크기로 추정
+            try:
+                return os.path.getsize(audio_path) / (16000 * 2)
+            except OSError:
+                return self.config["fast_lane_seconds"]
+
+    def run(self, client_id: str, audio_path: Optional[str], fn: Callable[[], Any],
+            token: Optional[CancellationToken] = None, cost: Optional[float] = None) -> Any:
+        """
+        슬롯을 배정받을 때까지 대기한 뒤 fn 실행
+
+        Args:
+            cost: 이미 알고 있는 음성 길이 (초, 지정시 audio_path로 추정하지 않음)
+
+        Raises:
+            SchedulerRejected: 클라이언트 대기 요청 수 초과
+            RequestCancelled: 대기 중 요청이 취소됨 (슬롯을 차지하지 않고 대기열에서 제거)
+        """
+        with self.slot(client_id, cost if cost is not None else self.estimate_cost(audio_path), token):
+            return fn()
+
+    @contextmanager
+    def slot(self, client_id: str, cost: float, token: Optional[CancellationToken] = None):
+        """
+        슬롯을 배정받은 구간 (run과 같지만 호출자가 구간을 정함)
+
+        음성을 받는 동안에는 슬롯을 차지하지 않고, 수신이 끝나 길이를 알게 된 뒤
+        최종 처리 구간만 감싸는 스트리밍 요청용
+        """
+        ticket = self._enqueue(client_id, cost)
+        self._wait_for_slot(ticket, token)
+
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self._release(ticket, time.monotonic() - start)
+
+    @contextmanager
+    def background_slot(self, client_id: str, cost: float):
+        """
+        남는 슬롯만 쓰는 가장 낮은 우선순위 구간 (스트리밍 수신 중 부분 STT/추측 LLM)
+
+        대기하지 않음: 대기 중인 요청이 있거나 빈 슬롯이 없으면 아무것도 차지하지 않고 False,
+        슬롯을 얻으면 True를 yield (사용 시간은 일반 요청과 같이 클라이언트 사용량에 반영)
+        """
+        ticket = self._try_acquire(client_id, cost)
+        if ticket is None:
+            yield False
+            return
+
+        start = time.monotonic()
+        try:
+            yield True
+        finally:
+            self._release(ticket, time.monotonic() - start)
+
+    def _try_acquire(self, client_id: str, cost: float) -> Optional[_Ticket]:
+        """대기 없이 빈 슬롯 배정 (슬롯을 기다리는 요청이 있으면 양보)"""
+        with self._condition:
+            lane = None
+            if not self._waiting and self._client_running.get(client_id, 0) < self.config["client_max_running"]:
+                if cost <= self.config["fast_lane_seconds"] and \
+                        self._running["fast"] < self.config["fast_lane_slots"]:
+                    lane = "fast"
+                elif self._running["general"] < self.config["max_concurrent"]:
+                    lane = "general"
+            if lane is None:
+                self.metrics["background_skipped"] += 1
+                return None
+
+            ticket = _Ticket(next(self._sequence), client_id, cost)
+            ticket.lane = lane
+            self._client_running[client_id] = self._client_running.get(client_id, 0) + 1
+            self._running[lane] += 1
+            self.metrics["background"] += 1
+            return ticket
+
+    def _enqueue(self, client_id: str, cost: float) -> _Ticket:
+        with self._condition:
+            if self._client_queued.get(client_id, 0) >= self.config["client_max_queued"]:
+                self.metrics["rejected"] += 1
+                raise SchedulerRejected(f"Too many queued requests for client: {client_id}")
+
+            ticket = _Ticket(next(self._sequence), client_id, cost)
+            self._waiting[ticket.seq] = ticket
+            self._client_queued[client_id] = self._client_queued.get(client_id, 0) + 1
+            return ticket
+
+    def _wait_for_slot(self, ticket: _Ticket, token: Optional[CancellationToken] = None):
+        with self._condition:
+            while True:
+                lane = self._lane_for(ticket)
+                if lane is not None:
+                    break
+                if token is not None and token.cancelled:
+                    self._abandon(ticket)
+                    raise RequestCancelled(token.reason)
+                # 대기 시간 보정으로 우선순위가 바뀌므로 주기적으로 재평가
+                self._condition.wait(timeout=0.5 if token is None else min(0.5, token.probe_interval))
+
+            del self._waiting[ticket.seq]
+            self._client_queued[ticket.client_id] -= 1
+            self._client_running[ticket.client_id] = self._client_running.get(ticket.client_id, 0) + 1
+            self._running[lane] += 1
+            ticket.lane = lane
+
+            waited = time.monotonic() - ticket.enqueued_at
+            self.metrics["scheduled"] += 1
+            self.metrics["total_wait"] += waited
+            if lane == "fast":
+                self.metrics["fast_lane"] += 1
+            self._condition.notify_all()
+
+    def _abandon(self, ticket: _Ticket):
+        """취소된 요청을 대기열에서 제거 (condition 잠금 안에서 호출)"""
+        del self._waiting[ticket.seq]
+        self._client_queued[ticket.client_id] -= 1
+        self.metrics["abandoned"] += 1
+        self._condition.notify_all()
+
+    def _lane_for(self, ticket: _Ticket) -> Optional[str]:
+        """ticket이 지금 실행될 수 있으면 사용할 슬롯 종류 반환"""
+        now = time.monotonic()
+        eligible = [t for t in self._waiting.values()
+                    if self._client_running.get(t.client_id, 0) < self.config["client_max_running"]]
+        if ticket not in eligible:
+            return None
+
+        is_short = ticket.cost <= self.config["fast_lane_seconds"]
+        fast_free = self._running["fast"] < self.config["fast_lane_slots"]
+        general_free = self._running["general"] < self.config["max_concurrent"]
+
+        # 빠른 차선: 짧은 요청 중 최우선일 때 사용
+        if is_short and fast_free:
+            short = [t for t in eligible if t.cost <= self.config["fast_lane_seconds"]]
+            if min(short, key=lambda t: self._priority(t, now)) is ticket:
+                return "fast"
+
+        # 일반 슬롯: 전체 중 최우선일 때 사용
+        if general_free:
+            if fast_free:
+                # 짧은 요청은 빠른 차선에서 처리되므로 일반 슬롯 경쟁에서 제외
+                eligible = [t for t in eligible if t.cost > self.config["fast_lane_seconds"]] or eligible
+            if min(eligible, key=lambda t: self._priority(t, now)) is ticket:
+                return "general"
+        return None
+
+    def _priority(self, ticket: _Ticket, now: float):
+        """낮을수록 먼저 실행 (동률이면 도착 순서)"""
+        waited = now - ticket.enqueued_at
+        score = (ticket.cost
+                 + self.config["fairness_weight"] * self._usage(ticket.client_id, now)
+                 - self.config["aging_rate"] * waited)
+        return (score, ticket.seq)
+
+    def _usage(self, client_id: str, now: float) -> float:
+        """지수 감쇠된 클라이언트 최근 사용 시간"""
+        usage, updated_at = self._client_usage.get(client_id, (0.0, now))
+        decay = math.pow(0.5, (now - updated_at) / self.config["usage_half_life"])
+        return usage * decay
+
+    def _release(self, ticket: _Ticket, service_time: float):
+        with self._condition:
+            now = time.monotonic()
+            self._client_usage[ticket.client_id] = (self._usage(ticket.client_id, now) + service_time, now)
+            self._client_running[ticket.client_id] -= 1
+            self._running[ticket.lane] -= 1
+
+            # 유휴 클라이언트 정리
+            if not self._client_running[ticket.client_id]:
+                del self._client_running[ticket.client_id]
+            if not self._client_queued.get(ticket.client_id):
+                self._client_queued.pop(ticket.client_id, None)
+            self._sweep_usage(now)
+            self._condition.notify_all()
+
+    def _sweep_usage(self, now: float):
+        """감쇠되어 우선순위에 영향이 없는 사용량 기록 정리 (반감기마다 한 번, condition 잠금 안에서 호출)"""
+        if now - self._usage_swept_at < self.config["usage_half_life"]:
+            return
+        self._usage_swept_at = now
+        idle = [client_id for client_id in self._client_usage
+                if self._usage(client_id, now) < _USAGE_EPSILON]
+        for client_id in idle:
+            del self._client_usage[client_id]
+
+    def get_stats(self) -> Dict[str, Any]:
+        """스케줄러 상태 정보"""
+        with self._condition:
+            scheduled = self.metrics["scheduled"]
+            return {
+                "waiting": len(self._waiting),
+                "running": dict(self._running),
+                "clients_waiting": {c: n for c, n in self._client_queued.items() if n},
+                "scheduled": scheduled,
+                "rejected": self.metrics["rejected"],
+                "abandoned": self.metrics["abandoned"],
+                "fast_lane": self.metrics["fast_lane"],
+                "avg_wait": round(self.metrics["total_wait"] / scheduled, 3) if scheduled else 0.0,
+                "background": self.metrics["background"],
+                "background_skipped": self.metrics["background_skipped"],
+            }
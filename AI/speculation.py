@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+Speculative LLM Invocation
+부분 STT 결과가 일정 시간(음성 기준) 동안 바뀌지 않으면 최종 결과 전에 LLM 호출을 미리 시작
+
+- 최종 결과가 추측한 문장과 같으면 미리 받은 응답 사용 (hit)
+- 다르면 추측 요청을 버리고 최종 문장으로 다시 호출 (miss)
+"""
+
+import re
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, Future
+from typing import Callable, Dict, Any, Optional
+
+
+def normalize_transcript(text: str) -> str:
+    """비교용 정규화 (공백/문장 부호 차이 무시)"""
+    return re.sub(r"[\s.,!?~…]+", "", text or "").lower()
+
+
+class Speculation:
+    """요청 하나의 추측 호출 상태"""
+
+    def __init__(self, owner: "SpeculativeLLM", generate: Callable[[str], str],
+                 speculate: Optional[Callable[[str], str]] = None):
+        self.owner = owner
+        self.generate = generate
+        self.speculate = speculate or generate
+        self._hypothesis = None
+        self._stable_since = 0.0
+        self._launched_text = None
+        self._future: Optional[Future] = None
+        self._launched_at = 0.0
+        self._attempted = False
+        self._lock = threading.Lock()
+
+    def observe(self, hypothesis: str, audio_seconds: float):
+        """
+        부분 결과 반영
+
+        Args:
+            hypothesis: 현재까지의 음성에 대한 STT 결과
+            audio_seconds: 해당 결과를 만든 음성 길이 (안정 구간 측정 기준)
+        """
+        key = normalize_transcript(hypothesis)
+        with self._lock:
+            if key != self._hypothesis:
+                self._hypothesis = key
+                self._stable_since = audio_seconds
+                if self._launched_text is not None and key != self._launched_text:
+                    # 사용자가 말을 이어감 - 이전 추측은 폐기
+                    self._discard()
+                return
+
+            if (key and self._launched_text is None
+                    and audio_seconds - self._stable_since >= self.owner.stable_seconds):
+                self._launched_text = key
+                self._launched_at = time.time()
+                self._attempted = True
+                self._future = self.owner._submit(self.speculate, hypothesis)
+                self.owner._count("launched")
+
+    def _discard(self):
+        if self._future is not None and not self._future.cancel():
+            # 이미 실행 중인 호출은 중단할 수 없으므로 결과만 버림
+            self.owner._count("wasted")
+        self.owner._count("cancelled")
+        self._future = None
+        self._launched_text = None
+
+    def finish(self, final_text: str) -> str:
+        """최종 결과 확정 - 추측이 맞으면 미리 받은 응답, 아니면 다시 호출"""
+        with self._lock:
+            future = self._future
+            if future is not None and self._launched_text != normalize_transcript(final_text):
+                self._discard()
+                future = None
+
+        if future is None:
+            self.owner._count("misses" if self._attempted else "not_launched")
+            return self.generate(final_text)
+
+        try:
+            head_start = time.time() - self._launched_at
+            response = future.result()
+        except Exception:
+            # 추측 호출 실패는 최종 문장으로 재시도
+            self.owner._count("misses")
+            return self.generate(final_text)
+        self.owner._count("hits")
+        self.owner._record_saved(head_start)
+        return response
+
+
+class SpeculativeLLM:
+    """추측 호출 실행기와 적중률 통계"""
+
+    def __init__(self, stable_seconds: float = 0.6, max_workers: int = 4):
+        """
+        Args:
+            stable_seconds: 부분 결과가 이만큼의 음성 동안 바뀌지 않으면 호출 시작
+            max_workers: 동시에 진행할 수 있는 추측 호출 수
+        """
+        self.stable_seconds = stable_seconds
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="speculative-llm")
+        self._lock = threading.Lock()
+        self._stats = {"requests": 0, "launched": 0, "hits": 0, "misses": 0,
+                       "not_launched": 0, "cancelled": 0, "wasted": 0}
+        self._saved_seconds = 0.0
+
+    def begin(self, generate: Callable[[str], str],
+              speculate: Optional[Callable[[str], str]] = None) -> Speculation:
+        """
+        요청 하나의 추측 상태 생성 (generate는 문장 → 응답)
+
+        speculate를 주면 추측 호출에만 사용 (예: 남는 슬롯이 있을 때만 실행, 실패하면 최종 문장으로 generate)
+        """
+        self._count("requests")
+        return Speculation(self, generate, speculate)
+
+    def _submit(self, fn: Callable[[str], str], text: str) -> Future:
+        return self._executor.submit(fn, text)
+
+    def _count(self, key: str):
+        with self._lock:
+            self._stats[key] += 1
+
+    def _record_saved(self, seconds: float):
+        with self._lock:
+            self._saved_seconds += seconds
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+            saved = self._saved_seconds
+        decided = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = round(stats["hits"] / decided, 4) if decided else None
+        stats["mean_head_start"] = round(saved / stats["hits"], 4) if stats["hits"] else None
+        stats["stable_seconds"] = self.stable_seconds
+        return stats
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False)
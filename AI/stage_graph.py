@@ -0,0 +1,368 @@
+#!/usr/bin/env python3
+"""
+Stage Graph
+단계별 실행기 종류와 크기를 선언해 구성하는 파이프라인 그래프
+
+- 단계마다 전용 작업자: CPU 단계(디코딩/전처리/Whisper)는 프로세스 풀, I/O 단계(LLM/TTS HTTP)는 스레드
+  → CPU 동시 처리 수와 네트워크 동시 처리 수를 따로 정함
+- 단계 사이는 크기가 정해진 큐: 다음 단계 큐가 가득 차면 앞 단계 작업자가 기다리고,
+  첫 단계 큐가 가득 차면 submit이 기다림 (backpressure)
+- 단계별 점유율(바쁜 작업자 비율), 대기열 길이, 큐 대기/처리 시간 보고
+
+사용 예:
+    graph = StageGraph([
+        StageSpec("decode", decode, executor="process", workers=4),
+        StageSpec("llm", generate, executor="thread", workers=16),
+    ])
+    job = graph.run(audio_path, context={"session_id": "abc"}, token=token)
+    job.result, job.stage_times
+"""
+
+import time
+import queue
+import logging
+import threading
+import contextvars
+import multiprocessing
+from concurrent.futures import Future, ProcessPoolExecutor, TimeoutError as FutureTimeout
+from typing import Dict, Any, Optional, List, Callable, Tuple
+
+from Models.Cancellation import CancellationToken, RequestCancelled, check
+
+EXECUTORS = ("thread", "process")
+
+# 취소/종료 확인 간격 (초)
+_POLL_INTERVAL = 0.1
+
+
+def parse_stage_config(spec: Optional[str]) -> Dict[str, Dict[str, Any]]:
+    """
+    단계 설정 문자열 해석
+
+    "decode=process:4,llm=thread:16:32" →
+        {"decode": {"executor": "process", "workers": 4},
+         "llm": {"executor": "thread", "workers": 16, "queue_size": 32}}
+    """
+    config = {}
+    for item in (spec or "").split(","):
+        if not item.strip():
+            continue
+        name, _, value = item.partition("=")
+        parts = value.strip().split(":")
+        if not name.strip() or parts[0] not in EXECUTORS or len(parts) > 3:
+            raise ValueError(f"Invalid stage config: {item!r} (expected name=thread|process[:workers[:queue]])")
+        stage = {"executor": parts[0]}
+        if len(parts) > 1 and parts[1]:
+            stage["workers"] = int(parts[1])
+        if len(parts) > 2 and parts[2]:
+            stage["queue_size"] = int(parts[2])
+        config[name.strip()] = stage
+    return config
+
+
+class StageSpec:
+    """단계 선언"""
+
+    def __init__(self, name: str, fn: Callable[["StageJob"], Any],
+                 executor: str = "thread",
+                 workers: int = 1,
+                 queue_size: Optional[int] = None,
+                 initializer: Optional[Callable] = None,
+                 initargs: Tuple = ()):
+        """
+        Args:
+            name: 단계 이름
+            fn: 단계 함수 (StageJob → 다음 단계 입력, 단계 작업자 스레드에서 실행)
+            executor: "thread" (fn이 작업자 스레드에서 처리) 또는 "process"
+                      (fn이 job.run()으로 넘기는 작업을 단계 전용 프로세스 풀에서 실행)
+            workers: 동시 처리 수 (작업자 스레드 수, process는 프로세스 수도 같음)
+            queue_size: 단계 입력 큐 크기 (기본값: workers × 2)
+            initializer: 프로세스 풀 작업자 초기화 함수 (모델 로드 등)
+            initargs: initializer 인자
+        """
+        if executor not in EXECUTORS:
+            raise ValueError(f"Unknown executor for stage {name}: {executor}")
+        self.name = name
+        self.fn = fn
+        self.executor = executor
+        self.workers = max(1, int(workers))
+        self.queue_size = max(1, int(queue_size)) if queue_size else self.workers * 2
+        self.initializer = initializer
+        self.initargs = initargs
+
+
+class StageJob:
+    """그래프를 지나는 요청 하나"""
+
+    def __init__(self, payload: Any, context: Dict[str, Any], token: Optional[CancellationToken]):
+        self.payload = payload
+        # 요청 단위 값 (session_id 등, 단계 함수가 읽고 씀)
+        self.context = context
+        self.token = token
+        # 단계별 처리 시간 (큐 대기 제외, 초)
+        self.stage_times: Dict[str, float] = {}
+        self.wait_time = 0.0
+        self.result = None
+        # finish()로 남은 단계를 건너뛴 단계 이름
+        self.stopped_at: Optional[str] = None
+        self.stage: Optional["_Stage"] = None
+        self.future: Future = Future()
+        # 요청 스레드의 context (request_id 로그 필드, 프로파일링 세션)를 단계 작업자에도 적용
+        self._vars = contextvars.copy_context()
+        self._enqueued_at = 0.0
+
+    def run(self, fn: Callable, *args) -> Any:
+        """
+        현재 단계 실행기에서 fn(*args) 실행
+
+        process 단계는 단계 전용 프로세스 풀에서 실행 (fn/인자/결과는 pickle 가능해야 함),
+        thread 단계는 현재 작업자 스레드에서 바로 실행
+        """
+        return self.stage.execute(fn, args, self.token)
+
+    def finish(self, result: Any):
+        """남은 단계를 건너뛰고 결과 확정 (예: 변환 결과가 비어 LLM/TTS가 필요 없음)"""
+        self.stopped_at = self.stage.spec.name
+        self.result = result
+
+    def wait(self, token: Optional[CancellationToken] = None) -> Any:
+        """
+        그래프 처리가 끝날 때까지 대기
+
+        Raises:
+            RequestCancelled: 대기 중 token이 취소됨
+            Exception: 단계 함수에서 발생한 오류
+        """
+        token = token or self.token
+        while True:
+            try:
+                return self.future.result(timeout=_POLL_INTERVAL if token is not None else None)
+            except FutureTimeout:
+                check(token)
+
+
+class _Stage:
+    """단계 실행 상태 (입력 큐, 작업자, 통계)"""
+
+    def __init__(self, spec: StageSpec):
+        self.spec = spec
+        self.queue: "queue.Queue[Optional[StageJob]]" = queue.Queue(maxsize=spec.queue_size)
+        self.pool = None
+        if spec.executor == "process":
+            # torch는 fork 이후 스레드 풀 상태가 깨질 수 있어 spawn 사용
+            self.pool = ProcessPoolExecutor(max_workers=spec.workers,
+                                            mp_context=multiprocessing.get_context("spawn"),
+                                            initializer=spec.initializer, initargs=spec.initargs)
+            # 첫 요청이 프로세스 시작/모델 로드 비용을 떠안지 않도록 작업자를 미리 시작
+            for _ in range(spec.workers):
+                self.pool.submit(int)
+        self.threads: List[threading.Thread] = []
+        self.busy = 0
+        self.metrics = {"processed": 0, "failed": 0, "cancelled": 0,
+                        "busy_seconds": 0.0, "service_seconds": 0.0, "wait_seconds": 0.0,
+                        # 이 단계 큐가 가득 차 앞 단계(또는 submit)가 기다린 시간
+                        "blocked_seconds": 0.0, "max_queued": 0}
+        self._lock = threading.Lock()
+
+    def execute(self, fn: Callable, args: Tuple, token: Optional[CancellationToken]) -> Any:
+        if self.pool is None:
+            return fn(*args)
+        future = self.pool.submit(fn, *args)
+        while True:
+            try:
+                return future.result(timeout=_POLL_INTERVAL if token is not None else None)
+            except FutureTimeout:
+                if token is not None and token.cancelled:
+                    # 시작 전이면 취소, 이미 실행 중이면 결과를 버림 (작업자 프로세스는 다음 작업으로)
+                    future.cancel()
+                    check(token)
+
+    def record(self, key: str, value: float):
+        with self._lock:
+            self.metrics[key] += value
+
+    def get_stats(self, uptime: float) -> Dict[str, Any]:
+        with self._lock:
+            metrics = dict(self.metrics)
+            busy = self.busy
+        done = metrics["processed"] + metrics["failed"] + metrics["cancelled"]
+        workers = self.spec.workers
+        return {
+            "executor": self.spec.executor,
+            "workers": workers,
+            "queue_size": self.spec.queue_size,
+            "queued": self.queue.qsize(),
+            "max_queued": metrics["max_queued"],
+            "busy": busy,
+            # 현재 바쁜 작업자 비율 / 시작 이후 평균 (다음 단계 큐를 기다린 시간 포함)
+            "occupancy": round(busy / workers, 3),
+            "utilization": round(metrics["busy_seconds"] / (workers * uptime), 4) if uptime > 0 else 0.0,
+            "processed": metrics["processed"],
+            "failed": metrics["failed"],
+            "cancelled": metrics["cancelled"],
+            "avg_service_seconds": round(metrics["service_seconds"] / done, 4) if done else None,
+            "avg_wait_seconds": round(metrics["wait_seconds"] / done, 4) if done else None,
+            "blocked_seconds": round(metrics["blocked_seconds"], 3),
+        }
+
+    def shutdown(self):
+        if self.pool is not None:
+            self.pool.shutdown(wait=False, cancel_futures=True)
+
+
+class StageGraph:
+    """
+    선언한 순서대로 단계를 잇는 파이프라인 (단계마다 작업자 수/큐 크기/실행기 지정)
+
+    요청은 submit()으로 첫 단계(또는 start로 지정한 단계) 큐에 들어가고, 각 단계 함수의
+    반환값이 다음 단계의 입력(job.payload)이 됨. 마지막 단계의 반환값이 요청 결과
+    """
+
+    def __init__(self, stages: List[StageSpec]):
+        names = [spec.name for spec in stages]
+        if not stages or len(set(names)) != len(names):
+            raise ValueError(f"Stage names must be unique and non-empty: {names}")
+        self._stages = [_Stage(spec) for spec in stages]
+        self._index = {name: i for i, name in enumerate(names)}
+        self._closed = False
+        self._started_at = time.monotonic()
+        self._setup_logging()
+
+        for i, stage in enumerate(self._stages):
+            for n in range(stage.spec.workers):
+                thread = threading.Thread(target=self._work, args=(i,), daemon=True,
+                                          name=f"stage-{stage.spec.name}-{n}")
+                thread.start()
+                stage.threads.append(thread)
+
+        self.logger.info("Stage graph: " + " → ".join(
+            f"{s.spec.name}({s.spec.executor}×{s.spec.workers})" for s in self._stages))
+
+    def _setup_logging(self):
+        self.logger = logging.getLogger(__name__)
+
+    @property
+    def stages(self) -> List[StageSpec]:
+        return [stage.spec for stage in self._stages]
+
+    def submit(self, payload: Any, context: Optional[Dict[str, Any]] = None,
+               token: Optional[CancellationToken] = None, start: Optional[str] = None) -> StageJob:
+        """
+        요청을 그래프에 넣기 (첫 단계 큐가 가득 차면 자리가 날 때까지 대기)
+
+        Args:
+            payload: 시작 단계 입력
+            context: 요청 단위 값 (단계 함수에서 job.context로 사용)
+            token: 요청 취소 토큰 (단계 사이/큐 대기/프로세스 작업 대기 중 확인)
+            start: 시작 단계 이름 (앞 단계 결과를 이미 가진 요청용, 기본값: 첫 단계)
+
+        Raises:
+            RequestCancelled: 큐 자리를 기다리는 중 token이 취소됨
+        """
+        if start is not None and start not in self._index:
+            raise ValueError(f"Unknown stage: {start}")
+        job = StageJob(payload, dict(context or {}), token)
+        self._put(self._index[start] if start is not None else 0, job)
+        return job
+
+    def run(self, payload: Any, context: Optional[Dict[str, Any]] = None,
+            token: Optional[CancellationToken] = None, start: Optional[str] = None) -> StageJob:
+        """submit 후 처리가 끝날 때까지 대기 (결과는 job.result)"""
+        job = self.submit(payload, context, token, start)
+        job.wait()
+        return job
+
+    def _put(self, index: int, job: StageJob):
+        """단계 큐에 넣기 (가득 차 있으면 기다리며 취소/종료 확인)"""
+        stage = self._stages[index]
+        waited_from = time.monotonic()
+        while True:
+            if self._closed:
+                raise RuntimeError("Stage graph is closed")
+            check(job.token)
+            try:
+                stage.queue.put(job, timeout=_POLL_INTERVAL)
+                break
+            except queue.Full:
+                continue
+        job._enqueued_at = time.monotonic()
+        with stage._lock:
+            stage.metrics["blocked_seconds"] += job._enqueued_at - waited_from
+            stage.metrics["max_queued"] = max(stage.metrics["max_queued"], stage.queue.qsize())
+
+    def _work(self, index: int):
+        """단계 작업자 스레드"""
+        stage = self._stages[index]
+        name = stage.spec.name
+        while True:
+            job = stage.queue.get()
+            if job is None:
+                return
+
+            began = time.monotonic()
+            wait = began - job._enqueued_at
+            job.wait_time += wait
+            with stage._lock:
+                stage.busy += 1
+                stage.metrics["wait_seconds"] += wait
+            outcome = "processed"
+            try:
+                check(job.token)
+                job.stage = stage
+                start = time.perf_counter()
+                payload = job._vars.run(stage.spec.fn, job)
+                service = time.perf_counter() - start
+                job.stage_times[name] = round(service, 3)
+                stage.record("service_seconds", service)
+
+                if job.stopped_at is not None:
+                    job.future.set_result(job.result)
+                elif index + 1 == len(self._stages):
+                    job.result = payload
+                    job.future.set_result(payload)
+                else:
+                    job.payload = payload
+                    # 다음 단계 큐가 가득 차 있으면 이 작업자도 기다림 (backpressure)
+                    self._put(index + 1, job)
+            except RequestCancelled as e:
+                outcome = "cancelled"
+                job.future.set_exception(e)
+            except Exception as e:
+                outcome = "failed"
+                self.logger.debug(f"Stage {name} failed: {e}")
+                job.future.set_exception(e)
+            finally:
+                with stage._lock:
+                    stage.busy -= 1
+                    stage.metrics[outcome] += 1
+                    stage.metrics["busy_seconds"] += time.monotonic() - began
+
+    def get_stats(self) -> Dict[str, Any]:
+        """단계별 점유율/대기열 통계 (bottleneck: 평균 점유율이 가장 높은 단계)"""
+        uptime = time.monotonic() - self._started_at
+        stages = {stage.spec.name: stage.get_stats(uptime) for stage in self._stages}
+        busiest = max(stages, key=lambda name: stages[name]["utilization"])
+        return {
+            "stages": stages,
+            "bottleneck": busiest if stages[busiest]["utilization"] > 0 else None,
+        }
+
+    def close(self):
+        """작업자 종료 (큐에서 기다리던 요청은 실패 처리)"""
+        if self._closed:
+            return
+        self._closed = True
+        for stage in self._stages:
+            while True:
+                try:
+                    job = stage.queue.get_nowait()
+                except queue.Empty:
+                    break
+                if job is not None:
+                    job.future.set_exception(RuntimeError("Stage graph is closed"))
+            for _ in stage.threads:
+                try:
+                    stage.queue.put(None, timeout=_POLL_INTERVAL)
+                except queue.Full:
+                    pass  # 작업자는 daemon 스레드
+            stage.shutdown()
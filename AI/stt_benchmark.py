@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+"""
+STT Decoding Benchmark
+디코딩 프로필(Whisper 기본값 / general / command)과 command 프로필의 항목별 변형을
+같은 음성들로 실행해 지연 시간 분포(p95/최대)와 CER을 비교
+
+각 변형은 command 프로필에서 설정 하나만 되돌린 것이므로, 변형과 command의 차이가
+해당 설정(토큰 상한, EOT 조기 종료, 타임스탬프 생략)의 효과
+
+사용 예:
+    python stt_benchmark.py commands/ --references refs.json -o stt_benchmark.json
+    python stt_benchmark.py commands/ --model base --repeats 3 --variants general command
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import statistics
+from typing import Dict, Any, Optional, List, Callable
+
+# AI 모듈 import
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from batch_transcribe import collect_inputs
+from traffic_capture import character_error_rate
+
+# 변형 이름 → (프로필, command 프로필 설정 변경)
+VARIANTS: Dict[str, Any] = {
+    # 온도 fallback(0.0 → 1.0 재디코딩) + 압축률/로그확률 임계값 + 타임스탬프 + 이전 문맥
+    "whisper-default": None,
+    # 기존 transcribe 설정 (이전 문맥, 타임스탬프, 단일 온도)
+    "general": ("general", {}),
+    "command": ("command", {}),
+    "command-no-token-cap": ("command", {"tokens_per_second": None}),
+    "command-no-eot-stop": ("command", {"eot_threshold": None}),
+    "command-timestamps": ("command", {"without_timestamps": False}),
+}
+
+
+def load_references(paths: List[str], references_path: Optional[str]) -> Dict[str, str]:
+    """
+    정답 전사 (JSON {파일 이름 또는 경로: 텍스트} 또는 음성 옆의 같은 이름 .txt 파일)
+    """
+    references = {}
+    if references_path:
+        with open(references_path, encoding="utf-8") as f:
+            mapping = json.load(f)
+        for path in paths:
+            text = mapping.get(path, mapping.get(os.path.basename(path)))
+            if text is not None:
+                references[path] = text
+    for path in paths:
+        sidecar = os.path.splitext(path)[0] + ".txt"
+        if path not in references and os.path.exists(sidecar):
+            with open(sidecar, encoding="utf-8") as f:
+                references[path] = f.read().strip()
+    return references
+
+
+def _transcriber(stt, variant: str, use_preprocessing: bool) -> Callable[[str], str]:
+    """변형별 변환 함수"""
+    spec = VARIANTS[variant]
+    if spec is None:
+        import whisper
+
+        def transcribe_default(path: str) -> str:
+            with stt._decoding():
+                result = stt.model.transcribe(whisper.load_audio(path), language=stt.default_language,
+                                              fp16=stt.device != "cpu")
+            return stt._post_process_korean(result["text"].strip())
+        return transcribe_default
+
+    profile, _ = spec
+    return lambda path: stt.transcribe(path, use_preprocessing=use_preprocessing, profile=profile)
+
+
+def _latency_stats(values: List[float]) -> Dict[str, float]:
+    values = sorted(values)
+    return {
+        "mean": round(statistics.mean(values), 4),
+        "p50": round(values[len(values) // 2], 4),
+        "p95": round(values[min(len(values) - 1, int(0.95 * len(values)))], 4),
+        "max": round(values[-1], 4),
+    }
+
+
+def run_variant(stt, variant: str, paths: List[str], durations: Dict[str, float],
+                references: Dict[str, str], repeats: int = 1,
+                use_preprocessing: bool = False) -> Dict[str, Any]:
+    """
+    변형 하나를 모든 음성에 repeats번 실행
+
+    Returns:
+        Dict[str, Any]: 지연 시간 분포, 실시간 배율(RTF), CER, 토큰 상한/EOT 종료 횟수, 파일별 결과
+    """
+    base_config = dict(stt.decoding_config)
+    spec = VARIANTS[variant]
+    if spec is not None:
+        stt.configure_decoding(**spec[1])
+    before = stt.get_decoding_stats()
+    transcribe = _transcriber(stt, variant, use_preprocessing)
+
+    latencies, rtfs, records = [], [], []
+    try:
+        for path in paths:
+            samples = []
+            for _ in range(repeats):
+                start = time.perf_counter()
+                text = transcribe(path)
+                samples.append(time.perf_counter() - start)
+            latency = statistics.median(samples)
+            latencies.extend(samples)
+            if durations.get(path):
+                rtfs.append(latency / durations[path])
+            record = {"path": path, "latency": round(latency, 4), "text": text}
+            if path in references:
+                record["cer"] = round(character_error_rate(references[path], text), 4)
+            records.append(record)
+    finally:
+        after = stt.get_decoding_stats()
+        stt.configure_decoding(**base_config)
+
+    cers = [r["cer"] for r in records if "cer" in r]
+    return {
+        "latency": _latency_stats(latencies),
+        "mean_rtf": round(statistics.mean(rtfs), 4) if rtfs else None,
+        "mean_cer": round(statistics.mean(cers), 4) if cers else None,
+        "token_cap_hits": after["token_cap_hits"] - before["token_cap_hits"],
+        "eot_stops": after["eot_stops"] - before["eot_stops"],
+        "files": records,
+    }
+
+
+def _token_density(stt, references: Dict[str, str], durations: Dict[str, float]) -> Optional[Dict[str, float]]:
+    """
+    정답 전사의 음성 1초당 토큰 수 (command 프로필 tokens_per_second 상한을 정하는 근거)
+    """
+    import whisper
+
+    tokenizer = whisper.tokenizer.get_tokenizer(stt.model.is_multilingual, language="ko", task="transcribe")
+    densities = sorted(
+        len(tokenizer.encode(" " + text.strip())) / durations[path]
+        for path, text in references.items() if durations.get(path)
+    )
+    if not densities:
+        return None
+    return {
+        "mean": round(statistics.mean(densities), 2),
+        "p95": round(densities[min(len(densities) - 1, int(len(densities) * 0.95))], 2),
+        "max": round(densities[-1], 2),
+    }
+
+
+def benchmark(paths: List[str], model_name: str = "small", device: Optional[str] = None,
+              variants: Optional[List[str]] = None, references: Optional[Dict[str, str]] = None,
+              repeats: int = 1, use_preprocessing: bool = False) -> Dict[str, Any]:
+    """
+    변형별 실행 후 비교 (정답 전사가 없으면 general 결과를 기준으로 CER 계산)
+    """
+    import soundfile as sf
+    from Models.STT import WhisperSTT
+
+    variants = variants or list(VARIANTS)
+    stt = WhisperSTT(model_name=model_name, device=device)
+    durations = {}
+    for path in paths:
+        try:
+            durations[path] = sf.info(path).duration
+        except Exception:
+            durations[path] = None
+
+    # 첫 실행의 초기화 비용 제외
+    stt.transcribe(paths[0], use_preprocessing=use_preprocessing)
+
+    references = dict(references or {})
+    reference_source = "references" if references else "general"
+    results = {}
+    if not references:
+        results["general"] = run_variant(stt, "general", paths, durations, {}, repeats, use_preprocessing)
+        references = {r["path"]: r["text"] for r in results["general"]["files"]}
+
+    for variant in variants:
+        if variant in results:
+            continue
+        results[variant] = run_variant(stt, variant, paths, durations, references, repeats, use_preprocessing)
+        summary = results[variant]
+        print(f"  {variant:<22} p50 {summary['latency']['p50']:.3f}s  p95 {summary['latency']['p95']:.3f}s  "
+              f"max {summary['latency']['max']:.3f}s  CER {summary['mean_cer']}")
+
+    if reference_source == "general":
+        results["general"]["mean_cer"] = 0.0
+    token_density = _token_density(stt, references, durations)
+    if token_density:
+        print(f"  전사 토큰 밀도: 최대 {token_density['max']:.1f} 토큰/초, p95 {token_density['p95']:.1f} 토큰/초 "
+              f"(tokens_per_second 설정 {stt.decoding_config['tokens_per_second']})")
+    return {
+        "model_name": model_name,
+        "device": stt.device,
+        "files": len(paths),
+        "repeats": repeats,
+        "preprocessing": use_preprocessing,
+        "cer_reference": reference_source,
+        "command_config": dict(stt.decoding_config),
+        "token_density": token_density,
+        "variants": {name: results[name] for name in variants if name in results},
+    }
+
+
+def main(argv=None):
+    """메인 함수 - 디코딩 프로필 벤치마크"""
+    parser = argparse.ArgumentParser(description="Whisper 디코딩 프로필별 지연 시간/CER 비교")
+    parser.add_argument("source", help="음성 디렉토리 또는 목록 파일")
+    parser.add_argument("--references", help="정답 전사 JSON ({파일 이름: 텍스트})")
+    parser.add_argument("--model", default="small", help="Whisper 모델")
+    parser.add_argument("--device", help="실행 device (기본값: 자동 선택)")
+    parser.add_argument("--variants", nargs="+", choices=list(VARIANTS), help="실행할 변형 (기본값: 전체)")
+    parser.add_argument("--repeats", type=int, default=1, help="파일별 반복 횟수 (중앙값 사용)")
+    parser.add_argument("--preprocess", action="store_true", help="전처리 포함 (기본값: 디코딩만 측정)")
+    parser.add_argument("-o", "--output", help="결과 JSON 저장 경로")
+    args = parser.parse_args(argv)
+
+    paths = collect_inputs(args.source)
+    if not paths:
+        print("❌ 음성 파일이 없습니다.")
+        return
+
+    print(f"🎯 {len(paths)}개 파일, 모델 {args.model}")
+    report = benchmark(paths, args.model, args.device, args.variants,
+                       load_references(paths, args.references), args.repeats, args.preprocess)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"💾 결과 저장: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
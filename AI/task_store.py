@@ -0,0 +1,454 @@
+#!/usr/bin/env python3
+"""
+Task Store
+SQLite 기반 사용자 일정 저장소 (사용자/날짜 인덱스 + 변경 로그 기반 증분 동기화)
+
+- 추가/수정/삭제는 해당 일정 한 행만 변경 (전체 목록 재직렬화 없음)
+- 날짜 범위 조회는 (user_id, date) 인덱스 구간 탐색
+- 동기화: 클라이언트가 마지막으로 받은 cursor 이후의 변경만 전달
+"""
+
+import time
+import sqlite3
+import logging
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timedelta, tzinfo
+from zoneinfo import ZoneInfo
+from typing import Dict, Any, Optional, List, Callable
+
+# 시간대 없는 일정 시각을 해석할 기본 시간대 (앱의 DateTime.toIso8601String()은 기기 지역 시간)
+DEFAULT_TIMEZONE = "Asia/Seoul"
+
+# 변경 종류
+UPSERT = "upsert"
+DELETE = "delete"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS tasks (
+    user_id TEXT NOT NULL,
+    id TEXT NOT NULL,
+    title TEXT NOT NULL,
+    date TEXT NOT NULL,
+    is_completed INTEGER NOT NULL DEFAULT 0,
+    is_important INTEGER NOT NULL DEFAULT 0,
+    version INTEGER NOT NULL,
+    deleted INTEGER NOT NULL DEFAULT 0,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (user_id, id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_tasks_user_date ON tasks (user_id, date) WHERE deleted = 0;
+CREATE INDEX IF NOT EXISTS idx_tasks_tombstones ON tasks (updated_at) WHERE deleted = 1;
+
+-- 일정마다 마지막 변경 한 건만 유지 (로그 크기 = 일정 수 + 보관 중인 삭제 표시 수)
+CREATE TABLE IF NOT EXISTS task_changes (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id TEXT NOT NULL,
+    task_id TEXT NOT NULL,
+    op TEXT NOT NULL,
+    changed_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_changes_user_seq ON task_changes (user_id, seq);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_changes_user_task ON task_changes (user_id, task_id);
+
+-- 사용자별로 정리된 삭제 표시의 최대 seq (이보다 오래된 cursor는 전체 재동기화 필요)
+CREATE TABLE IF NOT EXISTS sync_floor (
+    user_id TEXT PRIMARY KEY,
+    seq INTEGER NOT NULL
+);
+"""
+
+
+class VersionConflict(Exception):
+    """expected_version과 저장된 일정 버전이 다름 (다른 기기에서 먼저 수정됨)"""
+    pass
+
+
+class CursorExpired(Exception):
+    """cursor 이후의 삭제 기록이 정리되어 증분 동기화 불가 (전체 목록을 다시 받아야 함)"""
+    pass
+
+
+def normalize_date(value: str, tz: tzinfo) -> str:
+    """
+    ISO 8601 날짜를 고정 형식으로 변환 (문자열 비교 = 시간 비교가 되도록)
+
+    앱의 DateTime.toIso8601String() 형식(예: 2025-07-01T09:00:00.000)과 호환
+    저장 값은 항상 tz 기준의 시간대 없는 지역 시각 (시간대가 없는 입력은 tz의 시각으로 간주)
+    """
+    try:
+        parsed = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+    except ValueError:
+        raise ValueError(f"Invalid date: {value}")
+    if parsed.tzinfo is not None:
+        # 시간대가 있는 값(예: toUtc()의 Z 접미사)은 tz의 지역 시각으로 바꿔 저장
+        parsed = parsed.astimezone(tz).replace(tzinfo=None)
+    return parsed.isoformat(timespec="milliseconds")
+
+
+class TaskStore:
+    """사용자별 일정 저장소"""
+
+    def __init__(self, db_path: str = "tasks.db", tombstone_ttl: float = 30 * 86400,
+                 max_page_size: int = 1000, timezone: str = DEFAULT_TIMEZONE):
+        """
+        Args:
+            db_path: SQLite 데이터베이스 경로
+            tombstone_ttl: 삭제 표시 보관 시간 (초, 이보다 오래 동기화하지 않은 기기는 전체 재동기화)
+            max_page_size: 조회/동기화 한 번에 반환하는 최대 일정 수
+            timezone: 일정 시각의 기준 시간대 (IANA 이름, 시간대 없는 앱 날짜를 이 시간대로 해석)
+        """
+        self.db_path = db_path
+        self.tz = ZoneInfo(timezone)
+        self.config = {
+            "tombstone_ttl": tombstone_ttl,
+            "max_page_size": max_page_size,
+            "timezone": timezone,
+        }
+        self._stop_event = threading.Event()
+        self._janitor = None
+        self._listeners: List[Callable[[str, str, Dict[str, Any]], None]] = []
+
+        self._setup_logging()
+        self._initialize_db()
+
+    def _setup_logging(self):
+        self.logger = logging.getLogger(__name__)
+
+    @contextmanager
+    def _connect(self):
+        """autocommit 연결 (사용 후 닫음)"""
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    @contextmanager
+    def _transaction(self):
+        """쓰기 트랜잭션 (일정 변경과 변경 로그 기록을 원자적으로)"""
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+
+    def _initialize_db(self):
+        """테이블 생성 및 WAL 모드 설정"""
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+
+    def start(self):
+        """오래된 삭제 표시 정리 스레드 시작"""
+        self._stop_event.clear()
+        self._janitor = threading.Thread(target=self._janitor_loop, name="task-janitor", daemon=True)
+        self._janitor.start()
+
+    def stop(self, timeout: float = 5.0):
+        self._stop_event.set()
+        if self._janitor is not None:
+            self._janitor.join(timeout=timeout)
+            self._janitor = None
+
+    def add_listener(self, listener: Callable[[str, str, Dict[str, Any]], None]):
+        """커밋된 변경마다 호출할 함수 등록 (user_id, op, task) - 예: 알림 재예약"""
+        self._listeners.append(listener)
+
+    def _notify(self, user_id: str, op: str, task: Dict[str, Any]):
+        for listener in self._listeners:
+            try:
+                listener(user_id, op, task)
+            except Exception as e:
+                self.logger.error(f"Task change listener failed: {e}")
+
+    @staticmethod
+    def _to_task(row: sqlite3.Row) -> Dict[str, Any]:
+        """앱 Task 모델(Task.fromJson)과 같은 키의 dict"""
+        return {
+            "id": row["id"],
+            "title": row["title"],
+            "date": row["date"],
+            "isCompleted": bool(row["is_completed"]),
+            "isImportant": bool(row["is_important"]),
+            "version": row["version"],
+        }
+
+    def _log_change(self, conn: sqlite3.Connection, user_id: str, task_id: str, op: str,
+                    now: float) -> int:
+        """변경 로그 기록 (같은 일정의 이전 변경은 대체) 후 새 seq 반환"""
+        conn.execute("DELETE FROM task_changes WHERE user_id = ? AND task_id = ?", (user_id, task_id))
+        cursor = conn.execute(
+            "INSERT INTO task_changes (user_id, task_id, op, changed_at) VALUES (?, ?, ?, ?)",
+            (user_id, task_id, op, now)
+        )
+        return cursor.lastrowid
+
+    def upsert(self, user_id: str, task: Dict[str, Any],
+               expected_version: Optional[int] = None) -> Dict[str, Any]:
+        """
+        일정 추가/수정
+
+        Args:
+            user_id: 사용자 ID
+            task: 앱 Task JSON (id, title, date, isCompleted, isImportant)
+            expected_version: 지정시 저장된 버전이 같을 때만 수정 (0이면 새 일정일 때만 추가)
+
+        Returns:
+            Dict[str, Any]: 저장된 일정 (새 version 포함)
+
+        Raises:
+            ValueError: 필수 필드 누락/잘못된 날짜
+            VersionConflict: expected_version 불일치
+        """
+        task_id = task.get("id")
+        title = task.get("title")
+        if not task_id or title is None or not task.get("date"):
+            raise ValueError("Task requires id, title and date")
+        date = normalize_date(task["date"], self.tz)
+
+        now = time.time()
+        with self._transaction() as conn:
+            if expected_version is not None:
+                row = conn.execute(
+                    "SELECT version, deleted FROM tasks WHERE user_id = ? AND id = ?", (user_id, task_id)
+                ).fetchone()
+                current = row["version"] if row is not None and not row["deleted"] else 0
+                if current != expected_version:
+                    raise VersionConflict(f"Task {task_id} is at version {current}, expected {expected_version}")
+
+            version = self._log_change(conn, user_id, task_id, UPSERT, now)
+            conn.execute(
+                "INSERT INTO tasks (user_id, id, title, date, is_completed, is_important, version, deleted, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, 0, ?) "
+                "ON CONFLICT (user_id, id) DO UPDATE SET title = excluded.title, date = excluded.date, "
+                "is_completed = excluded.is_completed, is_important = excluded.is_important, "
+                "version = excluded.version, deleted = 0, updated_at = excluded.updated_at",
+                (user_id, task_id, str(title), date, int(bool(task.get("isCompleted"))),
+                 int(bool(task.get("isImportant"))), version, now)
+            )
+
+        saved = {
+            "id": task_id,
+            "title": str(title),
+            "date": date,
+            "isCompleted": bool(task.get("isCompleted")),
+            "isImportant": bool(task.get("isImportant")),
+            "version": version,
+        }
+        self._notify(user_id, UPSERT, saved)
+        return saved
+
+    def delete(self, user_id: str, task_id: str, expected_version: Optional[int] = None) -> bool:
+        """
+        일정 삭제 (동기화를 위해 삭제 표시만 남김)
+
+        Returns:
+            bool: 삭제 여부 (없거나 이미 삭제된 일정이면 False)
+
+        Raises:
+            VersionConflict: expected_version 불일치
+        """
+        now = time.time()
+        with self._transaction() as conn:
+            row = conn.execute(
+                "SELECT version FROM tasks WHERE user_id = ? AND id = ? AND deleted = 0", (user_id, task_id)
+            ).fetchone()
+            if row is None:
+                return False
+            if expected_version is not None and row["version"] != expected_version:
+                raise VersionConflict(f"Task {task_id} is at version {row['version']}, expected {expected_version}")
+
+            version = self._log_change(conn, user_id, task_id, DELETE, now)
+            conn.execute(
+                "UPDATE tasks SET deleted = 1, version = ?, updated_at = ? WHERE user_id = ? AND id = ?",
+                (version, now, user_id, task_id)
+            )
+        self._notify(user_id, DELETE, {"id": task_id, "version": version})
+        return True
+
+    def get(self, user_id: str, task_id: str) -> Optional[Dict[str, Any]]:
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT * FROM tasks WHERE user_id = ? AND id = ? AND deleted = 0", (user_id, task_id)
+            ).fetchone()
+        return self._to_task(row) if row is not None else None
+
+    def list_range(self, user_id: str, start: Optional[str] = None, end: Optional[str] = None,
+                   limit: Optional[int] = None, after: Optional[str] = None) -> Dict[str, Any]:
+        """
+        날짜 범위의 일정 (날짜순, [start, end))
+
+        Args:
+            start: 시작 시각 (ISO 8601, 없으면 처음부터)
+            end: 끝 시각 (ISO 8601, 포함하지 않음, 없으면 끝까지)
+            limit: 최대 일정 수 (max_page_size로 제한)
+            after: 이전 페이지의 next 값 (다음 페이지 조회)
+
+        Returns:
+            Dict[str, Any]: tasks, next (다음 페이지가 있으면 after로 넘길 값), cursor (현재 동기화 위치)
+
+        Raises:
+            ValueError: 잘못된 날짜 또는 1보다 작은 limit
+        """
+        limit = self._page_size(limit)
+        clauses, params = ["user_id = ?", "deleted = 0"], [user_id]
+        if start:
+            clauses.append("date >= ?")
+            params.append(normalize_date(start, self.tz))
+        if end:
+            clauses.append("date < ?")
+            params.append(normalize_date(end, self.tz))
+        if after:
+            # (date, id) 순서의 키셋 페이지네이션
+            after_date, _, after_id = after.partition("|")
+            clauses.append("(date > ? OR (date = ? AND id > ?))")
+            params += [after_date, after_date, after_id]
+
+        with self._connect() as conn:
+            # 목록과 cursor를 같은 스냅샷에서 읽어야 사이에 생긴 변경이 동기화에서 빠지지 않음
+            conn.execute("BEGIN")
+            try:
+                rows = conn.execute(
+                    f"SELECT * FROM tasks WHERE {' AND '.join(clauses)} ORDER BY date, id LIMIT ?",
+                    (*params, limit + 1)
+                ).fetchall()
+                cursor = self._latest_seq(conn, user_id)
+            finally:
+                conn.execute("COMMIT")
+
+        tasks = [self._to_task(row) for row in rows[:limit]]
+        next_key = f"{tasks[-1]['date']}|{tasks[-1]['id']}" if len(rows) > limit else None
+        return {"tasks": tasks, "next": next_key, "cursor": cursor}
+
+    def list_for_date(self, user_id: str, date: str, limit: Optional[int] = None,
+                      after: Optional[str] = None) -> Dict[str, Any]:
+        """
+        특정 날짜(기준 시간대의 하루)의 일정 (list_range와 같은 페이지 형식, next가 있으면 after로 이어서 조회)
+        """
+        day = datetime.fromisoformat(normalize_date(date, self.tz)).replace(hour=0, minute=0, second=0, microsecond=0)
+        return self.list_range(user_id, day.isoformat(), (day + timedelta(days=1)).isoformat(),
+                               limit=limit, after=after)
+
+    def _page_size(self, limit: Optional[int]) -> int:
+        """요청한 limit을 페이지 크기로 (SQLite는 음수 LIMIT을 무제한으로 처리하므로 거부)"""
+        if limit is None:
+            return self.config["max_page_size"]
+        if limit < 1:
+            raise ValueError(f"Invalid limit: {limit}")
+        return min(limit, self.config["max_page_size"])
+
+    @staticmethod
+    def _latest_seq(conn: sqlite3.Connection, user_id: str) -> int:
+        row = conn.execute(
+            "SELECT MAX(seq) FROM task_changes WHERE user_id = ?", (user_id,)
+        ).fetchone()
+        floor = conn.execute("SELECT seq FROM sync_floor WHERE user_id = ?", (user_id,)).fetchone()
+        return max(row[0] or 0, floor["seq"] if floor is not None else 0)
+
+    def changes_since(self, user_id: str, cursor: int = 0, limit: Optional[int] = None) -> Dict[str, Any]:
+        """
+        cursor 이후의 변경 (증분 동기화)
+
+        Args:
+            cursor: 이전 동기화 응답의 cursor (0이면 처음부터 - 전체 목록)
+            limit: 최대 변경 수 (max_page_size로 제한)
+
+        Returns:
+            Dict[str, Any]: changes ([{op, id, task?}]), cursor (다음 요청에 보낼 값), has_more
+
+        Raises:
+            CursorExpired: cursor 이후에 정리된 삭제 기록이 있음
+            ValueError: 1보다 작은 limit
+        """
+        limit = self._page_size(limit)
+        with self._connect() as conn:
+            conn.execute("BEGIN")
+            try:
+                floor = conn.execute("SELECT seq FROM sync_floor WHERE user_id = ?", (user_id,)).fetchone()
+                if cursor and floor is not None and cursor < floor["seq"]:
+                    raise CursorExpired(f"Cursor {cursor} is older than retained history ({floor['seq']})")
+
+                rows = conn.execute(
+                    "SELECT c.seq, c.task_id, c.op, t.title, t.date, t.is_completed, t.is_important, t.version "
+                    "FROM task_changes c JOIN tasks t ON t.user_id = c.user_id AND t.id = c.task_id "
+                    "WHERE c.user_id = ? AND c.seq > ? ORDER BY c.seq LIMIT ?",
+                    (user_id, cursor, limit + 1)
+                ).fetchall()
+                latest = self._latest_seq(conn, user_id)
+            finally:
+                conn.execute("COMMIT")
+
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        changes = []
+        for row in rows:
+            if row["op"] == DELETE:
+                if cursor == 0:
+                    # 처음 동기화하는 기기에는 삭제 표시가 필요 없음
+                    continue
+                changes.append({"op": DELETE, "id": row["task_id"], "version": row["seq"]})
+            else:
+                changes.append({"op": UPSERT, "id": row["task_id"], "task": {
+                    "id": row["task_id"],
+                    "title": row["title"],
+                    "date": row["date"],
+                    "isCompleted": bool(row["is_completed"]),
+                    "isImportant": bool(row["is_important"]),
+                    "version": row["version"],
+                }})
+
+        next_cursor = rows[-1]["seq"] if has_more else max(latest, cursor)
+        return {"changes": changes, "cursor": next_cursor, "has_more": has_more}
+
+    def _janitor_loop(self):
+        """보관 시간이 지난 삭제 표시 정리"""
+        while not self._stop_event.wait(timeout=3600):
+            try:
+                self.purge_tombstones()
+            except sqlite3.Error as e:
+                self.logger.error(f"Failed to purge task tombstones: {e}")
+
+    def purge_tombstones(self, batch_size: int = 10000) -> int:
+        """
+        보관 시간이 지난 삭제 표시와 그 변경 로그 삭제
+
+        정리된 seq는 사용자별 sync_floor로 남겨, 그보다 오래된 cursor로 동기화하는 기기가
+        삭제를 놓치지 않고 전체 재동기화하도록 함
+        """
+        cutoff = time.time() - self.config["tombstone_ttl"]
+        purged = 0
+        while True:
+            with self._transaction() as conn:
+                rows = conn.execute(
+                    "SELECT user_id, id, version FROM tasks WHERE deleted = 1 AND updated_at < ? LIMIT ?",
+                    (cutoff, batch_size)
+                ).fetchall()
+                floors: Dict[str, int] = {}
+                for row in rows:
+                    floors[row["user_id"]] = max(floors.get(row["user_id"], 0), row["version"])
+                    conn.execute("DELETE FROM tasks WHERE user_id = ? AND id = ?", (row["user_id"], row["id"]))
+                    conn.execute("DELETE FROM task_changes WHERE user_id = ? AND task_id = ?",
+                                 (row["user_id"], row["id"]))
+                for user_id, seq in floors.items():
+                    conn.execute(
+                        "INSERT INTO sync_floor (user_id, seq) VALUES (?, ?) "
+                        "ON CONFLICT (user_id) DO UPDATE SET seq = MAX(seq, excluded.seq)",
+                        (user_id, seq)
+                    )
+            purged += len(rows)
+            if len(rows) < batch_size:
+                break
+        if purged:
+            self.logger.info(f"Purged {purged} task tombstones")
+        return purged
+
+    def get_stats(self) -> Dict[str, Any]:
+        """저장소 상태 (전체 개수 대신 변경 로그 위치만 조회 - O(1))"""
+        with self._connect() as conn:
+            row = conn.execute("SELECT MAX(seq) FROM task_changes").fetchone()
+        return {"db_path": self.db_path, "latest_seq": row[0] or 0}
@@ -12,7 +12,7 @@ import tempfile
 import soundfile as sf
 import numpy as np
 from datetime import datetime
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Optional, Union
 from dotenv import load_dotenv
 
 # AI 모듈 import
@@ -20,6 +20,11 @@ sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'Models'))
 from Models.STT import WhisperSTT
 from Models.LLM import LLMFactory
 from Models.TTS import TTS
+from Models.Memory import ConversationMemory, make_llm_summarizer
+
+# 대화형 어시스턴트 시스템 프롬프트 (매 턴 동일하게 유지되어 프롬프트 캐시 대상)
+CHAT_SYSTEM_PROMPT = """당신은 친근하고 도움이 되는 AI 어시스턴트입니다.
+사용자의 메시지에 대해 자연스럽고 유용한 응답을 제공하세요."""
 
 class VoiceChatPipeline:
     """음성 대화 파이프라인"""
@@ -65,19 +70,23 @@ class VoiceChatPipeline:
         self.stt.optimize_for_korean(True)
         
         # LLM 초기화 (GPT/Gemini 선택 가능)
-        self.llm = LLMFactory.create_llm(self.llm_type)
+        self.llm = LLMFactory.create_llm(self.llm_type, system_prompt=CHAT_SYSTEM_PROMPT)
+        
+        # 대화 기록 (오래된 턴은 LLM으로 요약)
+        self.memory = ConversationMemory(summarizer=make_llm_summarizer(self.llm))
         
         # TTS 초기화
         self.tts = TTS()
         
         self.logger.info("All AI components initialized successfully")
     
-    def chat_with_voice(self, audio_input_path: str) -> Dict[str, Any]:
+    def chat_with_voice(self, audio_input: Union[str, np.ndarray], session_id: str = "default") -> Dict[str, Any]:
         """
         음성으로 대화하는 메인 함수
         
         Args:
-            audio_input_path: 입력 음성 파일 경로
+            audio_input: 입력 음성 파일 경로 또는 16kHz mono float32 배열 (마이크 입력, 파일 저장 없음)
+            session_id: 대화 세션 ID (세션별로 대화 기록 유지)
             
         Returns:
             Dict[str, Any]: 대화 결과
@@ -85,15 +94,16 @@ class VoiceChatPipeline:
         start_time = time.time()
         
         try:
-            self.logger.info(f"Starting voice chat with: {audio_input_path}")
+            if isinstance(audio_input, str):
+                self.logger.info(f"Starting voice chat with: {audio_input}")
             
             # Step 1: STT (음성 → 텍스트)
-            user_message = self._process_stt(audio_input_path)
+            user_message = self._process_stt(audio_input)
             if not user_message:
                 return self._create_error_response("음성을 텍스트로 변환할 수 없습니다.")
             
             # Step 2: LLM (텍스트 → AI 응답)
-            ai_response = self._process_llm(user_message)
+            ai_response = self._process_llm(user_message, session_id)
             
             # Step 3: TTS (AI 응답 → 음성)
             audio_response = self._process_tts(ai_response)
@@ -108,26 +118,24 @@ class VoiceChatPipeline:
             self.logger.error(f"Voice chat failed: {e}")
             return self._create_error_response(str(e))
     
-    def _process_stt(self, audio_path: str) -> str:
+    def _process_stt(self, audio_input: Union[str, np.ndarray]) -> str:
         """STT 처리"""
         self.logger.info("Processing STT...")
-        transcribed_text = self.stt.transcribe(audio_path, use_preprocessing=True)
+        if isinstance(audio_input, np.ndarray):
+            transcribed_text = self.stt.transcribe_array(audio_input)
+        else:
+            transcribed_text = self.stt.transcribe(audio_input, use_preprocessing=True)
         self.logger.info(f"STT 결과: {transcribed_text}")
         return transcribed_text
     
-    def _process_llm(self, user_message: str) -> str:
-        """LLM 처리"""
+    def _process_llm(self, user_message: str, session_id: str = "default") -> str:
+        """LLM 처리 (세션 대화 기록 포함)"""
         self.logger.info("Processing LLM...")
         
-        # 대화형 프롬프트 구성
-        conversation_prompt = f"""
-당신은 친근하고 도움이 되는 AI 어시스턴트입니다.
-사용자의 메시지에 대해 자연스럽고 유용한 응답을 제공하세요.
-
-사용자: {user_message}
-AI: """
+        history = self.memory.get_context(session_id)
+        llm_response = self.llm.generate_response(user_message, history=history)
+        self.memory.add_turn(session_id, user_message, llm_response)
         
-        llm_response = self.llm.generate_response(conversation_prompt)
         self.logger.info(f"LLM 응답: {llm_response}")
         return llm_response
     
@@ -179,8 +187,13 @@ AI: """
         """LLM 모델 변경"""
         self.logger.info(f"Changing LLM model to: {llm_type}")
         self.llm_type = llm_type
-        self.llm = LLMFactory.create_llm(llm_type)
+        self.llm = LLMFactory.create_llm(llm_type, system_prompt=CHAT_SYSTEM_PROMPT)
+        self.memory.summarizer = make_llm_summarizer(self.llm)
         self.logger.info(f"LLM model changed successfully to {llm_type}")
+    
+    def reset_conversation(self, session_id: str = "default"):
+        """세션 대화 기록 초기화"""
+        self.memory.clear(session_id)
 
 def main():
     """테스트용 메인 함수"""
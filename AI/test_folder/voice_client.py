@@ -0,0 +1,441 @@
+#!/usr/bin/env python3
+"""
+Voice Capture Client - 발화 끝 감지(endpointing) + 스트리밍 업로드 + 스트리밍 재생
+마이크 입력을 VAD로 판별해 말이 시작되면 서버로 바로 보내기 시작하고,
+말이 끝난 뒤 일정 시간 조용하면 전송을 마침 (중간 파일 없음)
+
+응답 음성(Opus/MP3/PCM)은 도착하는 대로 디코딩해 첫 프레임부터 재생
+(응답 길이와 관계없이 첫 소리까지의 시간이 일정)
+
+사용 예:
+    python voice_client.py --server http://localhost:5000
+"""
+
+import os
+import sys
+import json
+import math
+import time
+import uuid
+import queue
+import shutil
+import argparse
+import threading
+import itertools
+import http.client
+from collections import deque
+from urllib.parse import urlparse, unquote
+from typing import Dict, Any, Iterable, Iterator, Optional, List
+
+import numpy as np
+
+try:
+    import webrtcvad
+except ImportError:
+    webrtcvad = None
+
+# 응답 음성 디코딩 (AI/audio_codec.py)
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from audio_codec import CODECS, PCM_SAMPLE_RATE, codec_for_content_type, decode_stream
+
+
+class EnergyVAD:
+    """
+    프레임 에너지 기반 음성 판별 (배경 소음 수준을 따라가며 그보다 충분히 크면 음성)
+
+    webrtcvad가 설치되어 있으면 그 판별 결과와 함께 사용
+    """
+
+    def __init__(self, sample_rate: int = 16000, threshold_db: float = 10.0,
+                 min_level_db: float = -50.0, noise_adapt: float = 0.05,
+                 aggressiveness: Optional[int] = 2):
+        """
+        Args:
+            sample_rate: 입력 샘플링 레이트
+            threshold_db: 소음 수준보다 이만큼 크면 음성으로 판단
+            min_level_db: 이보다 작은 프레임은 항상 무음 (dBFS)
+            noise_adapt: 무음 프레임마다 소음 수준을 따라가는 비율
+            aggressiveness: webrtcvad 민감도 (0~3, None이면 에너지 판별만 사용)
+        """
+        self.sample_rate = sample_rate
+        self.threshold_db = threshold_db
+        self.min_level_db = min_level_db
+        self.noise_adapt = noise_adapt
+        self.noise_db = None
+        self._webrtc = webrtcvad.Vad(aggressiveness) if webrtcvad and aggressiveness is not None else None
+
+    @staticmethod
+    def level_db(frame: bytes) -> float:
+        samples = np.frombuffer(frame, dtype="<i2").astype(np.float32) / 32768.0
+        rms = math.sqrt(float(np.mean(samples * samples))) if len(samples) else 0.0
+        return 20 * math.log10(max(rms, 1e-5))
+
+    def is_speech(self, frame: bytes) -> bool:
+        level = self.level_db(frame)
+        if self.noise_db is None:
+            self.noise_db = level
+        speech = level >= self.min_level_db and level >= self.noise_db + self.threshold_db
+        if speech and self._webrtc is not None:
+            try:
+                speech = self._webrtc.is_speech(frame, self.sample_rate)
+            except Exception:
+                # 10/20/30ms가 아닌 프레임은 에너지 판별만 사용
+                pass
+        if not speech:
+            self.noise_db += self.noise_adapt * (level - self.noise_db)
+        return speech
+
+
+class Endpointer:
+    """
+    프레임 단위 발화 구간 판별
+
+    - 대기: 음성 프레임이 start_ms 이상 이어지면 시작 (직전 pre_roll_ms 포함해 내보냄)
+    - 발화 중: 모든 프레임을 내보내고, 무음이 trailing_silence_ms 이어지면 종료
+    - 안전 장치: 발화가 max_seconds를 넘거나 no_speech_timeout 동안 말이 없으면 종료
+    """
+
+    def __init__(self, vad: EnergyVAD, frame_ms: int = 30, start_ms: int = 90,
+                 trailing_silence_ms: int = 700, pre_roll_ms: int = 300,
+                 max_seconds: float = 15.0, no_speech_timeout: float = 8.0):
+        self.vad = vad
+        self.frame_ms = frame_ms
+        self.start_frames = max(1, start_ms // frame_ms)
+        self.trailing_frames = max(1, trailing_silence_ms // frame_ms)
+        self.max_frames = int(max_seconds * 1000 / frame_ms)
+        self.timeout_frames = int(no_speech_timeout * 1000 / frame_ms)
+        self._pre_roll = deque(maxlen=max(self.start_frames, pre_roll_ms // frame_ms))
+        self._voiced_run = 0
+        self._silent_run = 0
+        self._waited = 0
+        self.speech_frames = 0
+        self.started = False
+        self.done = False
+        self.reason = None
+        self.ended_at = None
+
+    def process(self, frame: bytes) -> List[bytes]:
+        """프레임 하나를 판별해 서버로 보낼 프레임 목록 반환"""
+        if self.done:
+            return []
+        speech = self.vad.is_speech(frame)
+
+        if not self.started:
+            self._waited += 1
+            self._pre_roll.append(frame)
+            self._voiced_run = self._voiced_run + 1 if speech else 0
+            if self._voiced_run >= self.start_frames:
+                self.started = True
+                emitted = list(self._pre_roll)
+                self._pre_roll.clear()
+                self.speech_frames = len(emitted)
+                return emitted
+            if self._waited >= self.timeout_frames:
+                self._finish("no_speech")
+            return []
+
+        self.speech_frames += 1
+        self._silent_run = 0 if speech else self._silent_run + 1
+        if self._silent_run >= self.trailing_frames:
+            self._finish("trailing_silence")
+        elif self.speech_frames >= self.max_frames:
+            self._finish("max_length")
+        return [frame]
+
+    def _finish(self, reason: str):
+        self.done = True
+        self.reason = reason
+        self.ended_at = time.time()
+
+
+def capture_utterance(p, endpointer: Endpointer, rate: int = 16000,
+                      on_start=None) -> Iterator[bytes]:
+    """
+    마이크에서 발화 하나를 읽으며 PCM16 프레임을 바로 내보냄
+
+    Args:
+        p: pyaudio.PyAudio 인스턴스
+        endpointer: 발화 구간 판별기 (프레임 길이 기준)
+        on_start: 말이 시작된 시점에 호출할 함수
+    """
+    import pyaudio
+
+    frame_samples = rate * endpointer.frame_ms // 1000
+    stream = p.open(format=pyaudio.paInt16, channels=1, rate=rate, input=True,
+                    frames_per_buffer=frame_samples)
+    try:
+        while not endpointer.done:
+            frame = stream.read(frame_samples, exception_on_overflow=False)
+            was_started = endpointer.started
+            emitted = endpointer.process(frame)
+            if emitted and not was_started and on_start is not None:
+                on_start()
+            yield from emitted
+    finally:
+        stream.stop_stream()
+        stream.close()
+
+
+# 말이 시작되지 않아 서버로 보내지 않은 발화의 결과
+NO_SPEECH_RESULT = {"success": False, "error": "음성이 감지되지 않았습니다."}
+
+
+class StreamingVoiceClient:
+    """발화를 chunked 본문으로 /process_voice에 보내는 클라이언트"""
+
+    def __init__(self, server_url: str = "http://localhost:5000", timeout: float = 60.0,
+                 client_id: Optional[str] = None):
+        parsed = urlparse(server_url)
+        self.host = parsed.hostname or "localhost"
+        self.port = parsed.port or (443 if parsed.scheme == "https" else 80)
+        self.https = parsed.scheme == "https"
+        self.timeout = timeout
+        self.client_id = client_id or uuid.uuid4().hex[:8]
+
+    def _connect(self) -> http.client.HTTPConnection:
+        cls = http.client.HTTPSConnection if self.https else http.client.HTTPConnection
+        return cls(self.host, self.port, timeout=self.timeout)
+
+    def send(self, frames: Iterator[bytes], session_id: Optional[str] = None,
+             accept: str = "application/json",
+             chunk_bytes: int = 3200) -> Optional[http.client.HTTPResponse]:
+        """
+        PCM16 프레임을 모이는 대로 (기본 100ms 단위) 전송하고 응답 반환
+
+        서버는 받는 대로 디코딩/부분 STT를 진행하므로 말이 끝날 때 업로드도 거의 끝나 있음
+        첫 프레임(말이 시작된 시점)이 나올 때까지 연결하지 않으며, 음성이 감지되지 않으면 요청 없이 None
+        """
+        frames = iter(frames)
+        first = next(frames, None)
+        if first is None:
+            return None
+
+        def body():
+            pending = b""
+            for frame in itertools.chain([first], frames):
+                pending += frame
+                if len(pending) >= chunk_bytes:
+                    yield pending
+                    pending = b""
+            if pending:
+                yield pending
+
+        headers = {
+            "Content-Type": "audio/pcm; rate=16000",
+            "Accept": accept,
+            "X-Client-ID": self.client_id,
+        }
+        if session_id:
+            headers["X-Session-ID"] = session_id
+
+        connection = self._connect()
+        connection.request("POST", "/process_voice", body=body(), headers=headers, encode_chunked=True)
+        return connection.getresponse()
+
+    def send_utterance(self, frames: Iterator[bytes], session_id: Optional[str] = None) -> Dict[str, Any]:
+        """발화를 보내고 JSON 결과 반환 (audio_output은 MP3 base64)"""
+        response = self.send(frames, session_id)
+        if response is None:
+            return dict(NO_SPEECH_RESULT)
+        payload = json.loads(response.read().decode("utf-8") or "{}")
+        if response.status != 200:
+            return {"success": False, "error": payload.get("error", f"HTTP {response.status}")}
+        return payload
+
+    def send_and_play(self, frames: Iterator[bytes], player: "StreamingPlayer",
+                      session_id: Optional[str] = None, codec: Optional[str] = None,
+                      on_result=None) -> Dict[str, Any]:
+        """
+        발화를 보내고 응답 음성을 받는 대로 재생
+
+        Args:
+            codec: 요청할 응답 코덱 (기본값: ffmpeg가 있으면 opus, 없으면 디코딩이 필요 없는 pcm)
+            on_result: 재생 시작 전 텍스트 결과(응답 헤더)를 받을 함수
+
+        Returns:
+            Dict[str, Any]: 텍스트 결과 + 재생 통계 (playback)
+        """
+        codec = codec or ("opus" if shutil.which("ffmpeg") else "pcm")
+        response = self.send(frames, session_id, accept=f"{CODECS[codec]['mime']}, application/json;q=0.1")
+        if response is None:
+            return dict(NO_SPEECH_RESULT)
+        response_codec = codec_for_content_type(response.getheader("Content-Type"))
+        if response.status != 200 or response_codec is None:
+            # 실패 또는 음성이 없는 결과는 JSON으로 옴
+            payload = json.loads(response.read().decode("utf-8") or "{}")
+            if response.status != 200:
+                return {"success": False, "error": payload.get("error", f"HTTP {response.status}")}
+            return payload
+
+        result = {
+            "success": True,
+            "transcribed_text": unquote(response.getheader("X-Transcript", "")),
+            "llm_response": unquote(response.getheader("X-LLM-Response", "")),
+            "total_time": float(response.getheader("X-Total-Time") or 0.0),
+        }
+        if on_result is not None:
+            on_result(result)
+        result["playback"] = player.play(iter(lambda: response.read1(4096), b""), response_codec)
+        return result
+
+
+class StreamingPlayer:
+    """
+    압축 음성 스트림을 받는 대로 디코딩해 재생
+
+    네트워크 수신/디코딩 스레드와 출력 스레드 사이에 크기가 제한된 지터 버퍼를 두어
+    - prebuffer_ms만큼 모이면 바로 출력 시작 (전체 응답을 기다리지 않음)
+    - 버퍼가 비면(underrun) 다시 prebuffer_ms만큼 모일 때까지 대기
+    - 버퍼가 가득 차면 수신을 멈춰 메모리 사용량을 buffer_ms로 제한 (TCP 흐름 제어로 전달)
+    """
+
+    def __init__(self, p, block_ms: int = 40, prebuffer_ms: int = 120, buffer_ms: int = 2000):
+        """
+        Args:
+            p: pyaudio.PyAudio 인스턴스
+            block_ms: 출력 장치에 한 번에 쓰는 길이
+            prebuffer_ms: 출력 시작(재개) 전에 모을 길이
+            buffer_ms: 지터 버퍼 최대 길이
+        """
+        self.p = p
+        self.block_ms = block_ms
+        self.prebuffer_blocks = max(1, prebuffer_ms // block_ms)
+        self.max_blocks = max(self.prebuffer_blocks, buffer_ms // block_ms)
+
+    def _produce(self, source: Iterable[bytes], codec: Optional[str], jitter: queue.Queue,
+                 stop: threading.Event, errors: List[Exception]):
+        def put(item) -> bool:
+            # 버퍼가 가득 차면 출력이 따라올 때까지 대기 (재생이 중단되면 포기)
+            while not stop.is_set():
+                try:
+                    jitter.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+
+        block_samples = PCM_SAMPLE_RATE * self.block_ms // 1000
+        try:
+            for decoded in decode_stream(source, codec, block_seconds=self.block_ms / 1000):
+                pcm = (np.clip(decoded, -1.0, 1.0) * 32767).astype("<i2")
+                # 큰 조각(예: PCM 응답)도 block_ms 단위로 나눠 버퍼 크기 제한이 유지되도록
+                for start in range(0, len(pcm), block_samples):
+                    if not put(pcm[start:start + block_samples].tobytes()):
+                        return
+        except Exception as e:
+            errors.append(e)
+        finally:
+            put(None)
+
+    @staticmethod
+    def _fill(jitter: queue.Queue, pending: deque, target: int, wait: bool) -> bool:
+        """pending이 target개가 될 때까지 버퍼에서 꺼냄 (스트림이 끝났으면 True)"""
+        while len(pending) < target:
+            try:
+                block = jitter.get() if wait else jitter.get_nowait()
+            except queue.Empty:
+                return False
+            if block is None:
+                return True
+            pending.append(block)
+        return False
+
+    def play(self, source: Iterable[bytes], codec: Optional[str] = "mp3") -> Dict[str, Any]:
+        """
+        음성 바이트 조각을 재생 (재생이 끝날 때까지 대기)
+
+        Args:
+            source: 음성 바이트 조각 (예: chunked 응답 본문, 전체 MP3 바이트 [audio])
+            codec: 입력 코덱 (CODECS 키, None이면 ffmpeg가 판별)
+
+        Returns:
+            Dict[str, Any]: time_to_first_sound(초), underruns, played_seconds
+        """
+        import pyaudio
+
+        started_at = time.monotonic()
+        jitter: queue.Queue = queue.Queue(maxsize=self.max_blocks)
+        stop = threading.Event()
+        errors: List[Exception] = []
+        producer = threading.Thread(target=self._produce, args=(source, codec, jitter, stop, errors),
+                                    name="playback-decoder", daemon=True)
+        producer.start()
+
+        stream = self.p.open(format=pyaudio.paInt16, channels=1, rate=PCM_SAMPLE_RATE, output=True,
+                             frames_per_buffer=PCM_SAMPLE_RATE * self.block_ms // 1000)
+        stats = {"time_to_first_sound": None, "underruns": 0, "played_seconds": 0.0}
+        pending: deque = deque()
+        finished = False
+        try:
+            while True:
+                if not pending and not finished:
+                    # 시작 전 또는 버퍼가 빈 경우 prebuffer만큼 모일 때까지 대기
+                    if stats["time_to_first_sound"] is not None:
+                        stats["underruns"] += 1
+                    finished = self._fill(jitter, pending, self.prebuffer_blocks, wait=True)
+                if not pending:
+                    break
+
+                block = pending.popleft()
+                if stats["time_to_first_sound"] is None:
+                    stats["time_to_first_sound"] = round(time.monotonic() - started_at, 3)
+                stream.write(block)
+                stats["played_seconds"] += len(block) / 2 / PCM_SAMPLE_RATE
+                if not finished:
+                    finished = self._fill(jitter, pending, self.prebuffer_blocks, wait=False)
+        finally:
+            stop.set()
+            stream.stop_stream()
+            stream.close()
+            producer.join(timeout=1.0)
+
+        if errors:
+            raise errors[0]
+        stats["played_seconds"] = round(stats["played_seconds"], 3)
+        return stats
+
+
+def main(argv=None):
+    """메인 함수 - 말이 끝날 때까지 녹음하며 서버로 전송하고 응답을 받는 대로 재생"""
+    import pyaudio
+
+    parser = argparse.ArgumentParser(description="발화 끝 감지 + 스트리밍 음성 업로드 클라이언트")
+    parser.add_argument("--server", default="http://localhost:5000", help="AI 서버 주소")
+    parser.add_argument("--session", default=None, help="대화 세션 ID")
+    parser.add_argument("--silence-ms", type=int, default=700, help="발화 종료로 판단할 무음 길이 (ms)")
+    parser.add_argument("--max-seconds", type=float, default=15.0, help="최대 발화 길이 (초)")
+    parser.add_argument("--codec", choices=sorted(CODECS), default=None,
+                        help="응답 음성 코덱 (기본값: ffmpeg가 있으면 opus, 없으면 pcm)")
+    parser.add_argument("--prebuffer-ms", type=int, default=120, help="재생 시작 전에 모을 음성 길이 (ms)")
+    args = parser.parse_args(argv)
+
+    client = StreamingVoiceClient(args.server)
+    p = pyaudio.PyAudio()
+    try:
+        print("🎤 말씀해주세요! (말이 끝나면 자동으로 전송됩니다)")
+        endpointer = Endpointer(EnergyVAD(), trailing_silence_ms=args.silence_ms,
+                                max_seconds=args.max_seconds)
+        frames = capture_utterance(p, endpointer, on_start=lambda: print("🔴 녹음 중..."))
+
+        def show(result):
+            print(f"👤 사용자: {result['transcribed_text']}")
+            print(f"🤖 AI: {result['llm_response']}")
+            print(f"⏱️ 서버 처리 시간: {result['total_time']:.2f}초 (말이 끝나고 {time.time() - endpointer.ended_at:.2f}초 후 응답)")
+
+        player = StreamingPlayer(p, prebuffer_ms=args.prebuffer_ms)
+        result = client.send_and_play(frames, player, args.session, codec=args.codec, on_result=show)
+        if endpointer.reason == "no_speech":
+            print("🔇 음성이 감지되지 않았습니다.")
+            return
+        if result.get("playback"):
+            playback = result["playback"]
+            print(f"🔊 재생 완료 (첫 소리까지 {playback['time_to_first_sound']}초, "
+                  f"{playback['played_seconds']}초 재생, 끊김 {playback['underruns']}회)")
+        elif not result.get("success"):
+            print(f"❌ 오류: {result.get('error')}")
+    finally:
+        p.terminate()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -6,89 +6,100 @@ Voice Chat Test - 음성 대화 파이프라인 테스트
 
 import os
 import time
-import wave
 import pyaudio
-import tempfile
+import numpy as np
 from dotenv import load_dotenv
 from voice_chat_pipeline import VoiceChatPipeline
+from voice_client import EnergyVAD, Endpointer, StreamingVoiceClient, StreamingPlayer, capture_utterance
 
 class VoiceChatTest:
     """음성 대화 테스트 클래스"""
     
-    def __init__(self, llm_type: str = None):
+    def __init__(self, llm_type: str = None, server_url: str = None):
         # .env 파일 로드
         load_dotenv()
         
-        self.pipeline = VoiceChatPipeline(llm_type=llm_type)
+        # AI_SERVER_URL이 있으면 말하는 동안 서버로 스트리밍, 없으면 로컬 파이프라인 사용
+        self.server_url = server_url or os.getenv('AI_SERVER_URL')
+        if self.server_url:
+            self.client = StreamingVoiceClient(self.server_url)
+            self.pipeline = None
+        else:
+            self.client = None
+            self.pipeline = VoiceChatPipeline(llm_type=llm_type)
         self.audio_format = pyaudio.paInt16
         self.channels = 1
         self.rate = 16000
         self.chunk = 1024
-        self.record_seconds = 5
+        # 발화 끝 감지: 말이 끝나고 이만큼 조용하면 녹음 종료 (고정 길이 녹음 대신)
+        self.trailing_silence_ms = int(os.getenv('TRAILING_SILENCE_MS', '700'))
+        self.max_record_seconds = float(os.getenv('MAX_RECORD_SECONDS', '15'))
         
         self.p = pyaudio.PyAudio()
+        # 응답 음성 스트리밍 재생 (지터 버퍼 크기/재생 시작 전 버퍼 길이)
+        self.player = StreamingPlayer(
+            self.p,
+            prebuffer_ms=int(os.getenv('PLAYBACK_PREBUFFER_MS', '120')),
+            buffer_ms=int(os.getenv('PLAYBACK_BUFFER_MS', '2000'))
+        )
     
-    def record_audio(self, filename: str = "test_audio.wav"):
-        """음성 녹음"""
-        print(f"🎤 {self.record_seconds}초간 음성을 녹음합니다...")
-        print("말씀해주세요!")
-        
-        stream = self.p.open(
-            format=self.audio_format,
-            channels=self.channels,
-            rate=self.rate,
-            input=True,
-            frames_per_buffer=self.chunk
+    def _listen(self):
+        """발화 하나의 PCM16 프레임 (말이 끝나면 멈춤)"""
+        print("🎤 말씀해주세요! (말이 끝나면 자동으로 녹음이 종료됩니다)")
+        endpointer = Endpointer(
+            EnergyVAD(sample_rate=self.rate),
+            trailing_silence_ms=self.trailing_silence_ms,
+            max_seconds=self.max_record_seconds
         )
+        frames = capture_utterance(self.p, endpointer, rate=self.rate,
+                                   on_start=lambda: print("🔴 녹음 중..."))
+        return endpointer, frames
+    
+    def record_audio(self) -> np.ndarray:
+        """음성 녹음 (파일 저장 없이 16kHz float32 배열 반환, 말이 없으면 빈 배열)"""
+        endpointer, frames = self._listen()
+        pcm = b''.join(frames)
+        if pcm:
+            print(f"✅ 녹음 완료! ({len(pcm) / 2 / self.rate:.1f}초)")
+        return np.frombuffer(pcm, dtype='<i2').astype(np.float32) / 32768.0
+    
+    def chat_once(self, session_id: str = "default"):
+        """발화 하나로 대화 (서버 모드는 녹음과 전송, 수신과 재생을 동시에)"""
+        if self.client is not None:
+            endpointer, frames = self._listen()
+            result = self.client.send_and_play(
+                frames, self.player, session_id,
+                on_result=lambda r: self._show(r["transcribed_text"], r["llm_response"],
+                                               time.time() - endpointer.ended_at)
+            )
+            if endpointer.reason == "no_speech":
+                return None
+            if result.get('success'):
+                playback = result.get("playback") or {}
+                print(f"✅ 재생 완료! (첫 소리까지 {playback.get('time_to_first_sound')}초, "
+                      f"끊김 {playback.get('underruns', 0)}회)")
+                return {"success": True, "user_message": result["transcribed_text"]}
+            return result
         
-        frames = []
-        
-        for i in range(0, int(self.rate / self.chunk * self.record_seconds)):
-            data = stream.read(self.chunk)
-            frames.append(data)
-        
-        print("✅ 녹음 완료!")
-        
-        stream.stop_stream()
-        stream.close()
-        
-        # WAV 파일로 저장
-        with wave.open(filename, 'wb') as wf:
-            wf.setnchannels(self.channels)
-            wf.setsampwidth(self.p.get_sample_size(self.audio_format))
-            wf.setframerate(self.rate)
-            wf.writeframes(b''.join(frames))
-        
-        return filename
+        audio = self.record_audio()
+        if not len(audio):
+            return None
+        result = self.pipeline.chat_with_voice(audio, session_id)
+        if result['success']:
+            self._show(result['user_message'], result['ai_response'], result['processing_time'])
+            # AI 응답 음성 재생
+            self.play_audio(result['audio_response'])
+        return result
+    
+    def _show(self, user_message: str, ai_response: str, processing_time: float):
+        print(f"\n👤 사용자: {user_message}")
+        print(f"🤖 AI: {ai_response}")
+        print(f"⏱️ 처리 시간: {processing_time:.2f}초")
     
     def play_audio(self, audio_data: bytes):
-        """음성 재생"""
+        """음성 재생 (TTS MP3를 디코딩되는 대로 재생)"""
         print("🔊 AI 응답을 재생합니다...")
-        
-        # 임시 파일로 저장
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.wav') as tmp_file:
-            tmp_file.write(audio_data)
-            tmp_filename = tmp_file.name
-        
-        # WAV 파일 재생
-        with wave.open(tmp_filename, 'rb') as wf:
-            stream = self.p.open(
-                format=self.p.get_format_from_width(wf.getsampwidth()),
-                channels=wf.getnchannels(),
-                rate=wf.getframerate(),
-                output=True
-            )
-            
-            data = wf.readframes(self.chunk)
-            while data:
-                stream.write(data)
-                data = wf.readframes(self.chunk)
-            
-            stream.stop_stream()
-            stream.close()
-        
-        # 임시 파일 삭제
-        os.unlink(tmp_filename)
+        self.player.play([audio_data], codec="mp3")
         print("✅ 재생 완료!")
     
     def chat_loop(self):
@@ -99,20 +110,13 @@ class VoiceChatTest:
         
         while True:
             try:
-                # 음성 녹음
-                audio_file = self.record_audio()
-                
-                # AI와 대화
-                result = self.pipeline.chat_with_voice(audio_file)
+                # 음성 녹음 + AI와 대화
+                result = self.chat_once()
+                if result is None:
+                    print("🔇 음성이 감지되지 않았습니다.")
+                    continue
                 
                 if result['success']:
-                    print(f"\n👤 사용자: {result['user_message']}")
-                    print(f"🤖 AI: {result['ai_response']}")
-                    print(f"⏱️ 처리 시간: {result['processing_time']:.2f}초")
-                    
-                    # AI 응답 음성 재생
-                    self.play_audio(result['audio_response'])
-                    
                     # 종료 확인
                     if "종료" in result['user_message'] or "끝" in result['user_message']:
                         print("\n👋 대화를 종료합니다!")
@@ -146,12 +150,15 @@ def main():
     test = VoiceChatTest(llm_type=None)  # .env에서 자동으로 가져옴
     
     # 파이프라인 정보 출력
-    info = test.pipeline.get_pipeline_info()
-    print(f"\n📊 파이프라인 정보:")
-    print(f"Device: {info['device']}")
-    print(f"LLM Type: {info['llm_type']}")
-    print(f"STT Model: {info['components']['stt']['model_name']}")
-    print(f"TTS Model: {info['components']['tts']['model_name']}")
+    if test.pipeline is not None:
+        info = test.pipeline.get_pipeline_info()
+        print(f"\n📊 파이프라인 정보:")
+        print(f"Device: {info['device']}")
+        print(f"LLM Type: {info['llm_type']}")
+        print(f"STT Model: {info['components']['stt']['model_name']}")
+        print(f"TTS Model: {info['components']['tts']['model_name']}")
+    else:
+        print(f"\n🌐 서버 스트리밍 모드: {test.server_url}")
     print()
     
     # 대화 시작
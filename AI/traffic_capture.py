@@ -0,0 +1,296 @@
+#!/usr/bin/env python3
+"""
+Traffic Capture & Replay
+실제 요청을 샘플링해 trace 파일로 저장하고, 새 빌드의 VoicePipeline으로 재실행해
+지연 시간과 변환 결과를 비교
+
+Trace 파일 (.trace, zip 형식):
+    meta.json        설정, 단계별 시간, STT/LLM 결과
+    input.<ext>      원본 음성 (무압축 저장)
+    tts_output.mp3   TTS 결과
+
+사용 예:
+    TRACE_SAMPLE_RATE=0.01 python ai_server.py
+    python traffic_capture.py traces/ --stt-model small -o replay_report.json
+"""
+
+import os
+import sys
+import json
+import time
+import uuid
+import random
+import zipfile
+import logging
+import argparse
+import tempfile
+import statistics
+import threading
+from typing import Dict, Any, Optional, List
+
+# AI 모듈 import
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+TRACE_VERSION = 1
+
+
+class TrafficRecorder:
+    """요청 샘플링 기록기 (sample_rate가 0이면 아무것도 하지 않음)"""
+
+    def __init__(self, output_dir: Optional[str] = None, sample_rate: Optional[float] = None,
+                 max_traces: int = 10000):
+        """
+        Args:
+            output_dir: trace 저장 디렉토리 (기본값: TRACE_DIR 또는 ./traces)
+            sample_rate: 기록할 요청 비율 (기본값: TRACE_SAMPLE_RATE 또는 0)
+            max_traces: 디렉토리에 보관할 최대 trace 수 (초과시 기록 중단)
+        """
+        self.output_dir = output_dir or os.getenv('TRACE_DIR', 'traces')
+        self.sample_rate = sample_rate if sample_rate is not None else float(os.getenv('TRACE_SAMPLE_RATE', '0'))
+        self.max_traces = max_traces
+        self._count = None
+        self._lock = threading.Lock()
+        self._setup_logging()
+
+    def _setup_logging(self):
+        self.logger = logging.getLogger(__name__)
+
+    def should_record(self) -> bool:
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    def _reserve_slot(self) -> bool:
+        with self._lock:
+            if self._count is None:
+                os.makedirs(self.output_dir, exist_ok=True)
+                self._count = len([f for f in os.listdir(self.output_dir) if f.endswith(".trace")])
+            if self._count >= self.max_traces:
+                return False
+            self._count += 1
+            return True
+
+    def record(self, audio_path: str, result: Dict[str, Any], config: Dict[str, Any]) -> Optional[str]:
+        """
+        요청 하나를 trace 파일로 저장
+
+        Args:
+            audio_path: 입력 음성 파일 경로
+            result: VoicePipeline.process_voice_input 결과
+            config: 재현에 필요한 파이프라인 설정
+
+        Returns:
+            Optional[str]: 저장된 trace 경로
+        """
+        if not result.get("success") or not self._reserve_slot():
+            return None
+
+        trace_id = uuid.uuid4().hex[:12]
+        path = os.path.join(self.output_dir, f"{time.strftime('%Y%m%d-%H%M%S')}_{trace_id}.trace")
+        suffix = os.path.splitext(audio_path)[1] or ".wav"
+        meta = {
+            "version": TRACE_VERSION,
+            "trace_id": trace_id,
+            "recorded_at": time.time(),
+            "config": config,
+            "input_file": f"input{suffix}",
+            "stage_times": result.get("stage_times", {}),
+            "total_time": result.get("total_time"),
+            "transcribed_text": result.get("transcribed_text"),
+            "llm_response": result.get("llm_response"),
+        }
+
+        try:
+            with zipfile.ZipFile(path, "w") as trace:
+                trace.writestr("meta.json", json.dumps(meta, ensure_ascii=False),
+                               compress_type=zipfile.ZIP_DEFLATED)
+                # 음성은 이미 압축되었거나 압축 효율이 낮아 그대로 저장
+                trace.write(audio_path, meta["input_file"], compress_type=zipfile.ZIP_STORED)
+                if isinstance(result.get("audio_output"), bytes):
+                    trace.writestr("tts_output.mp3", result["audio_output"], compress_type=zipfile.ZIP_STORED)
+        except Exception as e:
+            self.logger.warning(f"Failed to record trace: {e}")
+            return None
+        return path
+
+    def maybe_record(self, audio_path: str, result: Dict[str, Any],
+                     config: Dict[str, Any]) -> Optional[str]:
+        """샘플링에 걸린 요청만 기록"""
+        if not self.should_record():
+            return None
+        return self.record(audio_path, result, config)
+
+
+def load_trace(path: str, extract_dir: str) -> Dict[str, Any]:
+    """trace 파일을 읽고 음성/TTS 결과를 extract_dir에 풀어 경로 반환"""
+    with zipfile.ZipFile(path) as trace:
+        meta = json.loads(trace.read("meta.json"))
+        meta["audio_path"] = trace.extract(meta["input_file"], extract_dir)
+        if "tts_output.mp3" in trace.namelist():
+            meta["tts_output"] = trace.read("tts_output.mp3")
+    return meta
+
+
+def _build_replay_backends():
+    """기록된 LLM/TTS 응답을 그대로 돌려주는 재현용 백엔드"""
+    from Models.LLM import BaseLLM
+
+    class ReplayLLM(BaseLLM):
+        def __init__(self):
+            self.response = ""
+            self.latency = 0.0
+
+        def generate_response(self, user_input: str, history=None, token=None) -> str:
+            time.sleep(self.latency)
+            return self.response
+
+        def get_model_info(self) -> Dict[str, Any]:
+            return {"model_name": "replay", "provider": "Replay"}
+
+    class ReplayTTS:
+        model_name = "replay"
+
+        def __init__(self):
+            self.audio = b""
+            self.latency = 0.0
+
+        def generate_from_llm_response(self, llm_response: str, output_path=None, token=None) -> bytes:
+            time.sleep(self.latency)
+            return self.audio
+
+        def get_model_info(self) -> Dict[str, Any]:
+            return {"model_name": "replay", "model_type": "replay"}
+
+    return ReplayLLM(), ReplayTTS()
+
+
+def character_error_rate(reference: str, hypothesis: str) -> float:
+    """문자 단위 편집 거리 / 기준 길이"""
+    reference = (reference or "").replace(" ", "")
+    hypothesis = (hypothesis or "").replace(" ", "")
+    if not reference:
+        return 0.0 if not hypothesis else 1.0
+    previous = list(range(len(hypothesis) + 1))
+    for i, ref_char in enumerate(reference, 1):
+        current = [i]
+        for j, hyp_char in enumerate(hypothesis, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1,
+                               previous[j - 1] + (ref_char != hyp_char)))
+        previous = current
+    return previous[-1] / len(reference)
+
+
+def replay(trace_paths: List[str], stt_model: Optional[str] = None,
+           device: str = "auto", simulate_latency: bool = False) -> Dict[str, Any]:
+    """
+    trace들을 현재 빌드의 VoicePipeline으로 재실행해 비교
+
+    Args:
+        trace_paths: trace 파일 목록
+        stt_model: STT 모델 (기본값: 기록 당시 설정)
+        device: 실행 device
+        simulate_latency: 기록된 LLM/TTS 지연 시간을 재현할지 여부
+    """
+    from voice_pipeline import VoicePipeline
+
+    pipeline = None
+    llm, tts = _build_replay_backends()
+    records = []
+
+    with tempfile.TemporaryDirectory() as extract_dir:
+        for path in trace_paths:
+            trace = load_trace(path, extract_dir)
+            config = trace["config"]
+
+            if pipeline is None:
+                pipeline = VoicePipeline(stt_model=stt_model or config.get("stt_model", "small"),
+                                         llm_type="stub", device=device, tts_type="stub")
+                pipeline.llm, pipeline.tts = llm, tts
+            if config.get("preprocessing"):
+                pipeline.stt.configure_preprocessing(**config["preprocessing"])
+
+            recorded_times = trace["stage_times"]
+            llm.response = trace["llm_response"]
+            tts.audio = trace.get("tts_output", b"")
+            llm.latency = recorded_times.get("llm", 0.0) if simulate_latency else 0.0
+            tts.latency = recorded_times.get("tts", 0.0) if simulate_latency else 0.0
+
+            result = pipeline.process_voice_input(trace["audio_path"])
+            os.remove(trace["audio_path"])
+
+            new_text = result.get("transcribed_text")
+            records.append({
+                "trace": os.path.basename(path),
+                "success": result["success"],
+                "recorded_stt": _stt_seconds(recorded_times),
+                "replayed_stt": _stt_seconds(result.get("stage_times", {})),
+                "transcript_match": new_text == trace["transcribed_text"],
+                "cer": round(character_error_rate(trace["transcribed_text"], new_text), 4),
+                "recorded_text": trace["transcribed_text"],
+                "replayed_text": new_text,
+            })
+
+    return {"summary": _summarize_replay(records), "traces": records}
+
+
+def _stt_seconds(stage_times: Dict[str, float]) -> Optional[float]:
+    """디코딩/전처리 + Whisper 시간 (decode 단계가 분리되기 전 trace의 stt와 같은 구간)"""
+    if stage_times.get("stt") is None:
+        return None
+    return round(stage_times["stt"] + stage_times.get("decode", 0.0), 3)
+
+
+def _summarize_replay(records: List[Dict[str, Any]]) -> Dict[str, Any]:
+    def stats(values):
+        values = sorted(v for v in values if v is not None)
+        if not values:
+            return None
+        return {
+            "mean": round(statistics.mean(values), 4),
+            "p50": round(values[len(values) // 2], 4),
+            "p95": round(values[min(len(values) - 1, int(0.95 * len(values)))], 4),
+        }
+
+    recorded = stats([r["recorded_stt"] for r in records])
+    replayed = stats([r["replayed_stt"] for r in records])
+    return {
+        "traces": len(records),
+        "failures": sum(1 for r in records if not r["success"]),
+        "transcript_match_rate": round(sum(r["transcript_match"] for r in records) / len(records), 4) if records else None,
+        "mean_cer": round(statistics.mean(r["cer"] for r in records), 4) if records else None,
+        "stt_latency": {"recorded": recorded, "replayed": replayed},
+    }
+
+
+def main(argv=None):
+    """메인 함수 - trace 재실행"""
+    parser = argparse.ArgumentParser(description="기록된 trace를 현재 빌드로 재실행해 지연 시간/변환 결과 비교")
+    parser.add_argument("traces", help="trace 파일 또는 디렉토리")
+    parser.add_argument("--stt-model", help="STT 모델 (기본값: 기록 당시 설정)")
+    parser.add_argument("--device", default="auto", help="실행 device")
+    parser.add_argument("--simulate-latency", action="store_true", help="기록된 LLM/TTS 지연 시간 재현")
+    parser.add_argument("-o", "--output", help="결과 JSON 저장 경로")
+    args = parser.parse_args(argv)
+
+    from Models.LogConfig import configure_logging
+    configure_logging(log_format=os.getenv('LOG_FORMAT', 'text'))
+
+    if os.path.isdir(args.traces):
+        paths = sorted(os.path.join(args.traces, f) for f in os.listdir(args.traces) if f.endswith(".trace"))
+    else:
+        paths = [args.traces]
+    if not paths:
+        print("❌ trace 파일이 없습니다.")
+        return
+
+    report = replay(paths, args.stt_model, args.device, args.simulate_latency)
+    summary = report["summary"]
+    print(f"📊 {summary['traces']}개 trace 재실행 (실패 {summary['failures']}개)")
+    print(f"📝 변환 결과 일치율: {summary['transcript_match_rate']}, 평균 CER: {summary['mean_cer']}")
+    print(f"⏱️  STT 지연 시간 (기록 → 재실행): {summary['stt_latency']['recorded']} → {summary['stt_latency']['replayed']}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+
+
+if __name__ == "__main__":
+    main()
@@ -2,25 +2,66 @@ import sys
 import os
 import time
 import logging
-from typing import Dict, Any
+import threading
+from contextlib import nullcontext
+import numpy as np
+import librosa
+from typing import Dict, Any, Optional, Iterable, Callable, ContextManager
 
 # AI 모듈 import
 sys.path.append(os.path.join(os.path.dirname(__file__), 'Models'))
-from Models.STT import WhisperSTT
-from Models.LLM import LLMFactory
-from Models.TTS import TTS
+from Models.STT import (WhisperSTT, decode_audio_file, init_decode_worker, init_stt_worker,
+                        transcribe_in_worker)
+from Models.LLM import LLMFactory, KOREAN_SYSTEM_PROMPT, FALLBACK_RESPONSE
+from Models.TTS import TTSFactory
+from Models.Memory import ConversationMemory
+from Models.MemoryGovernor import MemoryGovernor
+from Models.ResponseBudget import ResponseBudget, mp3_seconds
+from Models.Cancellation import CancellationToken, RequestCancelled, check
+from Models.LogConfig import log_fields, configure_logging
+from profiling import profile_stage
+from speculation import SpeculativeLLM
+from stage_graph import StageGraph, StageSpec, StageJob
+
+# 단계별 기본 실행기 (PIPELINE_STAGES로 단계마다 변경, 예: "decode=process:4,stt=process:2,llm=thread:16")
+# - decode: 음성 디코딩 + 전처리 (CPU, 모델 없이 실행되어 프로세스 풀로 옮기기 쉬움)
+# - stt: Whisper (thread는 공유 모델이라 한 번에 하나씩 디코딩, process는 프로세스마다 CPU 모델 로드)
+# - llm / tts: 대부분 HTTP 대기 (스레드 수 = 동시 호출 수)
+DEFAULT_STAGE_CONFIG = {
+    "decode": {"executor": "thread", "workers": 2},
+    "stt": {"executor": "thread", "workers": 1},
+    "llm": {"executor": "thread", "workers": 8},
+    "tts": {"executor": "thread", "workers": 8},
+}
 
 class VoicePipeline:
     """STT → LLM → TTS 음성 처리 파이프라인"""
     
     def __init__(self, 
                  stt_model: str = "small",
-                 llm_type: str = "gemini",  # "gpt" or "gemini"
-                 device: str = "auto"):
+                 llm_type: str = "gemini",  # "gpt", "gemini", "local", "router" or "stub"
+                 device: str = "auto",
+                 tts_type: str = "google",  # "google" or "stub"
+                 speculative_llm: bool = False,
+                 speculation_stable_seconds: float = 0.6,
+                 partial_interval: float = 0.5,
+                 governor: Optional[MemoryGovernor] = None,
+                 response_budget: Optional[ResponseBudget] = None,
+                 stage_config: Optional[Dict[str, Dict[str, Any]]] = None):
         self.device = self._get_device(device)
         self.llm_type = llm_type
+        self.tts_type = tts_type
+        # 스트리밍 입력에서 부분 STT 결과가 안정되면 LLM 호출을 미리 시작
+        self.speculator = SpeculativeLLM(stable_seconds=speculation_stable_seconds) if speculative_llm else None
+        self.partial_interval = partial_interval
+        # 지정시 STT 모델을 메모리 예산/유휴 시간에 따라 내렸다가 다시 로드
+        self.governor = governor
+        # 재생 시간 예산에서 LLM 생성 상한/중단 조건과 TTS 합성 범위를 함께 결정
+        self.budget = response_budget or ResponseBudget()
         self._setup_logging()
         self._initialize_components(stt_model)
+        # 단계마다 실행기 종류/작업자 수/큐 크기를 따로 지정 (CPU와 네트워크 동시 처리 수 분리)
+        self.stages = self._build_stage_graph(stage_config)
         self.logger.info(f"Voice Pipeline initialized successfully on {self.device}")
     
     def _get_device(self, device: str) -> str:
@@ -35,85 +76,310 @@ class VoicePipeline:
         return device
     
     def _setup_logging(self):
-        logging.basicConfig(level=logging.INFO)
         self.logger = logging.getLogger(__name__)
     
     def _initialize_components(self, stt_model: str):
         self.logger.info("Initializing AI components...")
         
-        self.stt = WhisperSTT(model_name=stt_model, device=self.device)
+        self.stt = WhisperSTT(model_name=stt_model, device=self.device, governor=self.governor)
         self.stt.optimize_for_korean(True)
         
-        # LLM 초기화 (GPT/Gemini 선택 가능)
-        self.llm = LLMFactory.create_llm(self.llm_type)
+        # LLM 초기화 (GPT/Gemini/로컬 모델 선택 가능, 로컬 모델은 메모리 관리 대상)
+        llm_kwargs = {"governor": self.governor} if self.llm_type == "local" else {}
+        self.llm = LLMFactory.create_llm(self.llm_type,
+                                         system_prompt=self.budget.system_prompt(KOREAN_SYSTEM_PROMPT),
+                                         **llm_kwargs)
+        
+        # 세션별 대화 기록 (session_id가 주어진 요청에만 사용)
+        self.memory = ConversationMemory()
         
-        self.tts = TTS()
+        self.tts = TTSFactory.create_tts(self.tts_type, budget=self.budget)
         
         self.logger.info("All AI components initialized")
     
-    def process_voice_input(self, audio_path: str) -> Dict[str, Any]:
+    def _build_stage_graph(self, stage_config: Optional[Dict[str, Dict[str, Any]]]) -> StageGraph:
+        """기본 단계 설정에 stage_config를 덮어써 decode → stt → llm → tts 그래프 구성"""
+        stage_config = stage_config or {}
+        unknown = set(stage_config) - set(DEFAULT_STAGE_CONFIG)
+        if unknown:
+            raise ValueError(f"Unknown pipeline stages: {sorted(unknown)}")
+        config = {name: dict(default, **stage_config.get(name, {}))
+                  for name, default in DEFAULT_STAGE_CONFIG.items()}
+        
+        decode = config["decode"]
+        if decode["executor"] == "process":
+            decode["initializer"] = init_decode_worker
+        stt = config["stt"]
+        if stt["executor"] == "process":
+            # 작업자 프로세스마다 CPU 모델을 따로 로드 (메모리 관리자 대상 아님) - 코어를 나눠 병렬 디코딩
+            cpu_count = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count()
+            stt["initializer"] = init_stt_worker
+            stt["initargs"] = (self.stt.model_name, max(1, cpu_count // max(1, stt.get("workers", 1))))
+        
+        return StageGraph([
+            StageSpec("decode", self._decode_stage, **decode),
+            StageSpec("stt", self._stt_stage, **stt),
+            StageSpec("llm", self._llm_stage, **config["llm"]),
+            StageSpec("tts", self._tts_stage, **config["tts"]),
+        ])
+    
+    def _decode_stage(self, job: StageJob) -> np.ndarray:
+        """음성 파일 → 16kHz 음성 (디코딩 + 적응형 전처리)"""
+        with profile_stage("decode"):
+            audio, timings = job.run(decode_audio_file, job.payload, self.stt.get_preprocessing_info())
+        self.stt.record_preprocessing(timings)
+        return audio
+    
+    def _stt_stage(self, job: StageJob) -> Optional[str]:
+        """16kHz 음성 → 텍스트 (비어 있으면 남은 단계 없이 오류 응답)"""
+        with profile_stage("stt"):
+            if job.stage.spec.executor == "process":
+                # 연결 끊김 취소는 job.run이 결과를 버리는 것으로 처리, 기한은 작업자 디코딩에도 적용
+                timeout = job.token.remaining() if job.token is not None else None
+                transcribed_text = job.run(transcribe_in_worker, job.payload,
+                                           dict(self.stt.decoding_config), timeout)
+            else:
+                transcribed_text = self.stt.transcribe_array(job.payload, token=job.token)
+        self.logger.debug("STT 완료", extra=log_fields(payload={"transcript": transcribed_text}))
+        if not transcribed_text:
+            job.finish(self._create_error_response("음성을 텍스트로 변환할 수 없습니다."))
+        job.context["transcribed_text"] = transcribed_text
+        return transcribed_text
+    
+    def _llm_stage(self, job: StageJob) -> str:
+        """텍스트 → 응답 (스트리밍 요청은 추측 호출 결과 재사용)"""
+        with profile_stage("llm"):
+            llm_response = self._process_llm(job.payload, job.context.get("session_id"),
+                                             job.context.get("speculation"), job.token)
+        job.context["llm_response"] = llm_response
+        return llm_response
+    
+    def _tts_stage(self, job: StageJob) -> bytes:
+        """응답 → 음성"""
+        with profile_stage("tts"):
+            return self._process_tts(job.payload, job.token)
+    
+    def process_voice_input(self, audio_path: str, session_id: Optional[str] = None,
+                            token: Optional[CancellationToken] = None) -> Dict[str, Any]:
         """
         음성 입력을 처리하는 메인 파이프라인
         
         Args:
             audio_path: 음성 파일 경로
+            session_id: 대화 세션 ID (없으면 이전 대화 없이 처리)
+            token: 요청 취소 토큰 (클라이언트 연결 끊김/제한 시간 초과시 남은 단계 중단)
             
         Returns:
             Dict[str, Any]: 처리 결과
+            
+        Raises:
+            RequestCancelled: 처리 도중 요청이 취소됨
         """
         start_time = time.time()
         
         try:
-            # Step 1: STT (음성 → 텍스트)
-            transcribed_text = self._process_stt(audio_path)
-            if not transcribed_text:
-                return self._create_error_response("음성을 텍스트로 변환할 수 없습니다.")
+            # decode → STT → LLM → TTS (단계마다 전용 작업자, 단계 사이 큐 대기는 stage_wait)
+            job = self.stages.run(audio_path, context={"session_id": session_id}, token=token)
+            if job.stopped_at is not None:
+                return job.result
             
-            # Step 2: LLM (텍스트 → 응답)
-            llm_response = self._process_llm(transcribed_text)
+            stage_times = dict(job.stage_times, stage_wait=round(job.wait_time, 3))
+            return self._create_success_response(
+                job.context["transcribed_text"], job.context["llm_response"], job.result,
+                time.time() - start_time, stage_times
+            )
             
-            # Step 3: TTS (텍스트 → 음성)
-            audio_output = self._process_tts(llm_response)
+        except RequestCancelled:
+            raise
+        except Exception as e:
+            self.logger.error(f"Pipeline processing failed: {e}")
+            return self._create_error_response(str(e))
+    
+    def process_voice_stream(self, chunks: Iterable[np.ndarray], session_id: Optional[str] = None,
+                             sample_rate: int = 16000,
+                             token: Optional[CancellationToken] = None,
+                             admit: Optional[Callable[[float], ContextManager]] = None,
+                             background: Optional[Callable[[float], ContextManager]] = None) -> Dict[str, Any]:
+        """
+        말하는 도중 도착하는 음성 청크를 처리하는 파이프라인
+        
+        speculative_llm이 켜져 있으면 수신 중 부분 STT를 반복해 결과가 안정되는 즉시
+        LLM 호출을 시작하고, 최종 STT 결과와 같으면 그 응답을 사용
+        
+        Args:
+            chunks: float32 mono 음성 청크 (수신 순서대로)
+            session_id: 대화 세션 ID
+            sample_rate: 청크의 샘플링 레이트
+            token: 요청 취소 토큰
+            admit: 수신이 끝난 뒤 최종 STT/LLM/TTS 구간을 감쌀 컨텍스트 (음성 길이(초) → 컨텍스트,
+                   예: 스케줄러 슬롯 - 사용자가 말하는 동안에는 슬롯을 차지하지 않도록)
+            background: 수신 중 부분 STT/추측 LLM 호출을 감쌀 컨텍스트 (음성 길이(초) → 실행 가능 여부를
+                        yield하는 컨텍스트, 예: 스케줄러의 남는 슬롯 - False면 이번 호출은 건너뜀)
+            
+        Returns:
+            Dict[str, Any]: 처리 결과 (stage_times["stt"]는 음성 종료 후 지연 시간,
+                            stage_times["queue"]는 admit 대기 시간)
+            
+        Raises:
+            RequestCancelled: 처리 도중 요청이 취소됨
+        """
+        start_time = time.time()
+        stage_times = {}
+        buffer = []
+        state = {"received": 0, "finished": False}
+        condition = threading.Condition()
+        decoder = None
+        idle_slot = background or (lambda duration: nullcontext(True))
+        
+        speculation = None
+        if self.speculator:
+            generate = self._llm_generator(session_id, token)
+            
+            def speculate(text: str) -> str:
+                # 최종 처리 전 호출이므로 남는 슬롯이 있을 때만 (실패하면 최종 문장으로 다시 호출)
+                with idle_slot(state["received"] / 16000) as acquired:
+                    if not acquired:
+                        raise RuntimeError("No idle slot for speculative LLM call")
+                    return generate(text)
+            speculation = self.speculator.begin(generate, speculate)
+        
+        def decode_partials():
+            interval = int(self.partial_interval * 16000)
+            decoded = 0
+            while True:
+                with condition:
+                    condition.wait_for(lambda: state["finished"] or state["received"] - decoded >= interval)
+                    if state["finished"]:
+                        return
+                    audio = np.concatenate(buffer)
+                decoded = len(audio)
+                try:
+                    with idle_slot(decoded / 16000) as acquired:
+                        if not acquired:
+                            # 슬롯을 기다리는 요청에 양보하고 다음 구간에서 다시 시도
+                            continue
+                        hypothesis = self.stt.transcribe_array(audio, partial=True, token=token)
+                except RequestCancelled:
+                    return
+                except Exception as e:
+                    self.logger.warning(f"Partial transcription failed: {e}")
+                    return
+                speculation.observe(hypothesis, decoded / 16000)
+        
+        try:
+            if speculation is not None:
+                decoder = threading.Thread(target=decode_partials, name="partial-stt", daemon=True)
+                decoder.start()
+            
+            for chunk in chunks:
+                check(token)
+                chunk = np.asarray(chunk, dtype=np.float32)
+                if sample_rate != 16000:
+                    chunk = librosa.resample(chunk, orig_sr=sample_rate, target_sr=16000)
+                with condition:
+                    buffer.append(chunk)
+                    state["received"] += len(chunk)
+                    condition.notify()
+        finally:
+            with condition:
+                state["finished"] = True
+                condition.notify()
+        
+        if not buffer:
+            return self._create_error_response("음성 데이터가 없습니다.")
+        
+        stage_start = time.time()
+        with admit(state["received"] / 16000) if admit is not None else nullcontext():
+            stage_times["queue"] = round(time.time() - stage_start, 3)
+            return self._finish_stream(buffer, decoder, speculation, session_id, token,
+                                       start_time, stage_times)
+    
+    def _finish_stream(self, buffer, decoder, speculation, session_id: Optional[str],
+                       token: Optional[CancellationToken], start_time: float,
+                       stage_times: Dict[str, float]) -> Dict[str, Any]:
+        """수신이 끝난 스트리밍 요청의 최종 STT → LLM → TTS"""
+        try:
+            stage_start = time.time()
+            if decoder is not None:
+                decoder.join()
+            join_time = time.time() - stage_start
             
-            total_time = time.time() - start_time
+            # 이미 16kHz 배열이므로 decode 단계를 건너뛰고 STT부터
+            job = self.stages.run(np.concatenate(buffer), token=token, start="stt",
+                                  context={"session_id": session_id, "speculation": speculation})
+            if job.stopped_at is not None:
+                return job.result
             
+            stage_times.update(job.stage_times, stage_wait=round(job.wait_time, 3))
+            stage_times["stt"] = round(join_time + job.stage_times["stt"], 3)
             return self._create_success_response(
-                transcribed_text, llm_response, audio_output, total_time
+                job.context["transcribed_text"], job.context["llm_response"], job.result,
+                time.time() - start_time, stage_times
             )
             
+        except RequestCancelled:
+            raise
         except Exception as e:
-            self.logger.error(f"Pipeline processing failed: {e}")
+            self.logger.error(f"Streaming pipeline processing failed: {e}")
             return self._create_error_response(str(e))
     
-    def _process_stt(self, audio_path: str) -> str:
-        """STT 처리"""
-        self.logger.info("Processing STT...")
-        transcribed_text = self.stt.transcribe(audio_path, use_preprocessing=True)
-        self.logger.info(f"STT 결과: {transcribed_text}")
-        return transcribed_text
+    def _llm_generator(self, session_id: Optional[str],
+                       token: Optional[CancellationToken] = None) -> Callable[[str], str]:
+        """현재 대화 기록으로 응답을 만드는 함수 (기록 갱신은 응답 확정 후)"""
+        history = self.memory.get_context(session_id) if session_id else None
+        
+        def generate(text: str) -> str:
+            # 말할 문장이 예산만큼 나오면 스트림을 닫아 생성 중단
+            try:
+                return self.budget.collect(self.llm.generate_stream(
+                    text, history=history, token=token, max_new_tokens=self.budget.max_tokens))
+            except RequestCancelled:
+                raise
+            except Exception as e:
+                self.logger.error(f"LLM response generation failed: {e}")
+                return FALLBACK_RESPONSE
+        return generate
     
-    def _process_llm(self, text: str) -> str:
-        """LLM 처리"""
-        self.logger.info("Processing LLM...")
-        llm_response = self.llm.generate_response(text)
-        self.logger.info(f"LLM 응답: {llm_response}")
+    def _process_llm(self, text: str, session_id: Optional[str] = None, speculation=None,
+                     token: Optional[CancellationToken] = None) -> str:
+        """LLM 처리 (추측 호출이 있으면 최종 문장과 비교해 재사용)"""
+        self.logger.debug("Processing LLM...")
+        if speculation is not None:
+            llm_response = speculation.finish(text)
+        else:
+            llm_response = self._llm_generator(session_id, token)(text)
+        # 실패 안내 문구는 기록하지 않음 (다음 요청의 문맥에 섞이면 모델이 같은 답을 반복함)
+        if session_id and llm_response != FALLBACK_RESPONSE:
+            self.memory.add_turn(session_id, text, llm_response)
+        self.logger.debug("LLM 완료", extra=log_fields(payload={"llm_response": llm_response}))
         return llm_response
     
-    def _process_tts(self, text: str) -> bytes:
+    def _process_tts(self, text: str, token: Optional[CancellationToken] = None) -> bytes:
         """TTS 처리"""
-        self.logger.info("Processing TTS...")
-        audio_output = self.tts.generate_from_llm_response(text)
+        self.logger.debug("Processing TTS...")
+        audio_output = self.tts.generate_from_llm_response(text, token=token)
+        if isinstance(audio_output, bytes):
+            # 실제 합성 길이로 발화 속도를 보정해 다음 응답의 글자/토큰 상한에 반영
+            self.budget.observe_speech(text, mp3_seconds(audio_output))
         return audio_output
     
     def _create_success_response(self, transcribed_text: str, llm_response: str, 
-                               audio_output: bytes, total_time: float) -> Dict[str, Any]:
-        """성공 응답 생성"""
+                               audio_output: bytes, total_time: float,
+                               stage_times: Optional[Dict[str, float]] = None) -> Dict[str, Any]:
+        """성공 응답 생성 (요청당 한 줄의 구조화 로그 기록)"""
+        self.logger.info("Voice pipeline completed", extra=log_fields(
+            payload={"transcript": transcribed_text, "llm_response": llm_response},
+            total_time=round(total_time, 3),
+            stage_times=stage_times or {},
+            audio_bytes=len(audio_output) if isinstance(audio_output, bytes) else None
+        ))
         return {
             "success": True,
             "transcribed_text": transcribed_text,
             "llm_response": llm_response,
             "audio_output": audio_output,
-            "total_time": round(total_time, 2)
+            "total_time": round(total_time, 2),
+            "stage_times": stage_times or {}
         }
     
     def _create_error_response(self, error_message: str) -> Dict[str, Any]:
@@ -135,20 +401,24 @@ class VoicePipeline:
                 "stt": self.stt.get_model_info(),
                 "llm": self.llm.get_model_info(),
                 "tts": self.tts.get_model_info()
-            }
+            },
+            "speculation": self.speculator.get_stats() if self.speculator else None,
+            "response_budget": self.budget.get_stats(),
+            "stages": self.stages.get_stats()
         }
     
-    def __del__(self):
-        """리소스 정리"""
-        if hasattr(self, 'stt'):
-            del self.stt
-        if hasattr(self, 'llm'):
-            del self.llm
-        if hasattr(self, 'tts'):
-            del self.tts
+    def close(self):
+        """리소스 정리 (단계 작업자 종료, 모델 메모리 해제)"""
+        self.stages.close()
+        if self.speculator is not None:
+            self.speculator.shutdown()
+        self.stt.close()
+        if hasattr(self.llm, "close"):
+            self.llm.close()
 
 def main():
     """메인 함수 - 파이프라인 테스트"""
+    configure_logging(log_format=os.getenv('LOG_FORMAT', 'text'))
     print("🎤 Voice Pipeline 테스트")
     print("=" * 50)
     